@@ -1,14 +1,20 @@
+import os
+import sys
 import cv2
 
-cap = cv2.VideoCapture(0)  # 0 = /dev/video0
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'test'))
+from camera_source import open_source
 
-if not cap.isOpened():
+# 0 = /dev/video0, or any source URI (see test/camera_source.py)
+try:
+    cap = open_source(sys.argv[1] if len(sys.argv) > 1 else 0)
+except RuntimeError:
     print("Cannot open camera")
     exit()
 
+frame = cap.new_buffer()
 while True:
-    ret, frame = cap.read()
-    if not ret:
+    if not cap.read_into(frame):
         print("Can't receive frame")
         break
 
@@ -6,12 +6,19 @@
 
 依赖:
   sudo apt install python3-opencv python3-picamera2
+
+用法:
+  python3 color.py [source]   # 默认 picam:，也可用 0、v4l2:///dev/video0?fourcc=MJPG、视频文件等
 """
 
-import time
+import os
+import sys
 import cv2
 import numpy as np
-from picamera2 import Picamera2
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'test'))
+from camera_source import open_source
+from robot_config import DEFAULT_CONFIG_FILE, load_config
 
 # ========== 颜色 HSV 阈值（初始版本，后续可调）==========
 # 红色需要两段
@@ -28,21 +35,41 @@ UPPER_BLUE = np.array([130, 255, 255])
 
 # 轮廓面积阈值，避免把噪点当成方块
 MIN_AREA = 500  # 根据实际画面可适当调大/调小
-
-# ========== 初始化 PiCamera2 ==========
-picam2 = Picamera2()
-config = picam2.create_preview_configuration(
-    main={
-        "size": (640, 480),   # 分辨率，够用即可
-        "format": "RGB888"
-    }
-)
-picam2.configure(config)
-picam2.start()
-time.sleep(0.5)  # 给相机一点时间稳定曝光
+KERNEL_SIZE = 5
+
+COLOR_RANGES = {
+    'red': [(LOWER_RED1, UPPER_RED1), (LOWER_RED2, UPPER_RED2)],
+    'yellow': [(LOWER_YELLOW, UPPER_YELLOW)],
+    'blue': [(LOWER_BLUE, UPPER_BLUE)],
+}
+
+# 若当前目录有 robot_config.json（见 test/robot_config.py），改用其中的方块阈值
+if os.path.exists(DEFAULT_CONFIG_FILE):
+    block = load_config(DEFAULT_CONFIG_FILE).get('block', {})
+    for color, bounds in block.get('color_ranges', {}).items():
+        if color in COLOR_RANGES:
+            COLOR_RANGES[color] = [(np.array(lo), np.array(hi)) for lo, hi in bounds]
+    MIN_AREA = block.get('min_area', MIN_AREA)
+    KERNEL_SIZE = block.get('kernel', KERNEL_SIZE)
+    print(f"Loaded block thresholds from {DEFAULT_CONFIG_FILE}")
+
+# ========== 初始化相机（默认 PiCamera2）==========
+try:
+    source = open_source(sys.argv[1] if len(sys.argv) > 1 else 'picam:', 640, 480)
+except RuntimeError:
+    print("Cannot open camera")
+    sys.exit(1)
+frame_bgr = source.new_buffer()  # 复用同一块缓冲区
 
 print("Camera started. Press 'q' in the window to quit.")
 
+def color_mask(hsv, ranges):
+    """多个 HSV 区间的掩膜取并集（红色需要两段）"""
+    mask = cv2.inRange(hsv, *ranges[0])
+    for lower, upper in ranges[1:]:
+        mask = cv2.bitwise_or(mask, cv2.inRange(hsv, lower, upper))
+    return mask
+
 def find_largest_contour(mask):
     """在二值掩膜中找到面积最大的轮廓及其外接矩形中心点"""
     contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
@@ -61,21 +88,18 @@ def find_largest_contour(mask):
 
 while True:
     # ========== 1. 采集一帧图像 ==========
-    frame = picam2.capture_array()       # RGB
-    frame_bgr = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
+    if not source.read_into(frame_bgr):  # BGR
+        break
     hsv = cv2.cvtColor(frame_bgr, cv2.COLOR_BGR2HSV)
 
     # ========== 2. 构建颜色掩膜 ==========
     # 红色：两个区间 + 起来
-    mask_red1 = cv2.inRange(hsv, LOWER_RED1, UPPER_RED1)
-    mask_red2 = cv2.inRange(hsv, LOWER_RED2, UPPER_RED2)
-    mask_red = cv2.bitwise_or(mask_red1, mask_red2)
-
-    mask_yellow = cv2.inRange(hsv, LOWER_YELLOW, UPPER_YELLOW)
-    mask_blue = cv2.inRange(hsv, LOWER_BLUE, UPPER_BLUE)
+    mask_red = color_mask(hsv, COLOR_RANGES['red'])
+    mask_yellow = color_mask(hsv, COLOR_RANGES['yellow'])
+    mask_blue = color_mask(hsv, COLOR_RANGES['blue'])
 
     # ========== 3. 去噪：形态学操作 ==========
-    kernel = np.ones((5, 5), np.uint8)
+    kernel = np.ones((KERNEL_SIZE, KERNEL_SIZE), np.uint8)
     mask_red = cv2.morphologyEx(mask_red, cv2.MORPH_OPEN, kernel)
     mask_yellow = cv2.morphologyEx(mask_yellow, cv2.MORPH_OPEN, kernel)
     mask_blue = cv2.morphologyEx(mask_blue, cv2.MORPH_OPEN, kernel)
@@ -135,5 +159,5 @@ while True:
         break
 
 # ========== 清理资源 ==========
-picam2.stop()
+source.release()
 cv2.destroyAllWindows()
@@ -63,6 +63,28 @@ int servo_min = 20;
 int servo_max = 160;
 
 unsigned long time;
+//host keep-alive dead-man: "ka<ms>" stops the motors when no command
+//arrives for <ms> while moving, "ka0" turns it off (default)
+unsigned long lastCommandMillis = 0;
+unsigned long deadmanMillis = 0;
+bool moving = false;
+
+//non-blocking arm schedule: "go" and "rel" start a sequence that armUpdate()
+//steps through on every loop(), so chassis commands keep being executed while
+//the arm moves. Progress lines: "Mclip" gripper closed (the block is held),
+//"Mup" arm raised, "Mopen" gripper open
+#define ARM_IDLE 0
+#define ARM_APPROACH 1
+#define ARM_CLIP 2
+#define ARM_CLIPPED 3
+#define ARM_RISE 4
+#define ARM_OPEN 5
+#define APPROACH_STEP 33   //ms per degree, as writeall() + delay(3)
+#define RISE_STEP 35       //ms per degree, as writeall() + delay(5)
+#define ARM_SETTLE 1000    //ms before clipping and before rising
+#define OPEN_SETTLE 300    //ms for the gripper to open
+int armPhase = ARM_IDLE;
+unsigned long armNextMillis = 0;
 
 //FaBoPWM faboPWM;
 int pos = 0;
@@ -439,6 +461,7 @@ void setup()
 
 void loop()
 {
+  armUpdate();
   // run the code in every 20ms
   if (millis() > (time + 15)) {
     voltCount++;
@@ -447,6 +470,10 @@ void loop()
 
       hand_move();
       Serialmove();
+      if (deadmanMillis > 0 && moving && millis() - lastCommandMillis > deadmanMillis) {
+        STOP();
+        moving = false;
+      }
     }else{
       UART_Control(); //get USB and BT serial data
     }
@@ -465,6 +492,14 @@ void loop()
 
 void Serialmove(){
   String Serialstr=Serial.readStringUntil('\n');
+  if (Serialstr.length() == 0) return;  // read timed out: not a command, the dead-man keeps counting
+  lastCommandMillis = millis();
+  if (Serialstr == "A" || Serialstr == "B" || Serialstr == "L" || Serialstr == "R" ||
+      Serialstr == "rC" || Serialstr == "rA") {
+    moving = true;
+  } else if (Serialstr == "S") {
+    moving = false;
+  }
   if(Serialstr =="A"){ADVANCE();}
   else if(Serialstr =="B"){BACK();}
   else if(Serialstr =="L"){LEFT_2();}
@@ -476,16 +511,34 @@ void Serialmove(){
   else if(Serialstr =="50"){Motor_PWM=50;}
   else if(Serialstr =="80"){Motor_PWM=80;}   
   else if(Serialstr =="go"){
-    approach();
-    delay(1000);
-    clip();
-    delay(1000);
-    rise();
-    delay(1000);
-    //away();
+    armStart(ARM_APPROACH, 0);
   }else if(Serialstr=="rel"){ 
     //back();
+    //opening always wins, also in the middle of a pick
     release(); 
+    armStart(ARM_OPEN, OPEN_SETTLE);
+  }else if(Serialstr.startsWith("(")){
+    //gimbal: "(pan,tilt,window)", same format and limits as UART_Control()
+    int commaIndex = Serialstr.indexOf(',');
+    int secondCommaIndex = Serialstr.indexOf(',', commaIndex + 1);
+    int newPan = Serialstr.substring(1, commaIndex).toInt();
+    int newTilt = Serialstr.substring(commaIndex + 1, secondCommaIndex).toInt();
+    if ((newPan > servo_min and newPan < servo_max) and
+        (newTilt > servo_min and newTilt < servo_max)) {
+      pan = newPan;
+      tilt = newTilt;
+      window_size = Serialstr.substring(secondCommaIndex + 1).toInt();
+    }
+  }else if(Serialstr.startsWith("ka")){
+    deadmanMillis = Serialstr.substring(2).toInt();
+    //short read timeout so an idle line cannot hold off the dead-man check
+    Serial.setTimeout(deadmanMillis > 0 || armPhase != ARM_IDLE ? 20 : 1000);
+  }else if(Serialstr.startsWith("P")){
+    //latency loopback: "P<seq>" -> "K<seq>,<millis>"
+    Serial.print("K");
+    Serial.print(Serialstr.substring(1));
+    Serial.print(",");
+    Serial.println(millis());
   }  
 
   
@@ -653,13 +706,64 @@ void release(){
 }
 
 void writeall(){
+  writeServos();
+  delay(30);
+}
+
+void writeServos(){
   myServo2.write(pos2);
   myServo3.write(pos3);
 
   myServo4.write(pos4);
   
   myServo5.write(pos5);
+}
 
-  
-  delay(30);
+void armStart(int phase, unsigned long wait){
+  armPhase = phase;
+  armNextMillis = millis() + wait;
+  //short read timeout so an idle line cannot hold off the arm steps
+  Serial.setTimeout(20);
+}
+
+//approach, clip and rise with the timing of the old blocking go sequence,
+//one step per due deadline instead of delay()
+void armUpdate(){
+  while (armPhase != ARM_IDLE && (long)(millis() - armNextMillis) >= 0) {
+    if (armPhase == ARM_APPROACH) {
+      if (pos4 > drop4) {
+        pos4 -= 1;
+      }
+      armNextMillis += APPROACH_STEP;
+      if (pos4 <= drop4) {
+        armPhase = ARM_CLIP;
+        armNextMillis += ARM_SETTLE;
+      }
+    } else if (armPhase == ARM_CLIP) {
+      pos5 = clip5;
+      armPhase = ARM_CLIPPED;
+      armNextMillis += 30 + ARM_SETTLE;
+    } else if (armPhase == ARM_CLIPPED) {
+      //gripper closed and settled, whatever pos4 the arm started from;
+      //the first rise step follows at once
+      Serial.println("Mclip");
+      armPhase = ARM_RISE;
+    } else if (armPhase == ARM_RISE) {
+      if (pos4 < rise4) {
+        pos4 += 1;
+      }
+      armNextMillis += RISE_STEP;
+      if (pos4 >= rise4) {
+        armPhase = ARM_IDLE;
+        Serial.println("Mup");
+      }
+    } else if (armPhase == ARM_OPEN) {
+      armPhase = ARM_IDLE;
+      Serial.println("Mopen");
+    }
+    writeServos();
+    if (armPhase == ARM_IDLE) {
+      Serial.setTimeout(deadmanMillis > 0 ? 20 : 1000);
+    }
+  }
 }
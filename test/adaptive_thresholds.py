@@ -0,0 +1,382 @@
+#!/usr/bin/env python3
+"""
+Adaptive Color Thresholds
+Fixed HSV bounds drift out of calibration as the arena lighting changes,
+and a region that falls outside them is lost until a long re-search finds
+it again. AdaptiveThresholds keeps decaying per-color H/S/V histograms of
+the pixels inside confidently tracked detections and nudges the detector's
+color_ranges toward them. Bounds only ever widen from the calibrated ones
+(within limits) and relax back as the lighting returns, so a well lit
+arena detects exactly as before.
+
+- Cheap: every `every` confident observations, a strided grid of pixels
+  inside the detection contour is sampled (a few hundred pixels)
+- Hue is handled on a circle centered on each color, so red's two ranges
+  move as one interval; hue edges never grow into another color's range
+- Bounds are written into the detector's range lists in place, so the HSV
+  backend uses them on the next frame. Backends whose tables were
+  synthesized from the ranges (lut, backproject without a samples file)
+  are rebuilt lazily: only after the rounded bounds actually changed, and at
+  most once per rebuild_interval
+
+Benchmark (simulated mats, lighting drifting over 300 frames, fixed vs
+adaptive detection rate):
+    python3 adaptive_thresholds.py --arenas 5
+"""
+
+import math
+import time
+from typing import Dict, List, Optional
+
+import cv2
+import numpy as np
+
+
+def _hue_center(ranges: List) -> float:
+    """Circular mean hue of a color's ranges, weighted by width"""
+    x = y = 0.0
+    for lower, upper in ranges:
+        width = float(upper[0] - lower[0])
+        angle = math.radians((lower[0] + upper[0]) / 2 * 2)  # 180 hue steps = full circle
+        x += width * math.cos(angle)
+        y += width * math.sin(angle)
+    return (math.degrees(math.atan2(y, x)) / 2) % 180
+
+
+class ColorBounds:
+    """One color's bounds: hue interval around its center, S and V limits"""
+
+    def __init__(self, ranges: List):
+        self.center = _hue_center(ranges)
+        intervals = [self.rotate(lower[0], upper[0]) for lower, upper in ranges]
+        self.h = [min(lo for lo, _ in intervals), max(hi for _, hi in intervals)]
+        self.s = [min(int(lower[1]) for lower, _ in ranges), max(int(upper[1]) for _, upper in ranges)]
+        self.v = [min(int(lower[2]) for lower, _ in ranges), max(int(upper[2]) for _, upper in ranges)]
+
+    def rotate(self, lo: float, hi: float):
+        """Hue interval in this color's frame (center at 90)"""
+        start = (lo - self.center + 90) % 180
+        return start, start + (hi - lo)
+
+    def to_ranges(self, h, s, v) -> List:
+        """Detector ranges for rounded bounds, split where hue wraps"""
+        lo = int(round(h[0] + self.center - 90))
+        hi = int(round(h[1] + self.center - 90))
+        s_lo, s_hi, v_lo, v_hi = int(round(s[0])), int(s[1]), int(round(v[0])), int(v[1])
+        if lo < 0:
+            spans = [(0, hi), (lo + 180, 180)]
+        elif hi > 180:
+            spans = [(0, hi - 180), (lo, 180)]
+        else:
+            spans = [(lo, hi)]
+        return [(np.array([a, s_lo, v_lo]), np.array([b, s_hi, v_hi])) for a, b in spans]
+
+
+class AdaptiveThresholds:
+    """Histogram-driven HSV bound updates for one detector"""
+
+    def __init__(self, detector, every: int = 5, stride: int = 6, decay: float = 0.8,
+                 rate: float = 0.25, clock=None):
+        """
+        Initialize with the detector's current (calibrated) ranges as the base
+
+        Args:
+            detector: VisualServo or SmallBlockDetector (color_ranges, segmentation)
+            every: Update on every N-th confident observation of a color
+            stride: Pixel grid step inside the detection
+            decay: Histogram weight kept per update (older lighting fades out)
+            rate: Fraction of the way the bounds move toward their target per update
+            clock: Object providing time() (default: time module)
+        """
+        self.detector = detector
+        self.every = every
+        self.stride = stride
+        self.decay = decay
+        self.rate = rate
+        self.clock = clock if clock is not None else time
+        self.enabled = True
+
+        # Safety limits: how far bounds may widen beyond the calibrated ones
+        self.hue_limit = 6      # hue steps per edge
+        self.sv_drop = 60       # S/V lower bounds
+        self.sv_floor = 40      # S/V lower bounds never go below this (gray floor, shadows)
+        self.min_samples = 150  # Histogram weight needed before bounds move
+        self.hue_margin = 3     # Added outside the 2nd/98th hue percentiles
+        self.sv_margin = 15     # Subtracted from the 2nd S/V percentiles
+        self.min_stable = 3     # Consecutive overlapping detections before learning
+        self.min_confidence = 0.8  # Ignore less certain detections
+        self.rebuild_interval = 2.0  # seconds between table rebuilds
+
+        self.base = {color: ColorBounds(ranges) for color, ranges in detector.color_ranges.items()}
+        self.bounds = {color: {'h': list(b.h), 's': list(b.s), 'v': list(b.v)}
+                       for color, b in self.base.items()}
+        self.hist = {color: {'h': np.zeros(180, np.float32), 's': np.zeros(256, np.float32),
+                             'v': np.zeros(256, np.float32)} for color in self.base}
+        self.observations = {color: 0 for color in self.base}
+        self.stable = {color: 0 for color in self.base}
+        self.last_bbox: Dict[str, tuple] = {}
+        self.stale = False
+        self.last_rebuild = None
+
+        # Statistics
+        self.updates = 0
+        self.changes = 0
+        self.rebuilds = 0
+        self.update_time = 0.0
+
+    # ---- Observations -------------------------------------------------------
+
+    def observe(self, frame: np.ndarray, color: str, detection: Optional[Dict],
+                confidence: float = 1.0) -> bool:
+        """
+        Feed one detection of color (None when it was not found)
+
+        Args:
+            frame: BGR frame the detection came from
+            color: Color name
+            detection: Detection dict with 'bbox' and 'contour', or None
+            confidence: Detection confidence (e.g. a block's shape confidence)
+
+        Returns:
+            True if the color's bounds changed
+        """
+        self.refresh()
+        if not self.enabled or color not in self.base:
+            return False
+        if detection is None or confidence < self.min_confidence:
+            self.stable[color] = 0
+            self.last_bbox.pop(color, None)
+            return False
+
+        # Only learn from a target that stays put between frames
+        bbox = detection['bbox']
+        previous = self.last_bbox.get(color)
+        self.last_bbox[color] = bbox
+        self.stable[color] = self.stable[color] + 1 if previous and _iou(previous, bbox) > 0.5 else 1
+        if self.stable[color] < self.min_stable:
+            return False
+        self.observations[color] += 1
+        if self.observations[color] % self.every:
+            return False
+
+        start = time.perf_counter()
+        changed = self._update(frame, color, detection)
+        self.update_time += time.perf_counter() - start
+        return changed
+
+    def _sample(self, frame: np.ndarray, detection: Dict) -> np.ndarray:
+        """HSV of a strided pixel grid inside the detection contour"""
+        x, y, w, h = detection['bbox']
+        step = self.stride
+        grid = frame[y:y + h:step, x:x + w:step]
+        inside = np.zeros(grid.shape[:2], np.uint8)
+        contour = (detection['contour'].astype(np.float32) - (x, y)) / step
+        cv2.drawContours(inside, [np.round(contour).astype(np.int32)], -1, 255, cv2.FILLED)
+        # Skip the outer ring: edges mix the region with the floor
+        inside = cv2.erode(inside, np.ones((3, 3), np.uint8))
+        pixels = grid[inside > 0]
+        if not len(pixels):
+            return pixels
+        return cv2.cvtColor(pixels.reshape(-1, 1, 3), cv2.COLOR_BGR2HSV).reshape(-1, 3)
+
+    def _update(self, frame: np.ndarray, color: str, detection: Dict) -> bool:
+        hsv = self._sample(frame, detection)
+        base = self.base[color]
+        hue = (hsv[:, 0].astype(np.float32) - base.center + 90) % 180
+        # Keep pixels that could plausibly be this color at all
+        keep = ((hue >= base.h[0] - self.hue_limit - self.hue_margin) &
+                (hue <= base.h[1] + self.hue_limit + self.hue_margin) &
+                (hsv[:, 1] >= self.sv_floor) & (hsv[:, 2] >= self.sv_floor))
+        hist = self.hist[color]
+        for channel in hist.values():
+            channel *= self.decay
+        np.add.at(hist['h'], hue[keep].astype(np.intp), 1.0)
+        np.add.at(hist['s'], hsv[keep, 1], 1.0)
+        np.add.at(hist['v'], hsv[keep, 2], 1.0)
+        self.updates += 1
+        if hist['h'].sum() < self.min_samples:
+            return False
+
+        current = self.bounds[color]
+        targets = {
+            'h': [_percentile(hist['h'], 0.02) - self.hue_margin,
+                  _percentile(hist['h'], 0.98) + self.hue_margin],
+            's': [_percentile(hist['s'], 0.02) - self.sv_margin, current['s'][1]],
+            'v': [_percentile(hist['v'], 0.02) - self.sv_margin, current['v'][1]]
+        }
+        limits = {
+            'h': [(base.h[0] - self.hue_limit, base.h[0]),
+                  (base.h[1], base.h[1] + self.hue_limit)],
+            's': [(max(base.s[0] - self.sv_drop, self.sv_floor), base.s[0]), (base.s[1],) * 2],
+            'v': [(max(base.v[0] - self.sv_drop, self.sv_floor), base.v[0]), (base.v[1],) * 2]
+        }
+        lo_cap, hi_cap = self._hue_neighbors(color)
+        limits['h'][0] = (max(limits['h'][0][0], lo_cap), limits['h'][0][1])
+        limits['h'][1] = (limits['h'][1][0], min(limits['h'][1][1], hi_cap))
+        for key in current:
+            for i in (0, 1):
+                value = current[key][i] + self.rate * (targets[key][i] - current[key][i])
+                current[key][i] = min(max(value, limits[key][i][0]), limits[key][i][1])
+
+        ranges = base.to_ranges(current['h'], current['s'], current['v'])
+        old = self.detector.color_ranges[color]
+        if len(old) == len(ranges) and all(np.array_equal(a, c) and np.array_equal(b, d)
+                                           for (a, b), (c, d) in zip(old, ranges)):
+            return False
+        old[:] = ranges  # In place: backends and the tiler share this list
+        self.changes += 1
+        self.stale = getattr(self.detector.segmentation, 'from_ranges', False)
+        return True
+
+    def _hue_neighbors(self, color: str):
+        """Hue caps (in color's frame) from the other colors' calibrated intervals"""
+        base = self.base[color]
+        lo_cap, hi_cap = -1e9, 1e9
+        for other, bounds in self.base.items():
+            if other == color:
+                continue
+            lo, hi = bounds.h[0] + bounds.center - 90, bounds.h[1] + bounds.center - 90
+            start, end = base.rotate(lo, hi)
+            if start > base.h[1]:
+                hi_cap = min(hi_cap, start - 1)
+            elif end < base.h[0]:
+                lo_cap = max(lo_cap, end + 1)
+        return lo_cap, hi_cap
+
+    # ---- Table rebuilds -----------------------------------------------------
+
+    def refresh(self):
+        """Rebuild a range-derived backend table if the bounds changed since"""
+        if not self.stale:
+            return
+        now = self.clock.time()
+        if self.last_rebuild is not None and now - self.last_rebuild < self.rebuild_interval:
+            return
+        self.detector.segmentation = self.detector.segmentation.name
+        self.stale = False
+        self.last_rebuild = now
+        self.rebuilds += 1
+
+    def reset(self):
+        """Back to the calibrated bounds"""
+        for color, base in self.base.items():
+            self.bounds[color] = {'h': list(base.h), 's': list(base.s), 'v': list(base.v)}
+            self.detector.color_ranges[color][:] = base.to_ranges(base.h, base.s, base.v)
+            for channel in self.hist[color].values():
+                channel[:] = 0
+        self.stale = getattr(self.detector.segmentation, 'from_ranges', False)
+
+    def stats(self) -> Dict:
+        """Update counts and cost"""
+        return {
+            'updates': self.updates,
+            'changes': self.changes,
+            'rebuilds': self.rebuilds,
+            'ms_per_update': self.update_time / self.updates * 1000 if self.updates else 0.0,
+            'bounds': {color: self.detector.color_ranges[color] for color in self.base}
+        }
+
+
+def _iou(a, b) -> float:
+    """Intersection over union of two (x, y, w, h) boxes"""
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    iw = max(0, min(ax + aw, bx + bw) - max(ax, bx))
+    ih = max(0, min(ay + ah, by + bh) - max(ay, by))
+    inter = iw * ih
+    union = aw * ah + bw * bh - inter
+    return inter / union if union > 0 else 0.0
+
+
+def _percentile(hist: np.ndarray, q: float) -> float:
+    """Bin at quantile q of a histogram"""
+    cumulative = np.cumsum(hist)
+    return float(np.searchsorted(cumulative, q * cumulative[-1]))
+
+
+# ---- Benchmark -------------------------------------------------------------
+
+# End-of-drift BGR gains and added gray level (haze washes out saturation)
+DRIFT = {
+    'dim': ((0.35, 0.35, 0.35), 0),
+    'warm': ((0.45, 0.8, 1.3), 0),
+    'haze': ((0.5, 0.5, 0.5), 140)
+}
+
+
+def benchmark(arenas: int = 5, frames: int = 300, seed: int = 0) -> List[Dict]:
+    """
+    Region detection rate while the lighting drifts, fixed vs adaptive bounds
+
+    The robot faces each region mat from 1m; the gain on every frame ramps
+    linearly from nominal to the DRIFT gains and offset.
+
+    Returns:
+        One dict per drift with 'fixed' and 'adaptive' detection rates and
+        the adaptive update cost
+    """
+    from simulator import Arena, SimulatedRobot, SimulatedCamera, VirtualClock
+    from vision_servo import VisualServo
+
+    results = []
+    for drift, (end, offset) in DRIFT.items():
+        found = {'fixed': 0, 'adaptive': 0}
+        total, cost, updates = 0, 0.0, 0
+        for arena_seed in range(seed, seed + arenas):
+            arena = Arena.random(np.random.default_rng(arena_seed))
+            for mat in arena.mats:
+                mx, my = mat['center']
+                yaw = math.radians(np.random.default_rng(arena_seed).uniform(-180, 180))
+                x = min(max(mx - math.cos(yaw), 0.2), arena.width - 0.2)
+                y = min(max(my - math.sin(yaw), 0.2), arena.height - 0.2)
+                heading = math.degrees(math.atan2(my - y, mx - x))
+                clock = VirtualClock()
+                robot = SimulatedRobot(arena, clock, pose=(x, y, heading))
+                camera = SimulatedCamera(robot, seed=arena_seed)
+                frame = camera.new_buffer()
+                lit = np.empty_like(frame)
+                servos = {mode: VisualServo(640, 480, preallocate=True) for mode in found}
+                adaptive = AdaptiveThresholds(servos['adaptive'], clock=clock)
+                for i in range(frames):
+                    camera.read_into(frame)
+                    t = i / max(frames - 1, 1)
+                    gains = tuple(1.0 + (g - 1.0) * t for g in end)
+                    cv2.multiply(frame, gains + (0,), dst=lit)
+                    cv2.add(lit, (offset * t,) * 3 + (0,), dst=lit)
+                    for mode, servo in servos.items():
+                        region = servo.detect_largest_block(lit, mat['color'])
+                        found[mode] += region is not None
+                        if mode == 'adaptive':
+                            adaptive.observe(lit, mat['color'], region)
+                    total += 1
+                    clock.sleep(1.0 / camera.fps)
+                cost += adaptive.update_time
+                updates += adaptive.updates
+        results.append({'drift': drift,
+                        'fixed': found['fixed'] / max(total, 1),
+                        'adaptive': found['adaptive'] / max(total, 1),
+                        'ms_per_update': cost / max(updates, 1) * 1000})
+    return results
+
+
+def main():
+    """Main entry point"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Adaptive threshold benchmark")
+    parser.add_argument('--arenas', type=int, default=5)
+    parser.add_argument('--frames', type=int, default=300, help="frames per lighting ramp")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    results = benchmark(args.arenas, args.frames, args.seed)
+    print(f"=== Adaptive thresholds: {args.arenas} arenas, every mat, "
+          f"{args.frames}-frame lighting ramp ===")
+    print(f"{'drift':8s} {'fixed':>6s} {'adaptive':>9s} {'ms/update':>10s}")
+    for r in results:
+        print(f"{r['drift']:8s} {r['fixed']:6.2f} {r['adaptive']:9.2f} {r['ms_per_update']:10.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
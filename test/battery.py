@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Battery-Aware Motion Compensation
+The firmware's sendVolt() prints analogRead(A0) whenever it changes. A
+sagging battery makes the same timed pulse move the robot less, so
+BatteryMonitor low-pass filters that stream and stretches pulse durations
+by nominal / filtered voltage, keeping displacement per command roughly
+constant. Motor PWM cannot be used for this: the firmware only accepts
+the fixed speeds 30, 50 and 80.
+
+Every compensated pulse is recorded in MissionMetrics (mean voltage and
+pulse scale per block), so mission_report.py can show alignment effort
+against battery voltage over a full discharge.
+
+Benchmark (simulated chassis over a full discharge, strafe displacement
+per 0.15s pulse with and without compensation):
+    python3 battery.py
+"""
+
+import math
+import time
+from typing import Optional
+
+
+class BatteryMonitor:
+    """Filtered battery voltage from sendVolt() lines and pulse scaling"""
+
+    def __init__(self, volts_per_count: float = 5.0 / 1023 * 3, nominal_voltage: float = 11.1,
+                 time_constant: float = 5.0, min_scale: float = 0.8, max_scale: float = 1.6,
+                 clock=None):
+        """
+        Initialize monitor
+
+        Args:
+            volts_per_count: Battery volts per analogRead count (5V reference
+                             behind a 1:3 divider by default)
+            nominal_voltage: Voltage the pulse durations were tuned at
+            time_constant: Filter time constant in seconds (motor load makes
+                           single readings sag)
+            min_scale, max_scale: Limits of the pulse duration scale
+            clock: Object providing time() (default: time module)
+        """
+        self.volts_per_count = volts_per_count
+        self.nominal_voltage = nominal_voltage
+        self.time_constant = time_constant
+        self.min_scale = min_scale
+        self.max_scale = max_scale
+        self.clock = clock if clock is not None else time
+        self.enabled = True
+
+        self.voltage: Optional[float] = None  # Filtered, None until the first report
+        self.last_update = None
+        self.readings = 0
+
+    def on_line(self, line: str, receive_time: Optional[float] = None) -> bool:
+        """
+        Line listener for RobotController.line_listeners
+
+        Returns:
+            True if the line was a voltage report
+        """
+        if not line.isdigit():
+            return False
+        self.update(int(line), receive_time)
+        return True
+
+    def update(self, counts: int, t: Optional[float] = None):
+        """Feed one raw analogRead(A0) value"""
+        t = self.clock.time() if t is None else t
+        volts = counts * self.volts_per_count
+        self.readings += 1
+        if self.voltage is None:
+            self.voltage = volts
+        else:
+            # Exponential filter that handles irregular report intervals
+            alpha = 1.0 - math.exp(-max(t - self.last_update, 0.0) / self.time_constant)
+            self.voltage += (volts - self.voltage) * alpha
+        self.last_update = t
+
+    def pulse_scale(self) -> float:
+        """Factor applied to pulse durations (1.0 without a reading or when disabled)"""
+        if not self.enabled or not self.voltage:
+            return 1.0
+        scale = self.nominal_voltage / self.voltage
+        return min(max(scale, self.min_scale), self.max_scale)
+
+    def scaled(self, duration: float) -> float:
+        """Pulse duration compensated for the current battery voltage"""
+        return duration * self.pulse_scale()
+
+
+# ---- Benchmark -------------------------------------------------------------
+
+def benchmark(full: float = 12.4, empty: float = 10.2, pulses: int = 40,
+              duration: float = 0.15) -> list:
+    """
+    Strafe pulses on a simulated chassis while the battery discharges
+
+    Args:
+        full, empty: Battery voltage at the start and end of the discharge
+        pulses: Pulses measured at evenly spaced points of the discharge
+        duration: Nominal pulse duration
+
+    Returns:
+        [(voltage, scale, displacement_fixed, displacement_compensated)]
+    """
+    from simulator import Arena, SimulatedRobot, VirtualClock
+
+    rows = []
+    for i in range(pulses):
+        volts = full + (empty - full) * i / max(pulses - 1, 1)
+        moved, scale = [], 1.0
+        for compensate in (False, True):
+            clock = VirtualClock()
+            robot = SimulatedRobot(Arena(), clock, pose=(1.5, 1.5, 0.0), battery_voltage=volts)
+            monitor = BatteryMonitor(clock=clock)
+            monitor.enabled = compensate
+            robot.line_listeners.append(monitor.on_line)
+            clock.sleep(1.0)  # A few voltage reports
+            start = robot.pose
+            robot.left()
+            clock.sleep(monitor.scaled(duration))
+            robot.stop()
+            clock.sleep(0.5)  # Let the chassis coast to rest
+            moved.append(math.hypot(robot.x - start[0], robot.y - start[1]))
+            scale = monitor.pulse_scale()
+        rows.append((volts, scale, moved[0], moved[1]))
+    return rows
+
+
+def main():
+    """Main entry point"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Battery compensation benchmark")
+    parser.add_argument('--full', type=float, default=12.4, help="charged voltage")
+    parser.add_argument('--empty', type=float, default=10.2, help="discharged voltage")
+    parser.add_argument('--pulses', type=int, default=12)
+    parser.add_argument('--duration', type=float, default=0.15, help="nominal pulse seconds")
+    args = parser.parse_args()
+
+    rows = benchmark(args.full, args.empty, args.pulses, args.duration)
+    print(f"=== Battery compensation: {args.duration:.2f}s strafe pulse, "
+          f"{args.full:.1f}V -> {args.empty:.1f}V ===")
+    print(f"{'volts':>6s} {'scale':>6s} {'fixed cm':>9s} {'compensated cm':>15s}")
+    for volts, scale, fixed, compensated in rows:
+        print(f"{volts:6.2f} {scale:6.2f} {fixed * 100:9.2f} {compensated * 100:15.2f}")
+    fixed = [r[2] for r in rows]
+    compensated = [r[3] for r in rows]
+    spread = lambda values: (max(values) - min(values)) / max(values) * 100
+    print(f"\nDisplacement spread over the discharge: {spread(fixed):.0f}% fixed, "
+          f"{spread(compensated):.0f}% compensated")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
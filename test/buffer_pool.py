@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Preallocated Frame Buffers
+Buffer pool and shared color-mask pipeline for the detectors. With a pool,
+every full-frame intermediate (blur, HSV, masks, morphology, annotated
+frame) is written into a reused array through OpenCV dst= outputs; without
+one, OpenCV allocates new arrays exactly like the original code.
+"""
+
+import time
+import tracemalloc
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+
+class BufferPool:
+    """Named arrays allocated once and reused for every frame"""
+
+    def __init__(self):
+        self.buffers: Dict[str, np.ndarray] = {}
+        self.allocations = 0  # Number of (re)allocations, stays flat in steady state
+
+    def get(self, name: str, shape: Tuple[int, ...], dtype=np.uint8) -> np.ndarray:
+        """
+        Buffer for name, reallocated only when the frame size changes
+
+        Args:
+            name: Buffer name (one per pipeline stage)
+            shape: Required array shape
+            dtype: Required array dtype
+        """
+        buf = self.buffers.get(name)
+        if buf is None or buf.shape != shape or buf.dtype != dtype:
+            buf = np.empty(shape, dtype=dtype)
+            self.buffers[name] = buf
+            self.allocations += 1
+        return buf
+
+    def nbytes(self) -> int:
+        """Total memory held by the pool"""
+        return sum(buf.nbytes for buf in self.buffers.values())
+
+
+def _dst(pool: Optional[BufferPool], name: str, shape, dtype=np.uint8):
+    """Pool buffer, or None to let OpenCV allocate"""
+    return pool.get(name, shape, dtype) if pool is not None else None
+
+
+def preprocess_hsv(frame: np.ndarray, pool: Optional[BufferPool] = None) -> np.ndarray:
+    """Gaussian blur and BGR->HSV conversion"""
+    blurred = cv2.GaussianBlur(frame, (5, 5), 0, dst=_dst(pool, 'blurred', frame.shape))
+    return cv2.cvtColor(blurred, cv2.COLOR_BGR2HSV, dst=_dst(pool, 'hsv', frame.shape))
+
+
+def color_mask(hsv: np.ndarray, ranges: List[Tuple[np.ndarray, np.ndarray]],
+               kernel: np.ndarray, pool: Optional[BufferPool] = None,
+               name: str = 'mask') -> np.ndarray:
+    """
+    Binary mask of the HSV ranges, cleaned with open + close
+
+    Args:
+        hsv: HSV image
+        ranges: List of (lower, upper) bounds, OR-ed together
+        kernel: Morphology kernel
+        pool: Buffer pool (None = allocate new arrays)
+        name: Pool buffer name; use one name per mask that must stay valid
+
+    Returns:
+        Mask (a pool buffer when pool is given, overwritten by the next call)
+    """
+    shape = hsv.shape[:2]
+    mask = _dst(pool, name, shape)
+    lower, upper = ranges[0]
+    mask = cv2.inRange(hsv, lower, upper, dst=mask)
+    if len(ranges) > 1:
+        part = _dst(pool, 'range', shape)
+        for lower, upper in ranges[1:]:
+            part = cv2.inRange(hsv, lower, upper, dst=part)
+            mask = cv2.bitwise_or(mask, part, dst=mask if pool is not None else None)
+
+    return clean_mask(mask, kernel, pool)
+
+
+def clean_mask(mask: np.ndarray, kernel: np.ndarray,
+               pool: Optional[BufferPool] = None) -> np.ndarray:
+    """Open + close a binary mask (in place when pool is given; kernel None = as is)"""
+    if kernel is None:
+        return mask
+    # Ping-pong through a scratch buffer so src and dst never alias
+    opened = cv2.morphologyEx(mask, cv2.MORPH_OPEN, kernel,
+                              dst=_dst(pool, 'morph', mask.shape))
+    return cv2.morphologyEx(opened, cv2.MORPH_CLOSE, kernel,
+                            dst=mask if pool is not None else None)
+
+
+def annotation_frame(frame: np.ndarray, pool: Optional[BufferPool] = None,
+                     out: Optional[np.ndarray] = None) -> np.ndarray:
+    """Copy of frame to draw on (into out, or a pool buffer, or a new array)"""
+    if out is None and pool is not None:
+        out = pool.get('annotated', frame.shape, frame.dtype)
+    if out is None:
+        return frame.copy()
+    np.copyto(out, frame)
+    return out
+
+
+def measure_allocation_rate(fn: Callable[[np.ndarray], object], frames: Iterable[np.ndarray],
+                            warmup: int = 5, fps: float = 30.0) -> Dict:
+    """
+    Steady-state allocation rate of a per-frame function
+
+    Python and NumPy allocations are traced with tracemalloc; the peak above
+    the starting level of each call is the memory that call allocated.
+
+    Args:
+        fn: Called once per frame
+        frames: Frames to process (the first `warmup` are not measured)
+        warmup: Calls before measuring (fills the buffer pool)
+        fps: Frame rate used to express the result in MB/s
+
+    Returns:
+        {'frames', 'bytes_per_frame', 'mb_per_second', 'ms_per_frame'}
+    """
+    frames = list(frames)
+    for frame in frames[:warmup]:
+        fn(frame)
+    measured = frames[warmup:]
+    if not measured:
+        raise ValueError("Need more frames than warmup")
+
+    total = 0
+    elapsed = 0.0
+    tracemalloc.start()
+    try:
+        for frame in measured:
+            tracemalloc.reset_peak()
+            before, _ = tracemalloc.get_traced_memory()
+            start = time.perf_counter()
+            fn(frame)
+            elapsed += time.perf_counter() - start
+            _, peak = tracemalloc.get_traced_memory()
+            total += peak - before
+    finally:
+        tracemalloc.stop()
+
+    per_frame = total / len(measured)
+    return {
+        'frames': len(measured),
+        'bytes_per_frame': per_frame,
+        'mb_per_second': per_frame * fps / 1e6,
+        'ms_per_frame': elapsed / len(measured) * 1000  # includes tracing overhead
+    }
+
+
+# Benchmark
+if __name__ == "__main__":
+    import sys
+    from camera_source import open_source
+    from color_detector import SmallBlockDetector
+    from vision_servo import VisualServo
+
+    uri = sys.argv[1] if len(sys.argv) > 1 else 'synthetic:'
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 60
+    source = open_source(uri)
+    frames = []
+    while len(frames) < count:
+        ok, frame = source.read()
+        if not ok:
+            break
+        frames.append(frame)
+    source.release()
+    print(f"=== Allocation Benchmark: {len(frames)} frames from {uri} ===")
+
+    for preallocate in (False, True):
+        detector = SmallBlockDetector(preallocate=preallocate)
+        servo = VisualServo(source.width, source.height, preallocate=preallocate)
+
+        def pipeline(frame):
+            blocks = detector.detect_blocks(frame)
+            detector.draw_blocks(frame, blocks)
+            info = servo.detect_largest_block(frame, 'green')
+            servo.draw_debug_info(frame, info, 'green')
+
+        rate = measure_allocation_rate(pipeline, frames)
+        mode = 'preallocated' if preallocate else 'allocating'
+        print(f"{mode:13s} {rate['bytes_per_frame'] / 1024:9.1f} KB/frame "
+              f"{rate['mb_per_second']:7.2f} MB/s @30fps  {rate['ms_per_frame']:6.2f} ms/frame")
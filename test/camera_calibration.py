@@ -0,0 +1,334 @@
+#!/usr/bin/env python3
+"""
+Camera Calibration and Ground-Plane Model
+Computes camera intrinsics/distortion from chessboard views and a homography
+from the image to the floor, so detections can be turned into metric
+distance and bearing. Undistortion remap tables are built once with
+initUndistortRectifyMap and cached on disk.
+
+Usage:
+    python3 camera_calibration.py intrinsics --camera 0 --board 9x6 --square 0.025
+    python3 camera_calibration.py intrinsics --images 'calib/*.png' --board 9x6 --square 0.025
+    python3 camera_calibration.py ground --camera 0 --board 9x6 --square 0.025 --origin 0.20,0.10
+    python3 camera_calibration.py show
+"""
+
+import os
+import sys
+import glob
+import math
+import hashlib
+import argparse
+from typing import Optional, Tuple, List
+
+import cv2
+import numpy as np
+
+from camera_source import open_source
+
+
+DEFAULT_CALIBRATION_FILE = 'camera_calibration.npz'
+DEFAULT_CACHE_DIR = '.cache'
+
+
+class CameraModel:
+    """Pinhole camera with lens distortion and a floor homography"""
+
+    def __init__(self, camera_matrix: np.ndarray, dist_coeffs: np.ndarray,
+                 image_size: Tuple[int, int], ground_homography: Optional[np.ndarray] = None):
+        """
+        Initialize camera model
+
+        Args:
+            camera_matrix: 3x3 intrinsic matrix
+            dist_coeffs: Distortion coefficients (OpenCV order)
+            image_size: (width, height) the calibration was made at
+            ground_homography: 3x3 map from undistorted pixels to floor
+                               coordinates in meters (x forward, y left)
+        """
+        self.camera_matrix = np.asarray(camera_matrix, dtype=np.float64)
+        self.dist_coeffs = np.asarray(dist_coeffs, dtype=np.float64).reshape(-1)
+        self.image_size = (int(image_size[0]), int(image_size[1]))
+        self.ground_homography = None if ground_homography is None else \
+            np.asarray(ground_homography, dtype=np.float64)
+
+        # Undistorted images keep the original camera matrix
+        self.new_camera_matrix = self.camera_matrix
+        self._maps = None
+
+    # ---- persistence -------------------------------------------------------
+
+    def save(self, path: str = DEFAULT_CALIBRATION_FILE):
+        """Save calibration to an .npz file"""
+        data = {
+            'camera_matrix': self.camera_matrix,
+            'dist_coeffs': self.dist_coeffs,
+            'image_size': np.array(self.image_size)
+        }
+        if self.ground_homography is not None:
+            data['ground_homography'] = self.ground_homography
+        np.savez(path, **data)
+
+    @classmethod
+    def load(cls, path: str = DEFAULT_CALIBRATION_FILE) -> 'CameraModel':
+        """Load calibration from an .npz file"""
+        data = np.load(path)
+        homography = data['ground_homography'] if 'ground_homography' in data else None
+        return cls(data['camera_matrix'], data['dist_coeffs'],
+                   tuple(data['image_size']), homography)
+
+    def fingerprint(self) -> str:
+        """Short hash of the intrinsics, used to key cached artifacts"""
+        h = hashlib.sha1()
+        h.update(self.camera_matrix.tobytes())
+        h.update(self.dist_coeffs.tobytes())
+        h.update(np.array(self.image_size).tobytes())
+        return h.hexdigest()[:16]
+
+    # ---- undistortion ------------------------------------------------------
+
+    def undistort_maps(self, cache_dir: Optional[str] = DEFAULT_CACHE_DIR):
+        """
+        Remap tables for undistortion, computed once and cached on disk
+        (memory-mapped from the cache on later starts)
+
+        Args:
+            cache_dir: Directory for the cached tables (None = no disk cache)
+
+        Returns:
+            (map1, map2) for cv2.remap
+        """
+        if self._maps is not None:
+            return self._maps
+
+        paths = None
+        if cache_dir:
+            prefix = os.path.join(cache_dir, f"undistort_{self.fingerprint()}")
+            paths = (f"{prefix}_map1.npy", f"{prefix}_map2.npy")
+            if all(os.path.exists(p) for p in paths):
+                self._maps = tuple(np.load(p, mmap_mode='r') for p in paths)
+                return self._maps
+
+        self._maps = cv2.initUndistortRectifyMap(
+            self.camera_matrix, self.dist_coeffs, None, self.new_camera_matrix,
+            self.image_size, cv2.CV_16SC2)
+
+        if paths:
+            os.makedirs(cache_dir, exist_ok=True)
+            for path, table in zip(paths, self._maps):
+                np.save(path, table)
+        return self._maps
+
+    def undistort(self, frame: np.ndarray, dst: Optional[np.ndarray] = None) -> np.ndarray:
+        """Undistort a full frame with the cached remap tables"""
+        map1, map2 = self.undistort_maps()
+        return cv2.remap(frame, map1, map2, cv2.INTER_LINEAR, dst=dst)
+
+    def undistort_points(self, points: np.ndarray) -> np.ndarray:
+        """Undistort pixel coordinates only (much cheaper than a full remap)"""
+        pts = np.asarray(points, dtype=np.float64).reshape(-1, 1, 2)
+        if not np.any(self.dist_coeffs):
+            return pts.reshape(-1, 2)
+        return cv2.undistortPoints(pts, self.camera_matrix, self.dist_coeffs,
+                                   P=self.new_camera_matrix).reshape(-1, 2)
+
+    # ---- ground plane ------------------------------------------------------
+
+    @property
+    def has_ground(self) -> bool:
+        return self.ground_homography is not None
+
+    def pixel_to_ground(self, points: np.ndarray, undistorted: bool = False) -> np.ndarray:
+        """
+        Map pixels to floor coordinates
+
+        Args:
+            points: Nx2 pixel coordinates
+            undistorted: True if points come from an already undistorted frame
+
+        Returns:
+            Nx2 floor coordinates in meters (x forward, y left)
+        """
+        pts = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        if not undistorted:
+            pts = self.undistort_points(pts)
+        return cv2.perspectiveTransform(pts.reshape(-1, 1, 2),
+                                        self.ground_homography).reshape(-1, 2)
+
+    def distance_and_bearing(self, u: float, v: float,
+                             undistorted: bool = False) -> Tuple[float, float]:
+        """
+        Distance and bearing of the floor point seen at pixel (u, v)
+
+        Returns:
+            (distance in meters, bearing in degrees, positive = to the right)
+        """
+        x, y = self.pixel_to_ground([(u, v)], undistorted)[0]
+        return math.hypot(x, y), math.degrees(math.atan2(-y, x))
+
+
+def _order_board_corners(corners: np.ndarray, board: Tuple[int, int]) -> np.ndarray:
+    """
+    Put chessboard corners in a fixed order: rows from near (bottom of the
+    image) to far, columns from left to right
+    """
+    cols, rows = board
+    grid = corners.reshape(rows, cols, 2)
+    if grid[0, :, 1].mean() < grid[-1, :, 1].mean():
+        grid = grid[::-1]
+    if grid[:, 0, 0].mean() > grid[:, -1, 0].mean():
+        grid = grid[:, ::-1]
+    return grid.reshape(-1, 2)
+
+
+def find_board(frame: np.ndarray, board: Tuple[int, int]) -> Optional[np.ndarray]:
+    """Find and refine chessboard corners, or return None"""
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+    found, corners = cv2.findChessboardCorners(gray, board, None)
+    if not found:
+        return None
+    criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 30, 0.001)
+    corners = cv2.cornerSubPix(gray, corners, (11, 11), (-1, -1), criteria)
+    return corners.reshape(-1, 2)
+
+
+def calibrate_intrinsics(frames: List[np.ndarray], board: Tuple[int, int],
+                         square: float) -> Tuple[CameraModel, float]:
+    """
+    Calibrate intrinsics from chessboard views
+
+    Args:
+        frames: Images showing the chessboard in different poses
+        board: Inner corners (columns, rows)
+        square: Square size in meters
+
+    Returns:
+        (CameraModel without ground homography, RMS reprojection error)
+    """
+    cols, rows = board
+    object_grid = np.zeros((rows * cols, 3), np.float32)
+    object_grid[:, :2] = np.mgrid[0:cols, 0:rows].T.reshape(-1, 2) * square
+
+    object_points, image_points = [], []
+    image_size = None
+    for frame in frames:
+        corners = find_board(frame, board)
+        if corners is None:
+            continue
+        image_size = (frame.shape[1], frame.shape[0])
+        object_points.append(object_grid)
+        image_points.append(corners.astype(np.float32))
+
+    if len(image_points) < 3:
+        raise ValueError(f"Need at least 3 chessboard views, found {len(image_points)}")
+
+    rms, camera_matrix, dist_coeffs, _, _ = cv2.calibrateCamera(
+        object_points, image_points, image_size, None, None)
+    return CameraModel(camera_matrix, dist_coeffs, image_size), rms
+
+
+def calibrate_ground(model: CameraModel, frame: np.ndarray, board: Tuple[int, int],
+                     square: float, origin: Tuple[float, float]) -> float:
+    """
+    Compute the floor homography from a chessboard lying flat in front of the robot
+
+    The board must be square to the robot; origin is the floor position
+    (forward, left) in meters of the nearest-left inner corner.
+
+    Returns:
+        RMS error of the fitted homography in meters
+    """
+    corners = find_board(frame, board)
+    if corners is None:
+        raise ValueError("Chessboard not found in ground image")
+    corners = _order_board_corners(corners, board)
+    pixels = model.undistort_points(corners)
+
+    cols, rows = board
+    r, c = np.mgrid[0:rows, 0:cols]
+    ground = np.stack([origin[0] + r.ravel() * square,
+                       origin[1] - c.ravel() * square], axis=1)
+
+    homography, _ = cv2.findHomography(pixels, ground)
+    model.ground_homography = homography
+    fitted = model.pixel_to_ground(pixels, undistorted=True)
+    return float(np.sqrt(np.mean(np.sum((fitted - ground) ** 2, axis=1))))
+
+
+def _capture(camera, count: int, board: Tuple[int, int]) -> List[np.ndarray]:
+    """Collect frames where the chessboard is visible (space = capture, q = done)"""
+    cap = open_source(camera, 640, 480)
+    frames = []
+    print("Press SPACE to capture a view, 'q' when done")
+    while len(frames) < count:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        corners = find_board(frame, board)
+        preview = frame.copy()
+        if corners is not None:
+            cv2.drawChessboardCorners(preview, board, corners.reshape(-1, 1, 2), True)
+        cv2.putText(preview, f"Views: {len(frames)}/{count}", (10, 30),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+        cv2.imshow('Calibration', preview)
+        key = cv2.waitKey(1) & 0xFF
+        if key == ord(' ') and corners is not None:
+            frames.append(frame)
+            print(f"Captured view {len(frames)}")
+        elif key == ord('q'):
+            break
+    cap.release()
+    cv2.destroyAllWindows()
+    return frames
+
+
+def main():
+    """Main entry point"""
+    parser = argparse.ArgumentParser(description="Camera calibration tool")
+    parser.add_argument('mode', choices=['intrinsics', 'ground', 'show'])
+    parser.add_argument('--camera', default='0', help="camera device ID or source URI")
+    parser.add_argument('--images', default=None, help="glob of images instead of camera")
+    parser.add_argument('--board', default='9x6', help="inner corners, COLSxROWS")
+    parser.add_argument('--square', type=float, default=0.025, help="square size in m")
+    parser.add_argument('--views', type=int, default=15, help="views to capture")
+    parser.add_argument('--origin', default='0.20,0.10',
+                        help="floor position (forward,left) of the nearest-left corner")
+    parser.add_argument('--file', default=DEFAULT_CALIBRATION_FILE, help="calibration file")
+    args = parser.parse_args()
+
+    board = tuple(int(n) for n in args.board.lower().split('x'))
+
+    if args.mode == 'show':
+        model = CameraModel.load(args.file)
+        print("Camera matrix:\n", model.camera_matrix)
+        print("Distortion:", model.dist_coeffs)
+        print("Image size:", model.image_size)
+        print("Ground homography:\n", model.ground_homography)
+        return 0
+
+    if args.images:
+        frames = [cv2.imread(p) for p in sorted(glob.glob(args.images))]
+        frames = [f for f in frames if f is not None]
+    else:
+        frames = _capture(args.camera, args.views if args.mode == 'intrinsics' else 1, board)
+    if not frames:
+        print("No checkerboard views captured, nothing saved")
+        return 1
+
+    if args.mode == 'intrinsics':
+        model, rms = calibrate_intrinsics(frames, board, args.square)
+        model.save(args.file)
+        model.undistort_maps()
+        print(f"Intrinsics saved to {args.file} (RMS reprojection error {rms:.3f}px)")
+        print("Run the 'ground' step again: the floor homography depends on the intrinsics")
+    else:
+        model = CameraModel.load(args.file)
+        origin = tuple(float(v) for v in args.origin.split(','))
+        error = calibrate_ground(model, frames[-1], board, args.square, origin)
+        model.save(args.file)
+        print(f"Ground homography saved to {args.file} (RMS error {error * 1000:.1f}mm)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,452 @@
+#!/usr/bin/env python3
+"""
+Camera Source Abstraction
+One capture interface for Picamera2, V4L2 USB cameras, video files, image
+directories and a synthetic generator. Every source returns BGR frames with
+a capture timestamp and supports read_into() to fill a preallocated buffer.
+
+Source URIs:
+    0, 1, ...                                    USB camera by index
+    v4l2:///dev/video0?fourcc=MJPG&buffers=2&fps=30&exposure=150
+    picam:?width=640&height=480
+    file:run1.mp4?loop=1&realtime=1              (or just run1.mp4)
+    dir:recordings/run1?fps=30&loop=1&realtime=1 (or just a directory path)
+    synthetic:?fps=30&blocks=3&seed=0
+"""
+
+import os
+import glob
+import time
+from typing import Optional, Tuple, Union
+from urllib.parse import urlparse, parse_qs
+
+import cv2
+import numpy as np
+
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mkv', '.mov', '.h264', '.mjpeg')
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp')
+
+# Offset between time.monotonic() (driver timestamps) and time.time()
+_MONOTONIC_OFFSET = time.time() - time.monotonic()
+
+
+class CameraSource:
+    """Base class for frame sources (VideoCapture-compatible read())"""
+
+    def __init__(self, width: int = 640, height: int = 480):
+        self.width = width
+        self.height = height
+        self.last_timestamp = 0.0  # Capture time of the last frame (time.time() domain)
+        self.frames_read = 0
+        # Playback pacing for recorded/generated sources
+        self.fps = 30.0
+        self.realtime = False
+        self._pace_start = None
+        self._pace_index = 0
+
+    def _pace(self):
+        """Stamp the frame, sleeping first to hold self.fps if realtime"""
+        if self.realtime:
+            if self._pace_start is None:
+                self._pace_start = time.time()
+            delay = self._pace_start + self._pace_index / self.fps - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            self._pace_index += 1
+        self.last_timestamp = time.time()
+
+    def read_into(self, buffer: np.ndarray) -> bool:
+        """
+        Capture the next frame directly into buffer
+
+        Args:
+            buffer: Preallocated (height, width, 3) uint8 array
+
+        Returns:
+            True if a frame was written
+        """
+        ok, frame = self._grab()
+        if not ok:
+            return False
+        if frame is not buffer:
+            np.copyto(buffer, frame)
+        self.frames_read += 1
+        return True
+
+    def read(self) -> Tuple[bool, Optional[np.ndarray]]:
+        """Capture the next frame into a new array"""
+        ok, frame = self._grab()
+        if ok:
+            self.frames_read += 1
+        return ok, frame if ok else None
+
+    def _grab(self) -> Tuple[bool, Optional[np.ndarray]]:
+        raise NotImplementedError
+
+    def new_buffer(self) -> np.ndarray:
+        """Allocate a buffer suitable for read_into()"""
+        return np.empty((self.height, self.width, 3), dtype=np.uint8)
+
+    def isOpened(self) -> bool:
+        return True
+
+    def set(self, prop, value) -> bool:
+        """Compatibility with cv2.VideoCapture.set(); sources are configured at open"""
+        return False
+
+    def release(self):
+        pass
+
+
+class V4L2Source(CameraSource):
+    """USB camera through OpenCV's V4L2 backend"""
+
+    def __init__(self, device: Union[int, str] = 0, width: int = 640, height: int = 480,
+                 fourcc: Optional[str] = None, buffers: Optional[int] = None,
+                 fps: Optional[float] = None, exposure: Optional[float] = None,
+                 backend: int = cv2.CAP_V4L2):
+        """
+        Open a V4L2 camera
+
+        Args:
+            device: Device index or path such as /dev/video0
+            width, height: Capture size
+            fourcc: 'MJPG' or 'YUYV' (None = driver default)
+            buffers: Driver buffer count; 1-2 keeps latency low
+            fps: Requested frame rate
+            exposure: Lock exposure to this value (None = auto exposure)
+            backend: OpenCV capture backend
+        """
+        super().__init__(width, height)
+        self.cap = cv2.VideoCapture(device, backend)
+        if not self.cap.isOpened():
+            raise RuntimeError(f"Cannot open camera {device}")
+
+        if fourcc:
+            self.cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*fourcc))
+        self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+        self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+        if fps:
+            self.cap.set(cv2.CAP_PROP_FPS, fps)
+        if buffers:
+            self.cap.set(cv2.CAP_PROP_BUFFERSIZE, buffers)
+        if exposure is not None:
+            self.cap.set(cv2.CAP_PROP_AUTO_EXPOSURE, 1)  # V4L2 manual mode
+            self.cap.set(cv2.CAP_PROP_EXPOSURE, exposure)
+
+        # The driver may pick a different size
+        self.width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH)) or width
+        self.height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT)) or height
+
+    def _stamp(self):
+        """Use the driver buffer timestamp when the backend provides one"""
+        msec = self.cap.get(cv2.CAP_PROP_POS_MSEC)
+        now = time.time()
+        stamp = msec / 1000.0 + _MONOTONIC_OFFSET if msec > 0 else now
+        # Reject timestamps from a different clock domain
+        self.last_timestamp = stamp if 0 <= now - stamp < 1.0 else now
+
+    def read_into(self, buffer: np.ndarray) -> bool:
+        ok, frame = self.cap.read(buffer)  # decodes straight into buffer
+        if not ok:
+            return False
+        self._stamp()
+        if frame is not buffer:
+            np.copyto(buffer, frame)
+        self.frames_read += 1
+        return True
+
+    def _grab(self):
+        ok, frame = self.cap.read()
+        if ok:
+            self._stamp()
+        return ok, frame
+
+    def isOpened(self) -> bool:
+        return self.cap.isOpened()
+
+    def set(self, prop, value) -> bool:
+        return self.cap.set(prop, value)
+
+    def release(self):
+        self.cap.release()
+
+
+class Picamera2Source(CameraSource):
+    """Raspberry Pi camera through Picamera2"""
+
+    def __init__(self, width: int = 640, height: int = 480, fps: Optional[float] = None,
+                 exposure: Optional[int] = None, buffers: int = 2):
+        """
+        Start a Picamera2 preview stream
+
+        Args:
+            width, height: Stream size
+            fps: Requested frame rate
+            exposure: Lock exposure time in microseconds (None = auto)
+            buffers: Number of stream buffers
+        """
+        from picamera2 import Picamera2
+
+        super().__init__(width, height)
+        self.picam2 = Picamera2()
+        controls = {}
+        if fps:
+            controls['FrameRate'] = fps
+        if exposure is not None:
+            controls.update({'AeEnable': False, 'ExposureTime': int(exposure)})
+        config = self.picam2.create_preview_configuration(
+            main={"size": (width, height), "format": "RGB888"},
+            buffer_count=buffers, controls=controls)
+        self.picam2.configure(config)
+        self.picam2.start()
+        time.sleep(0.5)  # Let auto exposure settle
+
+    def _capture(self, dst: Optional[np.ndarray]) -> Tuple[bool, Optional[np.ndarray]]:
+        request = self.picam2.capture_request()
+        try:
+            array = request.make_array("main")
+            metadata = request.get_metadata()
+        finally:
+            request.release()
+        sensor_ns = metadata.get('SensorTimestamp')
+        self.last_timestamp = sensor_ns / 1e9 + _MONOTONIC_OFFSET if sensor_ns else time.time()
+        # Same channel handling as the original color.py
+        return True, cv2.cvtColor(array, cv2.COLOR_RGB2BGR, dst=dst)
+
+    def read_into(self, buffer: np.ndarray) -> bool:
+        ok, _ = self._capture(buffer)
+        if ok:
+            self.frames_read += 1
+        return ok
+
+    def _grab(self):
+        return self._capture(None)
+
+    def release(self):
+        self.picam2.stop()
+
+
+class VideoFileSource(CameraSource):
+    """Recorded video file"""
+
+    def __init__(self, path: str, loop: bool = False, realtime: bool = False):
+        """
+        Open a video file
+
+        Args:
+            path: Video file path
+            loop: Restart at the end instead of returning False
+            realtime: Pace reads at the file frame rate (for replay tests)
+        """
+        self.cap = cv2.VideoCapture(path)
+        if not self.cap.isOpened():
+            raise RuntimeError(f"Cannot open video {path}")
+        super().__init__(int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+                         int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+        self.path = path
+        self.loop = loop
+        self.realtime = realtime
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS) or 30.0
+
+    def _read(self, dst):
+        ok, frame = self.cap.read(dst) if dst is not None else self.cap.read()
+        if not ok and self.loop:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ok, frame = self.cap.read(dst) if dst is not None else self.cap.read()
+        if ok:
+            self._pace()
+        return ok, frame
+
+    def read_into(self, buffer: np.ndarray) -> bool:
+        ok, frame = self._read(buffer)
+        if not ok:
+            return False
+        if frame is not buffer:
+            np.copyto(buffer, frame)
+        self.frames_read += 1
+        return True
+
+    def _grab(self):
+        return self._read(None)
+
+    def release(self):
+        self.cap.release()
+
+
+class ImageDirSource(CameraSource):
+    """Directory of still images, read in sorted order"""
+
+    def __init__(self, path: str, fps: float = 30.0, loop: bool = False,
+                 realtime: bool = False):
+        """
+        Open an image directory
+
+        Args:
+            path: Directory containing .png/.jpg frames
+            fps: Frame rate of the recording
+            loop: Restart at the end instead of returning False
+            realtime: Pace reads at fps
+        """
+        self.files = sorted(f for f in glob.glob(os.path.join(path, '*'))
+                            if f.lower().endswith(IMAGE_EXTENSIONS))
+        if not self.files:
+            raise RuntimeError(f"No images found in {path}")
+        first = cv2.imread(self.files[0])
+        super().__init__(first.shape[1], first.shape[0])
+        self.fps = fps
+        self.loop = loop
+        self.realtime = realtime
+        self.index = 0
+
+    def _grab(self):
+        if self.index >= len(self.files):
+            if not self.loop:
+                return False, None
+            self.index = 0
+        frame = cv2.imread(self.files[self.index])
+        self._pace()
+        self.index += 1
+        return frame is not None, frame
+
+
+class SyntheticSource(CameraSource):
+    """Generated frames: START mat and colored blocks drifting over a grey floor"""
+
+    COLORS = {
+        'red': (30, 30, 220),
+        'yellow': (20, 220, 235),
+        'blue': (220, 60, 20)
+    }
+
+    def __init__(self, width: int = 640, height: int = 480, fps: float = 30.0,
+                 blocks: int = 3, seed: int = 0, realtime: bool = False):
+        """
+        Initialize synthetic generator
+
+        Args:
+            width, height: Frame size
+            fps: Frame rate (paced only if realtime)
+            blocks: Number of moving blocks
+            seed: Random seed for block placement and motion
+            realtime: Sleep to keep the nominal frame rate
+        """
+        super().__init__(width, height)
+        self.fps = fps
+        self.realtime = realtime
+        rng = np.random.default_rng(seed)
+        colors = list(self.COLORS)
+        self.blocks = [{
+            'color': colors[i % len(colors)],
+            'pos': rng.uniform([40, height * 0.4], [width - 80, height - 80]),
+            'vel': rng.uniform(-3, 3, 2),
+            'size': int(rng.integers(35, 70))
+        } for i in range(blocks)]
+
+    def _render(self, frame: np.ndarray):
+        frame[:] = (110, 110, 110)
+        frame[int(self.height * 0.35):, :] = (60, 160, 50)  # START mat
+        for block in self.blocks:
+            block['pos'] += block['vel']
+            for axis, limit in ((0, self.width), (1, self.height)):
+                lo, hi = (self.height * 0.35, limit) if axis == 1 else (0, limit)
+                if not lo <= block['pos'][axis] <= hi - block['size']:
+                    block['vel'][axis] *= -1
+                    block['pos'][axis] = np.clip(block['pos'][axis], lo, hi - block['size'])
+            x, y = block['pos'].astype(int)
+            s = block['size']
+            cv2.rectangle(frame, (x, y), (x + s, y + s), self.COLORS[block['color']], -1)
+
+    def read_into(self, buffer: np.ndarray) -> bool:
+        self._render(buffer)
+        self._pace()
+        self.frames_read += 1
+        return True
+
+    def _grab(self):
+        frame = self.new_buffer()
+        self._render(frame)
+        self._pace()
+        return True, frame
+
+
+def open_source(uri: Union[int, str] = 0, width: int = 640, height: int = 480) -> CameraSource:
+    """
+    Open a camera source from a URI (see module docstring)
+
+    Args:
+        uri: Source URI, camera index, video file or image directory
+        width, height: Default capture size for live cameras
+
+    Returns:
+        CameraSource instance
+    """
+    if isinstance(uri, int) or (isinstance(uri, str) and uri.isdigit()):
+        return V4L2Source(int(uri), width, height, backend=cv2.CAP_ANY)
+
+    if '://' not in uri and ':' not in uri.split('?')[0]:
+        # Plain path
+        if os.path.isdir(uri):
+            return ImageDirSource(uri)
+        return VideoFileSource(uri)
+
+    parsed = urlparse(uri)
+    query = {k: v[-1] for k, v in parse_qs(parsed.query).items()}
+
+    def opt(name, cast=str, default=None):
+        return cast(query[name]) if name in query else default
+
+    def flag(name):
+        return query.get(name, '0').lower() in ('1', 'true', 'yes')
+
+    w = opt('width', int, width)
+    h = opt('height', int, height)
+    scheme = parsed.scheme.lower()
+    path = (parsed.netloc + parsed.path) or None
+
+    if scheme == 'v4l2':
+        device = path or '/dev/video0'
+        return V4L2Source(int(device) if device.isdigit() else device, w, h,
+                          fourcc=opt('fourcc'), buffers=opt('buffers', int),
+                          fps=opt('fps', float), exposure=opt('exposure', float))
+    if scheme in ('picam', 'picamera2'):
+        return Picamera2Source(w, h, fps=opt('fps', float), exposure=opt('exposure', int),
+                               buffers=opt('buffers', int, 2))
+    if scheme == 'file':
+        return VideoFileSource(path, loop=flag('loop'), realtime=flag('realtime'))
+    if scheme == 'dir':
+        return ImageDirSource(path, fps=opt('fps', float, 30.0), loop=flag('loop'),
+                              realtime=flag('realtime'))
+    if scheme == 'synthetic':
+        return SyntheticSource(w, h, fps=opt('fps', float, 30.0), blocks=opt('blocks', int, 3),
+                               seed=opt('seed', int, 0), realtime=flag('realtime'))
+    raise ValueError(f"Unknown camera source: {uri}")
+
+
+# Test function
+if __name__ == "__main__":
+    import sys
+
+    uri = sys.argv[1] if len(sys.argv) > 1 else 0
+    print(f"=== Camera Source Test: {uri} ===")
+    source = open_source(uri)
+    buffer = source.new_buffer()
+    print(f"Frame size: {source.width}x{source.height}")
+
+    start = time.time()
+    previous = None
+    while source.frames_read < 100:
+        if not source.read_into(buffer):
+            break
+        if previous is not None:
+            interval = (source.last_timestamp - previous) * 1000
+            print(f"\rFrame {source.frames_read:3d}  interval {interval:6.1f}ms  "
+                  f"age {(time.time() - source.last_timestamp) * 1000:6.1f}ms",
+                  end='', flush=True)
+        previous = source.last_timestamp
+
+    elapsed = time.time() - start
+    print(f"\n{source.frames_read} frames in {elapsed:.2f}s "
+          f"({source.frames_read / max(elapsed, 1e-9):.1f} fps)")
+    source.release()
@@ -1,14 +1,17 @@
+import sys
 import cv2
+from camera_source import open_source
 
-cap = cv2.VideoCapture(0)  # 0 = /dev/video0
-
-if not cap.isOpened():
+# 0 = /dev/video0, or any source URI (see camera_source.py)
+try:
+    cap = open_source(sys.argv[1] if len(sys.argv) > 1 else 0)
+except RuntimeError:
     print("Cannot open camera")
     exit()
 
+frame = cap.new_buffer()
 while True:
-    ret, frame = cap.read()
-    if not ret:
+    if not cap.read_into(frame):
         print("Can't receive frame")
         break
 
@@ -6,14 +6,30 @@ Simplified version using USB camera
 
 import cv2
 import numpy as np
-from typing import List, Optional, Dict
+from typing import List, Optional, Dict, Union
+
+from buffer_pool import BufferPool, annotation_frame, measure_allocation_rate
+from segmentation import SegmentationBackend, make_backend
+from tiled import TiledSegmenter, component_contours
 
 
 class SmallBlockDetector:
     """Detector for small colored blocks (pickup targets)"""
     
-    def __init__(self):
-        """Initialize detector"""
+    def __init__(self, preallocate: bool = False,
+                 segmentation: Union[str, SegmentationBackend] = 'hsv',
+                 workers: int = 1):
+        """
+        Initialize detector
+        
+        Args:
+            preallocate: Reuse preallocated full-frame buffers instead of
+                         allocating new arrays on every call
+            segmentation: Segmentation backend spec (see segmentation.py),
+                          e.g. 'hsv', 'lut' or 'backproject:mat_colors.npz'
+            workers: Segment horizontal strips in this many threads
+                     (see tiled.py; 1 = whole frame in the calling thread)
+        """
         # HSV color ranges for small blocks
         self.color_ranges = {
             'red': [
@@ -32,6 +48,36 @@ class SmallBlockDetector:
         self.min_area = 500  # Minimum area for small blocks
         self.max_area = 8000  # Maximum area for small blocks
         self.kernel = np.ones((5, 5), np.uint8)
+        
+        # Shape verification: (confident, rejected) value of each feature,
+        # confidence ramps linearly in between
+        self.shape_limits = {
+            'elongation': (1.6, 2.2),       # Principal axis ratio (far mats are flat and wide)
+            'solidity': (0.92, 0.80),       # Area / convex hull area
+            'rectangularity': (0.75, 0.55)  # Area / minimum-area rectangle
+        }
+        self.min_confidence = 0.5  # Blocks below this are probably not blocks
+        
+        # Reach verification: a block is inside the gripper window when its
+        # bottom edge is at least reach_min_y pixels down the frame. The line
+        # comes from a ground calibration (set_reach); None = no reach check
+        self.reach_min_y: Optional[int] = None
+        self.reach_distance = 0.40  # meters - farthest floor point the gripper reaches
+        
+        # Buffer pool (None = allocate per call)
+        self.buffers = BufferPool() if preallocate else None
+        
+        self.segmentation = segmentation
+        self.tiler = TiledSegmenter(workers) if workers > 1 else None
+    
+    @property
+    def segmentation(self) -> SegmentationBackend:
+        """Color segmentation backend (assign a spec to switch at runtime)"""
+        return self._segmentation
+    
+    @segmentation.setter
+    def segmentation(self, backend: Union[str, SegmentationBackend]):
+        self._segmentation = make_backend(backend, self.color_ranges)
     
     def detect_blocks(self, frame: np.ndarray) -> List[Dict]:
         """
@@ -41,26 +87,31 @@ class SmallBlockDetector:
             frame: BGR image from camera
             
         Returns:
-            List of detected blocks with color, center, area info
+            List of detected blocks with color, center, area, shape info and
+            'confidence' (0-1, see verify_shapes)
         """
-        blurred = cv2.GaussianBlur(frame, (5, 5), 0)
-        hsv = cv2.cvtColor(blurred, cv2.COLOR_BGR2HSV)
+        if self.tiler is not None:
+            segmented = self.tiler.segment(frame, self.segmentation, self.color_ranges,
+                                           self.kernel)
+        else:
+            self.segmentation.prepare(frame, self.buffers)
         
         all_blocks = []
+        moments = []
         
         # Check each color
         for color_name, ranges in self.color_ranges.items():
-            # Create mask
-            mask = np.zeros(hsv.shape[:2], dtype=np.uint8)
-            for lower, upper in ranges:
-                mask = cv2.bitwise_or(mask, cv2.inRange(hsv, lower, upper))
-            
-            # Morphological operations
-            mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, self.kernel)
-            mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, self.kernel)
-            
-            # Find contours
-            contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+            if self.tiler is not None:
+                # Components merged across strips; contours only for candidates
+                mask, components = segmented[color_name]
+                contours = component_contours(mask, components, self.min_area)
+            else:
+                # Create mask (open + close)
+                mask = self.segmentation.mask(color_name, ranges, self.kernel, self.buffers)
+                
+                # Find contours
+                contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL,
+                                               cv2.CHAIN_APPROX_SIMPLE)
             
             for contour in contours:
                 area = cv2.contourArea(contour)
@@ -82,12 +133,88 @@ class SmallBlockDetector:
                             'bbox': (x, y, w, h),
                             'contour': contour
                         })
+                        moments.append(M)
+        
+        self.verify_shapes(all_blocks, moments)
         
         # Sort by area (largest first)
         all_blocks.sort(key=lambda b: b['area'], reverse=True)
         
         return all_blocks
     
+    def verify_shapes(self, blocks: List[Dict], moments: List[Dict]):
+        """
+        Score how block-like each candidate blob is
+        
+        Only the hull area and minimum-area rectangle need one OpenCV call
+        per contour; the features and scores are computed for all candidates
+        at once. Adds 'shape' (elongation, solidity, rectangularity) and
+        'confidence' (product of the feature scores) to every block.
+        
+        Args:
+            blocks: Candidates from detect_blocks
+            moments: cv2.moments of each candidate contour
+        """
+        if not blocks:
+            return
+        area = np.array([b['area'] for b in blocks])
+        hull = np.array([cv2.contourArea(cv2.convexHull(b['contour'])) for b in blocks])
+        rect = np.array([np.prod(cv2.minAreaRect(b['contour'])[1]) for b in blocks])
+        mu = np.array([(m['mu20'], m['mu02'], m['mu11'], m['m00']) for m in moments])
+        
+        # Principal axis variances from the central moments
+        mu20, mu02, mu11 = mu[:, 0] / mu[:, 3], mu[:, 1] / mu[:, 3], mu[:, 2] / mu[:, 3]
+        half_sum = (mu20 + mu02) / 2
+        spread = np.sqrt(((mu20 - mu02) / 2) ** 2 + mu11 ** 2)
+        features = {
+            'elongation': np.sqrt((half_sum + spread) / np.maximum(half_sum - spread, 1e-9)),
+            'solidity': area / np.maximum(hull, 1e-9),
+            'rectangularity': area / np.maximum(rect, 1e-9)
+        }
+        
+        confidence = np.ones(len(blocks))
+        for name, values in features.items():
+            good, bad = self.shape_limits[name]
+            confidence *= np.clip((values - bad) / (good - bad), 0.0, 1.0)
+        
+        for i, block in enumerate(blocks):
+            block['shape'] = {name: float(values[i]) for name, values in features.items()}
+            block['confidence'] = float(confidence[i])
+    
+    def confident_blocks(self, blocks: List[Dict]) -> List[Dict]:
+        """Blocks whose shape confidence reaches min_confidence"""
+        return [b for b in blocks if b['confidence'] >= self.min_confidence]
+    
+    def in_reach(self, block: Dict) -> bool:
+        """True when the block is low enough in the frame to be inside the gripper window"""
+        if self.reach_min_y is None:
+            return True
+        x, y, w, h = block['bbox']
+        return y + h >= self.reach_min_y
+    
+    def set_reach(self, camera_model) -> Optional[int]:
+        """
+        Put the reach line where the floor reach_distance straight ahead appears
+        
+        Args:
+            camera_model: camera_calibration.CameraModel; without a ground
+                          homography the reach check is switched off
+            
+        Returns:
+            The new reach_min_y (None = no reach check)
+        """
+        if camera_model is None or not camera_model.has_ground:
+            self.reach_min_y = None
+            return None
+        ground = np.array([[[self.reach_distance, 0.0]]])
+        u, v = cv2.perspectiveTransform(ground, np.linalg.inv(camera_model.ground_homography))[0, 0]
+        # The homography works on undistorted pixels; the detector sees raw frames
+        ray = np.linalg.solve(camera_model.new_camera_matrix, [u, v, 1.0])
+        pixel, _ = cv2.projectPoints(ray.reshape(1, 1, 3), np.zeros(3), np.zeros(3),
+                                     camera_model.camera_matrix, camera_model.dist_coeffs)
+        self.reach_min_y = int(round(pixel[0, 0, 1]))
+        return self.reach_min_y
+    
     def find_closest_block(self, frame: np.ndarray, 
                           center_x: int, center_y: int) -> Optional[Dict]:
         """
@@ -112,18 +239,20 @@ class SmallBlockDetector:
         
         return min(blocks, key=distance)
     
-    def draw_blocks(self, frame: np.ndarray, blocks: List[Dict]) -> np.ndarray:
+    def draw_blocks(self, frame: np.ndarray, blocks: List[Dict],
+                    out: Optional[np.ndarray] = None) -> np.ndarray:
         """
         Draw detected blocks on frame
         
         Args:
             frame: Input frame
             blocks: List of detected blocks
+            out: Optional buffer for the annotated frame
             
         Returns:
             Annotated frame
         """
-        annotated = frame.copy()
+        annotated = annotation_frame(frame, self.buffers, out)
         
         color_map = {
             'red': (0, 0, 255),
@@ -133,6 +262,8 @@ class SmallBlockDetector:
         
         for i, block in enumerate(blocks):
             color = color_map.get(block['color'], (255, 255, 255))
+            if block['confidence'] < self.min_confidence:
+                color = (128, 128, 128)  # Rejected by shape verification
             
             # Draw bounding box
             x, y, w, h = block['bbox']
@@ -143,29 +274,37 @@ class SmallBlockDetector:
             cv2.circle(annotated, (cx, cy), 5, color, -1)
             
             # Label
-            label = f"{block['color'].upper()}#{i+1}"
+            label = f"{block['color'].upper()}#{i+1} {block['confidence']:.2f}"
             cv2.putText(annotated, label, (x, y - 10),
                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
         
         return annotated
+    
+    def allocation_rate(self, frames: List[np.ndarray], fps: float = 30.0) -> Dict:
+        """Steady-state allocation rate of detect_blocks (see buffer_pool)"""
+        return measure_allocation_rate(self.detect_blocks, frames, fps=fps)
 
 
 # Test function
 if __name__ == "__main__":
     print("=== Small Block Detector Test ===")
     
-    cap = cv2.VideoCapture(0)
-    cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
-    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
+    import sys
+    from camera_source import open_source
+    from loop_log import LoopLogger
+    
+    # Camera index or source URI, e.g. v4l2:///dev/video0?fourcc=MJPG&buffers=2
+    cap = open_source(sys.argv[1] if len(sys.argv) > 1 else 0, 640, 480)
+    frame = cap.new_buffer()
     
     detector = SmallBlockDetector()
+    log = LoopLogger()  # Status line without blocking the frame loop
     
     print("Detecting small colored blocks...")
     print("Press 'q' to quit")
     
     while True:
-        ret, frame = cap.read()
-        if not ret:
+        if not cap.read_into(frame):
             break
         
         # Detect blocks
@@ -180,16 +319,15 @@ if __name__ == "__main__":
         
         # Print to console
         if blocks:
-            print(f"\rDetected {len(blocks)} blocks: ", end='')
-            for b in blocks[:3]:  # Show first 3
-                print(f"{b['color']}({int(b['area'])}) ", end='')
-            print("   ", end='', flush=True)
+            log.status("Detected {} blocks: {}   ", len(blocks),  # Show first 3
+                       ' '.join(f"{b['color']}({int(b['area'])})" for b in blocks[:3]))
         
         cv2.imshow('Block Detection', result)
         
         if cv2.waitKey(1) & 0xFF == ord('q'):
             break
     
+    log.close()
     cap.release()
     cv2.destroyAllWindows()
 
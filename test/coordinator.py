@@ -0,0 +1,408 @@
+#!/usr/bin/env python3
+"""
+Multi-Robot Coordination on a Shared Arena
+Several robots working the same START mat otherwise chase the same block,
+queue up behind each other at a drop mat and search for regions another
+robot already found. Coordinator is the shared state they talk to:
+
+- block claims: a robot claims the block it is servoing on (by floor
+  position) and the others ignore detections within claim_radius of it;
+  a claim is dropped after a pick or when it is not refreshed for claim_ttl
+- sightings: every robot reports the blocks and regions it sees in arena
+  coordinates, so an idle robot turns toward a known block and a robot
+  that never saw its drop region turns toward where another robot saw it
+- drop-region access: one robot at a time aligns and drops at a region
+  mat, the others wait in GOTO_REGION in FIFO order
+
+Each robot holds a FleetClient, which turns detections into arena
+coordinates with the ground-plane camera model and the robot's arena pose
+(overhead localization on a real field; the simulator's true pose here).
+All methods are thread-safe, so the simulated fleet runs every robot's
+state machine in its own thread on one simulator.LockstepClock.
+
+Benchmark (aggregate blocks per minute for 1-3 robots, with and without
+coordination):
+    python3 coordinator.py --arenas 10 --robots 1 2 3
+"""
+
+import math
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+Point = Tuple[float, float]
+
+
+class Coordinator:
+    """Shared block claims, sightings and drop-region access for a fleet"""
+
+    def __init__(self, claim_radius: float = 0.15, claim_ttl: float = 8.0,
+                 sighting_ttl: float = 30.0, hold_ttl: float = 60.0, clock=None):
+        """
+        Initialize coordinator
+
+        Args:
+            claim_radius: Detections this close to another robot's claim are
+                          the same block (meters)
+            claim_ttl: Seconds a claim survives without being refreshed
+            sighting_ttl: Seconds a block sighting is kept
+            hold_ttl: Seconds after which a region grant is taken back from a
+                      robot that never left (it crashed or got stuck)
+            clock: Time source (default: time module)
+        """
+        self.claim_radius = claim_radius
+        self.claim_ttl = claim_ttl
+        self.sighting_ttl = sighting_ttl
+        self.hold_ttl = hold_ttl
+        self.clock = clock if clock is not None else time
+        self.lock = threading.Lock()
+
+        self.claims: Dict[str, Dict] = {}      # robot -> {'position', 'color', 'time'}
+        self.sightings: List[Dict] = []        # {'position', 'color', 'time'}
+        self.regions: Dict[str, Dict] = {}     # color -> {'position', 'time', 'robot'}
+        self.holders: Dict[str, Tuple[str, float]] = {}  # region color -> (robot, since)
+        self.queues: Dict[str, List[str]] = {}           # region color -> waiting robots
+        self.wait_start: Dict[str, float] = {}
+
+        # Statistics
+        self.claim_conflicts = 0
+        self.expired_claims = 0
+        self.grants = 0
+        self.wait_time: Dict[str, float] = {}
+
+    def client(self, name: str, locate: Callable[[], Optional[Tuple[float, float, float]]],
+               camera_model=None) -> 'FleetClient':
+        """Register a robot and return its client"""
+        with self.lock:
+            self.wait_time.setdefault(name, 0.0)
+        return FleetClient(self, name, locate, camera_model)
+
+    # ---- block claims and sightings --------------------------------------
+
+    def _expire(self, now: float):
+        """Drop stale claims and sightings (lock held)"""
+        for name in [n for n, c in self.claims.items() if now - c['time'] > self.claim_ttl]:
+            del self.claims[name]
+            self.expired_claims += 1
+        self.sightings = [s for s in self.sightings if now - s['time'] <= self.sighting_ttl]
+
+    def claimed_by_other(self, name: str, position: Point) -> bool:
+        """True if another robot holds a claim on the block at position"""
+        with self.lock:
+            self._expire(self.clock.time())
+            return any(other != name and _dist(c['position'], position) < self.claim_radius
+                       for other, c in self.claims.items())
+
+    def claim(self, name: str, position: Point, color: str) -> bool:
+        """
+        Claim (or move this robot's claim to) the block at position
+
+        Returns:
+            False if another robot already claimed it
+        """
+        with self.lock:
+            now = self.clock.time()
+            self._expire(now)
+            for other, c in self.claims.items():
+                if other != name and _dist(c['position'], position) < self.claim_radius:
+                    self.claim_conflicts += 1
+                    return False
+            self.claims[name] = {'position': position, 'color': color, 'time': now}
+            return True
+
+    def release_claim(self, name: str, picked: bool):
+        """Drop the robot's claim; a picked block is also gone from the sightings"""
+        with self.lock:
+            claim = self.claims.pop(name, None)
+            if claim is not None and picked:
+                self.sightings = [s for s in self.sightings
+                                  if _dist(s['position'], claim['position']) >= self.claim_radius]
+
+    def sight_block(self, position: Point, color: str):
+        """Record a block seen at position (merged with an earlier sighting of it)"""
+        with self.lock:
+            now = self.clock.time()
+            for sighting in self.sightings:
+                if _dist(sighting['position'], position) < self.claim_radius:
+                    sighting.update(position=position, color=color, time=now)
+                    return
+            self.sightings.append({'position': position, 'color': color, 'time': now})
+
+    def free_sightings(self, name: str) -> List[Dict]:
+        """Known blocks no other robot has claimed"""
+        with self.lock:
+            self._expire(self.clock.time())
+            return [dict(s) for s in self.sightings
+                    if not any(other != name and
+                               _dist(c['position'], s['position']) < self.claim_radius
+                               for other, c in self.claims.items())]
+
+    # ---- regions ---------------------------------------------------------
+
+    def sight_region(self, name: str, color: str, position: Point):
+        """Record where a region mat was seen"""
+        with self.lock:
+            self.regions[color] = {'position': position, 'time': self.clock.time(),
+                                   'robot': name}
+
+    def region_position(self, color: str) -> Optional[Point]:
+        """Last reported position of a region mat"""
+        with self.lock:
+            region = self.regions.get(color)
+            return region['position'] if region is not None else None
+
+    def request_region(self, name: str, color: str) -> bool:
+        """
+        Ask for exclusive access to a drop region
+
+        Call every control tick while waiting; requests are served in order.
+
+        Returns:
+            True if this robot may align and drop now
+        """
+        with self.lock:
+            now = self.clock.time()
+            holder = self.holders.get(color)
+            if holder is not None and holder[0] != name and now - holder[1] > self.hold_ttl:
+                print(f"Coordinator: {holder[0]} held {color} for {now - holder[1]:.0f}s, revoked")
+                holder = None
+                del self.holders[color]
+            if holder is not None and holder[0] == name:
+                return True
+            queue = self.queues.setdefault(color, [])
+            if name not in queue:
+                queue.append(name)
+                self.wait_start[name] = now
+            if holder is not None or queue[0] != name:
+                return False
+            queue.pop(0)
+            self.holders[color] = (name, now)
+            self.grants += 1
+            self.wait_time[name] = self.wait_time.get(name, 0.0) + now - self.wait_start.pop(name)
+            return True
+
+    def leave_region(self, name: str):
+        """Give up any region this robot holds or waits for"""
+        with self.lock:
+            for color in [c for c, (holder, _) in self.holders.items() if holder == name]:
+                del self.holders[color]
+            for queue in self.queues.values():
+                if name in queue:
+                    queue.remove(name)
+            self.wait_start.pop(name, None)
+
+    def leave(self, name: str):
+        """Robot stopped: free its claim and region access"""
+        self.release_claim(name, picked=False)
+        self.leave_region(name)
+
+    def stats(self) -> Dict:
+        """Coordination counters"""
+        with self.lock:
+            return {'claim_conflicts': self.claim_conflicts,
+                    'expired_claims': self.expired_claims,
+                    'region_grants': self.grants,
+                    'region_wait': sum(self.wait_time.values())}
+
+
+class FleetClient:
+    """One robot's view of the Coordinator, in camera pixels and chassis bearings"""
+
+    def __init__(self, coordinator: Coordinator, name: str,
+                 locate: Callable[[], Optional[Tuple[float, float, float]]],
+                 camera_model=None):
+        """
+        Initialize client
+
+        Args:
+            coordinator: Shared coordinator
+            name: Robot name
+            locate: Returns the robot's arena pose (x, y, yaw_degrees
+                    counter-clockwise), or None while it is unknown
+            camera_model: camera_calibration.CameraModel with a ground plane
+                          (None: positions unknown, coordination by region only)
+        """
+        self.coordinator = coordinator
+        self.name = name
+        self.locate = locate
+        self.camera_model = camera_model
+
+    def world_point(self, u: float, v: float) -> Optional[Point]:
+        """Arena position of the floor point seen at pixel (u, v)"""
+        pose = self.locate()
+        if pose is None or self.camera_model is None:
+            return None
+        bx, by = self.camera_model.pixel_to_ground([(u, v)])[0]
+        x, y, yaw = pose
+        c, s = math.cos(math.radians(yaw)), math.sin(math.radians(yaw))
+        return x + bx * c - by * s, y + bx * s + by * c
+
+    def block_position(self, block: Dict) -> Optional[Point]:
+        """Arena position of a detected block (bottom center of its box)"""
+        x, y, w, h = block['bbox']
+        return self.world_point(x + w / 2, y + h - 1)
+
+    def bearing_to(self, position: Point) -> Optional[float]:
+        """Bearing of an arena point in degrees, positive = to the right"""
+        pose = self.locate()
+        if pose is None:
+            return None
+        x, y, yaw = pose
+        heading = math.degrees(math.atan2(position[1] - y, position[0] - x))
+        return (yaw - heading + 180) % 360 - 180
+
+    def free_blocks(self, blocks: List[Dict]) -> List[Dict]:
+        """Report the detected blocks and keep those no other robot claimed"""
+        free = []
+        for block in blocks:
+            position = self.block_position(block)
+            if position is None:
+                free.append(block)
+                continue
+            self.coordinator.sight_block(position, block['color'])
+            if not self.coordinator.claimed_by_other(self.name, position):
+                free.append(block)
+        return free
+
+    def claim(self, block: Dict) -> bool:
+        """Claim the block being servoed on (True without a position)"""
+        position = self.block_position(block)
+        if position is None:
+            return True
+        return self.coordinator.claim(self.name, position, block['color'])
+
+    def picked(self, success: bool):
+        """Pick finished: the claimed block is gone, or free for others again"""
+        self.coordinator.release_claim(self.name, success)
+
+    def block_direction(self, default: str) -> str:
+        """Turn toward the nearest unclaimed block another robot reported"""
+        pose = self.locate()
+        sightings = self.coordinator.free_sightings(self.name)
+        if pose is None or not sightings:
+            return default
+        nearest = min(sightings, key=lambda s: _dist(s['position'], pose[:2]))
+        return 'cw' if self.bearing_to(nearest['position']) > 0 else 'ccw'
+
+    def observe_region(self, color: str, region: Dict):
+        """Report a detected region mat"""
+        position = self.world_point(*region['center'])
+        if position is not None:
+            self.coordinator.sight_region(self.name, color, position)
+
+    def region_bearing(self, color: str) -> Optional[float]:
+        """Bearing of a region any robot has seen (None if unknown)"""
+        position = self.coordinator.region_position(color)
+        return self.bearing_to(position) if position is not None else None
+
+    def request_region(self, color: str) -> bool:
+        """True if this robot may align and drop at the region now"""
+        return self.coordinator.request_region(self.name, color)
+
+    def leave_region(self):
+        """Dropped and backed off: let the next robot in"""
+        self.coordinator.leave_region(self.name)
+
+    def region_wait(self) -> float:
+        """Seconds this robot spent queued for regions"""
+        with self.coordinator.lock:
+            return self.coordinator.wait_time.get(self.name, 0.0)
+
+    def leave(self):
+        """Robot stopped"""
+        self.coordinator.leave(self.name)
+
+
+def _dist(a: Point, b: Point) -> float:
+    return math.hypot(a[0] - b[0], a[1] - b[1])
+
+
+# ---- Benchmark -------------------------------------------------------------
+
+def _run_fleet_args(args):
+    from simulator import run_fleet
+    return run_fleet(*args)
+
+
+def benchmark(seeds, robot_counts=(1, 2, 3), n_blocks: int = 6,
+              time_limit: float = 300.0, jobs: Optional[int] = None) -> Dict:
+    """
+    Run simulated fleets of each size, without and with coordination
+
+    Returns:
+        {(n_robots, coordinated): {'blocks_per_minute', 'delivered_rate',
+        'delivered', 'pick_failures', 'close_time', 'region_overlap_time',
+        'region_wait', 'claim_conflicts', 'wall_time'}} over the seeds;
+        blocks_per_minute, close_time and region_overlap_time also as
+        '<key>_std', the standard deviation across seeds
+    """
+    from multiprocessing import Pool
+
+    tasks = [(seed, n, n_blocks, time_limit, coordinated)
+             for n in robot_counts for coordinated in (False, True) for seed in seeds]
+    if jobs == 1:
+        runs = [_run_fleet_args(task) for task in tasks]
+    else:
+        with Pool(jobs) as pool:
+            runs = pool.map(_run_fleet_args, tasks)
+
+    results = {}
+    for n in robot_counts:
+        for coordinated in (False, True):
+            batch = [r for r in runs if r['robots'] == n and r['coordinated'] == coordinated]
+            delivered = sum(r['blocks_delivered'] for r in batch)
+            results[(n, coordinated)] = {
+                'blocks_per_minute': float(np.mean([r['blocks_per_minute'] for r in batch])),
+                'delivered_rate': delivered / max(sum(r['blocks_total'] for r in batch), 1),
+                'delivered': delivered,
+                'pick_failures': sum(r['pick_failures'] for r in batch),
+                'close_time': float(np.mean([r['close_time'] for r in batch])),
+                'region_overlap_time': float(np.mean([r['region_overlap_time'] for r in batch])),
+                'region_wait': float(np.mean([r['region_wait'] for r in batch])),
+                'claim_conflicts': sum(r['claim_conflicts'] for r in batch),
+                'wall_time': sum(r['wall_time'] for r in batch)
+            }
+            # A handful of deliveries per arena: the spread says how much a mean means
+            for key in ('blocks_per_minute', 'close_time', 'region_overlap_time'):
+                results[(n, coordinated)][f"{key}_std"] = float(np.std([r[key] for r in batch]))
+    return results
+
+
+def main():
+    """Main entry point"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Multi-robot coordination benchmark")
+    parser.add_argument('--arenas', type=int, default=10,
+                        help="number of arenas (a few deliveries each: use enough)")
+    parser.add_argument('--seed', type=int, default=0, help="first arena seed")
+    parser.add_argument('--robots', type=int, nargs='+', default=[1, 2, 3],
+                        help="fleet sizes to run")
+    parser.add_argument('--blocks', type=int, default=6, help="blocks per arena")
+    parser.add_argument('--time-limit', type=float, default=300.0,
+                        help="simulated seconds per mission")
+    parser.add_argument('--jobs', type=int, default=None, help="worker processes")
+    args = parser.parse_args()
+
+    seeds = range(args.seed, args.seed + args.arenas)
+    results = benchmark(seeds, args.robots, args.blocks, args.time_limit, args.jobs)
+    print(f"=== Fleet: {args.arenas} arenas, {args.blocks} blocks, "
+          f"{args.time_limit:.0f}s limit ===")
+    print("(mean ± standard deviation across arenas)")
+    print(f"{'robots':>6s} {'coord':>5s} {'blocks/min':>13s} {'delivered':>9s} "
+          f"{'failed picks':>12s} {'close s':>11s} {'overlap s':>11s} {'queued s':>8s}")
+    for (n, coordinated), r in results.items():
+        print(f"{n:6d} {'on' if coordinated else 'off':>5s} "
+              f"{r['blocks_per_minute']:6.3f}±{r['blocks_per_minute_std']:<6.3f} "
+              f"{r['delivered']:9d} {r['pick_failures']:12d} "
+              f"{r['close_time']:5.0f}±{r['close_time_std']:<5.0f} "
+              f"{r['region_overlap_time']:5.0f}±{r['region_overlap_time_std']:<5.0f} "
+              f"{r['region_wait']:8.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,623 @@
+#!/usr/bin/env python3
+"""
+Fake Arduino on a Pseudo-Terminal
+Opens a pty pair and emulates Car_Volt_Feedback_24A_with_hand_gesture_and_robo_arm.ino,
+so RobotController (or anything else) can be pointed at fake.port instead of
+the real robot:
+
+- TESTMODE loop: one Serial.readStringUntil('\\n') per 16ms tick with the 1s
+  Stream timeout, Serialmove() commands A, B, L, R, rC, rA, S, 30, 50, 80,
+  go, rel, the P<seq> loopback ping and (pan,tilt,window) gimbal lines
+- ka<ms> keep-alive dead-man: motors stop when no line arrives for <ms>
+  while moving, and the read timeout drops to 20ms
+- UART_Control() (pan,tilt,window) frames, including its habit of cutting a
+  frame short when the next byte has not arrived yet
+- sendVolt() every 5 ticks when the reading changes
+- Baud-rate throughput in both directions and per-command parse latency
+- The arm step schedule: go (approach, clip, rise) and rel run alongside
+  other commands and report Mclip, Mup and Mopen; blocking_arm=True models
+  the old firmware that blocked in delay() for the whole go sequence
+
+Usage:
+    python3 fake_arduino.py                      # print the port and log commands
+    python3 fake_arduino.py --bench --count 500  # stress RobotController
+    python3 fake_arduino.py --stream 0.1         # keep-alive streaming vs per call
+    python3 fake_arduino.py --arm-cycle          # pick-and-drop cycle: blocking vs overlapped arm
+"""
+
+import os
+import time
+import threading
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+
+# Firmware constants
+TICK_PERIOD = 0.016      # loop() runs when millis() > time + 15
+STREAM_TIMEOUT = 1.0     # Arduino Stream default timeout
+VOLT_TICKS = 5           # sendVolt() every 5 ticks
+SERVO_WRITE_DELAY = 0.030  # delay(30) in writeall()
+RISE4, DROP4 = 140, 90   # Arm servo 4 positions
+CLIP5, RELEASE5 = 55, 90  # Gripper servo 5 positions
+SERVO_MIN, SERVO_MAX = 20, 160
+
+# Arm step schedule (armUpdate())
+APPROACH_STEP = 0.033    # Seconds per degree, as writeall() + delay(3)
+RISE_STEP = 0.035        # Seconds per degree, as writeall() + delay(5)
+ARM_SETTLE = 1.0         # Before clipping and before rising
+OPEN_SETTLE = 0.3        # Gripper opening
+
+# Serialmove() motion commands and the firmware function they call
+MOTIONS = {
+    'A': 'ADVANCE', 'B': 'BACK', 'L': 'LEFT_2', 'R': 'RIGHT_2',
+    'rC': 'rotate_1', 'rA': 'rotate_2', 'S': 'STOP'
+}
+
+
+def _to_int(text: str) -> int:
+    """Arduino String.toInt(): leading integer, 0 if none"""
+    text = text.lstrip()
+    digits = ''
+    for i, ch in enumerate(text):
+        if ch.isdigit() or (i == 0 and ch in '+-'):
+            digits += ch
+        else:
+            break
+    try:
+        return int(digits)
+    except ValueError:
+        return 0
+
+
+class FakeArduino:
+    """Firmware emulator behind a pseudo-terminal"""
+
+    def __init__(self, baudrate: int = 9600, testmode: bool = True,
+                 parse_delay: float = 0.0, time_scale: float = 1.0,
+                 voltage: int = 800, verbose: bool = False, blocking_arm: bool = False):
+        """
+        Initialize emulator
+
+        Args:
+            baudrate: Modeled line rate (10 bits per byte, both directions)
+            testmode: True = Serialmove() text commands (TESTMODE),
+                      False = UART_Control() (pan,tilt,window) frames
+            parse_delay: Extra seconds spent handling each command line
+            time_scale: Divide all firmware delays (arm sequence, tick, timeout)
+            voltage: Initial analogRead(A0) value reported by sendVolt()
+            verbose: Print every handled command
+            blocking_arm: Old firmware: go blocks the loop for the whole
+                          sequence and nothing is reported
+        """
+        self.byte_time = 10.0 / baudrate
+        self.testmode = testmode
+        self.parse_delay = parse_delay
+        self.time_scale = time_scale
+        self.verbose = verbose
+        self.blocking_arm = blocking_arm
+        self.master, self.slave = os.openpty()
+        self.port = os.ttyname(self.slave)
+        self.start_time = time.monotonic()
+
+        # Firmware state
+        self.motion = 'STOP'
+        self.motor_pwm = 0
+        self.pos4 = RISE4
+        self.pos5 = RELEASE5
+        self.pan, self.tilt, self.window_size = 90, 120, 0
+        self.voltage = voltage
+        self.reported_voltage = None
+        self.busy = False  # Inside a blocking arm sequence
+        self.arm_phase = None  # Step schedule: 'approach', 'clip', 'rise', 'open'
+        self.arm_next = 0.0
+        self.arm_events: List[Tuple[float, str]] = []  # (time, Mclip/Mup/Mopen)
+        self.stream_timeout = STREAM_TIMEOUT
+        self.deadman = 0.0  # seconds, 0 = off
+        self.moving = False
+        self.last_command = time.monotonic()
+        self.deadman_stops: List[float] = []  # Times the dead-man stopped the motors
+
+        # Statistics
+        self.commands: List[Tuple[float, str]] = []  # (handle time, command)
+        self.queue_delays: List[float] = []  # Last byte arrival -> handled, seconds
+        self.frames: List[Tuple[int, int, int]] = []  # Accepted UART frames
+        self.rejected_frames: List[str] = []
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+        # Modeled wire: bytes with their arrival time at the firmware
+        self._rx: deque = deque()
+        self._rx_cond = threading.Condition()
+        self._rx_free_at = 0.0
+        self._tx_free_at = 0.0
+        self._tx_lock = threading.Lock()
+        self._last_arrival = 0.0
+        self.running = False
+        self.threads: List[threading.Thread] = []
+
+    # ---- Lifecycle ------------------------------------------------------
+
+    def millis(self) -> int:
+        """Firmware uptime in milliseconds"""
+        return int((time.monotonic() - self.start_time) * 1000)
+
+    def start(self) -> 'FakeArduino':
+        """Start the wire and firmware threads"""
+        self.running = True
+        for target in (self._receive, self._firmware):
+            thread = threading.Thread(target=target, daemon=True)
+            thread.start()
+            self.threads.append(thread)
+        return self
+
+    def stop(self):
+        """Stop the threads and close the pty"""
+        self.running = False
+        with self._rx_cond:
+            self._rx_cond.notify_all()
+        for fd in (self.master, self.slave):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+        for thread in self.threads:
+            thread.join(timeout=2.0)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _delay(self, seconds: float):
+        """Firmware delay(), scaled"""
+        time.sleep(seconds / self.time_scale)
+
+    # ---- Wire model -----------------------------------------------------
+
+    def _receive(self):
+        """Host -> firmware: stamp each byte with its arrival time at the modeled baud rate"""
+        while self.running:
+            try:
+                data = os.read(self.master, 4096)
+            except OSError:
+                break
+            if not data:
+                break
+            now = time.monotonic()
+            with self._rx_cond:
+                arrival = max(now, self._rx_free_at)
+                for byte in data:
+                    arrival += self.byte_time
+                    self._rx.append((arrival, byte))
+                self._rx_free_at = arrival
+                self.bytes_in += len(data)
+                self._rx_cond.notify_all()
+
+    def _read_byte(self, timeout: Optional[float]) -> Optional[int]:
+        """
+        Next received byte
+
+        Args:
+            timeout: Seconds to wait (None = don't wait, like Serial.read())
+
+        Returns:
+            Byte value, or None on timeout / nothing available
+        """
+        deadline = time.monotonic() + (timeout or 0.0)
+        with self._rx_cond:
+            while self.running:
+                now = time.monotonic()
+                if self._rx and self._rx[0][0] <= now:
+                    arrival, byte = self._rx.popleft()
+                    self._last_arrival = arrival
+                    return byte
+                if now >= deadline:
+                    return None
+                wake = min(deadline, self._rx[0][0]) if self._rx else deadline
+                self._rx_cond.wait(wake - now)
+        return None
+
+    def _available(self) -> bool:
+        """Serial.available(): a byte has fully arrived"""
+        with self._rx_cond:
+            return bool(self._rx) and self._rx[0][0] <= time.monotonic()
+
+    def write_line(self, text: str):
+        """Serial.println(): delivered to the host after its transmission time"""
+        data = f"{text}\r\n".encode()
+        with self._tx_lock:
+            ready = max(time.monotonic(), self._tx_free_at) + len(data) * self.byte_time
+            self._tx_free_at = ready
+        delay = ready - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        try:
+            os.write(self.master, data)
+            self.bytes_out += len(data)
+        except OSError:
+            pass
+
+    # ---- Firmware -------------------------------------------------------
+
+    def _firmware(self):
+        """setup() banner, then loop()"""
+        for line in ("Start", "INIT OK", "Please input your gestures:", ""):
+            self.write_line(line)
+        volt_count = 0
+        next_tick = time.monotonic()
+        while self.running:
+            delay = next_tick - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            next_tick = time.monotonic() + TICK_PERIOD / self.time_scale
+            self._arm_update()
+            volt_count += 1
+            if self.testmode:
+                self._serialmove()
+                if self.deadman > 0 and self.moving and \
+                        time.monotonic() - self.last_command > self.deadman / self.time_scale:
+                    self.motion = 'STOP'
+                    self.moving = False
+                    self.deadman_stops.append(time.time())
+            else:
+                self._uart_control()
+            if volt_count >= VOLT_TICKS:
+                volt_count = 0
+                self._send_volt()
+
+    def _serialmove(self):
+        """Serial.readStringUntil('\\n') then dispatch, like Serialmove()"""
+        line = bytearray()
+        byte = None
+        while self.running:
+            byte = self._read_byte(self.stream_timeout / self.time_scale)
+            if byte is None or byte == ord('\n'):
+                break
+            line.append(byte)
+        if line:  # A timeout returns "" and, like Serialmove(), must not feed the dead-man
+            self.handle(line.decode(errors='replace'))
+
+    def handle(self, cmd: str):
+        """Execute one Serialmove() command"""
+        now = time.monotonic()
+        self.last_command = now
+        self.commands.append((time.time(), cmd))
+        self.queue_delays.append(max(0.0, now - self._last_arrival))
+        if self.verbose:
+            print(f"[{self.millis():8d}ms] {cmd!r}")
+        if self.parse_delay > 0:
+            time.sleep(self.parse_delay)
+
+        if cmd in MOTIONS:
+            self.motion = MOTIONS[cmd]
+            self.moving = cmd != 'S'
+        elif cmd in ('30', '50', '80'):
+            self.motor_pwm = int(cmd)
+        elif cmd == 'go' and self.blocking_arm:
+            self.busy = True
+            self._approach()
+            self._delay(1.0)
+            self._clip()
+            self._delay(1.0)
+            self._rise()
+            self._delay(1.0)
+            self.busy = False
+        elif cmd == 'go':
+            self._arm_start('approach', 0.0)
+        elif cmd == 'rel':
+            self.pos5 = RELEASE5
+            self._delay(SERVO_WRITE_DELAY)
+            if not self.blocking_arm:
+                self._arm_start('open', OPEN_SETTLE)
+        elif cmd.startswith('('):
+            self._gimbal_frame(cmd[1:])
+        elif cmd.startswith('ka'):
+            self.deadman = _to_int(cmd[2:]) / 1000.0
+            self.stream_timeout = 0.020 if self.deadman > 0 or self.arm_phase else STREAM_TIMEOUT
+        elif cmd.startswith('P'):
+            self.write_line(f"K{cmd[1:]},{self.millis()}")
+
+    def _gimbal_frame(self, text: str):
+        """Apply a pan,tilt,window frame if both angles are inside the servo limits"""
+        first, _, rest = text.partition(',')
+        second, _, third = rest.partition(',')
+        pan, tilt = _to_int(first), _to_int(second)
+        if SERVO_MIN < pan < SERVO_MAX and SERVO_MIN < tilt < SERVO_MAX:
+            self.pan, self.tilt, self.window_size = pan, tilt, _to_int(third)
+            self.frames.append((self.pan, self.tilt, self.window_size))
+        elif text:
+            self.rejected_frames.append(text)
+
+    def _approach(self):
+        while self.pos4 > DROP4:
+            self.pos4 -= 1
+            self._delay(SERVO_WRITE_DELAY + 0.003)
+
+    def _clip(self):
+        self.pos5 = CLIP5
+        self._delay(SERVO_WRITE_DELAY)
+
+    def _rise(self):
+        while self.pos4 < RISE4:
+            self.pos4 += 1
+            self._delay(SERVO_WRITE_DELAY + 0.005)
+
+    def _arm_start(self, phase: str, wait: float):
+        self.arm_phase = phase
+        self.arm_next = time.monotonic() + wait / self.time_scale
+        self.stream_timeout = 0.020
+
+    def _arm_update(self):
+        """armUpdate(): every step that is due, reporting phase ends"""
+        while self.arm_phase is not None and time.monotonic() >= self.arm_next:
+            event = None
+            if self.arm_phase == 'approach':
+                self.pos4 = max(DROP4, self.pos4 - 1)
+                self.arm_next += APPROACH_STEP / self.time_scale
+                if self.pos4 <= DROP4:
+                    self.arm_phase = 'clip'
+                    self.arm_next += ARM_SETTLE / self.time_scale
+            elif self.arm_phase == 'clip':
+                self.pos5 = CLIP5
+                self.arm_phase = 'clipped'
+                self.arm_next += (SERVO_WRITE_DELAY + ARM_SETTLE) / self.time_scale
+            elif self.arm_phase == 'clipped':
+                self.arm_phase = 'rise'  # First rise step is due at once
+                event = 'Mclip'
+                self.write_line(event)
+            elif self.arm_phase == 'rise':
+                self.pos4 = min(RISE4, self.pos4 + 1)
+                self.arm_next += RISE_STEP / self.time_scale
+                if self.pos4 >= RISE4:
+                    self.arm_phase = None
+                    event = 'Mup'
+                    self.write_line(event)
+            elif self.arm_phase == 'open':
+                self.arm_phase = None
+                event = 'Mopen'
+                self.write_line(event)
+            if event is not None:
+                self.arm_events.append((time.time(), event))
+            if self.arm_phase is None:
+                self.stream_timeout = 0.020 if self.deadman > 0 else STREAM_TIMEOUT
+
+    def _uart_control(self):
+        """UART_Control() USB part: parse one (pan,tilt,window) frame if a byte is waiting"""
+        if not self._available():
+            return
+        text = ''
+        char = self._read_byte(None)
+        if char == ord('('):
+            # Same loop as the firmware: read() returns -1 (0xFF) when empty and
+            # the loop stops as soon as nothing else is available
+            char = self._read_byte(None)
+            while char != ord(')'):
+                text += chr(char if char is not None else 0xFF)
+                char = self._read_byte(None)
+                if not self._available():
+                    break
+        accepted = len(self.frames)
+        self._gimbal_frame(text)
+        if len(self.frames) > accepted:
+            self.commands.append((time.time(), f"({text})"))
+
+    def _send_volt(self):
+        """sendVolt(): print the reading when it changed"""
+        if self.voltage != self.reported_voltage:
+            self.write_line(str(self.voltage))
+        self.reported_voltage = self.voltage
+
+    # ---- Expected durations ---------------------------------------------
+
+    @staticmethod
+    def pick_duration() -> float:
+        """Seconds the old firmware blocks on 'go' (approach + clip + rise + delays)"""
+        steps = RISE4 - DROP4
+        return (steps * (SERVO_WRITE_DELAY + 0.003) + SERVO_WRITE_DELAY
+                + steps * (SERVO_WRITE_DELAY + 0.005) + 3.0)
+
+    @staticmethod
+    def arm_timings() -> Dict[str, float]:
+        """Seconds from 'go' / 'rel' to each report of the step schedule"""
+        steps = RISE4 - DROP4
+        clip = steps * APPROACH_STEP + ARM_SETTLE + SERVO_WRITE_DELAY + ARM_SETTLE
+        return {'Mclip': clip, 'Mup': clip + steps * RISE_STEP, 'Mopen': OPEN_SETTLE}
+
+    def stats(self) -> Dict:
+        """Command counts and queueing delay summary"""
+        delays = sorted(self.queue_delays)
+
+        def pct(p):
+            return delays[min(len(delays) - 1, int(p * len(delays)))] * 1000 if delays else 0.0
+        return {
+            'commands': len(self.commands),
+            'bytes_in': self.bytes_in,
+            'bytes_out': self.bytes_out,
+            'queue_p50_ms': pct(0.5),
+            'queue_p99_ms': pct(0.99),
+            'frames': len(self.frames),
+            'rejected_frames': len(self.rejected_frames),
+            'deadman_stops': len(self.deadman_stops)
+        }
+
+
+def benchmark(count: int = 200, baudrate: int = 9600, parse_delay: float = 0.0,
+              command: str = 'A') -> Dict:
+    """
+    Stress RobotController against the emulator
+
+    Args:
+        count: Commands to send back to back
+        baudrate: Modeled line rate
+        parse_delay: Extra firmware time per command
+        command: Command to repeat
+
+    Returns:
+        Host write rate, firmware execution rate and write -> execute latency
+    """
+    from movement import RobotController
+
+    with FakeArduino(baudrate=baudrate, parse_delay=parse_delay) as fake:
+        robot = RobotController(port=fake.port, baudrate=baudrate)
+        writes = []
+        robot.write_listeners.append(lambda cmd, t: writes.append(t))
+        start = time.time()
+        for _ in range(count):
+            robot._send_command(command)
+        host_done = time.time()
+
+        deadline = host_done + count * (fake.byte_time * (len(command) + 1)
+                                        + TICK_PERIOD + parse_delay) + 5.0
+        while len(fake.commands) < count and time.time() < deadline:
+            time.sleep(0.01)
+        robot.serial.close()
+
+    handled = [t for t, _ in fake.commands[:count]]
+    latencies = sorted(h - w for h, w in zip(handled, writes))
+    elapsed = (handled[-1] - start) if handled else float('inf')
+    return {
+        'sent': count,
+        'handled': len(handled),
+        'host_cmd_per_s': count / max(host_done - start, 1e-9),
+        'firmware_cmd_per_s': len(handled) / elapsed,
+        'latency_p50_ms': latencies[len(latencies) // 2] * 1000 if latencies else 0.0,
+        'latency_max_ms': latencies[-1] * 1000 if latencies else 0.0
+    }
+
+
+def streaming_benchmark(seconds: float = 3.0, fps: float = 30.0, stall: float = 1.5,
+                        keepalive: Optional[float] = None) -> Dict:
+    """
+    Control loop traffic with and without setpoint streaming, then a host stall
+
+    Every frame the loop decides a motion (held for 10 frames at a time) and
+    sends it, like the alignment loop does; then it stops sending and calling
+    heartbeat() for stall seconds.
+
+    Returns:
+        Serial bytes, commands parsed and seconds from the stall to the motors
+        stopping (inf = still moving)
+    """
+    from movement import RobotController
+
+    pattern = ['A', 'rC', 'L', 'rA']
+    with FakeArduino() as fake:
+        robot = RobotController(port=fake.port, keepalive=keepalive)
+        frames = int(seconds * fps)
+        for frame in range(frames):
+            robot._send_command(pattern[frame // 10 % len(pattern)])
+            robot.heartbeat()
+            time.sleep(1.0 / fps)
+        stall_start = time.time()
+        time.sleep(stall)
+        stats = fake.stats()
+        stopped = [t - stall_start for t in fake.deadman_stops if t >= stall_start]
+        robot.serial.close()
+    return {
+        'frames': frames,
+        'host_writes': robot.writes,
+        'bytes_in': stats['bytes_in'],
+        'commands': stats['commands'],
+        'suppressed': robot.suppressed,
+        'stall_stop_s': stopped[0] if stopped else float('inf')
+    }
+
+
+def arm_cycle_benchmark(overlap: bool = False, blocking_arm: bool = False,
+                        transit: float = 2.0, backoff: float = 0.5) -> Dict:
+    """
+    One pick-and-drop cycle as main.py runs it: pick, turn toward the
+    region for transit seconds, release, back off for backoff seconds
+
+    Args:
+        overlap: RobotController.pick / release overlap mode
+        blocking_arm: Old blocking firmware
+        transit: Chassis motion between pick and drop
+        backoff: Back-off pulse after the release
+
+    Returns:
+        Firmware-side seconds from go to the turn, of turning actually done
+        (commands queued behind a blocking go run back to back), from rel to
+        the back-off, from go to the back-off, and whether the arm finished
+        rising before the release
+    """
+    from movement import RobotController
+
+    with FakeArduino(blocking_arm=blocking_arm) as fake:
+        robot = RobotController(port=fake.port)
+        robot.pick(overlap=overlap)
+        robot.rotate_clockwise()  # Turn toward the target region
+        time.sleep(transit)
+        robot.stop()
+        arm_up = fake.pos4 == RISE4
+        robot.release(overlap=overlap)
+        robot.backward(backoff)
+        time.sleep(fake.pick_duration() if blocking_arm else 0.5)
+        robot.serial.close()
+
+    handled = {}
+    for t, cmd in fake.commands:
+        handled.setdefault(cmd, t)
+    return {
+        'pick_wait_s': handled['rC'] - handled['go'],
+        'turn_s': handled['S'] - handled['rC'],
+        'drop_wait_s': handled['B'] - handled['rel'],
+        'cycle_s': handled['B'] - handled['go'],
+        'arm_up': arm_up
+    }
+
+
+# Test function
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Pty fake Arduino")
+    parser.add_argument('--baud', type=int, default=9600)
+    parser.add_argument('--uart', action='store_true', help="UART_Control mode (not TESTMODE)")
+    parser.add_argument('--parse-delay', type=float, default=0.0)
+    parser.add_argument('--bench', action='store_true', help="benchmark RobotController")
+    parser.add_argument('--count', type=int, default=200)
+    parser.add_argument('--stream', type=float, default=None, metavar='SECONDS',
+                        help="compare setpoint streaming at this keep-alive period")
+    parser.add_argument('--arm-cycle', action='store_true',
+                        help="pick-and-drop cycle time: blocking vs overlapped arm")
+    args = parser.parse_args()
+
+    if args.arm_cycle:
+        print("=== Pick-and-drop cycle: 2s transit, 0.5s back-off (firmware timestamps) ===")
+        results = {'blocking firmware': arm_cycle_benchmark(blocking_arm=True),
+                   'schedule': arm_cycle_benchmark(),
+                   'schedule+overlap': arm_cycle_benchmark(overlap=True)}
+        print(f"{'mode':18s} " + ' '.join(f"{k:>12s}" for k in results['schedule']))
+        for mode, result in results.items():
+            print(f"{mode:18s} " + ' '.join(f"{v:12.2f}" if isinstance(v, float) else f"{v!s:>12s}"
+                                            for v in result.values()))
+        saved = results['schedule']['cycle_s'] - results['schedule+overlap']['cycle_s']
+        print(f"Saved per pick-and-drop cycle: {saved:.2f}s")
+    elif args.stream is not None:
+        if not 0 < args.stream < 0.3:
+            parser.error("--stream must be shorter than the 0.3s firmware dead-man")
+        print("=== Setpoint streaming: 30 fps control loop, then a 1.5s host stall ===")
+        results = {'per-call': streaming_benchmark(),
+                   f'stream {args.stream:g}s': streaming_benchmark(keepalive=args.stream)}
+        print(f"{'mode':14s} " + ' '.join(f"{k:>12s}" for k in results['per-call']))
+        for mode, result in results.items():
+            print(f"{mode:14s} " + ' '.join(f"{v:12.2f}" if isinstance(v, float) else f"{v:12d}"
+                                            for v in result.values()))
+    elif args.bench:
+        print(f"=== Serial Benchmark: {args.count} commands @ {args.baud} baud ===")
+        result = benchmark(args.count, args.baud, args.parse_delay)
+        for key, value in result.items():
+            print(f"{key:20s}: {value:.1f}" if isinstance(value, float) else
+                  f"{key:20s}: {value}")
+    else:
+        with FakeArduino(baudrate=args.baud, testmode=not args.uart,
+                         parse_delay=args.parse_delay, verbose=True) as fake:
+            print(f"=== Fake Arduino on {fake.port} ===")
+            print("Press Ctrl+C to quit")
+            try:
+                while True:
+                    time.sleep(1)
+            except KeyboardInterrupt:
+                print(f"\n{fake.stats()}")
@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""
+Gimbal Tracking
+Keeps a target centered with the camera pan/tilt servos instead of turning
+the chassis. The firmware takes (pan,tilt,window) lines
+(RobotController.set_gimbal) and writes the servos every 16ms tick, so a
+correction per frame is cheap and lands within a frame or two.
+
+The chassis only rotates when the pan servo nears its limits. Other chassis
+decisions are made on a "chassis frame": the detection moved to where a
+camera looking straight ahead would see it, so VisualServo keeps working
+unchanged. Searches sweep the pan servo first, which covers about 200
+degrees in well under the time the chassis needs for a quarter turn.
+
+Benchmark (simulated arenas: time to find each region and how well it
+stays centered while the chassis turns, fixed camera vs gimbal):
+    python3 gimbal.py --arenas 10
+"""
+
+import math
+import time
+from typing import Callable, Dict, Optional
+
+import numpy as np
+
+
+class GimbalTracker:
+    """Proportional pan/tilt tracking with limit-triggered chassis rotation"""
+
+    def __init__(self, robot, frame_width: int = 640, frame_height: int = 480,
+                 hfov: float = 62.0, clock=None):
+        """
+        Initialize tracker
+
+        Args:
+            robot: Controller with set_gimbal() and PAN_CENTER / TILT_CENTER /
+                   SERVO_LIMITS (RobotController or SimulatedRobot)
+            frame_width, frame_height: Camera frame size
+            hfov: Horizontal field of view in degrees
+            clock: Object providing time() and sleep() (default: time module)
+        """
+        self.robot = robot
+        self.clock = clock if clock is not None else time
+        self.center_x = frame_width // 2
+        self.center_y = frame_height // 2
+        self.focal = (frame_width / 2) / math.tan(math.radians(hfov) / 2)
+
+        self.pan_center = robot.PAN_CENTER
+        self.tilt_center = robot.TILT_CENTER
+        self.pan_limits = (robot.SERVO_LIMITS[0] + 10, robot.SERVO_LIMITS[1] - 10)
+        self.tilt_limits = (self.tilt_center - 15, self.tilt_center + 15)
+        self.pan_sign = 1   # +1 servo degree turns the camera left (counter-clockwise)
+        self.tilt_sign = 1  # +1 servo degree pitches the camera down
+
+        # Tracking parameters
+        self.gain = 0.7          # Fraction of the angular error corrected per frame
+        self.deadband = 1.5      # degrees - no correction below this
+        self.max_step = 12       # degrees per update
+        self.min_interval = 0.03  # seconds between frames sent (9600 baud: ~12ms each)
+        self.track_tilt = True   # False = hold tilt (keeps a ground calibration valid)
+        self.chassis_margin = 15  # degrees from a pan limit where the chassis rotates
+
+        # Search sweep: pan angles tried before turning the chassis
+        self.sweep_offsets = [0, 35, 70, -35, -70]
+        self.settle_time = 0.12  # seconds for the servo to arrive and a fresh frame
+
+        self.pan = self.pan_center
+        self.tilt = self.tilt_center
+        self.last_sent = None
+        self.frames_sent = 0
+
+    # ---- Servo commands -----------------------------------------------------
+
+    @property
+    def pan_offset(self) -> float:
+        """Camera yaw from straight ahead in degrees (positive = left)"""
+        return self.pan_sign * (self.pan - self.pan_center)
+
+    @property
+    def tilt_offset(self) -> float:
+        """Camera pitch from the centered position in degrees (positive = down)"""
+        return self.tilt_sign * (self.tilt - self.tilt_center)
+
+    def point(self, pan: float, tilt: float, force: bool = False) -> bool:
+        """
+        Send new servo angles (clamped, rounded, rate limited)
+
+        Returns:
+            True if a frame was sent
+        """
+        pan = int(round(min(max(pan, self.pan_limits[0]), self.pan_limits[1])))
+        tilt = int(round(min(max(tilt, self.tilt_limits[0]), self.tilt_limits[1])))
+        if (pan, tilt) == (self.pan, self.tilt) and not force:
+            return False
+        now = self.clock.time()
+        if not force and self.last_sent is not None and now - self.last_sent < self.min_interval:
+            return False
+        self.robot.set_gimbal(pan, tilt)
+        self.pan, self.tilt = pan, tilt
+        self.last_sent = now
+        self.frames_sent += 1
+        return True
+
+    def center(self):
+        """Point the camera straight ahead"""
+        self.point(self.pan_center, self.tilt_center, force=True)
+
+    # ---- Tracking -------------------------------------------------------------
+
+    def angular_error(self, block_info: Dict):
+        """(horizontal, vertical) angle of the target from the image center (right, down)"""
+        cx, cy = block_info['center']
+        return (math.degrees(math.atan2(cx - self.center_x, self.focal)),
+                math.degrees(math.atan2(cy - self.center_y, self.focal)))
+
+    def track(self, block_info: Dict) -> bool:
+        """
+        One proportional correction toward the target
+
+        Args:
+            block_info: Detection result with 'center'
+
+        Returns:
+            True if new angles were sent
+        """
+        ex, ey = self.angular_error(block_info)
+        pan, tilt = self.pan, self.tilt
+        if abs(ex) > self.deadband:
+            step = min(max(self.gain * ex, -self.max_step), self.max_step)
+            pan -= self.pan_sign * step
+        if self.track_tilt and abs(ey) > self.deadband:
+            step = min(max(self.gain * ey, -self.max_step), self.max_step)
+            tilt += self.tilt_sign * step
+        return self.point(pan, tilt)
+
+    def bearing(self, block_info: Dict) -> float:
+        """Target bearing from the chassis heading in degrees (positive = right)"""
+        return self.angular_error(block_info)[0] - self.pan_offset
+
+    def chassis_frame(self, block_info: Dict) -> Dict:
+        """
+        The detection as a camera looking straight ahead would see it
+
+        Center and box are shifted by the gimbal angles (small-angle
+        approximation: the box is moved, not re-projected).
+        """
+        ex, ey = self.angular_error(block_info)
+        cx = self.center_x + self.focal * math.tan(math.radians(ex - self.pan_offset))
+        cy = self.center_y + self.focal * math.tan(math.radians(ey + self.tilt_offset))
+        dx = cx - block_info['center'][0]
+        dy = cy - block_info['center'][1]
+        x, y, w, h = block_info['bbox']
+        shifted = dict(block_info)
+        shifted['center'] = (int(round(cx)), int(round(cy)))
+        shifted['bbox'] = (int(round(x + dx)), int(round(y + dy)), w, h)
+        return shifted
+
+    def chassis_command(self) -> Optional[str]:
+        """Rotate the chassis toward the camera when the pan servo nears a limit"""
+        limit = min(self.pan_center - self.pan_limits[0], self.pan_limits[1] - self.pan_center)
+        if abs(self.pan_offset) < limit - self.chassis_margin:
+            return None
+        return 'rotate_ccw' if self.pan_offset > 0 else 'rotate_cw'
+
+    # ---- Search ---------------------------------------------------------------
+
+    def sweep(self, detect: Callable[[np.ndarray], object],
+              get_frame: Callable[[], Optional[np.ndarray]]):
+        """
+        Look around with the pan servo, chassis still
+
+        Args:
+            detect: Detection function taking a frame
+            get_frame: Returns the next frame (or None)
+
+        Returns:
+            Detection result (gimbal left pointing at it), or None with the
+            gimbal centered again
+        """
+        for offset in self.sweep_offsets:
+            if self.point(self.pan_center + self.pan_sign * offset, self.tilt_center, force=True):
+                self.clock.sleep(self.settle_time)
+            frame = get_frame()
+            if frame is None:
+                continue
+            result = detect(frame)
+            if result:
+                return result
+        self.center()
+        return None
+
+
+def benchmark(arenas: int = 10, seed: int = 0, turn_time: float = 1.5) -> Dict:
+    """
+    Search and hold a region in simulated arenas, fixed camera vs gimbal
+
+    For every region of every arena, from the same random start pose:
+    search with a chassis rotation only, or a pan sweep first; then keep
+    the chassis turning for turn_time and measure how far from the image
+    center the region drifts.
+
+    Returns:
+        {mode: {'found', 'search_time', 'held', 'error_px'}}
+    """
+    from simulator import Arena, SimulatedRobot, SimulatedCamera, VirtualClock
+    from rotation_search import ContinuousRotationSearch
+    from vision_servo import VisualServo
+
+    servo = VisualServo(640, 480, preallocate=True)
+    stats = {mode: {'found': 0, 'trials': 0, 'search_time': [], 'held': [], 'error_px': []}
+             for mode in ('chassis', 'gimbal')}
+    for arena_seed in range(seed, seed + arenas):
+        rng = np.random.default_rng(arena_seed)
+        arena = Arena.random(rng)
+        while True:
+            pose = (rng.uniform(0.4, arena.width - 0.4), rng.uniform(0.4, arena.height - 0.4),
+                    rng.uniform(-180, 180))
+            if arena.mat_at(pose[0], pose[1]) is None:
+                break
+        for color in [mat['color'] for mat in arena.mats]:
+            for mode, result in stats.items():
+                clock = VirtualClock()
+                robot = SimulatedRobot(arena, clock, pose=pose)
+                camera = SimulatedCamera(robot, seed=arena_seed)
+                frame = camera.new_buffer()
+
+                def get_frame():
+                    camera.read_into(frame)
+                    return frame, camera.last_timestamp
+
+                def detect(f):
+                    return servo.detect_largest_block(f, color)
+
+                tracker = GimbalTracker(robot, 640, 480, clock=clock)
+                start = clock.time()
+                found = None
+                if mode == 'gimbal':
+                    found = tracker.sweep(detect, lambda: get_frame()[0])
+                if found is None:
+                    found, _ = ContinuousRotationSearch(robot, get_frame, clock=clock).search(detect)
+                result['trials'] += 1
+                if found is None:
+                    continue
+                result['found'] += 1
+                result['search_time'].append(clock.time() - start)
+
+                # Chassis keeps turning; the gimbal (if used) follows the region
+                robot.set_speed(30)
+                robot.rotate_counterclockwise()
+                held, errors = 0, []
+                frames = int(turn_time * camera.fps)
+                for _ in range(frames):
+                    region = detect(get_frame()[0])
+                    if region is None:
+                        continue
+                    held += 1
+                    errors.append(abs(region['center'][0] - tracker.center_x))
+                    if mode == 'gimbal':
+                        tracker.track(region)
+                robot.stop()
+                result['held'].append(held / frames)
+                result['error_px'].extend(errors)
+
+    return {mode: {'found': r['found'] / max(r['trials'], 1),
+                   'search_time': float(np.mean(r['search_time'])) if r['search_time'] else 0.0,
+                   'held': float(np.mean(r['held'])) if r['held'] else 0.0,
+                   'error_px': float(np.mean(r['error_px'])) if r['error_px'] else 0.0}
+            for mode, r in stats.items()}
+
+
+def main():
+    """Main entry point"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Gimbal search and tracking benchmark")
+    parser.add_argument('--arenas', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--turn-time', type=float, default=1.5,
+                        help="seconds the chassis keeps turning after the region is found")
+    args = parser.parse_args()
+
+    results = benchmark(args.arenas, args.seed, args.turn_time)
+    print(f"=== Gimbal: {args.arenas} arenas, every region from a random start pose ===")
+    print(f"{'mode':8s} {'found':>6s} {'search s':>9s} {'held':>6s} {'error px':>9s}")
+    for mode, r in results.items():
+        print(f"{mode:8s} {r['found']:6.2f} {r['search_time']:9.2f} {r['held']:6.2f} "
+              f"{r['error_px']:9.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
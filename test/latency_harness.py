@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""
+Glass-to-Motor Latency Harness
+Stamps every frame at capture, follows it through detection and
+get_movement_command, and records when the reacting command is written to
+the serial port. With --loopback, a "P<seq>" ping follows each reacting
+command and the firmware answers "K<seq>,<millis>", adding the time until
+the Arduino has parsed the command.
+
+Runs the real ColorBlockRobot against any camera source (live, replayed
+video, synthetic) and any serial port (default: a pty fake Arduino).
+
+Usage:
+    python3 latency_harness.py --source "file:run1.mp4?realtime=1" --duration 30 --label baseline
+    python3 latency_harness.py --report latency/baseline.csv latency/prealloc.csv
+"""
+
+import os
+import csv
+import time
+import signal
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+
+
+# Stages between capture and serial write, in pipeline order
+STAGES = ('detect', 'decide', 'write', 'ack')
+
+
+class LatencyTracer:
+    """Follows frame capture stamps through the pipeline to the serial write"""
+
+    def __init__(self, loopback: bool = False, clock=None):
+        """
+        Initialize tracer
+
+        Args:
+            loopback: Send a ping after each reacting command and wait for the ack
+            clock: Object providing time() (default: time module)
+        """
+        self.clock = clock if clock is not None else time
+        self.loopback = loopback
+        self.samples: List[Dict] = []
+        self.frame: Optional[Dict] = None  # Frame whose reaction is pending
+        self.robot = None
+        self.seq = 0
+        self.pings: Dict[int, Dict] = {}
+        self.lock = threading.Lock()
+
+    def begin_frame(self, capture_time: float, state: str):
+        """A new frame was captured; it replaces any frame that got no reaction"""
+        self.frame = {'state': state, 'capture': capture_time}
+
+    def mark(self, stage: str):
+        """Time a pipeline stage of the current frame (last call wins)"""
+        if self.frame is not None:
+            self.frame[stage] = self.clock.time()
+
+    def on_write(self, cmd: str, write_time: float):
+        """RobotController write listener: the first write after a frame is its reaction"""
+        if self.frame is None or cmd.startswith('P'):
+            return
+        sample = self.frame
+        self.frame = None
+        sample['command'] = cmd
+        sample['write'] = write_time
+        self.samples.append(sample)
+        if self.loopback and self.robot is not None:
+            with self.lock:
+                self.seq += 1
+                self.pings[self.seq] = sample
+            self.robot._send_command(f"P{self.seq}")
+
+    def on_line(self, line: str, receive_time: float):
+        """Handle one line from the firmware; returns True for loopback acks"""
+        if not line.startswith('K') or ',' not in line:
+            return False
+        seq, millis = line[1:].split(',', 1)
+        with self.lock:
+            sample = self.pings.pop(int(seq), None)
+        if sample is not None:
+            sample['ack'] = receive_time
+            sample['firmware_ms'] = int(millis)
+        return True
+
+    def instrument(self, app):
+        """
+        Hook a ColorBlockRobot: frames, detectors, command decisions and writes
+
+        Args:
+            app: main.ColorBlockRobot instance
+        """
+        get_frame = app.get_frame
+
+        def traced_get_frame():
+            frame = get_frame()
+            if frame is not None:
+                self.begin_frame(app.frame_time, app.state.value)
+            return frame
+        app.get_frame = traced_get_frame
+
+        def traced(fn, stage):
+            def wrapper(*args, **kwargs):
+                result = fn(*args, **kwargs)
+                self.mark(stage)
+                return result
+            return wrapper
+
+        app.visual_servo.detect_largest_block = traced(app.visual_servo.detect_largest_block,
+                                                       'detect')
+        app.block_detector.detect_blocks = traced(app.block_detector.detect_blocks, 'detect')
+        app.visual_servo.get_movement_command = traced(app.visual_servo.get_movement_command,
+                                                       'decide')
+
+        self.robot = app.robot
+        self.robot.write_listeners.append(self.on_write)
+        if self.loopback and hasattr(self.robot, 'line_listeners'):
+            self.robot.line_listeners.append(self.on_line)
+
+    def rows(self) -> List[Dict]:
+        """Samples as latencies in milliseconds relative to capture"""
+        rows = []
+        for sample in self.samples:
+            row = {'state': sample['state'], 'command': sample['command']}
+            for stage in STAGES:
+                value = sample.get(stage)
+                row[stage] = round((value - sample['capture']) * 1000, 3) \
+                    if value is not None else None
+            rows.append(row)
+        return rows
+
+    def write_csv(self, path: str):
+        """Write samples (ms since capture per stage) to a CSV file"""
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=['state', 'command'] + list(STAGES))
+            writer.writeheader()
+            writer.writerows(self.rows())
+
+
+def load_samples(path: str) -> List[Dict]:
+    """Load a CSV written by LatencyTracer.write_csv()"""
+    with open(path, newline='') as f:
+        rows = list(csv.DictReader(f))
+    for row in rows:
+        for stage in STAGES:
+            row[stage] = float(row[stage]) if row.get(stage) else None
+    return rows
+
+
+def distributions(rows: List[Dict], stage: str = 'write') -> Dict[str, Dict]:
+    """
+    Latency distribution per state
+
+    Args:
+        rows: Sample rows (ms since capture)
+        stage: Stage to summarize ('write' = glass to serial write)
+
+    Returns:
+        {state: {'n', 'p50', 'p90', 'p99', 'max'}} plus an 'ALL' entry
+    """
+    groups: Dict[str, List[float]] = {}
+    for row in rows:
+        if row[stage] is None:
+            continue
+        groups.setdefault(row['state'], []).append(row[stage])
+        groups.setdefault('ALL', []).append(row[stage])
+    result = {}
+    for state, values in groups.items():
+        values = np.asarray(values)
+        p50, p90, p99 = np.percentile(values, [50, 90, 99])
+        result[state] = {'n': len(values), 'p50': p50, 'p90': p90, 'p99': p99,
+                         'max': values.max()}
+    return result
+
+
+def print_distributions(name: str, rows: List[Dict]):
+    """Print per-state glass-to-write (and glass-to-ack) percentiles"""
+    print(f"\n[{name}] {len(rows)} reactions, latency since capture (ms)")
+    for stage in ('detect', 'write', 'ack'):
+        dist = distributions(rows, stage)
+        if not dist:
+            continue
+        print(f"  {stage}:")
+        for state, d in sorted(dist.items(), key=lambda item: item[0] == 'ALL'):
+            print(f"    {state:14s} n={d['n']:4d}  p50 {d['p50']:7.1f}  p90 {d['p90']:7.1f}  "
+                  f"p99 {d['p99']:7.1f}  max {d['max']:7.1f}")
+
+
+def main():
+    """Main entry point"""
+    import ast
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Glass-to-motor latency harness")
+    parser.add_argument('--source', default='synthetic:?realtime=1',
+                        help="camera source URI (see camera_source.py)")
+    parser.add_argument('--port', default=None,
+                        help="serial port (default: start a pty fake Arduino)")
+    parser.add_argument('--loopback', action='store_true',
+                        help="ping the firmware after each reacting command")
+    parser.add_argument('--duration', type=float, default=30.0, help="seconds to run")
+    parser.add_argument('--label', default='run', help="name of this pipeline variant")
+    parser.add_argument('--out-dir', default='latency', help="where to write <label>.csv")
+    parser.add_argument('--set', action='append', default=[], metavar='PATH=VALUE',
+                        help="override, e.g. visual_servo.x_tolerance=40")
+    parser.add_argument('--report', nargs='+', default=None, metavar='CSV',
+                        help="only print distributions of earlier runs")
+    args = parser.parse_args()
+
+    if args.report:
+        for path in args.report:
+            print_distributions(os.path.splitext(os.path.basename(path))[0],
+                                load_samples(path))
+        return 0
+
+    from main import ColorBlockRobot
+    from simulator import apply_override
+
+    fake = None
+    port = args.port
+    if port is None:
+        from fake_arduino import FakeArduino
+        fake = FakeArduino().start()
+        port = fake.port
+        print(f"Fake Arduino on {port}")
+
+    app = ColorBlockRobot(serial_port=port, camera_id=args.source)
+    app.show_debug = False
+    app.metrics_dir = None
+    for item in args.set:
+        path, value = item.split('=', 1)
+        apply_override(app, path, ast.literal_eval(value))
+
+    tracer = LatencyTracer(loopback=args.loopback)
+    tracer.instrument(app)
+
+    # run() treats KeyboardInterrupt as a clean stop
+    def stop(signum, frame):
+        raise KeyboardInterrupt
+    signal.signal(signal.SIGALRM, stop)
+    signal.setitimer(signal.ITIMER_REAL, args.duration)
+    try:
+        app.run()
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        if fake is not None:
+            fake.stop()
+
+    path = os.path.join(args.out_dir, f"{args.label}.csv")
+    tracer.write_csv(path)
+    print_distributions(args.label, tracer.rows())
+    print(f"\nSamples written to {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+"""
+Non-Blocking Rate-Limited Logger for the Control Loop
+print() is a synchronous write to a terminal or SSH session; when the
+session is slow or scrolled back, the write blocks the control thread and
+servoing overshoots. LoopLogger only appends records to a ring buffer (a
+bounded deque: append/popleft are atomic, the control thread never takes a
+lock) and a background thread formats and writes them.
+
+- messages are format strings with arguments; formatting happens on the
+  writer thread, so suppressed messages are never formatted
+- a message key (format string and arguments by default) logs at most once
+  per rate_limit seconds; the suppressed repeats are counted and the next
+  one that gets through ends in "(repeated 57×)"
+- event() is never rate limited (state changes, failures) and first
+  writes the pending repeat counts, so the log reads in order
+- status() is a single '\\r' status line for test loops, throttled harder
+- a full ring drops records (counted) instead of blocking
+- binary_path additionally writes a compact binary log (each format string
+  once, then records of time, format id and JSON arguments) for decode()
+
+Benchmark (control-loop tick time, print vs LoopLogger, slow and fast
+terminal):
+    python3 loop_log.py bench --ticks 600 --latency 5
+    python3 loop_log.py decode run.bin
+"""
+
+import io
+import json
+import struct
+import sys
+import threading
+import time
+from collections import deque
+from typing import Dict, Iterator, Optional, Tuple
+
+
+BINARY_MAGIC = b'LOOPLOG1'
+_FORMAT = struct.Struct('<cH')        # b'F', format length; then the format string
+_RECORD = struct.Struct('<cdHIH')     # b'M', time, format id, repeats, args length
+
+
+class LoopLogger:
+    """Ring-buffered console logger with per-key rate limits"""
+
+    def __init__(self, stream=None, capacity: int = 4096, rate_limit: float = 1.0,
+                 status_interval: float = 0.1, flush_interval: float = 0.05,
+                 binary_path: Optional[str] = None, clock=None):
+        """
+        Initialize logger
+
+        Args:
+            stream: Text stream to write to (default: sys.stdout at creation)
+            capacity: Ring buffer size in records
+            rate_limit: Minimum seconds between two messages with the same key
+            status_interval: Minimum seconds between status() updates
+            flush_interval: Seconds the writer thread sleeps between drains
+            binary_path: Also write a binary log to this file
+            clock: Time source for timestamps and rate limits (default: time module)
+        """
+        self.stream = stream if stream is not None else sys.stdout
+        self.capacity = capacity
+        self.rate_limit = rate_limit
+        self.status_interval = status_interval
+        self.flush_interval = flush_interval
+        self.clock = clock if clock is not None else time
+
+        self.ring = deque(maxlen=capacity)
+        self.last: Dict[object, float] = {}    # Key -> time of the last record let through
+        self.suppressed: Dict[object, Tuple[int, str, tuple]] = {}  # Key -> (count, fmt, args)
+
+        # Statistics
+        self.records = 0
+        self.dropped = 0
+        self.repeats = 0
+        self.lines_written = 0
+
+        self.binary = open(binary_path, 'wb') if binary_path else None
+        if self.binary is not None:
+            self.binary.write(BINARY_MAGIC)
+        self.format_ids: Dict[str, int] = {}
+        self._status_active = False
+
+        self._wake = threading.Event()
+        self._closed = False
+        self._thread = threading.Thread(target=self._drain_loop, daemon=True)
+        self._thread.start()
+
+    # ---- control thread side ------------------------------------------------
+
+    def _push(self, kind: str, fmt: str, args: tuple, repeats: int = 0):
+        if len(self.ring) >= self.capacity:
+            self.dropped += 1  # deque drops the oldest record itself
+        self.ring.append((kind, self.clock.time(), fmt, args, repeats))
+        self.records += 1
+
+    def info(self, fmt: str, *args, key: Optional[str] = None):
+        """
+        Log a message, at most once per rate_limit seconds per key
+
+        Args:
+            fmt: str.format() format string
+            args: Format arguments (formatted on the writer thread)
+            key: Rate-limit key (default: fmt and args, i.e. identical messages)
+        """
+        if key is None:
+            key = (fmt,) + args
+        now = self.clock.time()
+        last = self.last.get(key)
+        if last is not None and now - last < self.rate_limit:
+            count = self.suppressed.get(key, (0,))[0]
+            self.suppressed[key] = (count + 1, fmt, args)
+            self.repeats += 1
+            return
+        if len(self.last) > 1024:
+            # Messages with changing arguments are all distinct keys; forget
+            # the ones that could no longer be suppressed anyway
+            self.last = {k: t for k, t in self.last.items()
+                         if now - t < self.rate_limit or k in self.suppressed}
+        self.last[key] = now
+        count = self.suppressed.pop(key, (0,))[0]
+        self._push('line', fmt, args, count)
+
+    def event(self, fmt: str, *args):
+        """Log a message that is never rate limited (writes pending repeat counts first)"""
+        self.flush_repeats()
+        self._push('line', fmt, args)
+
+    def status(self, fmt: str, *args):
+        """Overwrite a one-line status display, at most once per status_interval"""
+        now = self.clock.time()
+        last = self.last.get('\r')
+        if last is not None and now - last < self.status_interval:
+            return
+        self.last['\r'] = now
+        self._push('status', fmt, args)
+
+    def flush_repeats(self):
+        """Write the repeat counts of every rate-limited key now"""
+        for key in list(self.suppressed):
+            count, fmt, args = self.suppressed.pop(key)
+            self._push('line', fmt, args, count)
+            self.last[key] = self.clock.time()
+
+    def close(self):
+        """Write everything still queued and stop the writer thread"""
+        if self._closed:
+            return
+        self.flush_repeats()
+        self._closed = True
+        self._wake.set()
+        self._thread.join()
+        if self.binary is not None:
+            self.binary.close()
+
+    # ---- writer thread side -------------------------------------------------
+
+    def _drain_loop(self):
+        while not self._closed:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self._drain()
+        self._drain()
+        if self._status_active:
+            self._write('\n')
+
+    def _drain(self):
+        parts = []
+        while self.ring:
+            kind, t, fmt, args, repeats = self.ring.popleft()
+            text = fmt.format(*args) if args else fmt
+            if repeats:
+                text += f" (repeated {repeats}×)"
+            if kind == 'status':
+                parts.append('\r' + text)
+                self._status_active = True
+            else:
+                if self._status_active:
+                    parts.append('\n')
+                    self._status_active = False
+                parts.append(text + '\n')
+                self.lines_written += 1
+            if self.binary is not None:
+                self._write_binary(t, fmt, args, repeats)
+        if parts:
+            self._write(''.join(parts))
+
+    def _write(self, text: str):
+        try:
+            self.stream.write(text)
+            self.stream.flush()
+        except (OSError, ValueError):
+            pass  # Terminal gone: the control loop carries on
+
+    def _write_binary(self, t: float, fmt: str, args: tuple, repeats: int):
+        format_id = self.format_ids.get(fmt)
+        if format_id is None:
+            format_id = self.format_ids[fmt] = len(self.format_ids)
+            encoded = fmt.encode('utf-8')
+            self.binary.write(_FORMAT.pack(b'F', len(encoded)) + encoded)
+        payload = json.dumps(args, default=str).encode('utf-8') if args else b''
+        self.binary.write(_RECORD.pack(b'M', t, format_id, repeats, len(payload)) + payload)
+
+    def stats(self) -> Dict:
+        """Counters: records queued, repeats suppressed, records dropped, lines written"""
+        return {'records': self.records, 'repeats': self.repeats,
+                'dropped': self.dropped, 'lines': self.lines_written}
+
+
+def decode(path: str) -> Iterator[Tuple[float, str, int]]:
+    """
+    Read a binary log written by LoopLogger
+
+    Yields:
+        (time, text, repeats) per record
+    """
+    formats = []
+    with open(path, 'rb') as f:
+        if f.read(len(BINARY_MAGIC)) != BINARY_MAGIC:
+            raise ValueError(f"{path} is not a LoopLogger binary log")
+        while True:
+            tag = f.read(1)
+            if not tag:
+                return
+            if tag == b'F':
+                (length,) = struct.unpack('<H', f.read(2))
+                formats.append(f.read(length).decode('utf-8'))
+            elif tag == b'M':
+                t, format_id, repeats, length = struct.unpack('<dHIH', f.read(_RECORD.size - 1))
+                args = json.loads(f.read(length)) if length else []
+                fmt = formats[format_id]
+                yield t, fmt.format(*args) if args else fmt, repeats
+            else:
+                raise ValueError(f"Corrupt record tag {tag!r} in {path}")
+
+
+# ---- Benchmark -------------------------------------------------------------
+
+class SlowTerminal(io.TextIOBase):
+    """Text sink whose every write blocks like a congested SSH session"""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.chars = 0
+
+    def write(self, text: str) -> int:
+        time.sleep(self.latency)
+        self.chars += len(text)
+        return len(text)
+
+
+def benchmark(ticks: int = 600, latency: float = 0.005, work: float = 0.002) -> Dict:
+    """
+    Control-loop tick time with per-tick log messages
+
+    Every tick spins for `work` seconds (the vision and control work), logs a
+    search message and a status line, and every 50 ticks a state change.
+
+    Returns:
+        {(logger, terminal): {'mean_ms', 'p99_ms', 'max_ms', 'lines', 'dropped'}}
+    """
+    import numpy as np
+
+    results = {}
+    for terminal in ('slow', 'fast'):
+        for mode in ('print', 'loop_log'):
+            stream = SlowTerminal(latency if terminal == 'slow' else 0.0)
+            log = LoopLogger(stream) if mode == 'loop_log' else None
+            periods = []
+            for i in range(ticks):
+                tick = time.perf_counter()
+                spin_until = tick + work
+                while time.perf_counter() < spin_until:
+                    pass
+                if log is not None:
+                    if i % 50 == 0:
+                        log.event("\n>>> State: {} -> {}", 'SEARCH_BLOCK', 'PICK')
+                    log.info("Searching for {} region...", 'RED')
+                    log.status("Command: {:15s}", 'forward')
+                else:
+                    if i % 50 == 0:
+                        print("\n>>> State: SEARCH_BLOCK -> PICK", file=stream)
+                    print("Searching for RED region...", file=stream)
+                    print(f"\rCommand: {'forward':15s}", end='', file=stream, flush=True)
+                periods.append(time.perf_counter() - tick)
+            stats = {'dropped': 0}
+            if log is not None:
+                log.close()
+                stats = log.stats()
+            periods = np.array(periods) * 1000
+            results[(mode, terminal)] = {'mean_ms': float(periods.mean()),
+                                         'p99_ms': float(np.percentile(periods, 99)),
+                                         'max_ms': float(periods.max()),
+                                         'chars': stream.chars,
+                                         'dropped': stats['dropped']}
+    return results
+
+
+def main():
+    """Main entry point"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Control-loop logger tools")
+    sub = parser.add_subparsers(dest='command', required=True)
+    bench = sub.add_parser('bench', help="tick time with print vs LoopLogger")
+    bench.add_argument('--ticks', type=int, default=600)
+    bench.add_argument('--latency', type=float, default=5.0,
+                       help="slow terminal write latency (ms)")
+    bench.add_argument('--work', type=float, default=2.0, help="work per tick (ms)")
+    dump = sub.add_parser('decode', help="print a binary log")
+    dump.add_argument('path')
+    args = parser.parse_args()
+
+    if args.command == 'decode':
+        for t, text, repeats in decode(args.path):
+            suffix = f" (repeated {repeats}×)" if repeats else ""
+            print(f"{t:10.3f}  {text.strip()}{suffix}")
+        return 0
+
+    results = benchmark(args.ticks, args.latency / 1000, args.work / 1000)
+    print(f"=== Logger: {args.ticks} ticks, {args.work:.0f} ms work, "
+          f"{args.latency:.0f} ms per write on the slow terminal ===")
+    print(f"{'logger':9s} {'terminal':8s} {'mean ms':>8s} {'p99 ms':>7s} {'max ms':>7s} "
+          f"{'chars':>7s} {'dropped':>7s}")
+    for (mode, terminal), r in results.items():
+        print(f"{mode:9s} {terminal:8s} {r['mean_ms']:8.2f} {r['p99_ms']:7.2f} "
+              f"{r['max_ms']:7.2f} {r['chars']:7d} {r['dropped']:7d}")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
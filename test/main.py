@@ -4,14 +4,29 @@ Main State Machine for Autonomous Color Block Transport Robot
 Handles full workflow: pickup from START, transport to target region, return
 """
 
+import os
 import cv2
+import json
 import time
 from enum import Enum
-from typing import Optional, Dict
+from typing import Optional, Dict, Union
 
 from movement import RobotController
 from vision_servo import VisualServo
 from color_detector import SmallBlockDetector
+from rotation_search import ContinuousRotationSearch
+from mission_metrics import MissionMetrics
+from camera_calibration import CameraModel, DEFAULT_CALIBRATION_FILE
+from camera_source import open_source
+from visual_odometry import VisualOdometry, RegionMemory
+from gimbal import GimbalTracker
+from battery import BatteryMonitor
+from adaptive_thresholds import AdaptiveThresholds
+from qos import QualityGovernor
+from threshold_sweep import apply_params, BLOCK_PARAMS_FILE, REGION_PARAMS_FILE
+from loop_log import LoopLogger
+from robot_config import (DEFAULT_CONFIG_FILE, ConfigWatcher, configure, merge_config,
+                          snapshot)
 
 
 class State(Enum):
@@ -31,30 +46,140 @@ class State(Enum):
 class ColorBlockRobot:
     """Main robot controller with state machine"""
     
-    def __init__(self, serial_port: str = '/dev/ttyUSB0', camera_id: int = 0):
+    def __init__(self, serial_port: str = '/dev/ttyUSB0', camera_id: Union[int, str] = 0,
+                 robot=None, camera=None, clock=None, segmentation: str = 'hsv',
+                 segmentation_workers: int = 1, keepalive: Optional[float] = None,
+                 config_file: Optional[str] = DEFAULT_CONFIG_FILE,
+                 log_file: Optional[str] = None,
+                 calibration_file: Optional[str] = DEFAULT_CALIBRATION_FILE,
+                 block_params_file: Optional[str] = BLOCK_PARAMS_FILE,
+                 region_params_file: Optional[str] = REGION_PARAMS_FILE):
         """
         Initialize robot system
         
         Args:
             serial_port: Arduino serial port
-            camera_id: USB camera device ID
+            camera_id: USB camera device ID or camera source URI
+                       (see camera_source.py, e.g. 'v4l2:///dev/video0?fourcc=MJPG')
+            robot: Use this controller instead of opening serial_port
+                   (e.g. simulator.SimulatedRobot)
+            camera: Use this camera instead of opening camera_id
+                    (anything with read() and release())
+            clock: Object providing time() and sleep() (default: time module)
+            segmentation: Color segmentation backend spec for both detectors
+                          (see segmentation.py, e.g. 'lut:mat_colors.npz')
+            segmentation_workers: Threads for strip-parallel segmentation
+                                  (see tiled.py; worth it at high resolution)
+            keepalive: Stream the active motion every keepalive seconds with a
+                       firmware dead-man (see RobotController; None = off)
+            config_file: Config applied over the defaults if the file exists,
+                         and reloaded when it changes (see robot_config.py;
+                         None = defaults only)
+            log_file: Also write the control-loop log to this binary file
+                      (see loop_log.py)
+            calibration_file: Camera calibration loaded if the file exists
+                              (see camera_calibration.py; None = uncalibrated)
+            block_params_file, region_params_file: Thresholds tuned with
+                              threshold_sweep.py, applied if the file exists
+                              (None = built-in thresholds)
         """
         print("=== Color Block Transport Robot ===")
         print("Initializing systems...")
         
+        self.clock = clock if clock is not None else time
+        
+        # Control-loop messages go through a ring buffer and a writer thread,
+        # so a slow terminal never stalls a tick; repeats are rate limited
+        self.log = LoopLogger(binary_path=log_file, clock=self.clock)
+        
         # Initialize hardware
-        self.robot = RobotController(port=serial_port)
+        if robot is None:
+            robot = RobotController(port=serial_port, keepalive=keepalive)
+        self.robot = robot
         self.robot.set_speed(50)  # Set moderate speed
         
         # Initialize camera
-        self.camera = cv2.VideoCapture(camera_id)
-        self.camera.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
-        self.camera.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
-        time.sleep(1)
-        
-        # Initialize vision modules
-        self.visual_servo = VisualServo(640, 480)
-        self.block_detector = SmallBlockDetector()
+        if camera is not None:
+            self.camera = camera
+        else:
+            self.camera = open_source(camera_id, 640, 480)
+            self.clock.sleep(1)
+        
+        # Two capture buffers so the previous frame stays valid for one tick
+        self.frame_buffers = None
+        if hasattr(self.camera, 'read_into'):
+            self.frame_buffers = [self.camera.new_buffer(), self.camera.new_buffer()]
+        self.frame_index = 0
+        
+        # Initialize vision modules (metric decisions if the camera is calibrated)
+        camera_model = None
+        if calibration_file and os.path.exists(calibration_file):
+            camera_model = CameraModel.load(calibration_file)
+            print(f"Loaded camera calibration from {calibration_file}")
+        # Detectors reuse preallocated frame buffers (no per-frame allocation)
+        self.visual_servo = VisualServo(640, 480, camera_model=camera_model, preallocate=True,
+                                        workers=segmentation_workers)
+        self.block_detector = SmallBlockDetector(preallocate=True, workers=segmentation_workers)
+        self.block_detector.set_reach(camera_model)  # No reach check without a ground calibration
+        # Thresholds tuned offline with threshold_sweep.py
+        for path, detector in ((block_params_file, self.block_detector),
+                               (region_params_file, self.visual_servo)):
+            if path and os.path.exists(path):
+                with open(path) as f:
+                    apply_params(detector, json.load(f))
+                print(f"Loaded tuned thresholds from {path}")
+        # One config file over all of the above (robot_config.py), applied at
+        # the end of __init__ and reloaded between control ticks
+        self.config_watcher = None
+        if config_file and os.path.exists(config_file):
+            self.config_watcher = ConfigWatcher(config_file, clock=self.clock)
+        self.config_defaults = None  # Config before the file was applied
+        self.config_key = None       # Compiled artifacts the detectors use
+        self.segmentation_spec = segmentation
+        # Backends derive their default color models from the (tuned) ranges
+        # (with a config file, from its cached artifacts instead)
+        if segmentation != 'hsv' and self.config_watcher is None:
+            self.visual_servo.segmentation = segmentation
+            self.block_detector.segmentation = segmentation
+            print(f"Segmentation backend: {segmentation}")
+        
+        # Online threshold adaptation from confidently tracked targets, starting
+        # from the (tuned) ranges (False = fixed ranges)
+        self.adaptive_thresholds = False
+        self.region_thresholds = AdaptiveThresholds(self.visual_servo, clock=self.clock)
+        self.block_thresholds = AdaptiveThresholds(self.block_detector, clock=self.clock)
+        
+        # Dead reckoning between detections (metric if the camera is calibrated)
+        self.odometry = VisualOdometry(camera_model)
+        self.region_memory = RegionMemory(self.odometry)
+        
+        # Timed motion pulses, stretched as the battery sags (sendVolt() reports)
+        self.pulse_durations = {
+            'forward': 0.2,
+            'left': 0.15,
+            'right': 0.15,
+            'rotate_cw': 0.1,
+            'rotate_ccw': 0.1
+        }
+        self.battery = BatteryMonitor(clock=self.clock)
+        if hasattr(self.robot, 'line_listeners'):
+            self.robot.line_listeners.append(self.battery.on_line)
+        
+        # Gimbal tracking: pan/tilt keep the target centered, pan sweeps search
+        # first (False = fixed camera, chassis does all the turning)
+        self.gimbal_tracking = False
+        self.gimbal = GimbalTracker(self.robot, 640, 480, clock=self.clock)
+        
+        # Vision quality levels chosen per frame to hold the control rate
+        # (enabled = False: always the full-quality pipeline)
+        self.qos = QualityGovernor(target_rate=15.0, enabled=False)
+        
+        # Continuous-rotation search (False = legacy rotate/stop pulses)
+        self.continuous_search = True
+        self.frame_time = 0.0  # Capture timestamp of the last frame
+        self.search_frame = None  # Frame a rotation search stopped on, for the next state
+        self.rotation_search = ContinuousRotationSearch(
+            self.robot, self.get_timestamped_frame, clock=self.clock)
         
         # State machine
         self.state = State.INIT
@@ -65,6 +190,21 @@ class ColorBlockRobot:
         self.target_region_color = None  # Target region color
         self.blocks_transported = 0
         
+        # Arm/chassis overlap (firmware arm schedule): leave PICK once the
+        # gripper has closed and back off while it opens (False = wait out
+        # each arm sequence)
+        self.overlap_arm = False
+        
+        # Fleet coordination (coordinator.FleetClient): block claims, shared
+        # region positions and one robot at a time per drop region (None =
+        # working alone)
+        self.coordinator = None
+        
+        # Consecutive centered, in-reach, block-shaped frames required before PICK
+        # (1 = pick on the first one)
+        self.pick_confirm_frames = 1
+        self.confirmed_frames = 0
+        
         # Color mapping: block color -> region color (can be customized)
         self.color_map = {
             'red': 'red',
@@ -73,40 +213,238 @@ class ColorBlockRobot:
         }
         
         # Timing
-        self.state_start_time = time.time()
+        self.state_start_time = self.clock.time()
         self.timeout = 30.0  # State timeout in seconds
         
         # Debug display
         self.show_debug = True
         
+        # Mission telemetry (set metrics_dir to None to disable the log)
+        self.metrics = MissionMetrics(clock=self.clock)
+        self.metrics.on_state_change(None, self.state.value)
+        self.metrics_dir = 'runs'
+        
+        if self.config_watcher is not None:
+            self.apply_config(self.config_watcher.config)
+            print(f"Loaded config from {config_file}")
+        
         print("Initialization complete!")
         print(f"Blocks transported: {self.blocks_transported}")
     
+    def apply_config(self, config: Dict):
+        """
+        Apply a (partial) config over the startup defaults
+        
+        Args:
+            config: Config dict as in the config file (see robot_config.py)
+        """
+        if self.config_defaults is None:
+            self.config_defaults = snapshot(self)
+        if configure(self, merge_config(self.config_defaults, config)):
+            # New calibrated ranges: adaptation starts over from them
+            self.region_thresholds = AdaptiveThresholds(self.visual_servo, clock=self.clock)
+            self.block_thresholds = AdaptiveThresholds(self.block_detector, clock=self.clock)
+    
+    def reload_config(self):
+        """Apply edits to the config file (called between control ticks)"""
+        if self.config_watcher is None:
+            return
+        config = self.config_watcher.poll()
+        if config is None:
+            return
+        try:
+            self.apply_config(config)
+            self.log.event("Reloaded {}", self.config_watcher.path)
+        except (OSError, ValueError, TypeError, KeyError, IndexError) as e:
+            # A bad live edit must not end the mission: configure() only
+            # swaps in the new state once all of it was built
+            self.log.event("Config reload failed, keeping the current values: {}", e)
+    
     def get_frame(self) -> Optional[cv2.Mat]:
-        """Capture frame from camera"""
-        ret, frame = self.camera.read()
-        return frame if ret else None
+        """Capture frame from camera (or hand over the one a rotation search stopped on)"""
+        if self.search_frame is not None:
+            # Already timestamped and fed to odometry when the search read it
+            frame, self.search_frame = self.search_frame, None
+            return frame
+        if self.frame_buffers is not None:
+            frame = self.frame_buffers[self.frame_index % 2]
+            ret = self.camera.read_into(frame)
+            self.frame_index += 1
+        else:
+            ret, frame = self.camera.read()
+        # Prefer the source's capture timestamp over the time we got the frame
+        self.frame_time = getattr(self.camera, 'last_timestamp', None) or self.clock.time()
+        if hasattr(self.robot, 'heartbeat'):
+            self.robot.heartbeat()  # Control loop alive: keep the streamed motion going
+        if not ret:
+            return None
+        self.metrics.record_quality(self.qos.frame(self.state.value))
+        camera_yaw = self.gimbal.pan_offset if self.gimbal_tracking else 0.0
+        with self.qos.work():
+            self.odometry.update(frame, self.frame_time, camera_yaw)
+        return frame
+    
+    def get_timestamped_frame(self):
+        """Capture frame and return it with its capture timestamp"""
+        frame = self.get_frame()
+        return frame, self.frame_time
+    
+    def search_rotating(self, detect, direction: str = 'cw'):
+        """
+        Spin in place until detect() finds something or one turn elapses
+        
+        The frame the target was found in becomes the next get_frame(), so
+        the following state acts on what stopped the spin instead of
+        detecting again on a newer frame.
+        
+        Args:
+            detect: Detection function taking a frame
+            direction: 'cw' or 'ccw'
+            
+        Returns:
+            Detection result or None
+        """
+        self.metrics.record_search()
+        
+        result, frame = self.rotation_search.search(self.qos.every_nth(detect), direction,
+                                                    on_frame=lambda frame, result: self.show(frame))
+        if result:
+            self.search_frame = frame
+        search = self.rotation_search
+        self.log.info("Rotation search: {} after {:.2f}s, {} frames, overshoot {:.0f}ms",
+                      'found' if result else 'nothing', search.last_duration,
+                      search.last_frames, search.last_overshoot * 1000)
+        return result
+    
+    @property
+    def pose(self):
+        """Odometry pose (x, y, yaw_degrees) relative to where the run started"""
+        return self.odometry.pose
+    
+    def remember_region(self, color: str, region: Dict):
+        """Record where a region was seen, for searches after losing it"""
+        if self.gimbal_tracking:
+            region = self.gimbal.chassis_frame(region)
+        if self.coordinator is not None:
+            self.coordinator.observe_region(color, region)
+        target = self.visual_servo.get_target_range(region)
+        if target is not None:
+            self.region_memory.remember(color, target['bearing'], target['distance'])
+        else:
+            self.region_memory.remember_pixel(color, region['center'][0],
+                                              self.visual_servo.frame_width)
+    
+    def detect_region(self, frame, color: str) -> Optional[Dict]:
+        """Largest region of color, at the quality level the governor chose"""
+        return self.qos.detect_region(self.visual_servo, frame, color)
+    
+    def show(self, frame, draw=None):
+        """
+        Update the debug window (as often as the quality level allows)
+        
+        Args:
+            frame: Camera frame
+            draw: Function returning the annotated frame (only called when shown)
+        """
+        if not self.show_debug or not self.qos.render():
+            return
+        with self.qos.work():
+            cv2.imshow('Robot Vision', draw(frame) if draw is not None else frame)
+            cv2.waitKey(1)
+    
+    def adapt_thresholds(self, frame, color: str, region: Optional[Dict]):
+        """Let a tracked region (or its loss) update the region color bounds"""
+        if self.adaptive_thresholds:
+            self.region_thresholds.observe(frame, color, region)
+    
+    def search_direction(self, color: str, default: str) -> str:
+        """Turn toward where the region was last seen (default if never seen)"""
+        bearing = None
+        if self.coordinator is not None:
+            bearing = self.coordinator.region_bearing(color)  # Seen by any robot
+        if bearing is None:
+            bearing = self.region_memory.bearing_to(color)
+        if bearing is None:
+            return default
+        return 'cw' if bearing > 0 else 'ccw'
+    
+    def pulse(self, move: str, duration: float):
+        """
+        Drive for a nominal duration, compensated for battery voltage, then stop
+        
+        Args:
+            move: 'forward', 'backward', 'left', 'right', 'rotate_cw' or 'rotate_ccw'
+            duration: Pulse length in seconds at the nominal voltage
+        """
+        moves = {
+            'forward': self.robot.forward,
+            'backward': self.robot.backward,
+            'left': self.robot.left,
+            'right': self.robot.right,
+            'rotate_cw': self.robot.rotate_clockwise,
+            'rotate_ccw': self.robot.rotate_counterclockwise
+        }
+        scale = self.battery.pulse_scale()
+        self.metrics.record_pulse(self.battery.voltage, scale)
+        moves[move]()
+        self.clock.sleep(duration * scale)
+        self.robot.stop()
+    
+    def execute_command(self, command: str):
+        """Run the motion pulse for a VisualServo movement command"""
+        if command in self.pulse_durations:
+            self.pulse(command, self.pulse_durations[command])
+    
+    def sweep_for(self, detect) -> bool:
+        """Pan sweep with the chassis still (gimbal tracking only)"""
+        if not self.gimbal_tracking:
+            return False
+        return self.gimbal.sweep(detect, self.get_frame) is not None
+    
+    def align_command(self, region: Dict) -> str:
+        """
+        Movement command toward a region
+        
+        With gimbal tracking the camera follows the region and the chassis
+        only turns when the pan servo nears its limits; everything else is
+        decided on where a straight-ahead camera would see the region.
+        """
+        if not self.gimbal_tracking:
+            return self.visual_servo.get_movement_command(region)
+        # Tilting would invalidate the ground calibration
+        self.gimbal.track_tilt = not self.visual_servo.metric
+        self.gimbal.track(region)
+        command = self.gimbal.chassis_command()
+        if command is not None:
+            return command
+        command = self.visual_servo.get_movement_command(self.gimbal.chassis_frame(region))
+        return {'rotate_cw': 'right', 'rotate_ccw': 'left'}.get(command, command)
     
     def change_state(self, new_state: State):
         """Change to new state"""
+        if self.gimbal_tracking and new_state == State.SEARCH_BLOCK:
+            self.gimbal.center()  # Block picking assumes a straight-ahead camera
         self.previous_state = self.state
         self.state = new_state
-        self.state_start_time = time.time()
-        print(f"\n>>> State: {self.previous_state.value} -> {new_state.value}")
+        self.state_start_time = self.clock.time()
+        self.confirmed_frames = 0
+        self.metrics.on_state_change(self.previous_state.value, new_state.value)
+        self.log.event("\n>>> State: {} -> {}", self.previous_state.value, new_state.value)
     
     def check_timeout(self) -> bool:
         """Check if current state has timed out"""
-        elapsed = time.time() - self.state_start_time
+        elapsed = self.clock.time() - self.state_start_time
         if elapsed > self.timeout:
-            print(f"!!! State timeout after {elapsed:.1f}s")
+            self.log.event("!!! State timeout after {:.1f}s", elapsed)
+            self.metrics.record_timeout(self.state.value)
             return True
         return False
     
     def state_init(self):
         """Initial state - prepare for operation"""
-        print("Robot ready. Starting mission...")
+        self.log.event("Robot ready. Starting mission...")
         self.robot.stop()
-        time.sleep(0.5)
+        self.clock.sleep(0.5)
         self.change_state(State.START_ALIGN)
     
     def state_start_align(self):
@@ -116,54 +454,44 @@ class ColorBlockRobot:
             return
         
         # Detect START region (green)
-        start_region = self.visual_servo.detect_largest_block(frame, 'green')
+        start_region = self.detect_region(frame, 'green')
+        self.adapt_thresholds(frame, 'green', start_region)
         
         if start_region is None:
             # Can't see START - search by rotating
-            print("Searching for START region...")
-            self.robot.rotate_clockwise()
-            time.sleep(0.1)
-            self.robot.stop()
+            self.log.info("Searching for START region...")
+            if self.sweep_for(lambda f: self.detect_region(f, 'green')):
+                return
+            if self.continuous_search:
+                self.search_rotating(
+                    lambda f: self.detect_region(f, 'green'),
+                    self.search_direction('green', 'cw'))
+            else:
+                self.metrics.record_search()
+                self.pulse('rotate_cw', 0.1)
             
             if self.check_timeout():
-                print("Cannot find START region!")
+                self.log.event("Cannot find START region!")
                 self.change_state(State.ERROR)
             return
+        self.remember_region('green', start_region)
         
         # Get movement command
-        command = self.visual_servo.get_movement_command(start_region)
+        command = self.align_command(start_region)
+        
+        if command != 'close':
+            self.metrics.record_alignment()
         
         # Execute command
         if command == 'close':
-            print("Aligned with START region!")
+            self.log.event("Aligned with START region!")
             self.robot.stop()
             self.change_state(State.SEARCH_BLOCK)
-        elif command == 'forward':
-            self.robot.forward()
-            time.sleep(0.2)
-            self.robot.stop()
-        elif command == 'left':
-            self.robot.left()
-            time.sleep(0.15)
-            self.robot.stop()
-        elif command == 'right':
-            self.robot.right()
-            time.sleep(0.15)
-            self.robot.stop()
-        elif command == 'rotate_cw':
-            self.robot.rotate_clockwise()
-            time.sleep(0.1)
-            self.robot.stop()
-        elif command == 'rotate_ccw':
-            self.robot.rotate_counterclockwise()
-            time.sleep(0.1)
-            self.robot.stop()
+        else:
+            self.execute_command(command)
         
         # Debug display
-        if self.show_debug:
-            debug_frame = self.visual_servo.draw_debug_info(frame, start_region, 'green')
-            cv2.imshow('Robot Vision', debug_frame)
-            cv2.waitKey(1)
+        self.show(frame, lambda f: self.visual_servo.draw_debug_info(f, start_region, 'green'))
     
     def state_search_block(self):
         """Search for small colored block to pick up"""
@@ -171,32 +499,54 @@ class ColorBlockRobot:
         if frame is None:
             return
         
-        # Detect small blocks
-        blocks = self.block_detector.detect_blocks(frame)
+        # Detect small blocks; blobs that fail shape verification are ignored
+        candidates = self.qos.detect_blocks(self.block_detector, frame)
+        blocks = self.block_detector.confident_blocks(candidates)
+        if self.coordinator is not None:
+            blocks = self.coordinator.free_blocks(blocks)  # Skip blocks other robots claimed
+        if self.adaptive_thresholds and blocks:
+            self.block_thresholds.observe(frame, blocks[0]['color'], blocks[0],
+                                          blocks[0]['confidence'])
         
         if not blocks:
-            print("No blocks found. Searching...")
-            # Try small rotation to search
-            self.robot.rotate_clockwise()
-            time.sleep(0.15)
-            self.robot.stop()
+            self.confirmed_frames = 0
+            if candidates:
+                self.log.info("Ignoring {} blob(s) that are not block-shaped. Searching...",
+                              len(candidates))
+            else:
+                self.log.info("No blocks found. Searching...")
+            if self.continuous_search:
+                detector = self.block_detector
+                direction = 'cw'
+                if self.coordinator is not None:
+                    direction = self.coordinator.block_direction(direction)
+                self.search_rotating(
+                    lambda f: detector.confident_blocks(self.qos.detect_blocks(detector, f)),
+                    direction)
+            else:
+                self.metrics.record_search()
+                # Try small rotation to search
+                self.pulse('rotate_cw', 0.15)
             
             if self.check_timeout():
-                print("No blocks found in START area. Completing mission.")
+                self.log.event("No blocks found in START area. Completing mission.")
                 self.change_state(State.COMPLETE)
             
-            if self.show_debug:
-                cv2.imshow('Robot Vision', frame)
-                cv2.waitKey(1)
+            self.show(frame)
             return
         
         # Found blocks - select the first one (largest)
         target_block = blocks[0]
+        if self.coordinator is not None and not self.coordinator.claim(target_block):
+            self.confirmed_frames = 0
+            return
+        if target_block['color'] != self.current_block_color:
+            self.confirmed_frames = 0
         self.current_block_color = target_block['color']
         self.target_region_color = self.color_map[self.current_block_color]
         
-        print(f"Found {self.current_block_color.upper()} block!")
-        print(f"Target region: {self.target_region_color.upper()}")
+        self.log.info("Found {} block!", self.current_block_color.upper())
+        self.log.info("Target region: {}", self.target_region_color.upper())
         
         # Check if block is centered
         cx, cy = target_block['center']
@@ -204,29 +554,44 @@ class ColorBlockRobot:
         
         if abs(cx - frame_center_x) > 60:
             # Need to align with block
-            if cx > frame_center_x:
-                self.robot.right()
-            else:
-                self.robot.left()
-            time.sleep(0.1)
-            self.robot.stop()
+            self.confirmed_frames = 0
+            self.metrics.record_alignment()
+            self.pulse('right' if cx > frame_center_x else 'left', 0.1)
+        elif not self.block_detector.in_reach(target_block):
+            # Centered but beyond the gripper window - creep closer
+            self.confirmed_frames = 0
+            self.metrics.record_alignment()
+            self.pulse('forward', 0.1)
         else:
-            # Block is centered - pick it up
-            self.change_state(State.PICK)
+            # Centered and in reach - pick only after consecutive confident frames,
+            # a wasted 4s arm cycle costs far more than a few frames
+            self.confirmed_frames += 1
+            if self.confirmed_frames >= self.pick_confirm_frames:
+                self.change_state(State.PICK)
+            else:
+                self.log.event("Verifying block ({}/{}, confidence {:.2f})", self.confirmed_frames,
+                               self.pick_confirm_frames, target_block['confidence'])
         
         # Debug display
-        if self.show_debug:
-            debug_frame = self.block_detector.draw_blocks(frame, blocks)
+        def draw(f):
+            debug_frame = self.block_detector.draw_blocks(f, blocks)
             cv2.putText(debug_frame, f"Target: {self.current_block_color.upper()}", 
                        (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
-            cv2.imshow('Robot Vision', debug_frame)
-            cv2.waitKey(1)
+            return debug_frame
+        self.show(frame, draw)
     
     def state_pick(self):
         """Execute pick sequence"""
-        print(f"Picking up {self.current_block_color.upper()} block...")
-        self.robot.pick()
-        print("Block picked!")
+        self.log.event("Picking up {} block...", self.current_block_color.upper())
+        picked = self.robot.pick(overlap=self.overlap_arm)  # None when the controller cannot tell
+        self.metrics.record_pick(self.current_block_color, picked)
+        if self.coordinator is not None:
+            self.coordinator.picked(picked is not False)
+        if picked is False:
+            self.log.event("Pick failed!")
+            self.change_state(State.SEARCH_BLOCK)
+            return
+        self.log.event("Block picked!")
         self.change_state(State.GOTO_REGION)
     
     def state_goto_region(self):
@@ -236,34 +601,43 @@ class ColorBlockRobot:
             return
         
         # Detect target region
-        target_region = self.visual_servo.detect_largest_block(frame, self.target_region_color)
+        target_region = self.detect_region(frame, self.target_region_color)
+        self.adapt_thresholds(frame, self.target_region_color, target_region)
         
         if target_region is None:
             # Can't see target - rotate to search
-            print(f"Searching for {self.target_region_color.upper()} region...")
-            self.robot.rotate_clockwise()
-            time.sleep(0.2)
-            self.robot.stop()
+            self.log.info("Searching for {} region...", self.target_region_color.upper())
+            if self.sweep_for(lambda f: self.detect_region(f, self.target_region_color)):
+                return
+            if self.continuous_search:
+                self.search_rotating(
+                    lambda f: self.detect_region(f, self.target_region_color),
+                    self.search_direction(self.target_region_color, 'cw'))
+            else:
+                self.metrics.record_search()
+                self.pulse('rotate_cw', 0.2)
             
             if self.check_timeout():
-                print(f"Cannot find {self.target_region_color.upper()} region!")
+                self.log.event("Cannot find {} region!", self.target_region_color.upper())
                 self.change_state(State.ERROR)
             
-            if self.show_debug:
-                cv2.imshow('Robot Vision', frame)
-                cv2.waitKey(1)
+            self.show(frame)
             return
         
         # Found target region - switch to precise alignment
-        print(f"Found {self.target_region_color.upper()} region!")
+        self.remember_region(self.target_region_color, target_region)
+        self.log.info("Found {} region!", self.target_region_color.upper())
         self.robot.stop()
-        self.change_state(State.ALIGN_REGION)
+        if (self.coordinator is not None and
+                not self.coordinator.request_region(self.target_region_color)):
+            # Another robot is dropping there - hold back until it has left
+            self.log.info("Waiting for {} region...", self.target_region_color.upper())
+            self.state_start_time = self.clock.time()  # Queueing is not a stall
+        else:
+            self.change_state(State.ALIGN_REGION)
         
-        if self.show_debug:
-            debug_frame = self.visual_servo.draw_debug_info(
-                frame, target_region, self.target_region_color)
-            cv2.imshow('Robot Vision', debug_frame)
-            cv2.waitKey(1)
+        self.show(frame, lambda f: self.visual_servo.draw_debug_info(
+            f, target_region, self.target_region_color))
     
     def state_align_region(self):
         """Precise visual servoing to align with target region"""
@@ -272,62 +646,47 @@ class ColorBlockRobot:
             return
         
         # Detect target region
-        target_region = self.visual_servo.detect_largest_block(frame, self.target_region_color)
+        target_region = self.detect_region(frame, self.target_region_color)
+        self.adapt_thresholds(frame, self.target_region_color, target_region)
         
         if target_region is None:
-            print("Lost target region!")
+            self.log.event("Lost target region!")
             self.change_state(State.GOTO_REGION)
             return
+        self.remember_region(self.target_region_color, target_region)
         
         # Get movement command
-        command = self.visual_servo.get_movement_command(target_region)
+        command = self.align_command(target_region)
+        
+        if command != 'close':
+            self.metrics.record_alignment()
         
         # Execute command
         if command == 'close':
-            print(f"Reached {self.target_region_color.upper()} region!")
+            self.log.event("Reached {} region!", self.target_region_color.upper())
             self.robot.stop()
             self.change_state(State.DROP)
-        elif command == 'forward':
-            self.robot.forward()
-            time.sleep(0.2)
-            self.robot.stop()
-        elif command == 'left':
-            self.robot.left()
-            time.sleep(0.15)
-            self.robot.stop()
-        elif command == 'right':
-            self.robot.right()
-            time.sleep(0.15)
-            self.robot.stop()
-        elif command == 'rotate_cw':
-            self.robot.rotate_clockwise()
-            time.sleep(0.1)
-            self.robot.stop()
-        elif command == 'rotate_ccw':
-            self.robot.rotate_counterclockwise()
-            time.sleep(0.1)
-            self.robot.stop()
+        else:
+            self.execute_command(command)
         
         # Debug display
-        if self.show_debug:
-            debug_frame = self.visual_servo.draw_debug_info(
-                frame, target_region, self.target_region_color)
-            cv2.imshow('Robot Vision', debug_frame)
-            cv2.waitKey(1)
+        self.show(frame, lambda f: self.visual_servo.draw_debug_info(
+            f, target_region, self.target_region_color))
     
     def state_drop(self):
         """Drop the block"""
-        print(f"Dropping {self.current_block_color.upper()} block...")
-        self.robot.release()
-        print("Block dropped!")
+        self.log.event("Dropping {} block...", self.current_block_color.upper())
+        self.robot.release(overlap=self.overlap_arm)  # Back-off below starts while it opens
+        self.log.event("Block dropped!")
         
         self.blocks_transported += 1
-        print(f"Blocks transported: {self.blocks_transported}")
+        self.metrics.record_delivery(self.current_block_color)
+        self.log.event("Blocks transported: {}", self.blocks_transported)
         
         # Move back a bit
-        self.robot.backward()
-        time.sleep(0.5)
-        self.robot.stop()
+        self.pulse('backward', 0.5)
+        if self.coordinator is not None:
+            self.coordinator.leave_region()
         
         # Reset mission data
         self.current_block_color = None
@@ -342,77 +701,64 @@ class ColorBlockRobot:
             return
         
         # Detect START region (green)
-        start_region = self.visual_servo.detect_largest_block(frame, 'green')
+        start_region = self.detect_region(frame, 'green')
+        self.adapt_thresholds(frame, 'green', start_region)
         
         if start_region is None:
             # Can't see START - search
-            print("Searching for START region to return...")
-            self.robot.rotate_counterclockwise()
-            time.sleep(0.2)
-            self.robot.stop()
+            self.log.info("Searching for START region to return...")
+            if self.sweep_for(lambda f: self.detect_region(f, 'green')):
+                return
+            if self.continuous_search:
+                self.search_rotating(
+                    lambda f: self.detect_region(f, 'green'),
+                    self.search_direction('green', 'ccw'))
+            else:
+                self.metrics.record_search()
+                self.pulse('rotate_ccw', 0.2)
             
             if self.check_timeout():
-                print("Cannot find START region!")
+                self.log.event("Cannot find START region!")
                 self.change_state(State.ERROR)
             
-            if self.show_debug:
-                cv2.imshow('Robot Vision', frame)
-                cv2.waitKey(1)
+            self.show(frame)
             return
         
         # Navigate back to START
-        command = self.visual_servo.get_movement_command(start_region)
+        self.remember_region('green', start_region)
+        command = self.align_command(start_region)
+        if command != 'close':
+            self.metrics.record_alignment()
         
         if command == 'close':
-            print("Returned to START region!")
+            self.log.event("Returned to START region!")
             self.robot.stop()
-            time.sleep(0.5)
+            self.clock.sleep(0.5)
             self.change_state(State.START_ALIGN)  # Start next cycle
-        elif command == 'forward':
-            self.robot.forward()
-            time.sleep(0.2)
-            self.robot.stop()
-        elif command == 'left':
-            self.robot.left()
-            time.sleep(0.15)
-            self.robot.stop()
-        elif command == 'right':
-            self.robot.right()
-            time.sleep(0.15)
-            self.robot.stop()
-        elif command == 'rotate_cw':
-            self.robot.rotate_clockwise()
-            time.sleep(0.1)
-            self.robot.stop()
-        elif command == 'rotate_ccw':
-            self.robot.rotate_counterclockwise()
-            time.sleep(0.1)
-            self.robot.stop()
+        else:
+            self.execute_command(command)
         
         # Debug display
-        if self.show_debug:
-            debug_frame = self.visual_servo.draw_debug_info(frame, start_region, 'green')
-            cv2.imshow('Robot Vision', debug_frame)
-            cv2.waitKey(1)
+        self.show(frame, lambda f: self.visual_servo.draw_debug_info(f, start_region, 'green'))
     
     def state_complete(self):
         """Mission complete"""
-        print("\n" + "="*50)
-        print("MISSION COMPLETE!")
-        print(f"Total blocks transported: {self.blocks_transported}")
-        print("="*50)
+        self.log.event("\n" + "="*50)
+        self.log.event("MISSION COMPLETE!")
+        self.log.event("Total blocks transported: {}", self.blocks_transported)
+        self.log.event("="*50)
         self.robot.stop()
     
     def state_error(self):
         """Error state"""
-        print("\n!!! ERROR STATE !!!")
-        print("Stopping robot...")
+        self.log.event("\n!!! ERROR STATE !!!")
+        self.log.event("Stopping robot...")
         self.robot.stop()
     
     def run(self):
         """Main control loop"""
-        print("\nStarting autonomous operation...")
-        print("Press 'q' to quit, 's' to skip to next state")
+        self.log.event("\nStarting autonomous operation...")
+        self.log.event("Press 'q' to quit, 's' to skip to next state")
         
         # State handler mapping
         state_handlers = {
@@ -430,6 +776,9 @@ class ColorBlockRobot:
         
         try:
             while True:
+                # Parameters only change between ticks, never inside a handler
+                self.reload_config()
+                
                 # Execute current state handler
                 handler = state_handlers.get(self.state)
                 if handler:
@@ -437,34 +786,80 @@ class ColorBlockRobot:
                 
                 # Check for terminal states
                 if self.state in [State.COMPLETE, State.ERROR]:
-                    time.sleep(2)
+                    self.clock.sleep(2)
                     break
                 
-                # Check keyboard
-                key = cv2.waitKey(1) & 0xFF
-                if key == ord('q'):
-                    print("\nUser quit")
-                    break
-                elif key == ord('s'):
-                    print("\nSkipping to next state...")
-                    # Manual state skip for debugging
-                    pass
+                # Check keyboard (needs a debug window)
+                if self.show_debug:
+                    key = cv2.waitKey(1) & 0xFF
+                    if key == ord('q'):
+                        self.log.event("\nUser quit")
+                        break
+                    elif key == ord('s'):
+                        self.log.event("\nSkipping to next state...")
+                        # Manual state skip for debugging
+                        pass
                 
-                time.sleep(0.05)  # Small delay
+                self.clock.sleep(0.05)  # Small delay
         
         except KeyboardInterrupt:
-            print("\n\nInterrupted by user")
+            self.log.event("\n\nInterrupted by user")
         
         finally:
             self.cleanup()
     
+    def write_metrics(self):
+        """Finish the telemetry record and append it to the metrics log"""
+        self.metrics.finish(self.state.value)
+        summary = self.metrics.summary()
+        if self.battery.voltage is not None:
+            self.metrics.set_value('battery_voltage', round(self.battery.voltage, 2))
+            print(f"Battery: {self.battery.voltage:.2f}V, pulse scale "
+                  f"{self.battery.pulse_scale():.2f}")
+        if self.adaptive_thresholds:
+            for name, adaptive in (('region', self.region_thresholds),
+                                   ('block', self.block_thresholds)):
+                stats = adaptive.stats()
+                print(f"Adaptive {name} thresholds: {stats['updates']} updates, "
+                      f"{stats['changes']} bound changes, {stats['rebuilds']} table rebuilds")
+        if self.qos.enabled:
+            qos = self.qos.stats()
+            self.metrics.set_value('quality_changes', qos['changes'])
+            print(f"Quality governor: {qos['changes']} level changes, "
+                  f"{qos['roi_fallbacks']} ROI fallbacks, load {qos['load_ms']:.1f} ms/frame")
+        if self.coordinator is not None:
+            self.metrics.set_value('region_wait', round(self.coordinator.region_wait(), 1))
+            print(f"Fleet {self.coordinator.name}: {self.coordinator.region_wait():.1f}s "
+                  f"queued for drop regions")
+        if self.config_watcher is not None:
+            self.metrics.set_value('config_reloads', self.config_watcher.reloads)
+            print(f"Config {self.config_key}: {self.config_watcher.reloads} reloads, "
+                  f"{self.config_watcher.errors} rejected edits")
+        odometry = self.odometry.stats()
+        print(f"Odometry: {odometry['updates']} frames, {odometry['lost']} lost, "
+              f"{odometry['ms_per_frame']:.2f} ms/frame")
+        print(f"Run {summary['run_id']}: {summary['blocks']} blocks in "
+              f"{summary['duration']:.1f}s ({summary['blocks_per_minute']:.2f}/min), "
+              f"{summary['transitions']} transitions, {summary['timeouts']} timeouts, "
+              f"{summary['pick_failures']} failed picks")
+        if self.metrics_dir:
+            try:
+                self.metrics.write(self.metrics_dir)
+            except OSError as e:
+                print(f"Failed to write metrics: {e}")
+    
     def cleanup(self):
         """Clean up resources"""
+        self.log.close()  # Queued messages first, the shutdown report below is synchronous
         print("\nCleaning up...")
+        if self.coordinator is not None:
+            self.coordinator.leave()
+        self.write_metrics()
         self.robot.stop()
         self.robot.close()
         self.camera.release()
-        cv2.destroyAllWindows()
+        if self.show_debug:
+            cv2.destroyAllWindows()
         print("Shutdown complete")
 
 
@@ -475,14 +870,25 @@ def main():
     # Parse arguments
     serial_port = '/dev/ttyUSB0'
     camera_id = 0
+    segmentation = 'hsv'
+    keepalive = None
+    log_file = None
     
     if len(sys.argv) > 1:
         serial_port = sys.argv[1]
     if len(sys.argv) > 2:
-        camera_id = int(sys.argv[2])
+        camera_id = sys.argv[2]  # Index or camera source URI
+    if len(sys.argv) > 3:
+        segmentation = sys.argv[3]  # Segmentation backend spec
+    if len(sys.argv) > 4:
+        keepalive = float(sys.argv[4])  # Setpoint streaming period in seconds
+    if len(sys.argv) > 5:
+        log_file = sys.argv[5]  # Binary control-loop log (python3 loop_log.py decode)
     
     try:
-        robot = ColorBlockRobot(serial_port=serial_port, camera_id=camera_id)
+        robot = ColorBlockRobot(serial_port=serial_port, camera_id=camera_id,
+                                segmentation=segmentation, keepalive=keepalive,
+                                log_file=log_file)
         robot.run()
     except Exception as e:
         print(f"\nFATAL ERROR: {e}")
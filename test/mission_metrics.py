@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+Mission Throughput Metrics
+Per-run telemetry for the ColorBlockRobot state machine: time in each state,
+transitions, search/alignment attempts per block, timeouts, pick failures and
+the mean vision quality level chosen in each state.
+Runs are appended to a chunked CSV log (one chunk file per run and table).
+"""
+
+import os
+import csv
+import time
+import uuid
+from typing import Dict, List, Optional
+
+
+# Tables written for every run
+TABLES = ('runs', 'states', 'blocks')
+
+# Columns kept as text when loading
+STRING_FIELDS = ('run_id', 'label', 'final_state', 'state', 'color')
+
+
+class MissionMetrics:
+    """Collects telemetry for one mission run"""
+
+    def __init__(self, run_id: Optional[str] = None, label: str = '', clock=None):
+        """
+        Initialize metrics collector
+
+        Args:
+            run_id: Unique run identifier (generated if omitted)
+            label: Free-form tag used by the report tool to group runs
+            clock: Object providing time() (default: time module)
+        """
+        self.clock = clock if clock is not None else time
+        self.run_id = run_id or time.strftime('%Y%m%d-%H%M%S-') + uuid.uuid4().hex[:6]
+        self.label = label
+        self.start_time = self.clock.time()
+        self.wall_start = time.time()
+
+        self.state = None
+        self.state_since = self.start_time
+        self.state_time: Dict[str, float] = {}
+        self.state_entries: Dict[str, int] = {}
+        self.transitions = 0
+        self.timeouts: Dict[str, int] = {}
+        self.pick_attempts = 0
+        self.pick_failures = 0
+        self.extra: Dict[str, float] = {}
+        self.quality: Dict[str, List[int]] = {}  # state -> [level sum, frames]
+
+        # Per-block counters, reset after every drop
+        self.blocks: List[Dict] = []
+        self._block = self._new_block()
+        self.final_state = None
+        self.end_time = None
+
+    def _new_block(self) -> Dict:
+        return {
+            'color': '',
+            'started': self.clock.time(),
+            'search_attempts': 0,
+            'align_attempts': 0,
+            'pick_attempts': 0,
+            'timeouts': 0,
+            'pulses': 0,
+            'voltage_sum': 0.0,
+            'scale_sum': 0.0
+        }
+
+    def _close_state(self, now: float):
+        """Add the time since state_since to the current state"""
+        self.state_time[self.state] = self.state_time.get(self.state, 0.0) \
+            + now - self.state_since
+        self.state_since = now
+
+    def on_state_change(self, old_state: Optional[str], new_state: str):
+        """Account time spent in old_state and enter new_state"""
+        now = self.clock.time()
+        if self.state is not None:
+            self._close_state(now)
+            self.transitions += 1
+        self.state = new_state
+        self.state_since = now
+        self.state_entries[new_state] = self.state_entries.get(new_state, 0) + 1
+
+    def record_search(self):
+        """One search step (rotation pulse or continuous search)"""
+        self._block['search_attempts'] += 1
+
+    def record_alignment(self):
+        """One alignment motion command"""
+        self._block['align_attempts'] += 1
+
+    def record_pulse(self, voltage: Optional[float], scale: float):
+        """
+        One timed motion pulse and its battery compensation
+        
+        Args:
+            voltage: Filtered battery voltage (None if no report yet)
+            scale: Factor applied to the pulse duration
+        """
+        if voltage is None:
+            return
+        self._block['pulses'] += 1
+        self._block['voltage_sum'] += voltage
+        self._block['scale_sum'] += scale
+
+    def record_quality(self, level: int):
+        """Vision quality level used for one frame (0 = full quality)"""
+        counts = self.quality.setdefault(self.state, [0, 0])
+        counts[0] += level
+        counts[1] += 1
+    
+    def record_timeout(self, state: str):
+        """A state timed out"""
+        self.timeouts[state] = self.timeouts.get(state, 0) + 1
+        self._block['timeouts'] += 1
+
+    def record_pick(self, color: Optional[str], success: Optional[bool]):
+        """
+        A pick sequence was executed
+
+        Args:
+            color: Color of the targeted block
+            success: True/False if known, None if the controller cannot tell
+        """
+        self.pick_attempts += 1
+        self._block['pick_attempts'] += 1
+        self._block['color'] = color or ''
+        if success is False:
+            self.pick_failures += 1
+
+    def record_delivery(self, color: Optional[str]):
+        """A block was dropped on its target region"""
+        block = self._block
+        block['color'] = color or block['color']
+        block['cycle_time'] = self.clock.time() - block['started']
+        self.blocks.append(block)
+        self._block = self._new_block()
+
+    def set_value(self, name: str, value: float):
+        """Attach an extra run-level value (written as a column of the runs table)"""
+        self.extra[name] = value
+
+    def finish(self, final_state: str):
+        """Close the current state's time (not a transition) and freeze the run"""
+        self.end_time = self.clock.time()
+        if self.state is not None:
+            self._close_state(self.end_time)
+        self.final_state = final_state
+
+    def summary(self) -> Dict:
+        """Run-level summary row"""
+        end = self.end_time if self.end_time is not None else self.clock.time()
+        duration = end - self.start_time
+        delivered = len(self.blocks)
+        row = {
+            'run_id': self.run_id,
+            'label': self.label,
+            'started': self.wall_start,
+            'duration': round(duration, 3),
+            'final_state': self.final_state or '',
+            'blocks': delivered,
+            'blocks_per_minute': round(delivered / (duration / 60.0), 4) if duration > 0 else 0.0,
+            'transitions': self.transitions,
+            'timeouts': sum(self.timeouts.values()),
+            'pick_attempts': self.pick_attempts,
+            'pick_failures': self.pick_failures,
+            'search_attempts': sum(b['search_attempts'] for b in self.blocks)
+            + self._block['search_attempts'],
+            'align_attempts': sum(b['align_attempts'] for b in self.blocks)
+            + self._block['align_attempts']
+        }
+        row.update(self.extra)
+        return row
+
+    def rows(self) -> Dict[str, List[Dict]]:
+        """All table rows of this run"""
+        states = [{
+            'run_id': self.run_id,
+            'label': self.label,
+            'state': state,
+            'seconds': round(seconds, 3),
+            'entries': self.state_entries.get(state, 0),
+            'timeouts': self.timeouts.get(state, 0),
+            'quality': round(self.quality[state][0] / self.quality[state][1], 2)
+            if state in self.quality else ''
+        } for state, seconds in sorted(self.state_time.items())]
+        blocks = [{
+            'run_id': self.run_id,
+            'label': self.label,
+            'index': i,
+            'color': b['color'],
+            'cycle_time': round(b['cycle_time'], 3),
+            'search_attempts': b['search_attempts'],
+            'align_attempts': b['align_attempts'],
+            'pick_attempts': b['pick_attempts'],
+            'timeouts': b['timeouts'],
+            'voltage': round(b['voltage_sum'] / b['pulses'], 3) if b['pulses'] else '',
+            'pulse_scale': round(b['scale_sum'] / b['pulses'], 3) if b['pulses'] else ''
+        } for i, b in enumerate(self.blocks)]
+        return {'runs': [self.summary()], 'states': states, 'blocks': blocks}
+
+    def write(self, log_dir: str):
+        """
+        Append this run to the chunked log
+
+        Each table is a directory of CSV chunks (<log_dir>/<table>/<run_id>.csv),
+        so concurrent runs never write to the same file.
+        """
+        for table, rows in self.rows().items():
+            if not rows:
+                continue
+            table_dir = os.path.join(log_dir, table)
+            os.makedirs(table_dir, exist_ok=True)
+            path = os.path.join(table_dir, f"{self.run_id}.csv")
+            tmp_path = path + '.tmp'
+            with open(tmp_path, 'w', newline='') as f:
+                writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()))
+                writer.writeheader()
+                writer.writerows(rows)
+            os.replace(tmp_path, path)
+
+
+def load_table(log_dir: str, table: str) -> List[Dict]:
+    """
+    Load all chunks of one table
+
+    Args:
+        log_dir: Metrics log directory
+        table: 'runs', 'states' or 'blocks'
+
+    Returns:
+        List of rows with numeric fields converted to float
+    """
+    table_dir = os.path.join(log_dir, table)
+    if not os.path.isdir(table_dir):
+        return []
+    rows = []
+    for name in sorted(os.listdir(table_dir)):
+        if not name.endswith('.csv'):
+            continue
+        with open(os.path.join(table_dir, name), newline='') as f:
+            for row in csv.DictReader(f):
+                for key, value in row.items():
+                    if key in STRING_FIELDS:
+                        continue
+                    try:
+                        row[key] = float(value)
+                    except (TypeError, ValueError):
+                        pass
+                rows.append(row)
+    return rows
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Mission Report Tool
+Reads the chunked metrics log written by mission_metrics.py, compares runs
+(or groups of runs by label), shows which states dominate cycle time (and
+the mean vision quality level used in each) and, when voltage reports were
+logged, alignment effort against battery voltage.
+
+Usage:
+    python3 mission_report.py [log_dir] [--by label|run] [--runs ID ...]
+"""
+
+import sys
+import argparse
+from typing import Dict, List
+
+from mission_metrics import load_table
+
+
+def group_runs(runs: List[Dict], by: str) -> Dict[str, List[Dict]]:
+    """Group run rows by label or by run id"""
+    groups: Dict[str, List[Dict]] = {}
+    for run in runs:
+        key = run['run_id'] if by == 'run' else (run['label'] or '(no label)')
+        groups.setdefault(key, []).append(run)
+    return groups
+
+
+def state_shares(states: List[Dict], run_ids) -> Dict[str, float]:
+    """Fraction of total mission time spent in each state"""
+    totals: Dict[str, float] = {}
+    for row in states:
+        if row['run_id'] in run_ids:
+            totals[row['state']] = totals.get(row['state'], 0.0) + row['seconds']
+    total = sum(totals.values())
+    if total <= 0:
+        return {}
+    return {state: seconds / total for state, seconds in
+            sorted(totals.items(), key=lambda item: item[1], reverse=True)}
+
+
+def quality_levels(states: List[Dict], run_ids) -> Dict[str, float]:
+    """Mean vision quality level per state (time-weighted), where it was logged"""
+    sums: Dict[str, List[float]] = {}
+    for row in states:
+        if row['run_id'] in run_ids and isinstance(row.get('quality'), float):
+            acc = sums.setdefault(row['state'], [0.0, 0.0])
+            acc[0] += row['quality'] * row['seconds']
+            acc[1] += row['seconds']
+    return {state: total / seconds for state, (total, seconds) in sums.items() if seconds > 0}
+
+
+def print_comparison(groups: Dict[str, List[Dict]]):
+    """Print one line of throughput figures per group"""
+    header = (f"{'group':24s} {'runs':>4s} {'blocks':>6s} {'min':>7s} {'blk/min':>7s} "
+              f"{'trans':>6s} {'tmout':>5s} {'picks':>5s} {'fail':>4s} "
+              f"{'search/blk':>10s} {'align/blk':>9s}")
+    print(header)
+    print('-' * len(header))
+    baseline = None
+    for name, runs in groups.items():
+        blocks = sum(r['blocks'] for r in runs)
+        minutes = sum(r['duration'] for r in runs) / 60.0
+        bpm = blocks / minutes if minutes > 0 else 0.0
+        per_block = max(blocks, 1)
+        line = (f"{name[:24]:24s} {len(runs):4d} {int(blocks):6d} {minutes:7.1f} {bpm:7.2f} "
+                f"{int(sum(r['transitions'] for r in runs)):6d} "
+                f"{int(sum(r['timeouts'] for r in runs)):5d} "
+                f"{int(sum(r['pick_attempts'] for r in runs)):5d} "
+                f"{int(sum(r['pick_failures'] for r in runs)):4d} "
+                f"{sum(r['search_attempts'] for r in runs) / per_block:10.1f} "
+                f"{sum(r['align_attempts'] for r in runs) / per_block:9.1f}")
+        if baseline is None:
+            baseline = bpm
+        elif baseline > 0:
+            line += f"  ({(bpm / baseline - 1) * 100:+.0f}% vs first)"
+        print(line)
+
+
+def print_state_breakdown(groups: Dict[str, List[Dict]], states: List[Dict],
+                          width: int = 30):
+    """Print time share per state for each group, dominant states first"""
+    for name, runs in groups.items():
+        run_ids = {r['run_id'] for r in runs}
+        shares = state_shares(states, run_ids)
+        if not shares:
+            continue
+        levels = quality_levels(states, run_ids)
+        print(f"\n[{name}] time per state")
+        for i, (state, share) in enumerate(shares.items()):
+            bar = '#' * int(round(share * width))
+            marker = '  <-- dominant' if i == 0 else ''
+            quality = f"  q{levels[state]:.1f}" if state in levels else ''
+            print(f"  {state:14s} {share * 100:5.1f}%{quality} {bar}{marker}")
+
+
+def print_battery_breakdown(groups: Dict[str, List[Dict]], blocks: List[Dict],
+                            step: float = 0.4):
+    """Print alignment attempts and cycle time per block, by battery voltage band"""
+    for name, runs in groups.items():
+        run_ids = {r['run_id'] for r in runs}
+        rows = [b for b in blocks if b['run_id'] in run_ids
+                and isinstance(b.get('voltage'), float)]
+        if not rows:
+            continue
+        bands: Dict[float, List[Dict]] = {}
+        for row in rows:
+            bands.setdefault(row['voltage'] // step * step, []).append(row)
+        print(f"\n[{name}] alignment vs battery voltage")
+        print(f"  {'volts':>11s} {'blocks':>6s} {'scale':>6s} {'align/blk':>9s} {'cycle s':>8s}")
+        for low in sorted(bands, reverse=True):
+            band = bands[low]
+            n = len(band)
+            print(f"  {low:5.1f}-{low + step:<5.1f} {n:6d} "
+                  f"{sum(b['pulse_scale'] for b in band) / n:6.2f} "
+                  f"{sum(b['align_attempts'] for b in band) / n:9.1f} "
+                  f"{sum(b['cycle_time'] for b in band) / n:8.1f}")
+
+
+def main():
+    """Main entry point"""
+    parser = argparse.ArgumentParser(description="Compare mission metric runs")
+    parser.add_argument('log_dir', nargs='?', default='runs', help="metrics log directory")
+    parser.add_argument('--by', choices=['label', 'run'], default='label',
+                        help="group runs by label (default) or show each run")
+    parser.add_argument('--runs', nargs='*', default=None, help="only these run ids")
+    args = parser.parse_args()
+
+    runs = load_table(args.log_dir, 'runs')
+    if args.runs:
+        runs = [r for r in runs if r['run_id'] in args.runs]
+    if not runs:
+        print(f"No runs found in {args.log_dir}")
+        return 1
+
+    states = load_table(args.log_dir, 'states')
+    groups = group_runs(runs, args.by)
+
+    print(f"=== Mission Report: {len(runs)} runs from {args.log_dir} ===\n")
+    print_comparison(groups)
+    print_state_breakdown(groups, states)
+    print_battery_breakdown(groups, load_table(args.log_dir, 'blocks'))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -6,28 +6,96 @@ Handles movement commands and gripper control via USB serial port
 
 import serial
 import time
+import threading
 from typing import Optional
 
 
 class RobotController:
     """Serial controller for Arduino-based robot car with gripper"""
     
-    def __init__(self, port: str = '/dev/ttyUSB0', baudrate: int = 9600, timeout: float = 1.0):
+    # Camera gimbal servos: firmware start position and accepted range (exclusive)
+    PAN_CENTER = 90
+    TILT_CENTER = 120
+    SERVO_LIMITS = (20, 160)
+    
+    # Commands that set the chassis motion (the streamed setpoint)
+    MOTIONS = ('A', 'B', 'L', 'R', 'rC', 'rA', 'S')
+    
+    # Arm progress lines of the firmware's step schedule: gripper closed,
+    # arm raised, gripper open
+    ARM_EVENTS = ('Mclip', 'Mup', 'Mopen')
+    PICK_TIME = 4.0     # Seconds pick() waits without overlap
+    RELEASE_TIME = 2.0  # Seconds release() waits without overlap
+    CLIP_TIMEOUT = 5.0  # Longest wait for Mclip (approach + two 1s settles)
+    
+    def __init__(self, port: str = '/dev/ttyUSB0', baudrate: int = 9600, timeout: float = 1.0,
+                 keepalive: Optional[float] = None, deadman: float = 0.3,
+                 lease: float = 0.5, tick: float = 0.016):
         """
         Initialize serial connection to Arduino
         
         Args:
-            port: Serial port path (usually /dev/ttyUSB0 or /dev/ttyACM0)
+            port: Serial port path (usually /dev/ttyUSB0 or /dev/ttyACM0), or
+                  'unix:<socket>?name=<name>&priority=<n>' to go through
+                  serial_broker.py
             baudrate: Communication speed
             timeout: Read timeout in seconds
+            keepalive: Setpoint streaming mode: resend the active motion every
+                       keepalive seconds and let the firmware dead-man stop the
+                       motors when it stops arriving (None = one write per call)
+            deadman: Firmware dead-man timeout in seconds (streaming mode,
+                     must be longer than keepalive)
+            lease: A motion keeps streaming this long after the last command
+                   or heartbeat(), so a stalled host stops the robot
+            tick: Writer period; commands queued within a tick go out in one write
         """
+        if keepalive is not None and not 0 < keepalive < deadman:
+            raise ValueError(f"keepalive {keepalive}s must be positive and shorter than "
+                             f"the {deadman}s dead-man, or the firmware stops between writes")
         self.port = port
         self.baudrate = baudrate
         self.serial = None
+        self.speed = None  # Last speed sent with set_speed()
+        self.pan, self.tilt = self.PAN_CENTER, self.TILT_CENTER
+        self.write_listeners = []  # Called as listener(cmd, write_time) after each write
+        self.line_listeners = []   # Called as listener(line, receive_time) per firmware line
+        self.reader = None
+        
+        # Latest receive time of each arm report
+        self.arm_events = {}
+        self.arm_cond = threading.Condition()
+        self.line_listeners.append(self._on_arm_line)
+        
+        # Setpoint streaming state
+        self.keepalive = keepalive
+        self.deadman = deadman
+        self.lease = lease
+        self.tick = tick
+        self.setpoint = 'S'
+        self.setpoint_until = 0.0   # Lease expiry of the active motion
+        self.last_setpoint_write = 0.0
+        self.pending = []           # Commands waiting for the next tick
+        self.lock = threading.Lock()
+        self.writer = None
+        self.writer_stop = threading.Event()
+        self.writes = 0             # write() calls
+        self.lines_written = 0
+        self.suppressed = 0         # Redundant motion commands not sent
+        
         self.connect()
+        self.start_reader()
+        if keepalive is not None:
+            self._write_lines([f"ka{int(deadman * 1000)}"])
+            self.writer = threading.Thread(target=self._stream, daemon=True)
+            self.writer.start()
         
     def connect(self):
         """Establish serial connection"""
+        if self.port.startswith('unix:'):
+            from serial_broker import BrokerLink
+            self.serial = BrokerLink.from_uri(self.port)  # Broker owns the port: no reset
+            print(f"Connected to serial broker {self.port}")
+            return
         try:
             self.serial = serial.Serial(self.port, self.baudrate, timeout=1.0)
             time.sleep(2)  # Wait for Arduino to reset
@@ -44,11 +112,113 @@ class RobotController:
                 print(f"Failed to connect: {e2}")
                 raise
     
+    def start_reader(self):
+        """Read firmware output (voltage reports, acks) in a background thread"""
+        if self.reader is None and self.serial is not None:
+            self.reader = threading.Thread(target=self._read_lines, daemon=True)
+            self.reader.start()
+    
+    def _read_lines(self):
+        """Hand every line the firmware prints to the line listeners"""
+        while self.serial is not None and self.serial.is_open:
+            try:
+                raw = self.serial.readline()
+            except Exception:
+                break
+            if not raw:
+                continue
+            line = raw.decode(errors='replace').strip()
+            receive_time = time.time()
+            for listener in self.line_listeners:
+                listener(line, receive_time)
+    
+    def _on_arm_line(self, line: str, receive_time: float):
+        if line in self.ARM_EVENTS:
+            with self.arm_cond:
+                self.arm_events[line] = receive_time
+                self.arm_cond.notify_all()
+    
+    def wait_arm(self, event: str, since: float, timeout: float) -> bool:
+        """
+        Wait for an arm report from the firmware
+        
+        Args:
+            event: 'Mclip', 'Mup' or 'Mopen'
+            since: Only a report received after this time counts
+            timeout: Seconds to wait
+            
+        Returns:
+            True if the report arrived, False on timeout (older firmware
+            without the step schedule never sends one)
+        """
+        deadline = time.time() + timeout
+        with self.arm_cond:
+            while self.arm_events.get(event, 0.0) < since:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return False
+                self.arm_cond.wait(remaining)
+        return True
+    
     def _send_command(self, cmd: str):
-        """Send command to Arduino via serial"""
+        """Send command to Arduino via serial (queued for the next tick when streaming)"""
+        if self.keepalive is None:
+            self._write_lines([cmd])
+            return
+        with self.lock:
+            if cmd not in self.MOTIONS:
+                self.pending.append(cmd)
+                return
+            if cmd != 'S':
+                self.setpoint_until = time.time() + self.lease
+            if cmd == self.setpoint:
+                self.suppressed += 1
+                return
+            # A motion replaced within the same tick is never sent
+            if self.pending and self.pending[-1] in self.MOTIONS:
+                self.pending.pop()
+            self.pending.append(cmd)
+            self.setpoint = cmd
+    
+    def _write_lines(self, lines):
+        """One write() and flush() for a batch of command lines"""
         if self.serial and self.serial.is_open:
-            self.serial.write(f"{cmd}\n".encode())
+            self.serial.write(''.join(f"{cmd}\n" for cmd in lines).encode())
             self.serial.flush()
+            self.writes += 1
+            self.lines_written += len(lines)
+            if self.write_listeners:
+                write_time = time.time()
+                for cmd in lines:
+                    for listener in self.write_listeners:
+                        listener(cmd, write_time)
+    
+    def heartbeat(self):
+        """Renew the lease of the active motion (call once per control loop)"""
+        if self.setpoint != 'S':
+            self.setpoint_until = time.time() + self.lease
+    
+    def _stream(self):
+        """Writer thread: flush queued commands and keep the active motion alive"""
+        next_tick = time.monotonic()
+        while (not self.writer_stop.is_set() and
+               self.serial is not None and self.serial.is_open):
+            now = time.time()
+            with self.lock:
+                lines, self.pending = self.pending, []
+                if self.setpoint in lines:
+                    self.last_setpoint_write = now
+                elif (self.setpoint != 'S' and now < self.setpoint_until
+                      and now - self.last_setpoint_write >= self.keepalive):
+                    lines.append(self.setpoint)
+                    self.last_setpoint_write = now
+            if lines:
+                try:
+                    self._write_lines(lines)
+                except Exception:
+                    break
+            next_tick += self.tick
+            time.sleep(max(0.0, next_tick - time.monotonic()))
             
     def forward(self, duration: float = 0):
         """Move forward (A command)"""
@@ -104,25 +274,68 @@ class RobotController:
         """
         if speed in [30, 50, 80]:
             self._send_command(str(speed))
+            self.speed = speed
         else:
             print(f"Invalid speed {speed}, use 30, 50, or 80")
     
-    def pick(self):
-        """Execute pick sequence: approach, clip, rise"""
+    def set_gimbal(self, pan: int, tilt: int, window: int = 0):
+        """
+        Point the camera gimbal
+        
+        Args:
+            pan: Pan servo angle in degrees
+            tilt: Tilt servo angle in degrees
+            window: Window size field of the (pan,tilt,window) frame
+        """
+        low, high = self.SERVO_LIMITS
+        if not (low < pan < high and low < tilt < high):
+            print(f"Gimbal angles ({pan}, {tilt}) outside {low}..{high}")
+            return
+        self._send_command(f"({pan},{tilt},{window})")
+        self.pan, self.tilt = pan, tilt
+    
+    def pick(self, overlap: bool = False):
+        """
+        Execute pick sequence: approach, clip, rise
+        
+        Args:
+            overlap: Return once the firmware reports the gripper closed
+                     (Mclip), so the chassis can move while the arm rises
+                     (False = wait PICK_TIME, as before the step schedule)
+        """
         print("Executing pick sequence...")
+        start = time.time()
         self._send_command("go")
-        time.sleep(4)  # Wait for sequence to complete
+        if overlap and self.wait_arm('Mclip', start, self.CLIP_TIMEOUT):
+            return
+        time.sleep(max(0.0, start + self.PICK_TIME - time.time()))  # Wait for sequence to complete
     
-    def release(self):
-        """Release gripper"""
+    def release(self, overlap: bool = False):
+        """
+        Release gripper
+        
+        Args:
+            overlap: Return at once, so the chassis can back off while the
+                     gripper opens (False = wait RELEASE_TIME)
+        """
         print("Releasing gripper...")
         self._send_command("rel")
-        time.sleep(2)  # Wait for release
+        if not overlap:
+            time.sleep(self.RELEASE_TIME)  # Wait for release
     
     def close(self):
         """Close serial connection"""
         if self.serial and self.serial.is_open:
-            self.stop()
+            if self.keepalive is not None:
+                # The writer must be out of write() before the final stop goes out
+                self.writer_stop.set()
+                if self.writer is not None:
+                    self.writer.join()
+                with self.lock:
+                    self.pending, self.setpoint = [], 'S'
+                self._write_lines(['S', 'ka0'])
+            else:
+                self.stop()
             self.serial.close()
             print("Serial connection closed")
 
@@ -131,8 +344,12 @@ class RobotController:
 if __name__ == "__main__":
     print("=== Robot Controller Test ===")
     
+    import sys
+    
+    robot = None
     try:
-        robot = RobotController()
+        # Port or broker URI, e.g. 'unix:/tmp/elec3848-serial.sock?name=test&priority=5'
+        robot = RobotController(port=sys.argv[1]) if len(sys.argv) > 1 else RobotController()
         robot.set_speed(50)
         
         print("Testing movements (each 1 second)...")
@@ -159,5 +376,6 @@ if __name__ == "__main__":
     except Exception as e:
         print(f"Error: {e}")
     finally:
-        robot.close()
+        if robot is not None:
+            robot.close()
 
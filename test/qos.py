@@ -0,0 +1,370 @@
+#!/usr/bin/env python3
+"""
+Vision Loop Quality-of-Service Governor
+The control loop does the same work whatever the load, so when the Pi
+throttles or the debug window is open the loop rate drops and servoing
+overshoots. QualityGovernor measures the per-frame vision work (detection,
+debug rendering, odometry) against the budget of a target control rate and
+steps through quality levels, cheapest last:
+
+    level  resolution  window  morphology  debug every  detect every
+    0      full        frame   on          1            1
+    1      full        frame   on          3            1
+    2      full        ROI     on          5            1
+    3      half        ROI     on (3x3)    10           1
+    4      half        ROI     off         never        2 (searches)
+
+ROI detection looks only around the region's last bounding box and falls
+back to the full frame when the region is missing or touches the window
+edge, so a window never loses a target. Half resolution scales the area
+thresholds and maps every detection back to full-frame pixels.
+
+Levels change with hysteresis (over budget for `patience` frames to step
+down in quality, well under budget for three times as long to step back
+up) and per-state policies bound them: ALIGN_REGION keeps full resolution,
+the search-heavy states may go to the cheapest level.
+
+Benchmark (simulated frames, CPU throttled 3x halfway through):
+    python3 qos.py --frames 300 --target 60
+"""
+
+import contextlib
+import math
+import time
+from typing import Callable, Dict, List, Optional
+
+import cv2
+import numpy as np
+
+from buffer_pool import BufferPool
+
+
+LEVELS: List[Dict] = [
+    {'scale': 1.0, 'roi': False, 'morphology': True, 'debug_every': 1, 'detect_every': 1},
+    {'scale': 1.0, 'roi': False, 'morphology': True, 'debug_every': 3, 'detect_every': 1},
+    {'scale': 1.0, 'roi': True, 'morphology': True, 'debug_every': 5, 'detect_every': 1},
+    {'scale': 0.5, 'roi': True, 'morphology': True, 'debug_every': 10, 'detect_every': 1},
+    {'scale': 0.5, 'roi': True, 'morphology': False, 'debug_every': 0, 'detect_every': 2}
+]
+
+# (best, cheapest) level allowed in each state
+STATE_POLICIES = {
+    'START_ALIGN': (0, 3),
+    'SEARCH_BLOCK': (0, 2),   # Shape verification needs full-resolution blocks
+    'GOTO_REGION': (1, 4),
+    'ALIGN_REGION': (0, 2),   # Final approach: full resolution
+    'RETURN_START': (1, 4)
+}
+
+
+class QualityGovernor:
+    """Picks a vision quality level per frame to hold a target control rate"""
+
+    def __init__(self, target_rate: float = 15.0, policies: Optional[Dict] = None,
+                 enabled: bool = True):
+        """
+        Initialize governor
+
+        Args:
+            target_rate: Control loop rate to hold (frames per second)
+            policies: {state: (best, cheapest)} level bounds (default: STATE_POLICIES)
+            enabled: False = always level 0 (original pipeline)
+        """
+        self.target_rate = target_rate
+        self.policies = dict(STATE_POLICIES if policies is None else policies)
+        self.enabled = enabled
+
+        # Hysteresis
+        self.high = 0.85     # Load above this share of the budget is "over"
+        self.low = 0.5       # Load below this share of the budget is "under"
+        self.patience = 3    # Frames over budget before stepping down in quality
+        self.cooldown = 5    # Frames after a change before the next one
+        self.smoothing = 0.3  # EMA weight of the newest frame
+
+        self.level = 0
+        self.state = None
+        self.load = 0.0      # Smoothed vision work per frame in seconds
+        self.busy = 0.0      # Work of the current frame so far
+        self.over = 0
+        self.under = 0
+        self.since_change = 0
+        self.frames = 0
+        self.calls = 0       # Search detection calls (for detect_every)
+        self.last_bbox: Dict[str, Optional[tuple]] = {}
+        self.buffers = BufferPool()
+        self.small_kernel = np.ones((3, 3), np.uint8)
+
+        # Statistics
+        self.changes = 0
+        self.level_frames: Dict[str, List[int]] = {}
+        self.roi_fallbacks = 0
+
+    @property
+    def settings(self) -> Dict:
+        """Knobs of the current level"""
+        return LEVELS[self.level]
+
+    # ---- Load measurement ---------------------------------------------------
+
+    @contextlib.contextmanager
+    def work(self):
+        """Account the enclosed block as vision work of the current frame"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.busy += time.perf_counter() - start
+
+    def frame(self, state: Optional[str] = None) -> int:
+        """
+        Close the previous frame's accounting and choose the level for this one
+
+        Args:
+            state: State machine state name (selects the level policy)
+
+        Returns:
+            Quality level for this frame
+        """
+        if self.frames:
+            self.load += self.smoothing * (self.busy - self.load)
+        self.busy = 0.0
+        self.frames += 1
+        self.state = state
+
+        level = self.level
+        best, cheapest = self.policies.get(state, (0, len(LEVELS) - 1))
+        if not self.enabled:
+            best = cheapest = 0
+        budget = 1.0 / self.target_rate
+        if self.load > self.high * budget:
+            self.over, self.under = self.over + 1, 0
+        elif self.load < self.low * budget:
+            self.over, self.under = 0, self.under + 1
+        else:
+            self.over = self.under = 0
+        if self.since_change >= self.cooldown:
+            if self.over >= self.patience:
+                level += 1
+            elif self.under >= 3 * self.patience:
+                level -= 1
+        level = min(max(level, best), cheapest)
+
+        if level != self.level:
+            self.level = level
+            self.since_change = 0
+            self.over = self.under = 0
+            self.changes += 1
+        else:
+            self.since_change += 1
+        counts = self.level_frames.setdefault(state or '', [0] * len(LEVELS))
+        counts[self.level] += 1
+        return self.level
+
+    # ---- Governed work ------------------------------------------------------
+
+    def render(self) -> bool:
+        """True if the debug window should be updated on this frame"""
+        every = self.settings['debug_every']
+        return every > 0 and self.frames % every == 0
+
+    def every_nth(self, detect: Callable[[np.ndarray], object]) -> Callable:
+        """Search detection that only runs on every detect_every-th call (None otherwise)"""
+        def governed(frame):
+            self.calls += 1
+            every = self.settings['detect_every']
+            if every > 1 and self.calls % every:
+                return None
+            return detect(frame)
+        return governed
+
+    def detect_region(self, servo, frame: np.ndarray, color: str) -> Optional[Dict]:
+        """VisualServo.detect_largest_block at the current quality level"""
+        settings = self.settings
+        with self.work():
+            region = None
+            window = self._window(color, frame.shape) if settings['roi'] else None
+            if window is not None:
+                region = self._detect(servo, frame, window, settings,
+                                      lambda view: servo.detect_largest_block(view, color))
+                if region is None or self._at_edge(region['bbox'], window, frame.shape):
+                    self.roi_fallbacks += 1
+                    region = None
+            if region is None:
+                region = self._detect(servo, frame, None, settings,
+                                      lambda view: servo.detect_largest_block(view, color))
+            if region is not None and (settings['scale'] != 1.0 or window is not None):
+                region.update(servo.get_target_range(region) or {})
+            self.last_bbox[color] = region['bbox'] if region is not None else None
+        return region
+
+    def detect_blocks(self, detector, frame: np.ndarray) -> List[Dict]:
+        """SmallBlockDetector.detect_blocks at the current quality level (whole frame)"""
+        with self.work():
+            return self._detect(detector, frame, None, self.settings, detector.detect_blocks)
+
+    def _window(self, color: str, shape) -> Optional[tuple]:
+        """Region's last box grown by half its size, sizes rounded to 64 px (buffer reuse)"""
+        bbox = self.last_bbox.get(color)
+        if bbox is None:
+            return None
+        height, width = shape[:2]
+        x, y, w, h = bbox
+        ww = min(width, -(-(w * 2) // 64) * 64)
+        wh = min(height, -(-(h * 2) // 64) * 64)
+        wx = min(max(x + w // 2 - ww // 2, 0), width - ww)
+        wy = min(max(y + h // 2 - wh // 2, 0), height - wh)
+        if ww * wh >= width * height * 0.75:
+            return None  # Hardly cheaper than the whole frame
+        return wx, wy, ww, wh
+
+    @staticmethod
+    def _at_edge(bbox, window, shape) -> bool:
+        """True if the box touches a window edge that is not a frame edge"""
+        x, y, w, h = bbox
+        wx, wy, ww, wh = window
+        height, width = shape[:2]
+        return ((x <= wx and wx > 0) or (y <= wy and wy > 0) or
+                (x + w >= wx + ww and wx + ww < width) or
+                (y + h >= wy + wh and wy + wh < height))
+
+    def _detect(self, detector, frame, window, settings, detect):
+        """Run detect on the windowed / scaled view and map results to frame pixels"""
+        x0 = y0 = 0
+        view = frame
+        if window is not None:
+            x0, y0, w, h = window
+            view = frame[y0:y0 + h, x0:x0 + w]
+        scale = settings['scale']
+        if scale != 1.0:
+            size = (int(view.shape[1] * scale), int(view.shape[0] * scale))
+            view = cv2.resize(view, size, interpolation=cv2.INTER_AREA,
+                              dst=self.buffers.get('small', (size[1], size[0], 3)))
+
+        # Pixel-area thresholds follow the resolution
+        overrides = {'kernel': (detector.kernel if scale == 1.0 else self.small_kernel)
+                     if settings['morphology'] else None}
+        for name in ('min_area_threshold', 'min_area', 'max_area'):
+            if hasattr(detector, name):
+                overrides[name] = getattr(detector, name) * scale * scale
+        saved = {name: getattr(detector, name) for name in overrides}
+        try:
+            for name, value in overrides.items():
+                setattr(detector, name, value)
+            result = detect(view)
+        finally:
+            for name, value in saved.items():
+                setattr(detector, name, value)
+
+        if scale == 1.0 and window is None:
+            return result
+        for detection in (result if isinstance(result, list) else [result]):
+            if detection is not None:
+                _map_back(detection, scale, x0, y0)
+        return result
+
+    def stats(self) -> Dict:
+        """Level changes, ROI fallbacks and the share of frames at each level per state"""
+        return {
+            'level': self.level,
+            'load_ms': self.load * 1000,
+            'changes': self.changes,
+            'roi_fallbacks': self.roi_fallbacks,
+            'level_frames': self.level_frames
+        }
+
+
+def _map_back(detection: Dict, scale: float, x0: int, y0: int):
+    """Detection in view pixels -> frame pixels (the 'mask' stays in view pixels)"""
+    inv = 1.0 / scale
+    cx, cy = detection['center']
+    x, y, w, h = detection['bbox']
+    detection['center'] = (int(round(cx * inv)) + x0, int(round(cy * inv)) + y0)
+    detection['bbox'] = (int(round(x * inv)) + x0, int(round(y * inv)) + y0,
+                         int(round(w * inv)), int(round(h * inv)))
+    detection['area'] = detection['area'] * inv * inv
+    detection['contour'] = np.round(detection['contour'] * inv).astype(np.int32) + (x0, y0)
+
+
+# ---- Benchmark -------------------------------------------------------------
+
+def benchmark(frames: int = 300, target_rate: float = 60.0, throttle: float = 3.0,
+              seed: int = 0) -> Dict:
+    """
+    Region tracking loop with a debug render, CPU throttled for the second half
+
+    The robot approaches a region mat; throttling is emulated by spinning
+    for (throttle - 1) times the measured work after every frame.
+
+    Returns:
+        {mode: {'nominal_hz', 'throttled_hz', 'found', 'levels'}} for the
+        governor off and on
+    """
+    from simulator import Arena, SimulatedRobot, SimulatedCamera, VirtualClock
+    from vision_servo import VisualServo
+
+    arena = Arena.random(np.random.default_rng(seed))
+    mat = arena.mat('blue')
+    results = {}
+    for mode in ('fixed', 'governed'):
+        clock = VirtualClock()
+        # 1.2m from the mat, on the side of the arena center, facing it
+        mx, my = mat['center']
+        away = math.atan2(arena.height / 2 - my, arena.width / 2 - mx)
+        x, y = mx + 1.2 * math.cos(away), my + 1.2 * math.sin(away)
+        robot = SimulatedRobot(arena, clock, pose=(x, y, math.degrees(away) + 180))
+        camera = SimulatedCamera(robot, seed=seed)
+        frame = camera.new_buffer()
+        servo = VisualServo(640, 480, preallocate=True)
+        governor = QualityGovernor(target_rate, enabled=(mode == 'governed'))
+        periods = {'nominal': [], 'throttled': []}
+        found = 0
+        for i in range(frames):
+            phase = 'throttled' if i >= frames // 2 else 'nominal'
+            camera.read_into(frame)
+            tick = time.perf_counter()
+            governor.frame('GOTO_REGION')
+            region = governor.detect_region(servo, frame, 'blue')
+            found += region is not None
+            if governor.render():
+                with governor.work():
+                    debug = servo.draw_debug_info(frame, region, 'blue')
+                    cv2.imencode('.png', debug)  # Stand-in for imshow on a headless box
+            if phase == 'throttled':
+                with governor.work():
+                    spin_until = time.perf_counter() + (throttle - 1) * (time.perf_counter() - tick)
+                    while time.perf_counter() < spin_until:
+                        pass
+            periods[phase].append(time.perf_counter() - tick)
+            robot.forward()
+            clock.sleep(1.0 / camera.fps)
+        results[mode] = {'nominal_hz': 1.0 / np.mean(periods['nominal']),
+                         'throttled_hz': 1.0 / np.mean(periods['throttled']),
+                         'found': found / frames,
+                         'levels': governor.level_frames.get('GOTO_REGION')}
+    return results
+
+
+def main():
+    """Main entry point"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Vision QoS governor benchmark")
+    parser.add_argument('--frames', type=int, default=300)
+    parser.add_argument('--target', type=float, default=60.0, help="target loop rate (Hz)")
+    parser.add_argument('--throttle', type=float, default=3.0,
+                        help="CPU slowdown in the second half")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    results = benchmark(args.frames, args.target, args.throttle, args.seed)
+    print(f"=== QoS governor: {args.frames} frames, target {args.target:.0f} Hz, "
+          f"{args.throttle:.0f}x throttle in the second half ===")
+    print(f"{'mode':9s} {'nominal Hz':>10s} {'throttled Hz':>12s} {'found':>6s}  frames per level")
+    for mode, r in results.items():
+        print(f"{mode:9s} {r['nominal_hz']:10.1f} {r['throttled_hz']:12.1f} {r['found']:6.2f}  "
+              f"{r['levels']}")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
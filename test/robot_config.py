@@ -0,0 +1,465 @@
+#!/usr/bin/env python3
+"""
+Declarative Robot Config
+One JSON file for the parameters that are otherwise spread over
+color_detector.py, vision_servo.py and main.py: HSV ranges, area limits,
+alignment tolerances, motion pulse durations, speed and the state timeout.
+Keys left out keep the code defaults (and the threshold_sweep.py results).
+
+    {"speed": 50, "timeout": 30.0, "segmentation": "lut",
+     "pulse_durations": {"forward": 0.2, ...},
+     "block":  {"color_ranges": {"red": [[[0, 100, 100], [10, 255, 255]], ...]},
+                "kernel": 5, "min_area": 500, "max_area": 8000, ...},
+     "region": {"color_ranges": {...}, "kernel": 5, "x_tolerance": 50, ...}}
+
+Artifacts derived from it (morphology kernels, the color LUT of the 'lut'
+backend) are compiled once into .cache/config_<hash>/ as .npy files, keyed
+by a hash of everything they are built from, and memory-mapped on later
+starts. Undistortion maps are cached the same way, keyed by the camera
+calibration (see camera_calibration.py).
+
+ConfigWatcher picks up edits to the file; ColorBlockRobot applies them
+between control ticks, with the camera and serial port left open.
+
+Usage:
+    python3 robot_config.py dump                    # write the current defaults
+    python3 robot_config.py compile                 # build the artifact cache
+    python3 robot_config.py bench --segmentation lut
+"""
+
+import os
+import re
+import json
+import time
+import hashlib
+import argparse
+from typing import Dict, Optional
+
+import numpy as np
+
+from camera_calibration import DEFAULT_CACHE_DIR
+from segmentation import BACKENDS, ColorLUTBackend, load_samples, make_backend
+
+
+DEFAULT_CONFIG_FILE = 'robot_config.json'
+
+# Bumped when an artifact's layout changes, so old caches are not reused
+ARTIFACT_VERSION = 1
+
+SPEEDS = (30, 50, 80)
+
+# Config key -> detector attribute, per detector section
+BLOCK_FIELDS = {
+    'min_area': 'min_area',
+    'max_area': 'max_area',
+    'min_confidence': 'min_confidence',
+    'reach_min_y': 'reach_min_y'
+}
+REGION_FIELDS = {
+    'min_area': 'min_area_threshold',
+    'approach_area': 'approach_area_threshold',
+    'x_tolerance': 'x_tolerance',
+    'y_tolerance': 'y_tolerance',
+    'approach_distance': 'approach_distance',
+    'rotate_bearing': 'rotate_bearing',
+    'lateral_tolerance': 'lateral_tolerance'
+}
+SECTIONS = {'block': BLOCK_FIELDS, 'region': REGION_FIELDS}
+OPTIONAL_FIELDS = ('reach_min_y',)  # null switches the check off
+TOP_KEYS = ('speed', 'timeout', 'pick_confirm_frames', 'pulse_durations', 'segmentation')
+
+
+def _detectors(robot):
+    """(section, detector) pairs of a ColorBlockRobot"""
+    return (('block', robot.block_detector), ('region', robot.visual_servo))
+
+
+def snapshot(robot) -> Dict:
+    """
+    The complete config a ColorBlockRobot is running with
+
+    Args:
+        robot: main.ColorBlockRobot
+    """
+    config = {
+        'speed': getattr(robot.robot, 'speed', None) or 50,
+        'timeout': robot.timeout,
+        'pick_confirm_frames': robot.pick_confirm_frames,
+        'pulse_durations': dict(robot.pulse_durations),
+        'segmentation': robot.segmentation_spec
+    }
+    for section, detector in _detectors(robot):
+        params = {key: getattr(detector, attr) for key, attr in SECTIONS[section].items()}
+        params['kernel'] = int(detector.kernel.shape[0])
+        params['color_ranges'] = {
+            color: [[np.asarray(lo).tolist(), np.asarray(hi).tolist()] for lo, hi in bounds]
+            for color, bounds in detector.color_ranges.items()}
+        config[section] = params
+    return config
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _check_color_ranges(key: str, color_ranges):
+    """color_ranges must be {color: [[[h, s, v], [h, s, v]], ...]}"""
+    if not isinstance(color_ranges, dict):
+        raise ValueError(f"'{key}' must be an object of colors, got {color_ranges!r}")
+    for color, bounds in color_ranges.items():
+        if not isinstance(bounds, list) or not all(
+                isinstance(pair, list) and len(pair) == 2 and
+                all(isinstance(hsv, list) and len(hsv) == 3 and
+                    all(_is_number(v) and 0 <= v <= 255 for v in hsv) for hsv in pair)
+                for pair in bounds):
+            raise ValueError(f"'{key}.{color}' must be a list of [[h, s, v], [h, s, v]] "
+                             f"ranges (0-255), got {bounds!r}")
+
+
+def check_config(config: Dict):
+    """
+    Reject unknown keys, wrongly typed and out-of-range values (a partial
+    config is fine)
+
+    Raises:
+        ValueError: naming the first offending key
+    """
+    for key, value in config.items():
+        if key in SECTIONS:
+            if not isinstance(value, dict):
+                raise ValueError(f"'{key}' must be an object, got {value!r}")
+            for name, field in value.items():
+                if name == 'kernel':
+                    if not isinstance(field, int) or isinstance(field, bool) or field < 1:
+                        raise ValueError(f"'{key}.kernel' must be a positive integer, "
+                                         f"got {field!r}")
+                elif name == 'color_ranges':
+                    _check_color_ranges(f"{key}.color_ranges", field)
+                elif name not in SECTIONS[key]:
+                    raise ValueError(f"Unknown config key '{key}.{name}'")
+                elif not _is_number(field) and not (field is None and name in OPTIONAL_FIELDS):
+                    raise ValueError(f"'{key}.{name}' must be a number, got {field!r}")
+        elif key not in TOP_KEYS:
+            raise ValueError(f"Unknown config key '{key}'")
+    if 'speed' in config and (isinstance(config['speed'], bool) or
+                              config['speed'] not in SPEEDS):
+        raise ValueError(f"'speed' must be one of {SPEEDS}, got {config['speed']!r}")
+    if 'timeout' in config and not (_is_number(config['timeout']) and config['timeout'] > 0):
+        raise ValueError(f"'timeout' must be a positive number, got {config['timeout']!r}")
+    frames = config.get('pick_confirm_frames', 1)
+    if not isinstance(frames, int) or isinstance(frames, bool) or frames < 1:
+        raise ValueError(f"'pick_confirm_frames' must be a positive integer, got {frames!r}")
+    durations = config.get('pulse_durations', {})
+    if not isinstance(durations, dict):
+        raise ValueError(f"'pulse_durations' must be an object, got {durations!r}")
+    for command, duration in durations.items():
+        if not (_is_number(duration) and duration >= 0):
+            raise ValueError(f"'pulse_durations.{command}' must be a non-negative number, "
+                             f"got {duration!r}")
+    spec = config.get('segmentation', 'hsv')
+    if not isinstance(spec, str) or spec.partition(':')[0] not in BACKENDS:
+        raise ValueError(f"'segmentation' must be one of {', '.join(BACKENDS)} "
+                         f"(optionally ':<samples file>'), got {spec!r}")
+
+
+def load_config(path: str = DEFAULT_CONFIG_FILE) -> Dict:
+    """
+    Read and check a config file
+
+    Raises:
+        ValueError: malformed JSON or an invalid key
+    """
+    with open(path) as f:
+        config = json.load(f)
+    if not isinstance(config, dict):
+        raise ValueError(f"{path}: expected a JSON object")
+    check_config(config)
+    return config
+
+
+def merge_config(base: Dict, override: Dict) -> Dict:
+    """base with override's keys replaced, recursing into nested objects"""
+    merged = dict(base)
+    for key, value in override.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            value = merge_config(merged[key], value)
+        merged[key] = value
+    return merged
+
+
+# ---- Compiled artifacts --------------------------------------------------
+
+def artifact_key(config: Dict) -> str:
+    """Short hash of everything the compiled artifacts depend on"""
+    h = hashlib.sha1()
+    inputs = {'version': ARTIFACT_VERSION, 'segmentation': config['segmentation']}
+    for section in SECTIONS:
+        inputs[section] = {key: config[section][key] for key in ('kernel', 'color_ranges')}
+    h.update(json.dumps(inputs, sort_keys=True).encode())
+    # A samples file can be re-recorded under the same name
+    _, _, path = config['segmentation'].partition(':')
+    if path:
+        with open(path, 'rb') as f:
+            h.update(f.read())
+    return h.hexdigest()[:16]
+
+
+def _cached(path: str, build, compiled: list) -> np.ndarray:
+    """Memory-mapped array from path, built and saved first if missing"""
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, 'wb') as f:
+            np.save(f, build())
+        os.replace(tmp, path)  # A crash never leaves a half-written artifact behind
+        compiled.append(os.path.basename(path))
+    return np.load(path, mmap_mode='r')
+
+
+def compile_artifacts(config: Dict, camera_model=None,
+                      cache_dir: str = DEFAULT_CACHE_DIR) -> Dict:
+    """
+    Kernels and color LUTs for a complete config, from the disk cache or
+    compiled into it
+
+    Args:
+        config: Complete config (see snapshot)
+        camera_model: Also warm its undistortion map cache (optional)
+        cache_dir: Cache root
+
+    Returns:
+        {'key', 'compiled': names built this call, '<section>_kernel',
+         '<section>_lut' (lut backend only)}
+    """
+    key = artifact_key(config)
+    folder = os.path.join(cache_dir, f"config_{key}")
+    compiled = []
+    artifacts = {'key': key, 'compiled': compiled}
+    name, _, samples_path = config['segmentation'].partition(':')
+    samples = load_samples(samples_path) if name == 'lut' and samples_path else None
+    for section in SECTIONS:
+        params = config[section]
+        size = params['kernel']
+        artifacts[f"{section}_kernel"] = _cached(
+            os.path.join(folder, f"{section}_kernel.npy"),
+            lambda: np.ones((size, size), np.uint8), compiled)
+        if name == 'lut':
+            ranges = _ranges(params['color_ranges'])
+            artifacts[f"{section}_lut"] = _cached(
+                os.path.join(folder, f"{section}_lut.npy"),
+                lambda: ColorLUTBackend(ranges, samples).lut, compiled)
+    if camera_model is not None:
+        camera_model.undistort_maps(cache_dir)
+    return artifacts
+
+
+def _ranges(color_ranges: Dict) -> Dict:
+    return {color: [(np.array(lo), np.array(hi)) for lo, hi in bounds]
+            for color, bounds in color_ranges.items()}
+
+
+def _backend(spec: str, color_ranges: Dict, lut: Optional[np.ndarray]):
+    """Segmentation backend for spec, on a precompiled LUT when there is one"""
+    if lut is None:
+        return make_backend(spec, color_ranges)
+    _, _, path = spec.partition(':')
+    return ColorLUTBackend(color_ranges, load_samples(path) if path else None, lut=lut)
+
+
+def configure(robot, config: Dict, cache_dir: str = DEFAULT_CACHE_DIR) -> bool:
+    """
+    Apply a complete config to a running ColorBlockRobot
+
+    Scalars are set in place. Color ranges and segmentation backends are
+    only replaced when the artifact key changed, so a reload that touches
+    timings or tolerances leaves the detectors (and any online threshold
+    adaptation) alone. Camera and serial port are not touched.
+
+    Args:
+        robot: main.ColorBlockRobot
+        config: Complete config (merge a file over snapshot() first)
+        cache_dir: Artifact cache root
+
+    Returns:
+        True if the color ranges / backends were rebuilt
+    """
+    check_config(config)
+    artifacts = compile_artifacts(config, robot.visual_servo.camera_model, cache_dir)
+    if artifacts['compiled']:
+        print(f"Compiled config artifacts {artifacts['key']}: {', '.join(artifacts['compiled'])}")
+    rebuild = artifacts['key'] != robot.config_key
+    # Build everything that can fail before touching the detectors, so an
+    # error leaves the robot running on its previous config
+    rebuilt = {}
+    if rebuild:
+        for section, _ in _detectors(robot):
+            ranges = _ranges(config[section]['color_ranges'])
+            rebuilt[section] = (ranges, _backend(config['segmentation'], ranges,
+                                                 artifacts.get(f"{section}_lut")))
+    for section, detector in _detectors(robot):
+        params = config[section]
+        for key, attr in SECTIONS[section].items():
+            setattr(detector, attr, params[key])
+        detector.kernel = artifacts[f"{section}_kernel"]
+        if rebuild:
+            detector.color_ranges, detector.segmentation = rebuilt[section]
+    robot.timeout = config['timeout']
+    robot.pick_confirm_frames = config['pick_confirm_frames']
+    robot.pulse_durations = dict(config['pulse_durations'])
+    if getattr(robot.robot, 'speed', None) != config['speed']:
+        robot.robot.set_speed(config['speed'])
+    robot.segmentation_spec = config['segmentation']
+    robot.config_key = artifacts['key']
+    return rebuild
+
+
+class ConfigWatcher:
+    """Config file that reloads itself when it changes on disk"""
+
+    def __init__(self, path: str = DEFAULT_CONFIG_FILE, interval: float = 0.5, clock=None):
+        """
+        Load the file (errors propagate: a bad config should stop startup)
+
+        Args:
+            path: Config file
+            interval: Seconds between checks of the file's modification time
+            clock: Object providing time() (default: time module)
+        """
+        self.path = path
+        self.interval = interval
+        self.clock = clock if clock is not None else time
+        self.stamp = self._stamp()
+        self.config = load_config(path)
+        self.last_check = self.clock.time()
+        self.reloads = 0
+        self.errors = 0
+
+    def _stamp(self):
+        stat = os.stat(self.path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def poll(self) -> Optional[Dict]:
+        """
+        Check the file (at most every interval seconds)
+
+        Returns:
+            The new config if the file changed and is valid, else None (an
+            invalid edit is reported once and the current config kept)
+        """
+        now = self.clock.time()
+        if now - self.last_check < self.interval:
+            return None
+        self.last_check = now
+        try:
+            stamp = self._stamp()
+        except OSError:
+            return None  # Being replaced by an editor; try again next time
+        if stamp == self.stamp:
+            return None
+        self.stamp = stamp
+        try:
+            config = load_config(self.path)
+        except (OSError, ValueError) as e:
+            self.errors += 1
+            print(f"Ignoring invalid {self.path}: {e}")
+            return None
+        self.config = config
+        self.reloads += 1
+        return config
+
+
+# ---- Command line --------------------------------------------------------
+
+def _default_robot():
+    """ColorBlockRobot on simulated hardware, without config or tuned files applied"""
+    from simulator import Arena, SimulatedRobot, SimulatedCamera, VirtualClock
+    from main import ColorBlockRobot
+
+    clock = VirtualClock()
+    sim_robot = SimulatedRobot(Arena.random(np.random.default_rng(0)), clock)
+    robot = ColorBlockRobot(robot=sim_robot, camera=SimulatedCamera(sim_robot), clock=clock,
+                            config_file=None, calibration_file=None,
+                            block_params_file=None, region_params_file=None)
+    robot.show_debug = False
+    return robot
+
+
+def benchmark(segmentation: str = 'lut', repeats: int = 5) -> Dict:
+    """
+    Startup cost of the segmentation models: built from the config every
+    start, compiled into an empty cache, and loaded from the cache
+
+    Returns:
+        {'uncached_ms', 'compile_ms', 'cached_ms'}
+    """
+    import shutil
+    import tempfile
+
+    robot = _default_robot()
+    config = merge_config(snapshot(robot), {'segmentation': segmentation})
+
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for section, _detector in _detectors(robot):
+            _backend(segmentation, _ranges(config[section]['color_ranges']), None)
+    uncached = (time.perf_counter() - start) / repeats
+
+    cache_dir = tempfile.mkdtemp()
+    try:
+        start = time.perf_counter()
+        compile_artifacts(config, cache_dir=cache_dir)
+        compile_time = time.perf_counter() - start
+        start = time.perf_counter()
+        for _ in range(repeats):
+            artifacts = compile_artifacts(config, cache_dir=cache_dir)
+            for section, _detector in _detectors(robot):
+                _backend(segmentation, _ranges(config[section]['color_ranges']),
+                         artifacts.get(f"{section}_lut"))
+        cached = (time.perf_counter() - start) / repeats
+    finally:
+        shutil.rmtree(cache_dir)
+    return {'uncached_ms': uncached * 1000, 'compile_ms': compile_time * 1000,
+            'cached_ms': cached * 1000}
+
+
+def main():
+    """Main entry point"""
+    parser = argparse.ArgumentParser(description="Robot config file and artifact cache")
+    parser.add_argument('command', choices=['dump', 'compile', 'bench'])
+    parser.add_argument('--config', default=DEFAULT_CONFIG_FILE,
+                        help="config file (dump: output)")
+    parser.add_argument('--segmentation', default='lut', help="bench: backend spec")
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR)
+    args = parser.parse_args()
+
+    if args.command == 'bench':
+        r = benchmark(args.segmentation)
+        print(f"=== Segmentation model startup ({args.segmentation}) ===")
+        print(f"built from config  : {r['uncached_ms']:8.1f} ms per start")
+        print(f"compile into cache : {r['compile_ms']:8.1f} ms once")
+        print(f"memory-mapped      : {r['cached_ms']:8.1f} ms per start")
+        return 0
+
+    robot = _default_robot()
+    config = snapshot(robot)
+    if args.command == 'dump':
+        if os.path.exists(args.config):
+            print(f"{args.config} exists, not overwriting")
+            return 1
+        text = json.dumps(config, indent=2)
+        # One line per [h, s, v] triple
+        text = re.sub(r'\[\s+(-?[\d.]+),\s+(-?[\d.]+),\s+(-?[\d.]+)\s+\]', r'[\1, \2, \3]', text)
+        with open(args.config, 'w') as f:
+            f.write(text + '\n')
+        print(f"Wrote {args.config}")
+        return 0
+
+    config = merge_config(config, load_config(args.config))
+    artifacts = compile_artifacts(config, robot.visual_servo.camera_model, args.cache_dir)
+    print(f"Artifacts {artifacts['key']} in {args.cache_dir}: "
+          f"{', '.join(artifacts['compiled']) or 'all cached'}")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Continuous Rotation Search
+Rotates the robot at low speed while running detection on every frame,
+stops as soon as the target appears and undoes the overshoot caused by
+detection latency
+"""
+
+import time
+from typing import Callable, Optional, Tuple, Any
+
+import numpy as np
+
+
+class ContinuousRotationSearch:
+    """Search for a target by spinning in place instead of rotate-stop pulses"""
+
+    def __init__(self, robot, get_frame: Callable[[], Tuple[Optional[np.ndarray], float]],
+                 search_speed: int = 30, rotation_period: float = 8.0,
+                 capture_latency: float = 0.03, overshoot_gain: float = 1.0,
+                 clock=None, default_speed: int = 50):
+        """
+        Initialize rotation search
+
+        Args:
+            robot: RobotController (or compatible) instance
+            get_frame: Callable returning (frame, capture_timestamp)
+            search_speed: Motor speed used while rotating (30, 50 or 80)
+            rotation_period: Seconds for one full 360° turn at search_speed
+            capture_latency: Seconds between exposure and the capture timestamp
+            overshoot_gain: Fraction of the estimated overshoot to rotate back
+            clock: Object providing time() and sleep() (default: time module)
+            default_speed: Speed restored after a search when the robot's
+                           speed was never set (robot.speed is None)
+        """
+        self.robot = robot
+        self.get_frame = get_frame
+        self.search_speed = search_speed
+        self.default_speed = default_speed
+        self.rotation_period = rotation_period
+        self.capture_latency = capture_latency
+        self.overshoot_gain = overshoot_gain
+        self.clock = clock if clock is not None else time
+
+        # Statistics from the last search
+        self.last_frames = 0
+        self.last_duration = 0.0
+        self.last_overshoot = 0.0
+
+    def _rotate(self, direction: str):
+        """Start rotating in the given direction ('cw' or 'ccw')"""
+        if direction == 'cw':
+            self.robot.rotate_clockwise()
+        else:
+            self.robot.rotate_counterclockwise()
+
+    def search(self, detect: Callable[[np.ndarray], Any], direction: str = 'cw',
+               max_duration: Optional[float] = None,
+               on_frame: Optional[Callable[[np.ndarray, Any], None]] = None
+               ) -> Tuple[Any, Optional[np.ndarray]]:
+        """
+        Rotate until detect() returns a truthy result or one turn has elapsed
+
+        Args:
+            detect: Detection function called on every frame
+            direction: 'cw' or 'ccw'
+            max_duration: Give up after this many seconds (default: one turn)
+            on_frame: Optional callback (frame, result) for debug display
+
+        Returns:
+            (detection result, frame it was found in) or (None, None)
+        """
+        if max_duration is None:
+            max_duration = self.rotation_period * 1.1
+
+        previous_speed = getattr(self.robot, 'speed', None)
+        if previous_speed is None:
+            previous_speed = self.default_speed  # Unknown: leave a defined speed behind
+        if previous_speed != self.search_speed:
+            self.robot.set_speed(self.search_speed)
+
+        self.last_frames = 0
+        self.last_overshoot = 0.0
+        start_time = self.clock.time()
+        self._rotate(direction)
+
+        found, found_frame = None, None
+        try:
+            while self.clock.time() - start_time < max_duration:
+                frame, frame_time = self.get_frame()
+                if frame is None:
+                    continue
+                self.last_frames += 1
+
+                result = detect(frame)
+                if on_frame is not None:
+                    on_frame(frame, result)
+
+                if result:
+                    self.robot.stop()
+                    stop_time = self.clock.time()
+                    found, found_frame = result, frame
+
+                    # The target was seen (stop_time - frame_time) ago, so the
+                    # chassis kept turning past it for that long. Turn back.
+                    overshoot = (stop_time - frame_time + self.capture_latency) \
+                        * self.overshoot_gain
+                    self.last_overshoot = overshoot
+                    if overshoot > 0:
+                        self._rotate('ccw' if direction == 'cw' else 'cw')
+                        self.clock.sleep(overshoot)
+                    break
+        finally:
+            self.robot.stop()
+            self.last_duration = self.clock.time() - start_time
+            if previous_speed != self.search_speed:
+                self.robot.set_speed(previous_speed)
+
+        return found, found_frame
+
+    def degrees_per_second(self) -> float:
+        """Nominal rotation rate at search speed"""
+        return 360.0 / self.rotation_period
@@ -0,0 +1,549 @@
+#!/usr/bin/env python3
+"""
+Segmentation Backends
+Pluggable color segmentation for SmallBlockDetector and VisualServo. A
+backend turns a frame into one binary mask per color. Contours, areas and
+the detection dicts stay in the detectors, so every backend produces the
+same detection results.
+
+Backends:
+    hsv          HSV inRange + open/close (the original pipeline)
+    backproject  Histogram back-projection of sampled block/mat colors
+    lut          Nearest-centroid color classifier baked into a quantized BGR LUT
+
+A backend spec is 'name' or 'name:samples.npz'. Without a samples file,
+backproject and lut synthesize their training colors from the detector's
+HSV ranges. The comparison harness below samples real colors from annotated
+frames (--save-model), then scores every backend on the remaining frames
+under several lighting conditions.
+
+Usage:
+    python3 segmentation.py data/sim --mode block
+    python3 segmentation.py data/recorded --mode region --save-model mat_colors.npz
+    python3 main.py /dev/ttyUSB0 0 lut:mat_colors.npz
+"""
+
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, Sequence, Union
+
+import cv2
+import numpy as np
+
+from buffer_pool import BufferPool, _dst, preprocess_hsv, color_mask, clean_mask
+
+# Sample key for pixels that belong to no color
+BACKGROUND = 'background'
+
+# Per-channel BGR gains applied to test frames by the comparison harness
+LIGHTING = {
+    'nominal': (1.0, 1.0, 1.0),
+    'dim': (0.6, 0.6, 0.6),
+    'bright': (1.4, 1.4, 1.4),
+    'warm': (0.8, 1.0, 1.25),  # Tungsten-like cast
+    'cool': (1.25, 1.0, 0.85)  # Daylight through windows
+}
+
+
+# ---- Color samples -------------------------------------------------------
+
+def _hsv_to_bgr(hsv: np.ndarray) -> np.ndarray:
+    pixels = hsv.astype(np.uint8).reshape(-1, 1, 3)
+    return cv2.cvtColor(pixels, cv2.COLOR_HSV2BGR).reshape(-1, 3)
+
+
+def samples_from_ranges(color_ranges: Dict[str, List]) -> Dict[str, np.ndarray]:
+    """
+    Synthetic BGR samples: a grid over each HSV range, and the rest of the
+    HSV space as background
+
+    Args:
+        color_ranges: Detector color ranges {color: [(lower, upper), ...]}
+
+    Returns:
+        {color: (N, 3) uint8 BGR, BACKGROUND: (M, 3) uint8 BGR}
+    """
+    h, s, v = np.meshgrid(np.arange(0, 180, 3), np.arange(0, 256, 12),
+                          np.arange(0, 256, 12), indexing='ij')
+    grid = np.stack([h.ravel(), s.ravel(), v.ravel()], axis=1)
+    claimed = np.zeros(len(grid), bool)
+    samples = {}
+    for color, bounds in color_ranges.items():
+        inside = np.zeros(len(grid), bool)
+        for lower, upper in bounds:
+            inside |= np.all((grid >= lower) & (grid <= upper), axis=1)
+        samples[color] = _hsv_to_bgr(grid[inside])
+        claimed |= inside
+    samples[BACKGROUND] = _hsv_to_bgr(grid[~claimed])
+    return samples
+
+
+def _dominant(pixels: np.ndarray, max_chroma: float = 20.0) -> np.ndarray:
+    """Pixels within max_chroma (Lab a/b distance) of the patch median"""
+    if not len(pixels):
+        return pixels
+    ab = cv2.cvtColor(pixels.reshape(-1, 1, 3), cv2.COLOR_BGR2LAB).reshape(-1, 3)[:, 1:]
+    ab = ab.astype(np.float32)
+    dist = np.linalg.norm(ab - np.median(ab, axis=0), axis=1)
+    return pixels[dist <= max_chroma]
+
+
+def sample_colors(frames: Sequence[np.ndarray], annotations: Sequence[Dict],
+                  per_object: int = 400, background: int = 3000, inset: float = 0.25,
+                  seed: int = 0) -> Dict[str, np.ndarray]:
+    """
+    BGR samples of every annotated color plus background from labeled frames
+
+    Pixels come from the blurred frame, like the detectors see them. Each
+    bounding box is shrunk by `inset` on every side so object edges and the
+    floor around tilted mats stay out; blocks are cut out of the mats they
+    sit on, and only pixels close in chroma to the patch median are kept
+    (a block's box still shows some of the mat around it).
+
+    Args:
+        frames: BGR frames
+        annotations: threshold_sweep annotations, one dict per frame
+        per_object: Maximum samples per annotated object
+        background: Maximum background samples per frame
+        inset: Fraction of each box side to skip
+        seed: Subsampling seed
+
+    Returns:
+        {color: (N, 3) uint8 BGR, ..., BACKGROUND: (M, 3) uint8 BGR}
+    """
+    rng = np.random.default_rng(seed)
+    parts = defaultdict(list)
+
+    def take(pixels: np.ndarray, limit: int, key: str):
+        if len(pixels):
+            pick = rng.choice(len(pixels), min(limit, len(pixels)), replace=False)
+            parts[key].append(pixels[pick])
+
+    for frame, truth in zip(frames, annotations):
+        blurred = cv2.GaussianBlur(frame, (5, 5), 0)
+        objects = truth.get('blocks', []) + truth.get('regions', [])
+        in_block = np.zeros(frame.shape[:2], bool)
+        for obj in truth.get('blocks', []):
+            x, y, w, h = obj['bbox']
+            in_block[y:y + h, x:x + w] = True
+        annotated = in_block.copy()
+        for obj in objects:
+            x, y, w, h = obj['bbox']
+            annotated[y:y + h, x:x + w] = True
+            dx, dy = int(w * inset), int(h * inset)
+            inner = (slice(y + dy, y + h - dy), slice(x + dx, x + w - dx))
+            keep = np.ones(blurred[inner].shape[:2], bool)
+            if obj in truth.get('regions', []):
+                keep = ~in_block[inner]
+            take(_dominant(blurred[inner][keep]), per_object, obj['color'])
+        take(blurred[~annotated], background, BACKGROUND)
+
+    return {color: np.concatenate(chunks) for color, chunks in parts.items()}
+
+
+def save_samples(path: str, samples: Dict[str, np.ndarray]):
+    """Write color samples as a backend model (.npz)"""
+    np.savez_compressed(path, **samples)
+
+
+def load_samples(path: str) -> Dict[str, np.ndarray]:
+    """Read color samples written by save_samples"""
+    with np.load(path) as data:
+        return {name: data[name] for name in data.files}
+
+
+# ---- Backends ------------------------------------------------------------
+
+class SegmentationBackend:
+    """Frame -> per-color binary masks"""
+
+    name = ''
+    from_ranges = False  # Model synthesized from color_ranges (rebuild when they change)
+
+    def __init__(self, color_ranges: Dict[str, List]):
+        """
+        Args:
+            color_ranges: The detector's HSV ranges (used directly by the HSV
+                          backend, and for colors a model does not cover)
+        """
+        self.color_ranges = color_ranges
+        self.hsv = None
+
+    def prepare(self, frame: np.ndarray, pool: Optional[BufferPool] = None):
+        """Per-frame work shared by all colors (once per detection call)"""
+        raise NotImplementedError
+
+    def mask(self, color: str, ranges: List, kernel: np.ndarray,
+             pool: Optional[BufferPool] = None, name: str = 'mask') -> np.ndarray:
+        """
+        Cleaned binary mask of one color in the prepared frame
+
+        Args:
+            color: Color name
+            ranges: The detector's current HSV ranges for this color
+            kernel: Morphology kernel
+            pool: Buffer pool (None = allocate new arrays)
+            name: Pool buffer name of the returned mask
+
+        Returns:
+            uint8 mask (a pool buffer when pool is given, overwritten by the next call)
+        """
+        raise NotImplementedError
+
+
+class HSVThresholdBackend(SegmentationBackend):
+    """HSV inRange per color, OR-ed, then open + close"""
+
+    name = 'hsv'
+
+    def __init__(self, color_ranges: Dict[str, List], samples: Optional[Dict] = None):
+        super().__init__(color_ranges)
+
+    def prepare(self, frame, pool=None):
+        self.hsv = preprocess_hsv(frame, pool)
+
+    def mask(self, color, ranges, kernel, pool=None, name='mask'):
+        return color_mask(self.hsv, ranges, kernel, pool, name)
+
+
+class BackProjectionBackend(SegmentationBackend):
+    """
+    Back-projection of hue-saturation histograms built from sampled colors
+
+    Each color histogram is divided by the sum of all histograms (colors and
+    background), so a pixel's back-projected value is the share of training
+    samples in its bin that belong to the color. Hue is meaningless in the
+    dark, so pixels below v_min are never a color.
+    """
+
+    name = 'backproject'
+    bins = [30, 32]
+    hist_ranges = [0, 180, 0, 256]
+
+    def __init__(self, color_ranges: Dict[str, List], samples: Optional[Dict] = None,
+                 threshold: float = 0.5, v_min: int = 50):
+        """
+        Args:
+            color_ranges: Detector HSV ranges
+            samples: Color samples (default: synthesized from color_ranges)
+            threshold: Minimum color share of a pixel's bin
+            v_min: Minimum HSV value of a colored pixel
+        """
+        super().__init__(color_ranges)
+        self.from_ranges = samples is None
+        if samples is None:
+            samples = samples_from_ranges(color_ranges)
+        self.threshold = int(threshold * 255)
+        self.v_min = v_min
+        self.histograms = self._fit(samples)
+        self.bright = None
+
+    def _fit(self, samples: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        counts = {}
+        for color, bgr in samples.items():
+            hsv = cv2.cvtColor(bgr.reshape(-1, 1, 3), cv2.COLOR_BGR2HSV)
+            hsv = hsv[hsv[:, 0, 2] >= self.v_min]
+            hist = cv2.calcHist([hsv], [0, 1], None, self.bins, self.hist_ranges)
+            counts[color] = hist / max(float(hist.sum()), 1.0)
+        total = sum(counts.values())
+        total[total == 0] = 1.0
+        return {color: (hist / total * 255).astype(np.float32)
+                for color, hist in counts.items() if color != BACKGROUND}
+
+    def prepare(self, frame, pool=None):
+        self.hsv = preprocess_hsv(frame, pool)
+        shape = frame.shape[:2]
+        value = cv2.extractChannel(self.hsv, 2, dst=_dst(pool, 'value', shape))
+        _, self.bright = cv2.threshold(value, self.v_min - 1, 255, cv2.THRESH_BINARY,
+                                       dst=value)
+
+    def mask(self, color, ranges, kernel, pool=None, name='mask'):
+        hist = self.histograms.get(color)
+        if hist is None:
+            return color_mask(self.hsv, ranges, kernel, pool, name)
+        shape = self.hsv.shape[:2]
+        prob = cv2.calcBackProject([self.hsv], [0, 1], hist, self.hist_ranges, 1,
+                                   dst=_dst(pool, 'backproject', shape))
+        _, mask = cv2.threshold(prob, self.threshold, 255, cv2.THRESH_BINARY,
+                                dst=_dst(pool, name, shape))
+        mask = cv2.bitwise_and(mask, self.bright, dst=mask if pool is not None else None)
+        return clean_mask(mask, kernel, pool)
+
+
+class ColorLUTBackend(SegmentationBackend):
+    """
+    Nearest-centroid color classifier over a quantized BGR lookup table
+
+    Samples of each color and of the background are clustered (k-means)
+    into a few centroids. The feature is normalized chromaticity (g and r
+    share of b+g+r) plus a down-weighted intensity, so shading and exposure
+    changes move a color much less than in HSV or Lab. Every quantized BGR
+    value is labeled with the class of its nearest centroid, or background
+    when it is farther than max_distance from all of them. Per frame,
+    segmentation is one table lookup per pixel plus one compare per color.
+    """
+
+    name = 'lut'
+
+    def __init__(self, color_ranges: Dict[str, List], samples: Optional[Dict] = None,
+                 bits: int = 5, clusters: int = 4, background_clusters: int = 12,
+                 max_distance: float = 15.0, intensity_weight: float = 0.1,
+                 lut: Optional[np.ndarray] = None):
+        """
+        Args:
+            color_ranges: Detector HSV ranges
+            samples: Color samples (default: synthesized from color_ranges)
+            bits: Quantization bits per channel (LUT size 2^(3*bits))
+            clusters: Centroids per color
+            background_clusters: Centroids for the background
+            max_distance: Feature distance beyond which a value is background
+                          (chromaticity in percent)
+            intensity_weight: Scale of the mean channel value in the feature
+            lut: Table compiled earlier with the same arguments (skips the
+                 clustering; see robot_config.py)
+        """
+        super().__init__(color_ranges)
+        self.from_ranges = samples is None
+        if samples is None and lut is None:
+            samples = samples_from_ranges(color_ranges)
+        self.bits = bits
+        self.shift = 8 - bits
+        self.intensity_weight = intensity_weight
+        self.colors = [c for c in (color_ranges if samples is None else samples)
+                       if c != BACKGROUND]
+        self.labels = {color: i + 1 for i, color in enumerate(self.colors)}  # 0 = background
+        if lut is None:
+            lut = self._build(samples, clusters, background_clusters, max_distance)
+        self.lut = lut
+        self.blurred = None
+        self.classes = None
+
+    def _features(self, bgr: np.ndarray) -> np.ndarray:
+        bgr = bgr.reshape(-1, 3).astype(np.float32)
+        total = bgr.sum(axis=1, keepdims=True)
+        chroma = bgr[:, 1:] / (total + 1.0) * 100
+        return np.concatenate([total / 3 * self.intensity_weight, chroma], axis=1)
+
+    def _build(self, samples, clusters, background_clusters, max_distance) -> np.ndarray:
+        criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 20, 0.5)
+        cv2.setRNGSeed(0)  # Same samples -> same table
+        centroids, owners = [], []
+        for color, label in [(BACKGROUND, 0)] + list(self.labels.items()):
+            bgr = samples.get(color)
+            if bgr is None or not len(bgr):
+                continue
+            features = self._features(bgr)
+            k = min(background_clusters if label == 0 else clusters, len(features))
+            _, _, centers = cv2.kmeans(features, k, None, criteria, 2, cv2.KMEANS_PP_CENTERS)
+            centroids.append(centers)
+            owners.append(np.full(k, label, np.uint8))
+        centroids = np.concatenate(centroids)
+        owners = np.concatenate(owners)
+
+        # Bin centers in (b, g, r) index order
+        levels = (np.arange(1 << self.bits) << self.shift) + ((1 << self.shift) >> 1)
+        b, g, r = np.meshgrid(levels, levels, levels, indexing='ij')
+        features = self._features(np.stack([b.ravel(), g.ravel(), r.ravel()], axis=1))
+        dist2 = ((features[:, None, :] - centroids[None, :, :]) ** 2).sum(axis=2)
+        nearest = dist2.argmin(axis=1)
+        lut = owners[nearest]
+        lut[dist2[np.arange(len(features)), nearest] > max_distance ** 2] = 0
+        return lut
+
+    def prepare(self, frame, pool=None):
+        shape = frame.shape[:2]
+        self.blurred = cv2.GaussianBlur(frame, (5, 5), 0, dst=_dst(pool, 'blurred', frame.shape))
+        self.hsv = None
+        quant = np.right_shift(self.blurred, self.shift, out=_dst(pool, 'lut_quant', frame.shape))
+        # Index straight in intp so np.take does not convert it every frame
+        index = np.left_shift(quant[..., 0], 2 * self.bits, dtype=np.intp,
+                              out=_dst(pool, 'lut_index', shape, np.intp))
+        part = np.left_shift(quant[..., 1], self.bits, dtype=np.intp,
+                             out=_dst(pool, 'lut_part', shape, np.intp))
+        np.bitwise_or(index, part, out=index)
+        np.bitwise_or(index, quant[..., 2], out=index)
+        self.classes = np.take(self.lut, index, mode='clip', out=_dst(pool, 'lut_classes', shape))
+
+    def mask(self, color, ranges, kernel, pool=None, name='mask'):
+        label = self.labels.get(color)
+        if label is None:
+            if self.hsv is None:
+                self.hsv = cv2.cvtColor(self.blurred, cv2.COLOR_BGR2HSV,
+                                        dst=_dst(pool, 'hsv', self.blurred.shape))
+            return color_mask(self.hsv, ranges, kernel, pool, name)
+        mask = cv2.compare(self.classes, label, cv2.CMP_EQ,
+                           dst=_dst(pool, name, self.classes.shape))
+        return clean_mask(mask, kernel, pool)
+
+
+BACKENDS = {cls.name: cls for cls in (HSVThresholdBackend, BackProjectionBackend,
+                                      ColorLUTBackend)}
+
+
+def make_backend(spec: Union[str, SegmentationBackend], color_ranges: Dict[str, List],
+                 samples: Optional[Dict] = None) -> SegmentationBackend:
+    """
+    Backend from a spec such as 'hsv', 'lut' or 'backproject:mat_colors.npz'
+
+    Args:
+        spec: Backend spec, or an already constructed backend (returned as is)
+        color_ranges: The detector's HSV ranges
+        samples: Color samples used when the spec names no samples file
+    """
+    if not isinstance(spec, str):
+        return spec
+    name, _, path = spec.partition(':')
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown segmentation backend '{name}' "
+                         f"(choose from {', '.join(BACKENDS)})")
+    if path:
+        samples = load_samples(path)
+    return BACKENDS[name](color_ranges, samples)
+
+
+# ---- Comparison harness --------------------------------------------------
+
+def _make_detector(mode: str, backend: str, samples: Optional[Dict]):
+    if mode == 'block':
+        from color_detector import SmallBlockDetector
+        detector = SmallBlockDetector(preallocate=True)
+    else:
+        from vision_servo import VisualServo
+        detector = VisualServo(preallocate=True)
+    detector.segmentation = make_backend(backend, detector.color_ranges, samples)
+    return detector
+
+
+def compare(frames: Sequence[np.ndarray], truths: Sequence[Dict], backends: Sequence[str],
+            mode: str = 'block', lighting: Sequence[str] = ('nominal', 'dim', 'bright', 'warm'),
+            samples: Optional[Dict] = None, min_truth_area: int = 150) -> List[Dict]:
+    """
+    Accuracy and latency of each backend under each lighting condition
+
+    Args:
+        frames: Test frames (BGR)
+        truths: Their annotations
+        backends: Backend specs
+        mode: 'block' (SmallBlockDetector) or 'region' (VisualServo, every color)
+        lighting: LIGHTING conditions to apply to the frames
+        samples: Color samples for backends without a samples file
+        min_truth_area: Ignore annotations smaller than this (bbox pixels)
+
+    Returns:
+        One dict per (backend, lighting) with precision, recall, f1 and
+        median / p95 latency of one detector call in ms
+    """
+    from threshold_sweep import score_frame
+
+    key = 'blocks' if mode == 'block' else 'regions'
+    lit = np.empty_like(frames[0])
+    results = []
+    for backend in backends:
+        detector = _make_detector(mode, backend, samples)
+        for condition in lighting:
+            gains = LIGHTING[condition]
+            tp = fp = fn = 0
+            latencies = []
+            for frame, truth in zip(frames, truths):
+                cv2.multiply(frame, gains + (0,), dst=lit)
+                detections = []
+                if mode == 'block':
+                    start = time.perf_counter()
+                    blocks = detector.detect_blocks(lit)
+                    latencies.append(time.perf_counter() - start)
+                    detections = [(b['color'], b['bbox']) for b in blocks]
+                else:
+                    for color in detector.color_ranges:
+                        start = time.perf_counter()
+                        info = detector.detect_largest_block(lit, color)
+                        latencies.append(time.perf_counter() - start)
+                        if info is not None:
+                            detections.append((color, info['bbox']))
+                t, f, n = score_frame(detections, truth.get(key, []), min_truth_area)
+                tp, fp, fn = tp + t, fp + f, fn + n
+            precision = tp / (tp + fp) if tp + fp else 0.0
+            recall = tp / (tp + fn) if tp + fn else 0.0
+            f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+            ms = np.array(latencies) * 1000
+            results.append({'backend': backend, 'lighting': condition,
+                            'precision': precision, 'recall': recall, 'f1': f1,
+                            'ms_median': float(np.median(ms)),
+                            'ms_p95': float(np.percentile(ms, 95))})
+    return results
+
+
+def recommend(results: List[Dict], tolerance: float = 0.03) -> Optional[str]:
+    """
+    Fastest backend whose worst-lighting F1 is within tolerance of the best
+
+    Args:
+        results: Output of compare()
+        tolerance: Allowed F1 gap to the most robust backend
+    """
+    worst, latency = {}, {}
+    for r in results:
+        worst[r['backend']] = min(worst.get(r['backend'], 1.0), r['f1'])
+        latency.setdefault(r['backend'], []).append(r['ms_median'])
+    if not worst:
+        return None
+    floor = max(worst.values()) - tolerance
+    robust = [b for b in worst if worst[b] >= floor]
+    return min(robust, key=lambda b: np.mean(latency[b]))
+
+
+def main():
+    """Main entry point"""
+    import argparse
+    from threshold_sweep import load_dataset
+
+    parser = argparse.ArgumentParser(description="Compare segmentation backends")
+    parser.add_argument('folder', help="annotated dataset folder (see threshold_sweep.py)")
+    parser.add_argument('--mode', choices=['block', 'region'], default='block')
+    parser.add_argument('--backends', nargs='+', default=list(BACKENDS),
+                        help="backend specs, e.g. hsv lut backproject:mat_colors.npz")
+    parser.add_argument('--lighting', nargs='+', default=['nominal', 'dim', 'bright', 'warm'],
+                        choices=list(LIGHTING))
+    parser.add_argument('--fit', type=float, default=0.3,
+                        help="fraction of frames used to sample colors (0 = use HSV ranges)")
+    parser.add_argument('--save-model', default=None, metavar='NPZ',
+                        help="write the sampled colors for use as 'lut:NPZ' / 'backproject:NPZ'")
+    parser.add_argument('--min-truth-area', type=int, default=150)
+    parser.add_argument('--tolerance', type=float, default=0.03,
+                        help="F1 gap accepted when picking the fastest robust backend")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    paths, truths = load_dataset(args.folder)
+    frames = [cv2.imread(p) for p in paths]
+    n_fit = int(len(frames) * args.fit)
+    samples = None
+    if n_fit:
+        samples = sample_colors(frames[:n_fit], truths[:n_fit], seed=args.seed)
+        print(f"Sampled colors from {n_fit} frames: " +
+              ', '.join(f"{c} {len(s)}" for c, s in samples.items()))
+        if args.save_model:
+            save_samples(args.save_model, samples)
+            print(f"Color samples written to {args.save_model}")
+    frames, truths = frames[n_fit:], truths[n_fit:]
+    if not frames:
+        print("No frames left to evaluate")
+        return 1
+
+    results = compare(frames, truths, args.backends, args.mode, args.lighting,
+                      samples, args.min_truth_area)
+
+    print(f"\n=== Segmentation Backends ({args.mode}): {len(frames)} test frames ===\n")
+    print(f"{'backend':28s} {'lighting':8s} {'prec':>6s} {'recall':>6s} {'F1':>6s} "
+          f"{'ms med':>7s} {'ms p95':>7s}")
+    for r in results:
+        print(f"{r['backend'][:28]:28s} {r['lighting']:8s} {r['precision']:6.3f} "
+              f"{r['recall']:6.3f} {r['f1']:6.3f} {r['ms_median']:7.2f} {r['ms_p95']:7.2f}")
+
+    best = recommend(results, args.tolerance)
+    if best is not None:
+        print(f"\nFastest backend within {args.tolerance:.2f} F1 of the most robust: {best}")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,471 @@
+#!/usr/bin/env python3
+"""
+Serial Broker
+Owns the Arduino serial port and shares it over a Unix socket, so the
+mission controller, a telemetry logger and a teleop or test script can run
+at the same time. Only one process can open /dev/ttyUSB0, and every open
+resets the Arduino.
+
+Protocol (newline-terminated text, like the firmware itself):
+- client -> broker: "hello <name> <priority>" first, then firmware commands
+  verbatim; "sub <kind> ..." picks the forwarded lines (volt, ack, arm, text, all)
+- broker -> client: firmware lines verbatim, broker notices start with '#'
+  ("#ok", "#denied <cmd> <owner>", "#preempted <owner>")
+
+Arbitration: actuator commands (motion, speed, gimbal, arm) go through for
+the client holding the actuators. A client with a higher priority takes
+them over; the holder gives them up with S, by going quiet for hold
+seconds, or by disconnecting (the broker then sends S if it was moving).
+Everything else (P<seq> pings, ka<ms>) always passes.
+
+RobotController connects through the broker with a unix: port URI:
+    RobotController(port='unix:/tmp/elec3848-serial.sock?name=mission&priority=10')
+
+Usage:
+    python3 serial_broker.py --port /dev/ttyUSB0            # run the broker
+    python3 serial_broker.py --monitor volt ack             # print forwarded lines
+    python3 serial_broker.py --bench --count 500            # overhead vs direct
+"""
+
+import os
+import socket
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional
+from urllib.parse import urlparse, parse_qs
+
+
+DEFAULT_SOCKET = '/tmp/elec3848-serial.sock'
+
+# Serialmove() commands that drive the chassis or the arm
+MOTIONS = ('A', 'B', 'L', 'R', 'rC', 'rA')
+ACTUATOR_COMMANDS = MOTIONS + ('S', '30', '50', '80', 'go', 'rel')
+LINE_KINDS = ('volt', 'ack', 'arm', 'text')
+ARM_EVENTS = ('Mclip', 'Mup', 'Mopen')
+
+# Most recent per-command handling times kept for stats()
+HANDLE_SAMPLES = 4096
+
+
+def classify(line: str) -> str:
+    """Kind of a firmware line: sendVolt() reading, loopback ack, arm report or other text"""
+    if line.isdigit():
+        return 'volt'
+    if line.startswith('K') and ',' in line:
+        return 'ack'
+    if line in ARM_EVENTS:
+        return 'arm'
+    return 'text'
+
+
+def is_actuator(cmd: str) -> bool:
+    """True for commands that move the chassis, arm or gimbal"""
+    return cmd in ACTUATOR_COMMANDS or cmd.startswith('(')
+
+
+class BrokerClient:
+    """One connected process"""
+
+    def __init__(self, conn: socket.socket, name: str = '?', priority: int = 0):
+        self.conn = conn
+        self.name = name
+        self.priority = priority
+        self.kinds = set(LINE_KINDS)
+        self.send_lock = threading.Lock()
+        self.commands = 0
+        self.denied = 0
+
+    def send(self, line: str) -> bool:
+        """Send one line; False if the client is gone"""
+        try:
+            with self.send_lock:
+                self.conn.sendall(f"{line}\n".encode())
+            return True
+        except OSError:
+            return False
+
+
+class SerialBroker:
+    """Serial port owner with a Unix-socket command and telemetry API"""
+
+    def __init__(self, link, socket_path: str = DEFAULT_SOCKET, hold: float = 1.0,
+                 clock=None):
+        """
+        Initialize broker
+
+        Args:
+            link: Open serial port (serial.Serial or anything with write(),
+                  flush(), readline() and is_open)
+            socket_path: Unix socket to listen on
+            hold: Seconds without actuator commands after which the holder
+                  loses the actuators
+            clock: Object providing time() (default: time module)
+        """
+        self.link = link
+        self.socket_path = socket_path
+        self.hold = hold
+        self.clock = clock if clock is not None else time
+        self.write_lock = threading.Lock()
+        self.clients_lock = threading.Lock()
+        self.clients: List[BrokerClient] = []
+        self.server = None
+        self.running = False
+        self.threads: List[threading.Thread] = []
+
+        # Actuator ownership
+        self.owner: Optional[BrokerClient] = None
+        self.owner_time = 0.0
+        self.moving = False
+
+        # Statistics
+        self.handle_times = deque(maxlen=HANDLE_SAMPLES)  # Command received -> serial write done
+        self.lines_in = 0
+        self.lines_out = 0
+
+    # ---- Lifecycle ------------------------------------------------------
+
+    def start(self) -> 'SerialBroker':
+        """Listen on the socket and start the serial reader"""
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)  # Stale socket from a previous run
+        self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.server.bind(self.socket_path)
+        self.server.listen(8)
+        self.running = True
+        for target in (self._accept, self._read_serial):
+            thread = threading.Thread(target=target, daemon=True)
+            thread.start()
+            self.threads.append(thread)
+        print(f"Serial broker listening on {self.socket_path}")
+        return self
+
+    def stop(self):
+        """Stop the robot, disconnect clients and remove the socket"""
+        self.running = False
+        if self.moving:
+            self._write('S')
+        with self.clients_lock:
+            clients, self.clients = self.clients, []
+        for client in clients:
+            try:
+                client.conn.close()
+            except OSError:
+                pass
+        if self.server is not None:
+            self.server.close()
+            self.server = None
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # ---- Serial side ----------------------------------------------------
+
+    def _write(self, cmd: str):
+        """Write one command line to the firmware"""
+        with self.write_lock:
+            self.link.write(f"{cmd}\n".encode())
+            self.link.flush()
+        self.lines_out += 1
+
+    def _read_serial(self):
+        """Fan firmware lines out to the subscribed clients"""
+        while self.running and self.link.is_open:
+            try:
+                raw = self.link.readline()
+            except Exception:
+                break
+            if not raw:
+                continue
+            line = raw.decode(errors='replace').strip()
+            self.lines_in += 1
+            kind = classify(line)
+            with self.clients_lock:
+                clients = [c for c in self.clients if kind in c.kinds]
+            for client in clients:
+                if not client.send(line):
+                    self._drop(client)
+
+    # ---- Client side ----------------------------------------------------
+
+    def _accept(self):
+        """Accept clients, one handler thread each"""
+        while self.running:
+            try:
+                conn, _ = self.server.accept()
+            except OSError:
+                break
+            thread = threading.Thread(target=self._serve, args=(conn,), daemon=True)
+            thread.start()
+
+    def _serve(self, conn: socket.socket):
+        """Read one client's lines until it disconnects"""
+        client = BrokerClient(conn)
+        with self.clients_lock:
+            self.clients.append(client)
+        reader = conn.makefile('rb')
+        try:
+            for raw in reader:
+                received = self.clock.time()
+                line = raw.decode(errors='replace').strip()
+                if line:
+                    self.handle(client, line, received)
+        except OSError:
+            pass
+        finally:
+            reader.close()
+            self._drop(client)
+
+    def handle(self, client: BrokerClient, line: str, received: Optional[float] = None):
+        """Execute one client line (broker request or firmware command)"""
+        if line.startswith('hello '):
+            parts = line.split()
+            client.name = parts[1] if len(parts) > 1 else client.name
+            client.priority = int(parts[2]) if len(parts) > 2 else 0
+            client.send(f"#ok {client.name}")
+            return
+        if line.startswith('sub '):
+            kinds = line.split()[1:]
+            client.kinds = set(LINE_KINDS) if 'all' in kinds else set(kinds) & set(LINE_KINDS)
+            client.send('#ok sub')
+            return
+
+        client.commands += 1
+        if is_actuator(line) and not self._arbitrate(client, line):
+            client.denied += 1
+            client.send(f"#denied {line} {self.owner.name}")
+            return
+        self._write(line)
+        if received is not None:
+            self.handle_times.append(self.clock.time() - received)
+
+    def _arbitrate(self, client: BrokerClient, cmd: str) -> bool:
+        """True if client may send this actuator command (takes ownership)"""
+        now = self.clock.time()
+        with self.clients_lock:
+            owner = self.owner
+            if owner is not None and owner is not client:
+                idle = now - self.owner_time > self.hold
+                if client.priority <= owner.priority and not idle:
+                    return False
+                if not idle:
+                    owner.send(f"#preempted {client.name}")
+            if cmd == 'S':
+                # Stopping releases the actuators
+                self.owner = None
+                self.moving = False
+            else:
+                self.owner = client
+                self.owner_time = now
+                if cmd in MOTIONS:
+                    self.moving = True
+            return True
+
+    def _drop(self, client: BrokerClient):
+        """Forget a client; stop the robot if it was driving"""
+        with self.clients_lock:
+            if client in self.clients:
+                self.clients.remove(client)
+            was_owner = self.owner is client
+            if was_owner:
+                self.owner = None
+        if was_owner and self.moving and self.running:
+            self._write('S')
+            self.moving = False
+        try:
+            client.conn.close()
+        except OSError:
+            pass
+
+    def stats(self) -> Dict:
+        """Clients, line counts and broker overhead per command (recent commands)"""
+        times = sorted(self.handle_times)
+
+        def pct(p):
+            return times[min(len(times) - 1, int(p * len(times)))] * 1e6 if times else 0.0
+        with self.clients_lock:
+            clients = {c.name: {'priority': c.priority, 'commands': c.commands,
+                                'denied': c.denied} for c in self.clients}
+        return {
+            'clients': clients,
+            'lines_in': self.lines_in,
+            'lines_out': self.lines_out,
+            'handle_p50_us': pct(0.5),
+            'handle_p99_us': pct(0.99)
+        }
+
+
+class BrokerLink:
+    """Serial-port-like connection to a SerialBroker (for RobotController)"""
+
+    def __init__(self, socket_path: str = DEFAULT_SOCKET, name: str = 'client',
+                 priority: int = 0, kinds: Optional[List[str]] = None,
+                 timeout: float = 1.0):
+        """
+        Connect and introduce this client
+
+        Args:
+            socket_path: Broker socket
+            name: Client name shown in notices and stats
+            priority: Actuator priority (higher preempts lower)
+            kinds: Line kinds to receive (default: all)
+            timeout: readline() timeout in seconds, like serial.Serial
+        """
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(socket_path)
+        self.sock.settimeout(timeout)
+        self.buffer = b''
+        self.is_open = True
+        self.notices: List[str] = []  # Broker '#' lines, newest last
+        self.write(f"hello {name} {priority}\n".encode())
+        if kinds:
+            self.write(f"sub {' '.join(kinds)}\n".encode())
+
+    @classmethod
+    def from_uri(cls, uri: str) -> 'BrokerLink':
+        """Open 'unix:<socket path>?name=<name>&priority=<n>&sub=volt,ack'"""
+        parsed = urlparse(uri)
+        query = {k: v[-1] for k, v in parse_qs(parsed.query).items()}
+        kinds = query['sub'].split(',') if 'sub' in query else None
+        return cls(parsed.path or DEFAULT_SOCKET, query.get('name', 'client'),
+                   int(query.get('priority', 0)), kinds)
+
+    def write(self, data: bytes) -> int:
+        self.sock.sendall(data)
+        return len(data)
+
+    def flush(self):
+        pass  # sendall() already handed the bytes to the broker
+
+    def readline(self) -> bytes:
+        """Next line (broker notices are recorded, not returned); b'' on timeout"""
+        while True:
+            end = self.buffer.find(b'\n')
+            if end < 0:
+                try:
+                    data = self.sock.recv(4096)
+                except socket.timeout:
+                    return b''
+                if not data:
+                    self.is_open = False
+                    return b''
+                self.buffer += data
+                continue
+            line, self.buffer = self.buffer[:end + 1], self.buffer[end + 1:]
+            if line.startswith(b'#'):
+                notice = line.decode(errors='replace').strip()
+                self.notices.append(notice)
+                if notice.startswith(('#denied', '#preempted')):
+                    print(f"Broker: {notice}")
+                continue
+            return line
+
+    def close(self):
+        self.is_open = False
+        self.sock.close()
+
+
+def benchmark(count: int = 300, baudrate: int = 115200) -> Dict:
+    """
+    Command latency to the emulated firmware, direct vs through the broker
+
+    Args:
+        count: Commands sent (spaced a little so firmware queueing does not dominate)
+        baudrate: Modeled line rate
+
+    Returns:
+        {mode: {'latency_p50_ms', 'latency_p99_ms', 'handled'}} plus the
+        broker's own per-command overhead
+    """
+    import serial
+    from fake_arduino import FakeArduino
+    from movement import RobotController
+
+    socket_path = f"/tmp/elec3848-bench-{os.getpid()}.sock"
+    results = {}
+    with FakeArduino(baudrate=baudrate) as fake:
+        link = serial.Serial(fake.port, baudrate, timeout=1.0)
+        with SerialBroker(link, socket_path) as broker:
+            direct = RobotController(port=fake.port, baudrate=baudrate)
+            brokered = RobotController(port=f"unix:{socket_path}?name=bench&priority=1")
+            for mode, robot in (('direct', direct), ('broker', brokered)):
+                writes = []
+                robot.write_listeners.append(lambda cmd, t: writes.append(t))
+                first = len(fake.commands)
+                for i in range(count):
+                    robot._send_command('A' if i % 2 else 'S')
+                    time.sleep(0.02)  # Slower than a firmware tick
+                time.sleep(0.5)
+                handled = [t for t, _ in fake.commands[first:first + count]]
+                latencies = sorted(h - w for h, w in zip(handled, writes))
+                results[mode] = {
+                    'handled': len(handled),
+                    'latency_p50_ms': latencies[len(latencies) // 2] * 1000 if latencies else 0.0,
+                    'latency_p99_ms': latencies[int(len(latencies) * 0.99)] * 1000
+                    if latencies else 0.0
+                }
+            stats = broker.stats()
+            brokered.serial.close()
+            direct.serial.close()
+        link.close()
+    results['broker_overhead_us'] = {'p50': stats['handle_p50_us'], 'p99': stats['handle_p99_us']}
+    return results
+
+
+def main():
+    """Main entry point"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Share one Arduino serial link")
+    parser.add_argument('--port', default='/dev/ttyUSB0')
+    parser.add_argument('--baud', type=int, default=9600)
+    parser.add_argument('--socket', default=DEFAULT_SOCKET)
+    parser.add_argument('--hold', type=float, default=1.0,
+                        help="seconds an idle client keeps the actuators")
+    parser.add_argument('--monitor', nargs='*', default=None, metavar='KIND',
+                        help="connect as a client and print lines (volt, ack, arm, text)")
+    parser.add_argument('--bench', action='store_true', help="overhead vs a direct link")
+    parser.add_argument('--count', type=int, default=300)
+    args = parser.parse_args()
+
+    if args.bench:
+        print(f"=== Serial broker overhead: {args.count} commands ===")
+        for mode, result in benchmark(args.count).items():
+            print(f"{mode:20s}: " + ', '.join(f"{k} {v:.2f}" if isinstance(v, float) else
+                                            f"{k} {v}" for k, v in result.items()))
+        return 0
+
+    if args.monitor is not None:
+        link = BrokerLink(args.socket, 'monitor', 0, args.monitor or None)
+        try:
+            while link.is_open:
+                line = link.readline()
+                if line:
+                    print(f"{time.time():.3f} {line.decode(errors='replace').strip()}")
+        except KeyboardInterrupt:
+            pass
+        link.close()
+        return 0
+
+    import serial
+    link = serial.Serial(args.port, args.baud, timeout=1.0)
+    time.sleep(2)  # Wait for Arduino to reset
+    broker = SerialBroker(link, args.socket, args.hold).start()
+    try:
+        while True:
+            time.sleep(5)
+    except KeyboardInterrupt:
+        print(f"\n{broker.stats()}")
+    finally:
+        broker.stop()
+        link.close()
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,1172 @@
+#!/usr/bin/env python3
+"""
+Headless Kinematic Mission Simulator
+2D model of the mecanum chassis, arena mats and blocks with a synthetic
+forward-looking camera. SimulatedRobot implements the RobotController
+interface and VirtualClock replaces time.sleep, so the full ColorBlockRobot
+state machine runs with no hardware, several times faster than realtime
+(about 5-10x on one core; mean_speedup in the batch summary).
+run_fleet puts several robots in one arena on a shared LockstepClock.
+"""
+
+import io
+import math
+import time
+import threading
+import contextlib
+from typing import List, Dict, Optional, Tuple, Callable
+
+import cv2
+import numpy as np
+
+from camera_source import CameraSource
+
+
+class SimulationTimeLimit(Exception):
+    """Raised by VirtualClock when the simulated mission runs out of time"""
+
+
+class VirtualClock:
+    """Simulated time source with the time()/sleep() interface of the time module"""
+
+    def __init__(self, time_limit: Optional[float] = None, step: float = 0.01):
+        """
+        Initialize virtual clock
+
+        Args:
+            time_limit: Raise SimulationTimeLimit once this much time has passed
+            step: Integration step in seconds for registered listeners
+        """
+        self.now = 0.0
+        self.time_limit = time_limit
+        self.step = step
+        self.listeners: List[Callable[[float], None]] = []
+
+    def time(self) -> float:
+        """Current simulated time in seconds"""
+        return self.now
+
+    def monotonic(self) -> float:
+        """Alias of time() for code using time.monotonic"""
+        return self.now
+
+    def sleep(self, duration: float):
+        """Advance simulated time, integrating listeners in small steps"""
+        remaining = max(0.0, duration)
+        while remaining > 1e-9:
+            dt = min(self.step, remaining)
+            for listener in self.listeners:
+                listener(dt)
+            self.now += dt
+            remaining -= dt
+        if self.time_limit is not None and self.now > self.time_limit:
+            raise SimulationTimeLimit(f"Simulated time limit {self.time_limit:.0f}s reached")
+
+
+class LockstepClock(VirtualClock):
+    """
+    VirtualClock shared by several agents, each running in its own thread
+
+    Only one agent runs at a time. An agent's sleep() records when it wants to
+    wake and hands control to the agent with the earliest wake time (ties go
+    to the first registered), advancing shared time and listeners up to it,
+    so several ColorBlockRobot loops interleave deterministically on one arena.
+    """
+
+    def __init__(self, time_limit: Optional[float] = None, step: float = 0.01):
+        super().__init__(time_limit, step)
+        self._cond = threading.Condition()
+        self._names: Dict[int, str] = {}   # Agent thread ident -> name
+        self._wake: Dict[str, float] = {}  # Agents still running -> wake time
+        self._order: List[str] = []
+        self._running: Optional[str] = None
+        self.expired = False
+        self.errors: Dict[str, BaseException] = {}
+
+    def sleep(self, duration: float):
+        """Yield to the other agents until duration has passed for this one"""
+        name = self._names.get(threading.get_ident())
+        if name is None:
+            super().sleep(duration)  # Setup code outside the agents
+            return
+        with self._cond:
+            self._wake[name] = self.now + max(0.0, duration)
+            self._dispatch()
+            self._cond.wait_for(lambda: self._running == name or self.expired)
+        if self.expired:
+            raise SimulationTimeLimit(f"Simulated time limit {self.time_limit:.0f}s reached")
+
+    def _dispatch(self):
+        """Advance time to the earliest wake time and run that agent (lock held)"""
+        if self.expired or not self._wake:
+            self._running = None
+            return
+        name = min(self._wake, key=lambda n: (self._wake[n], self._order.index(n)))
+        remaining = self._wake[name] - self.now
+        while remaining > 1e-9:
+            dt = min(self.step, remaining)
+            for listener in self.listeners:
+                listener(dt)
+            self.now += dt
+            remaining -= dt
+        if self.time_limit is not None and self.now > self.time_limit:
+            self.expired = True
+        self._running = name
+        self._cond.notify_all()
+
+    def _agent(self, name: str, target: Callable[[], None]):
+        self._names[threading.get_ident()] = name
+        with self._cond:
+            self._cond.wait_for(lambda: self._running == name or self.expired)
+        try:
+            if not self.expired:
+                target()
+        except SimulationTimeLimit:
+            pass
+        except BaseException as e:
+            self.errors[name] = e
+        finally:
+            with self._cond:
+                del self._wake[name]
+                if self._running == name:
+                    self._dispatch()
+
+    def run(self, agents: Dict[str, Callable[[], None]]):
+        """
+        Run every agent to completion (or until the time limit)
+
+        Args:
+            agents: Name -> callable; the callables sleep on this clock
+
+        Raises:
+            The first exception an agent raised, other than SimulationTimeLimit
+        """
+        with self._cond:
+            for name in agents:
+                self._order.append(name)
+                self._wake[name] = self.now
+            self._dispatch()
+        threads = [threading.Thread(target=self._agent, args=(name, target), daemon=True)
+                   for name, target in agents.items()]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for error in self.errors.values():
+            raise error
+
+
+class Arena:
+    """Rectangular arena with colored mats and small blocks on the floor"""
+
+    # BGR colors chosen inside the HSV ranges used by the detectors
+    MAT_COLORS = {
+        'green': (60, 160, 50),
+        'red': (40, 40, 200),
+        'yellow': (30, 210, 220),
+        'blue': (200, 70, 30)
+    }
+    BLOCK_COLORS = {
+        'red': (30, 30, 220),
+        'yellow': (20, 220, 235),
+        'blue': (220, 60, 20)
+    }
+    FLOOR_COLOR = (110, 110, 110)
+    WALL_COLOR = (70, 70, 70)
+
+    def __init__(self, width: float = 3.0, height: float = 3.0):
+        """
+        Initialize empty arena
+
+        Args:
+            width: Arena size along x in meters
+            height: Arena size along y in meters
+        """
+        self.width = width
+        self.height = height
+        self.mats: List[Dict] = []    # {'color', 'center', 'size'}
+        self.blocks: List[Dict] = []  # {'color', 'position', 'size'}
+        self.block_size = 0.035
+
+    def add_mat(self, color: str, center: Tuple[float, float], size: float):
+        """Add a square mat of the given color"""
+        self.mats.append({'color': color, 'center': center, 'size': size})
+
+    def add_block(self, color: str, position: Tuple[float, float]):
+        """Add a small block lying on the floor"""
+        self.blocks.append({'color': color, 'position': position,
+                            'size': self.block_size})
+
+    def mat_at(self, x: float, y: float) -> Optional[str]:
+        """Return color of the mat under (x, y), topmost first"""
+        for mat in reversed(self.mats):
+            mx, my = mat['center']
+            half = mat['size'] / 2
+            if abs(x - mx) <= half and abs(y - my) <= half:
+                return mat['color']
+        return None
+
+    def mat(self, color: str) -> Optional[Dict]:
+        """Return the first mat of the given color"""
+        for mat in self.mats:
+            if mat['color'] == color:
+                return mat
+        return None
+
+    @classmethod
+    def random(cls, rng: np.random.Generator, n_blocks: int = 3,
+               mat_size: float = 0.6, region_size: float = 0.5) -> 'Arena':
+        """
+        Build a randomized arena: START mat, three region mats, blocks on START
+
+        Args:
+            rng: Random generator
+            n_blocks: Number of blocks placed on the START mat
+            mat_size: START mat side in meters
+            region_size: Target region mat side in meters
+        """
+        margin = 0.3
+
+        def place_mats():
+            arena = cls()
+            placed = []
+            sizes = [('green', mat_size)] + [(c, region_size)
+                                             for c in ('red', 'yellow', 'blue')]
+            for color, size in sizes:
+                for _ in range(200):
+                    x = rng.uniform(margin + size / 2, arena.width - margin - size / 2)
+                    y = rng.uniform(margin + size / 2, arena.height - margin - size / 2)
+                    if all(max(abs(x - px), abs(y - py)) > (size + ps) / 2 + 0.2
+                           for px, py, ps in placed):
+                        placed.append((x, y, size))
+                        arena.add_mat(color, (x, y), size)
+                        break
+                else:
+                    return None
+            return arena
+
+        arena = None
+        while arena is None:
+            arena = place_mats()
+
+        sx, sy = arena.mat('green')['center']
+        colors = list(cls.BLOCK_COLORS)
+        spread = mat_size / 2 - 0.08
+        for i in range(n_blocks):
+            color = colors[i % len(colors)] if i < len(colors) else rng.choice(colors)
+            for _ in range(100):
+                bx = sx + rng.uniform(-spread, spread)
+                by = sy + rng.uniform(-spread, spread)
+                if all(math.hypot(bx - b['position'][0], by - b['position'][1]) > 0.12
+                       for b in arena.blocks):
+                    break
+            arena.add_block(str(color), (bx, by))
+        return arena
+
+
+class SimulatedRobot:
+    """Mecanum chassis model with the RobotController interface"""
+
+    # Body-frame velocity direction for each firmware command: (vx, vy, yaw rate)
+    MOTIONS = {
+        'A': (1, 0, 0),
+        'B': (-1, 0, 0),
+        'L': (0, 1, 0),
+        'R': (0, -1, 0),
+        'rC': (0, 0, -1),
+        'rA': (0, 0, 1),
+        'S': (0, 0, 0)
+    }
+
+    # Battery model: speeds above are at NOMINAL_VOLTAGE, motors sag the supply
+    NOMINAL_VOLTAGE = 11.1
+    LOAD_SAG = 0.3               # volts while driving
+    VOLTS_PER_COUNT = 5.0 / 1023 * 3  # analogRead(A0) behind a 1:3 divider
+    VOLT_PERIOD = 0.08           # sendVolt() every 5 loop ticks
+
+    # Camera gimbal servos (same conventions as RobotController)
+    PAN_CENTER = 90
+    TILT_CENTER = 120
+    SERVO_LIMITS = (20, 160)
+
+    def __init__(self, arena: Arena, clock: VirtualClock,
+                 pose: Tuple[float, float, float] = (0.5, 0.5, 0.0),
+                 linear_speed: float = 0.20, strafe_speed: float = 0.16,
+                 yaw_rate: float = 75.0, time_constant: float = 0.08,
+                 slip: float = 1.0, battery_voltage: Optional[float] = None,
+                 battery_drain: float = 0.0):
+        """
+        Initialize simulated chassis
+
+        Args:
+            arena: Arena the robot drives in
+            clock: VirtualClock driving the integration
+            pose: Initial (x, y, yaw_degrees)
+            linear_speed: Forward speed in m/s at speed 50
+            strafe_speed: Sideways speed in m/s at speed 50
+            yaw_rate: Rotation rate in deg/s at speed 50
+            time_constant: Motor spin-up/spin-down time constant in seconds
+            slip: Floor factor applied to all velocities
+            battery_voltage: Simulate a battery starting at this voltage: speeds
+                             scale with voltage / NOMINAL_VOLTAGE and sendVolt()
+                             reports go to line_listeners (None = ideal supply)
+            battery_drain: Volts lost per second of driving
+        """
+        self.arena = arena
+        self.clock = clock
+        self.x, self.y = pose[0], pose[1]
+        self.yaw = math.radians(pose[2])
+        self.linear_speed = linear_speed
+        self.strafe_speed = strafe_speed
+        self.yaw_rate = math.radians(yaw_rate)
+        self.time_constant = time_constant
+        self.slip = slip
+
+        self.port = 'sim'
+        self.speed = None
+        self.command = 'S'
+        self.velocity = np.zeros(3)  # Current body-frame (vx, vy, wz)
+
+        # Arm model
+        self.reach = (0.12, 0.45)  # Forward reach window of the gripper in meters
+        self.reach_width = 0.06    # Half width of the gripper window
+        self.drop_distance = self.reach[1]  # The arm puts the block down at full extension
+        self.pick_duration = 4.0
+        self.release_duration = 2.0
+        self.clip_duration = 3.68  # go -> Mclip of the firmware arm schedule
+        self.carried: Optional[Dict] = None
+
+        # Battery
+        self.battery_voltage = battery_voltage
+        self.battery_drain = battery_drain
+        self.line_listeners = []  # Same hook as RobotController
+        self._volt_timer = 0.0
+        self._reported_counts = None
+
+        # Gimbal model: servos slew toward the last commanded angles
+        self.pan, self.tilt = float(self.PAN_CENTER), float(self.TILT_CENTER)
+        self.gimbal_target = (self.pan, self.tilt)
+        self.servo_rate = 400.0  # deg/s
+
+        # Statistics
+        self.commands_sent = 0
+        self.write_listeners = []  # Same hook as RobotController
+        self.pick_attempts = 0
+        self.pick_failures = 0
+        self.delivered: List[Dict] = []
+        self.misplaced: List[Dict] = []
+
+        clock.listeners.append(self._integrate)
+
+    # ---- kinematics -------------------------------------------------------
+
+    def _target_velocity(self) -> np.ndarray:
+        """Body-frame velocity commanded by the current motion"""
+        scale = (self.speed or 50) / 50.0 * self.slip
+        if self.battery_voltage is not None:
+            scale *= self.supply_voltage() / self.NOMINAL_VOLTAGE
+        vx, vy, wz = self.MOTIONS.get(self.command, (0, 0, 0))
+        return np.array([vx * self.linear_speed, vy * self.strafe_speed,
+                         wz * self.yaw_rate]) * scale
+
+    def _integrate(self, dt: float):
+        """Advance chassis state by dt seconds"""
+        alpha = 1.0 - math.exp(-dt / self.time_constant)
+        self.velocity += (self._target_velocity() - self.velocity) * alpha
+        vx, vy, wz = self.velocity
+        c, s = math.cos(self.yaw), math.sin(self.yaw)
+        self.x += (vx * c - vy * s) * dt
+        self.y += (vx * s + vy * c) * dt
+        self.yaw = (self.yaw + wz * dt + math.pi) % (2 * math.pi) - math.pi
+
+        if self.battery_voltage is not None:
+            self._battery(dt)
+
+        step = self.servo_rate * dt
+        self.pan += min(max(self.gimbal_target[0] - self.pan, -step), step)
+        self.tilt += min(max(self.gimbal_target[1] - self.tilt, -step), step)
+
+        # Walls stop the chassis
+        self.x = min(max(self.x, 0.15), self.arena.width - 0.15)
+        self.y = min(max(self.y, 0.15), self.arena.height - 0.15)
+
+    def supply_voltage(self) -> float:
+        """Battery voltage under the current motor load"""
+        driving = self.command != 'S'
+        return self.battery_voltage - (self.LOAD_SAG if driving else 0.0)
+
+    def _battery(self, dt: float):
+        """Drain while driving and print the reading like sendVolt()"""
+        if self.command != 'S':
+            self.battery_voltage -= self.battery_drain * dt
+        self._volt_timer += dt
+        if self._volt_timer < self.VOLT_PERIOD:
+            return
+        self._volt_timer = 0.0
+        counts = int(round(self.supply_voltage() / self.VOLTS_PER_COUNT))
+        if counts != self._reported_counts:
+            for listener in self.line_listeners:
+                listener(str(counts), self.clock.time())
+        self._reported_counts = counts
+
+    @property
+    def pose(self) -> Tuple[float, float, float]:
+        """Current (x, y, yaw_degrees)"""
+        return self.x, self.y, math.degrees(self.yaw)
+
+    def to_body(self, wx: float, wy: float) -> Tuple[float, float]:
+        """Convert a world point to the robot body frame"""
+        dx, dy = wx - self.x, wy - self.y
+        c, s = math.cos(self.yaw), math.sin(self.yaw)
+        return dx * c + dy * s, -dx * s + dy * c
+
+    def to_world(self, bx: float, by: float) -> Tuple[float, float]:
+        """Convert a body-frame point to world coordinates"""
+        c, s = math.cos(self.yaw), math.sin(self.yaw)
+        return self.x + bx * c - by * s, self.y + bx * s + by * c
+
+    # ---- RobotController interface -----------------------------------------
+
+    def _send_command(self, cmd: str):
+        """Apply a firmware command"""
+        self.commands_sent += 1
+        if cmd in self.MOTIONS:
+            self.command = cmd
+        for listener in self.write_listeners:
+            listener(cmd, self.clock.time())
+
+    def _move(self, cmd: str, duration: float):
+        self._send_command(cmd)
+        if duration > 0:
+            self.clock.sleep(duration)
+            self.stop()
+
+    def forward(self, duration: float = 0):
+        """Move forward (A command)"""
+        self._move("A", duration)
+
+    def backward(self, duration: float = 0):
+        """Move backward (B command)"""
+        self._move("B", duration)
+
+    def left(self, duration: float = 0):
+        """Move left (L command)"""
+        self._move("L", duration)
+
+    def right(self, duration: float = 0):
+        """Move right (R command)"""
+        self._move("R", duration)
+
+    def rotate_clockwise(self, duration: float = 0):
+        """Rotate clockwise (rC command)"""
+        self._move("rC", duration)
+
+    def rotate_counterclockwise(self, duration: float = 0):
+        """Rotate counter-clockwise (rA command)"""
+        self._move("rA", duration)
+
+    def stop(self):
+        """Stop all movement (S command)"""
+        self._send_command("S")
+
+    def set_speed(self, speed: int):
+        """Set motor speed (30, 50 or 80)"""
+        if speed in [30, 50, 80]:
+            self._send_command(str(speed))
+            self.speed = speed
+
+    def set_gimbal(self, pan: int, tilt: int, window: int = 0):
+        """Command the pan/tilt servos (ignored outside the firmware limits)"""
+        low, high = self.SERVO_LIMITS
+        self._send_command(f"({pan},{tilt},{window})")
+        if low < pan < high and low < tilt < high:
+            self.gimbal_target = (float(pan), float(tilt))
+
+    def pick(self, overlap: bool = False) -> bool:
+        """
+        Run the pick sequence on the closest block inside the gripper window
+
+        Args:
+            overlap: Return when the gripper has closed instead of after the
+                     whole sequence (see RobotController.pick)
+
+        Returns:
+            True if a block was picked up
+        """
+        self._send_command("go")
+        self.pick_attempts += 1
+        picked = None
+        if self.carried is None:
+            candidates = []
+            for block in self.arena.blocks:
+                bx, by = self.to_body(*block['position'])
+                if self.reach[0] <= bx <= self.reach[1] and abs(by) <= self.reach_width:
+                    candidates.append((bx, block))
+            if candidates:
+                picked = min(candidates, key=lambda c: c[0])[1]
+                self.arena.blocks.remove(picked)
+                if picked in self.misplaced:
+                    self.misplaced.remove(picked)  # Misplaced counts blocks left off their mat
+                self.carried = picked
+        self.clock.sleep(self.clip_duration if overlap else self.pick_duration)
+        if picked is None:
+            self.pick_failures += 1
+        return picked is not None
+
+    def release(self, overlap: bool = False):
+        """
+        Open the gripper and put the carried block down drop_distance ahead
+
+        A block that lands on its own mat is delivered and taken off the
+        field, like a referee scoring it; any other block stays in play.
+
+        Args:
+            overlap: Return at once instead of after release_duration
+        """
+        self._send_command("rel")
+        if self.carried is not None:
+            block = self.carried
+            self.carried = None
+            block['position'] = self.to_world(self.drop_distance, 0.0)
+            if self.arena.mat_at(*block['position']) == block['color']:
+                self.delivered.append(block)
+            else:
+                self.arena.blocks.append(block)
+                self.misplaced.append(block)
+        if not overlap:
+            self.clock.sleep(self.release_duration)
+
+    def close(self):
+        """Nothing to close"""
+        self.stop()
+
+
+class SimulatedCamera(CameraSource):
+    """Synthetic forward-looking camera rendering the arena from the robot pose"""
+
+    def __init__(self, robot: SimulatedRobot, width: int = 640, height: int = 480,
+                 hfov: float = 75.0, mount_height: float = 0.18,
+                 mount_forward: float = 0.10, tilt: float = 20.0,
+                 fps: float = 30.0, render_scale: float = 0.5,
+                 noise_sigma: float = 0.0, seed: Optional[int] = None,
+                 floor_texture: float = 0.0):
+        """
+        Initialize synthetic camera
+
+        Args:
+            robot: Simulated robot the camera is mounted on
+            width, height: Output frame size
+            hfov: Horizontal field of view in degrees
+            mount_height: Lens height above the floor in meters
+            mount_forward: Lens offset ahead of the robot center in meters
+            tilt: Downward pitch in degrees
+            fps: Frame rate; each read() advances the clock by one frame period
+            render_scale: Render at this fraction of the output size, then upscale
+            noise_sigma: Standard deviation of additive pixel noise
+            seed: Seed for pixel noise and the floor texture
+            floor_texture: Contrast of a fixed random pattern on the bare floor
+                           (0 = uniform floor; visual odometry needs texture)
+        """
+        super().__init__(width, height)
+        self.robot = robot
+        self.fps = fps
+        self.noise_sigma = noise_sigma
+        self.rng = np.random.default_rng(seed)
+        self.floor_texture = floor_texture
+        self.floor_pattern = None
+        self.floor_cell = 0.02  # Texture cell size in meters
+        self.seed = seed
+
+        # Camera intrinsics at full resolution
+        self.hfov = hfov
+        self.focal = (width / 2) / math.tan(math.radians(hfov) / 2)
+        self.mount_height = mount_height
+        self.mount_forward = mount_forward
+        self.base_tilt = math.radians(tilt)  # Downward pitch with the tilt servo centered
+        self.tilt = self.base_tilt
+        self.pan = 0.0  # Camera yaw from the gimbal, counter-clockwise positive
+        self.gimbal = None  # (pan, tilt) servo angles the rays were computed for
+
+        # Normalized camera-frame direction of every rendered pixel
+        rw, rh = int(width * render_scale), int(height * render_scale)
+        u = (np.arange(rw, dtype=np.float32) + 0.5) / render_scale
+        v = (np.arange(rh, dtype=np.float32) + 0.5) / render_scale
+        uu, vv = np.meshgrid(u, v)
+        self._xc = (uu - width / 2) / self.focal    # right
+        self._yc = (vv - height / 2) / self.focal   # down
+        self.render_scale = render_scale
+        self.render_size = (rw, rh)
+        self._image = np.empty((rh, rw, 3), dtype=np.uint8)
+        self._aim()
+
+    def _aim(self):
+        """Recompute the pixel rays when the robot's gimbal has moved"""
+        robot = self.robot
+        gimbal = (getattr(robot, 'pan', 90.0), getattr(robot, 'tilt', 120.0))
+        if gimbal == self.gimbal:
+            return
+        self.gimbal = gimbal
+        self.pan = math.radians(gimbal[0] - getattr(robot, 'PAN_CENTER', 90))
+        self.tilt = self.base_tilt + math.radians(gimbal[1] - getattr(robot, 'TILT_CENTER', 120))
+
+        # Body-frame floor coordinates of every rendered pixel
+        xc, yc = self._xc, self._yc
+        ahead = np.cos(self.tilt) - yc * np.sin(self.tilt)
+        down = np.sin(self.tilt) + yc * np.cos(self.tilt)
+        cp, sp = math.cos(self.pan), math.sin(self.pan)
+        forward = ahead * cp + xc * sp
+        left = ahead * sp - xc * cp
+        self.sky = down <= 1e-3
+        scale = np.where(self.sky, 0.0, self.mount_height / np.maximum(down, 1e-3))
+        self.ground_x = (self.mount_forward + scale * forward).astype(np.float32)
+        self.ground_y = (scale * left).astype(np.float32)
+        # Body-frame ray directions, used to ray-cast the blocks as cubes
+        self.ray_forward = forward.astype(np.float32)
+        self.ray_left = left.astype(np.float32)
+        self.ray_up = (-down).astype(np.float32)
+
+    def intrinsics(self) -> np.ndarray:
+        """3x3 camera matrix of the rendered frames"""
+        return np.array([[self.focal, 0, self.width / 2],
+                         [0, self.focal, self.height / 2],
+                         [0, 0, 1]], dtype=np.float64)
+
+    def project(self, bx: float, by: float, bz: float = 0.0) -> Optional[Tuple[float, float]]:
+        """
+        Project a body-frame point to full-resolution pixel coordinates
+
+        Returns:
+            (u, v) or None if the point is behind the camera
+        """
+        px, pz = bx - self.mount_forward, bz - self.mount_height
+        if self.pan:
+            cp, sp = math.cos(self.pan), math.sin(self.pan)
+            px, by = px * cp + by * sp, -px * sp + by * cp
+        depth = px * math.cos(self.tilt) - pz * math.sin(self.tilt)
+        if depth <= 0.02:
+            return None
+        u = self.focal * (-by) / depth + self.width / 2
+        v = self.focal * (-px * math.sin(self.tilt) - pz * math.cos(self.tilt)) / depth \
+            + self.height / 2
+        return u, v
+
+    def ground_truth(self, min_pixels: int = 50) -> Dict[str, List[Dict]]:
+        """
+        Bounding boxes of what the next render() shows
+
+        Args:
+            min_pixels: Ignore mats covering fewer full-resolution pixels
+
+        Returns:
+            {'regions': [...], 'blocks': [...]} with 'color' and 'bbox' (x, y, w, h)
+        """
+        self._aim()
+        robot, arena = self.robot, self.robot.arena
+        c, s = math.cos(robot.yaw), math.sin(robot.yaw)
+        wx = robot.x + self.ground_x * c - self.ground_y * s
+        wy = robot.y + self.ground_x * s + self.ground_y * c
+        scale = 1.0 / self.render_scale
+
+        regions = []
+        for mat in arena.mats:
+            mx, my = mat['center']
+            half = mat['size'] / 2
+            inside = (np.abs(wx - mx) <= half) & (np.abs(wy - my) <= half) & ~self.sky
+            rows = np.flatnonzero(inside.any(axis=1))
+            cols = np.flatnonzero(inside.any(axis=0))
+            if np.count_nonzero(inside) * scale * scale < min_pixels:
+                continue
+            x0, y0 = int(cols[0] * scale), int(rows[0] * scale)
+            x1, y1 = int((cols[-1] + 1) * scale), int((rows[-1] + 1) * scale)
+            regions.append({'color': mat['color'], 'bbox': (x0, y0, x1 - x0, y1 - y0)})
+
+        blocks = []
+        for block in arena.blocks:
+            half = block['size'] / 2
+            points = []
+            for dx in (-half, half):
+                for dy in (-half, half):
+                    bx, by = robot.to_body(block['position'][0] + dx, block['position'][1] + dy)
+                    for bz in (0.0, block['size']):
+                        points.append(self.project(bx, by, bz))
+            if any(p is None for p in points):
+                continue
+            us, vs = zip(*points)
+            x0, y0 = max(0, int(min(us))), max(0, int(min(vs)))
+            x1, y1 = min(self.width, int(max(us)) + 1), min(self.height, int(max(vs)) + 1)
+            if x1 - x0 < 2 or y1 - y0 < 2:
+                continue
+            blocks.append({'color': block['color'], 'bbox': (x0, y0, x1 - x0, y1 - y0)})
+        return {'regions': regions, 'blocks': blocks}
+
+    def camera_model(self):
+        """Exact camera_calibration.CameraModel of this synthetic camera"""
+        from camera_calibration import CameraModel
+
+        ground = np.array([(0.4, 0.3), (0.4, -0.3), (1.5, 0.6), (1.5, -0.6)])
+        pixels = np.array([self.project(x, y) for x, y in ground])
+        homography, _ = cv2.findHomography(pixels, ground)
+        return CameraModel(self.intrinsics(), np.zeros(5), (self.width, self.height),
+                           homography)
+
+    def render(self, dst: Optional[np.ndarray] = None) -> np.ndarray:
+        """Render the arena as seen from the current robot pose (into dst if given)"""
+        self._aim()
+        robot, arena = self.robot, self.robot.arena
+        c, s = math.cos(robot.yaw), math.sin(robot.yaw)
+        wx = robot.x + self.ground_x * c - self.ground_y * s
+        wy = robot.y + self.ground_x * s + self.ground_y * c
+
+        image = self._image
+        image[:] = Arena.FLOOR_COLOR
+        if self.floor_texture > 0:
+            self._draw_floor_texture(image, arena, wx, wy)
+        for mat in arena.mats:
+            mx, my = mat['center']
+            half = mat['size'] / 2
+            inside = (np.abs(wx - mx) <= half) & (np.abs(wy - my) <= half)
+            image[inside] = Arena.MAT_COLORS[mat['color']]
+        outside = (wx < 0) | (wx > arena.width) | (wy < 0) | (wy > arena.height)
+        image[outside | self.sky] = Arena.WALL_COLOR
+
+        # Draw blocks far to near so closer cubes occlude farther ones
+        blocks = sorted(arena.blocks, key=lambda b: -math.hypot(
+            b['position'][0] - robot.x, b['position'][1] - robot.y))
+        for block in blocks:
+            self._draw_cube(image, block, c, s)
+
+        frame = cv2.resize(image, (self.width, self.height), dst=dst,
+                           interpolation=cv2.INTER_NEAREST)
+        if self.noise_sigma > 0:
+            noise = self.rng.normal(0, self.noise_sigma, frame.shape)
+            np.copyto(frame, np.clip(frame + noise, 0, 255).astype(np.uint8))
+        return frame
+
+    def _draw_floor_texture(self, image: np.ndarray, arena: Arena,
+                            wx: np.ndarray, wy: np.ndarray):
+        """Shade the floor with a pattern fixed in world coordinates"""
+        if self.floor_pattern is None:
+            rng = np.random.default_rng(self.seed)
+            cells = (int(arena.height / self.floor_cell) + 1, int(arena.width / self.floor_cell) + 1)
+            pattern = cv2.GaussianBlur(rng.normal(0, 1, cells).astype(np.float32), (0, 0), 1.0)
+            pattern *= self.floor_texture / max(float(pattern.std()), 1e-6)
+            self.floor_pattern = pattern
+        rows = np.clip((wy / self.floor_cell).astype(np.int32), 0, self.floor_pattern.shape[0] - 1)
+        cols = np.clip((wx / self.floor_cell).astype(np.int32), 0, self.floor_pattern.shape[1] - 1)
+        shade = self.floor_pattern[rows, cols]
+        np.copyto(image, np.clip(image + shade[..., None], 0, 255).astype(np.uint8))
+
+    def _draw_cube(self, image: np.ndarray, block: Dict, c: float, s: float):
+        """Ray-cast one block as an upright cube inside its projected bounding box"""
+        robot = self.robot
+        size = block['size']
+        half = size / 2
+        cam_x, cam_y = robot.to_world(self.mount_forward, 0.0)
+
+        # Project the cube corners to find the pixels worth testing
+        corners = []
+        for dx in (-half, half):
+            for dy in (-half, half):
+                bx, by = robot.to_body(block['position'][0] + dx,
+                                       block['position'][1] + dy)
+                for z in (0.0, size):
+                    pixel = self.project(bx, by, z)
+                    if pixel is None:
+                        return
+                    corners.append(pixel)
+        corners = np.array(corners) * self.render_scale
+        rw, rh = self.render_size
+        u0, v0 = np.floor(corners.min(axis=0)).astype(int)
+        u1, v1 = np.ceil(corners.max(axis=0)).astype(int) + 1
+        u0, v0, u1, v1 = max(u0, 0), max(v0, 0), min(u1, rw), min(v1, rh)
+        if u0 >= u1 or v0 >= v1:
+            return
+
+        # Slab intersection of the pixel rays with the cube
+        fwd = self.ray_forward[v0:v1, u0:u1]
+        left = self.ray_left[v0:v1, u0:u1]
+        dirs = (fwd * c - left * s, fwd * s + left * c, self.ray_up[v0:v1, u0:u1])
+        origin = (cam_x, cam_y, self.mount_height)
+        box = ((block['position'][0] - half, block['position'][0] + half),
+               (block['position'][1] - half, block['position'][1] + half),
+               (0.0, size))
+        enter = np.full(fwd.shape, -np.inf, dtype=np.float32)
+        leave = np.full(fwd.shape, np.inf, dtype=np.float32)
+        top = None
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for axis in range(3):
+                t1 = (box[axis][0] - origin[axis]) / dirs[axis]
+                t2 = (box[axis][1] - origin[axis]) / dirs[axis]
+                near = np.fmin(t1, t2)
+                if axis == 2:
+                    top = near >= enter
+                enter = np.fmax(enter, near)
+                leave = np.fmin(leave, np.fmax(t1, t2))
+        hit = (enter <= leave) & (leave > 0)
+
+        color = np.array(Arena.BLOCK_COLORS[block['color']], dtype=np.float32)
+        region = image[v0:v1, u0:u1]
+        region[hit & top] = color
+        region[hit & ~top] = (color * 0.8).astype(np.uint8)
+
+    def read_into(self, buffer: np.ndarray) -> bool:
+        """Wait one frame period and render straight into buffer"""
+        self.robot.clock.sleep(1.0 / self.fps)
+        self.render(buffer)
+        self.last_timestamp = self.robot.clock.time()
+        self.frames_read += 1
+        return True
+
+    def _grab(self) -> Tuple[bool, np.ndarray]:
+        """Wait one frame period and return a rendered frame"""
+        self.robot.clock.sleep(1.0 / self.fps)
+        frame = self.render()
+        self.last_timestamp = self.robot.clock.time()
+        return True, frame
+
+
+def run_mission(seed: int, n_blocks: int = 3, time_limit: float = 600.0,
+                configure: Optional[Callable] = None,
+                overrides: Optional[Dict[str, object]] = None,
+                quiet: bool = True, metrics_dir: Optional[str] = None,
+                label: str = '', calibrated: bool = False,
+                floor_texture: float = 0.0,
+                battery: Optional[Tuple[float, float]] = None,
+                config_file: Optional[str] = None) -> Dict:
+    """
+    Run the full ColorBlockRobot mission in a randomized simulated arena
+
+    Args:
+        seed: Arena seed
+        n_blocks: Blocks placed on the START mat
+        time_limit: Simulated seconds before the run is aborted
+        configure: Optional callable(ColorBlockRobot) applied before running
+        overrides: Attribute overrides such as {'visual_servo.x_tolerance': 40}
+        quiet: Suppress the state machine's console output
+        metrics_dir: Append the run's mission metrics to this log directory
+        label: Metrics label used to group runs in mission_report.py
+        calibrated: Give VisualServo the exact ground model (metric decisions;
+                    the block reach line always comes from the exact model)
+        floor_texture: Floor texture contrast (gives visual odometry features)
+        battery: (start volts, volts lost per second of driving), None = ideal supply
+        config_file: Apply this robot_config.json (default: none, built-in values)
+
+    Returns:
+        Dictionary with mission statistics
+    """
+    from main import ColorBlockRobot
+
+    rng = np.random.default_rng(seed)
+    arena = Arena.random(rng, n_blocks=n_blocks)
+    clock = VirtualClock(time_limit=time_limit)
+
+    # Start somewhere off the mats, facing a random direction
+    while True:
+        x = rng.uniform(0.4, arena.width - 0.4)
+        y = rng.uniform(0.4, arena.height - 0.4)
+        if arena.mat_at(x, y) is None:
+            break
+    battery_voltage, battery_drain = battery if battery is not None else (None, 0.0)
+    sim_robot = SimulatedRobot(arena, clock, pose=(x, y, rng.uniform(-180, 180)),
+                               slip=rng.uniform(0.8, 1.1), battery_voltage=battery_voltage,
+                               battery_drain=battery_drain)
+    camera = SimulatedCamera(sim_robot, seed=seed, floor_texture=floor_texture)
+
+    wall_start = time.perf_counter()
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output) if quiet else contextlib.nullcontext():
+        # Config, tuned-threshold and calibration files in the cwd belong to
+        # the real robot; simulated runs start from the built-in values
+        robot = ColorBlockRobot(robot=sim_robot, camera=camera, clock=clock,
+                                config_file=config_file, calibration_file=None,
+                                block_params_file=None, region_params_file=None)
+        robot.show_debug = False
+        robot.metrics_dir = metrics_dir
+        robot.metrics.label = label
+        robot.visual_servo.camera_model = camera.camera_model() if calibrated else None
+        robot.odometry.camera_model = robot.visual_servo.camera_model
+        robot.odometry.hfov = camera.hfov  # Nominal lens when uncalibrated
+        robot.gimbal.focal = camera.focal
+        robot.block_detector.set_reach(camera.camera_model())
+        for path, value in (overrides or {}).items():
+            apply_override(robot, path, value)
+        if configure is not None:
+            configure(robot)
+        timed_out = False
+        try:
+            robot.run()
+        except SimulationTimeLimit:
+            timed_out = True
+    wall_time = time.perf_counter() - wall_start
+
+    mission_time = clock.now
+    delivered = len(sim_robot.delivered)
+    return {
+        'seed': seed,
+        'final_state': 'TIME_LIMIT' if timed_out else robot.state.value,
+        'mission_time': mission_time,
+        'wall_time': wall_time,
+        'speedup': mission_time / wall_time if wall_time > 0 else float('inf'),
+        'blocks_total': n_blocks,
+        'blocks_delivered': delivered,
+        'blocks_misplaced': len(sim_robot.misplaced),
+        'blocks_per_minute': delivered / (mission_time / 60.0) if mission_time > 0 else 0.0,
+        'pick_attempts': sim_robot.pick_attempts,
+        'pick_failures': sim_robot.pick_failures,
+        'commands_sent': sim_robot.commands_sent,
+        'frames': camera.frames_read,
+        'run_id': robot.metrics.run_id
+    }
+
+
+def run_fleet(seed: int, n_robots: int = 2, n_blocks: int = 6, time_limit: float = 300.0,
+              coordinated: bool = True, quiet: bool = True, calibrated: bool = False,
+              min_separation: float = 0.35, config_file: Optional[str] = None) -> Dict:
+    """
+    Run several ColorBlockRobots in one randomized arena on a LockstepClock
+
+    Robots do not appear in each other's camera images and drive through each
+    other; close approaches are measured instead of simulated.
+
+    Args:
+        seed: Arena seed
+        n_robots: Fleet size
+        n_blocks: Blocks placed on the START mat
+        time_limit: Simulated seconds before the run is aborted
+        coordinated: Give every robot a coordinator.FleetClient
+        quiet: Suppress the state machines' console output
+        calibrated: Give VisualServo the exact ground model (metric decisions;
+                    the block reach line always comes from the exact model)
+        min_separation: Robot centers closer than this count as a close call
+        config_file: Apply this robot_config.json to every robot (default: none)
+
+    Returns:
+        Dictionary with fleet statistics; close_time is the simulated time
+        any two robots were within min_separation, region_overlap_time the
+        time two robots were at the same drop mat
+    """
+    from main import ColorBlockRobot
+    from coordinator import Coordinator
+
+    rng = np.random.default_rng(seed)
+    arena = Arena.random(rng, n_blocks=n_blocks)
+    clock = LockstepClock(time_limit=time_limit)
+    coordinator = Coordinator(clock=clock) if coordinated else None
+
+    sim_robots, poses = [], []
+    while len(poses) < n_robots:
+        x = rng.uniform(0.4, arena.width - 0.4)
+        y = rng.uniform(0.4, arena.height - 0.4)
+        if arena.mat_at(x, y) is None and all(math.hypot(x - px, y - py) > 0.5
+                                               for px, py in poses):
+            poses.append((x, y))
+            sim_robots.append(SimulatedRobot(arena, clock, pose=(x, y, rng.uniform(-180, 180)),
+                                             slip=rng.uniform(0.8, 1.1)))
+
+    drop_mats = [m for m in arena.mats if m['color'] != 'green']
+    proximity = {'close': 0.0, 'overlap': 0.0}
+
+    def measure(dt: float):
+        close = any(math.hypot(a.x - b.x, a.y - b.y) < min_separation
+                    for i, a in enumerate(sim_robots) for b in sim_robots[i + 1:])
+        overlap = any(sum(max(abs(r.x - m['center'][0]), abs(r.y - m['center'][1])) <
+                          m['size'] / 2 + 0.3 for r in sim_robots) > 1 for m in drop_mats)
+        proximity['close'] += dt if close else 0.0
+        proximity['overlap'] += dt if overlap else 0.0
+
+    clock.listeners.append(measure)
+
+    wall_start = time.perf_counter()
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output) if quiet else contextlib.nullcontext():
+        robots, agents = [], {}
+        for i, sim_robot in enumerate(sim_robots):
+            camera = SimulatedCamera(sim_robot, seed=seed * 100 + i)
+            robot = ColorBlockRobot(robot=sim_robot, camera=camera, clock=clock,
+                                    config_file=config_file, calibration_file=None,
+                                    block_params_file=None, region_params_file=None)
+            robot.show_debug = False
+            robot.metrics_dir = None
+            robot.metrics.label = f'fleet{n_robots}'
+            robot.visual_servo.camera_model = camera.camera_model() if calibrated else None
+            robot.odometry.camera_model = robot.visual_servo.camera_model
+            robot.odometry.hfov = camera.hfov
+            robot.gimbal.focal = camera.focal
+            robot.block_detector.set_reach(camera.camera_model())
+            if coordinator is not None:
+                robot.coordinator = coordinator.client(
+                    f'robot{i}', lambda r=sim_robot: r.pose, camera.camera_model())
+            robots.append(robot)
+            agents[f'robot{i}'] = robot.run
+        clock.run(agents)
+    wall_time = time.perf_counter() - wall_start
+
+    mission_time = clock.now
+    delivered = sum(len(r.delivered) for r in sim_robots)
+    stats = coordinator.stats() if coordinator is not None else {}
+    return {
+        'seed': seed,
+        'robots': n_robots,
+        'coordinated': coordinated,
+        'final_states': ['TIME_LIMIT' if clock.expired else r.state.value for r in robots],
+        'mission_time': mission_time,
+        'wall_time': wall_time,
+        'blocks_total': n_blocks,
+        'blocks_delivered': delivered,
+        'blocks_misplaced': sum(len(r.misplaced) for r in sim_robots),
+        'blocks_per_minute': delivered / (mission_time / 60.0) if mission_time > 0 else 0.0,
+        'pick_attempts': sum(r.pick_attempts for r in sim_robots),
+        'pick_failures': sum(r.pick_failures for r in sim_robots),
+        'close_time': proximity['close'],
+        'region_overlap_time': proximity['overlap'],
+        'region_wait': stats.get('region_wait', 0.0),
+        'claim_conflicts': stats.get('claim_conflicts', 0)
+    }
+
+
+def apply_override(obj, path: str, value):
+    """Set a dotted attribute path such as 'visual_servo.x_tolerance'"""
+    *parents, name = path.split('.')
+    for parent in parents:
+        obj = getattr(obj, parent)
+    setattr(obj, name, value)
+
+
+def _run_mission_args(args):
+    return run_mission(*args)
+
+
+def batch_evaluate(seeds, n_blocks: int = 3, time_limit: float = 600.0,
+                   overrides: Optional[Dict[str, object]] = None,
+                   jobs: Optional[int] = None, metrics_dir: Optional[str] = None,
+                   label: str = '', calibrated: bool = False,
+                   floor_texture: float = 0.0,
+                   battery: Optional[Tuple[float, float]] = None) -> List[Dict]:
+    """
+    Run missions over many randomized arenas in parallel
+
+    Args:
+        seeds: Iterable of arena seeds
+        n_blocks: Blocks per arena
+        time_limit: Simulated seconds per mission
+        overrides: Attribute overrides applied to every robot
+        jobs: Worker processes (default: all cores)
+        metrics_dir: Append every run's mission metrics to this log directory
+        label: Metrics label for this batch
+        calibrated: Use metric distance/bearing decisions in VisualServo
+        floor_texture: Floor texture contrast in every arena
+        battery: (start volts, drain per driving second) for every robot
+
+    Returns:
+        List of per-mission statistics
+    """
+    from multiprocessing import Pool
+
+    tasks = [(seed, n_blocks, time_limit, None, overrides, True, metrics_dir, label,
+              calibrated, floor_texture, battery) for seed in seeds]
+    if jobs == 1:
+        return [_run_mission_args(task) for task in tasks]
+    with Pool(jobs) as pool:
+        return pool.map(_run_mission_args, tasks)
+
+
+def summarize(results: List[Dict]) -> Dict:
+    """Aggregate statistics over a batch of missions"""
+    times = np.array([r['mission_time'] for r in results])
+    delivered = np.array([r['blocks_delivered'] for r in results])
+    total = np.array([r['blocks_total'] for r in results])
+    return {
+        'missions': len(results),
+        'complete_rate': float(np.mean(delivered == total)),
+        'delivered_rate': float(delivered.sum() / max(total.sum(), 1)),
+        'mean_mission_time': float(times.mean()),
+        'blocks_per_minute': float(delivered.sum() / (times.sum() / 60.0)),
+        'pick_failures': int(sum(r['pick_failures'] for r in results)),
+        'mean_speedup': float(np.mean([r['speedup'] for r in results]))
+    }
+
+
+def check(seed: int = 0, n_blocks: int = 3, time_limit: float = 300.0) -> Dict:
+    """
+    Smoke check: the unmodified state machine delivers in a seeded arena
+
+    Args:
+        seed: Arena seed
+        n_blocks: Blocks placed on the START mat
+        time_limit: Simulated seconds before the run is aborted
+
+    Returns:
+        The mission statistics
+
+    Raises:
+        RuntimeError: If no block ended up on its mat
+    """
+    result = run_mission(seed, n_blocks, time_limit)
+    if result['blocks_delivered'] == 0:
+        raise RuntimeError(f"seed {seed}: no block delivered in {result['mission_time']:.0f}s "
+                           f"({result['final_state']}, {result['blocks_misplaced']} misplaced)")
+    return result
+
+
+# Test function
+if __name__ == "__main__":
+    import argparse
+    import ast
+
+    parser = argparse.ArgumentParser(description="Simulated mission batch runner")
+    parser.add_argument('--arenas', type=int, default=20, help="number of arenas")
+    parser.add_argument('--seed', type=int, default=0, help="first arena seed")
+    parser.add_argument('--blocks', type=int, default=3, help="blocks per arena")
+    parser.add_argument('--time-limit', type=float, default=600.0,
+                        help="simulated seconds per mission")
+    parser.add_argument('--jobs', type=int, default=None, help="worker processes")
+    parser.add_argument('--set', action='append', default=[], metavar='PATH=VALUE',
+                        help="override, e.g. visual_servo.x_tolerance=40")
+    parser.add_argument('--metrics-dir', default=None,
+                        help="append mission metrics to this directory")
+    parser.add_argument('--label', default='', help="metrics label for this batch")
+    parser.add_argument('--calibrated', action='store_true',
+                        help="use metric ground-plane decisions in VisualServo")
+    parser.add_argument('--floor-texture', type=float, default=0.0,
+                        help="floor texture contrast (features for visual odometry)")
+    parser.add_argument('--battery', default=None, metavar='VOLTS,DRAIN',
+                        help="simulate a discharging battery, e.g. 12.4,0.01 (V, V/s driving)")
+    parser.add_argument('--check', action='store_true',
+                        help="run one arena (--seed) and fail unless a block is delivered")
+    args = parser.parse_args()
+
+    if args.check:
+        try:
+            r = check(args.seed, args.blocks, args.time_limit)
+        except RuntimeError as e:
+            raise SystemExit(f"Check failed: {e}")
+        print(f"Check passed: seed {r['seed']} delivered {r['blocks_delivered']}/"
+              f"{r['blocks_total']} blocks in {r['mission_time']:.1f}s")
+        raise SystemExit(0)
+
+    overrides = {}
+    for item in args.set:
+        path, value = item.split('=', 1)
+        overrides[path] = ast.literal_eval(value)
+
+    print("=== Mission Simulator ===")
+    if overrides:
+        print(f"Overrides: {overrides}")
+    seeds = range(args.seed, args.seed + args.arenas)
+    results = batch_evaluate(seeds, args.blocks, args.time_limit, overrides, args.jobs,
+                             args.metrics_dir, args.label, args.calibrated,
+                             args.floor_texture,
+                             tuple(float(v) for v in args.battery.split(','))
+                             if args.battery else None)
+
+    for r in results:
+        print(f"seed {r['seed']:4d}: {r['final_state']:10s} "
+              f"{r['blocks_delivered']}/{r['blocks_total']} blocks in "
+              f"{r['mission_time']:6.1f}s (x{r['speedup']:.0f} realtime, "
+              f"{r['pick_failures']} failed picks)")
+
+    summary = summarize(results)
+    print("\n--- Summary ---")
+    for key, value in summary.items():
+        print(f"{key:20s}: {value:.3f}" if isinstance(value, float) else
+              f"{key:20s}: {value}")
@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+"""
+Serial Telemetry Service
+Parses the debug output of AutoParking.ino (S1|..S4| stage lines and event
+messages) and ultrasonicv2.ino (STATE,s, UL,d, UR,d) as it streams in,
+buffers samples in typed NumPy columns and flushes them as chunked .npy
+files that telemetry_report.py memory-maps.
+
+Log layout: <log_dir>/<table>/<run_id>.<chunk>/<column>.npy
+
+Usage:
+    python3 telemetry.py --port /dev/ttyUSB0 [--baud 115200] [--log-dir telemetry]
+    python3 telemetry.py --replay capture.txt --rate 10
+    python3 telemetry.py --bench 500000
+"""
+
+import os
+import time
+import uuid
+from typing import Dict, List, Optional
+
+import numpy as np
+
+
+# Columns of every table (t = host receive time)
+TABLES = {
+    's1': [('t', 'f8'), ('l', 'i4'), ('r', 'i4'), ('sum', 'i4'), ('diff', 'i4'), ('lock', 'i4')],
+    's2': [('t', 'f8'), ('uf', 'f4'), ('ur', 'f4')],
+    's3': [('t', 'f8'), ('uf', 'f4'), ('ur', 'f4'), ('delta', 'f4')],
+    's4': [('t', 'f8'), ('avg_dist', 'f4'), ('error', 'f4')],
+    'ultra': [('t', 'f8'), ('state', 'i1'), ('ul', 'i4'), ('ur', 'i4')],
+    'events': [('t', 'f8'), ('code', 'i1')]
+}
+
+# AutoParking stage lines: prefix -> (table, number of key=value fields, converter)
+STAGE_LINES = {
+    b'S1|': ('s1', 5, int),
+    b'S2|': ('s2', 2, float),
+    b'S3|': ('s3', 3, float),
+    b'S4|': ('s4', 2, float)
+}
+
+# Event messages (matched on the line start after stripping)
+EMERGENCY_STOP, LIGHT_LOCKED, PARKED, COMPLETE = 1, 2, 3, 4
+EVENTS = {
+    b'!!! EMERGENCY STOP': EMERGENCY_STOP,
+    b'S1: Light locked': LIGHT_LOCKED,
+    b'S4->S5: PARKED': PARKED,
+    b'PARKING COMPLETE': COMPLETE
+}
+EVENT_NAMES = {EMERGENCY_STOP: 'emergency_stop', LIGHT_LOCKED: 'light_locked',
+               PARKED: 'parked', COMPLETE: 'complete'}
+
+# ultrasonicv2.ino State enum
+ULTRA_STATES = ('IDLE', 'ALIGN_WALL', 'PARK_8CM', 'DONE', 'FAIL')
+
+
+class ColumnStore:
+    """Per-table row buffers flushed as chunked column files"""
+
+    def __init__(self, log_dir: str = 'telemetry', run_id: Optional[str] = None,
+                 chunk_rows: int = 4096):
+        """
+        Initialize store
+
+        Args:
+            log_dir: Root directory of the log
+            run_id: Run identifier (generated if omitted)
+            chunk_rows: Rows per table buffered before a chunk is written
+        """
+        self.log_dir = log_dir
+        self.run_id = run_id or time.strftime('%Y%m%d-%H%M%S-') + uuid.uuid4().hex[:6]
+        self.chunk_rows = chunk_rows
+        self.buffers = {table: np.empty(chunk_rows, dtype=columns)
+                        for table, columns in TABLES.items()}
+        self.counts = {table: 0 for table in TABLES}
+        self.chunks = {table: 0 for table in TABLES}
+        self.rows_written = 0
+
+    def append(self, table: str, row: tuple):
+        """Append one row (t, values...) to a table"""
+        n = self.counts[table]
+        self.buffers[table][n] = row
+        self.counts[table] = n + 1
+        if n + 1 == self.chunk_rows:
+            self.flush(table)
+
+    def flush(self, table: Optional[str] = None):
+        """Write buffered rows of one table (or all tables) as a chunk"""
+        for name in [table] if table else list(TABLES):
+            n = self.counts[name]
+            if n == 0:
+                continue
+            table_dir = os.path.join(self.log_dir, name)
+            chunk = f"{self.run_id}.{self.chunks[name]:05d}"
+            tmp_dir = os.path.join(table_dir, '.' + chunk)
+            os.makedirs(tmp_dir, exist_ok=True)
+            rows = self.buffers[name][:n]
+            for column in rows.dtype.names:
+                np.save(os.path.join(tmp_dir, column + '.npy'), np.ascontiguousarray(rows[column]))
+            os.replace(tmp_dir, os.path.join(table_dir, chunk))
+            self.chunks[name] += 1
+            self.counts[name] = 0
+            self.rows_written += n
+
+
+class TelemetryParser:
+    """Incremental line parser: bytes in, typed rows out (no regular expressions)"""
+
+    def __init__(self, store: ColumnStore, clock=None, line_period: Optional[float] = None):
+        """
+        Initialize parser
+
+        Args:
+            store: ColumnStore receiving the rows
+            clock: Object providing time() (default: time module)
+            line_period: Give successive lines synthetic times this far apart
+                         (replaying captures without timestamps)
+        """
+        self.store = store
+        self.clock = clock if clock is not None else time
+        self.line_period = line_period
+        self.next_time = 0.0
+        self.pending = b''
+        self.lines = 0
+        self.records = 0
+        self.malformed = 0
+
+    def feed(self, data: bytes) -> int:
+        """
+        Parse a block of received bytes (may end mid-line)
+
+        Returns:
+            Number of rows stored
+        """
+        data = self.pending + data
+        lines = data.split(b'\n')
+        self.pending = lines.pop()
+        now = self.clock.time()
+        stored = 0
+        for line in lines:
+            if self.line_period is not None:
+                now = self.next_time
+                self.next_time += self.line_period
+            stored += self.parse_line(line, now)
+        self.lines += len(lines)
+        self.records += stored
+        return stored
+
+    def parse_line(self, line: bytes, t: float) -> int:
+        """Parse one line; returns 1 if a row was stored"""
+        line = line.strip()
+        if not line:
+            return 0
+        store = self.store
+        stage = STAGE_LINES.get(line[:3])
+        try:
+            if stage is not None:
+                table, count, convert = stage
+                fields = line[3:].split()
+                if len(fields) != count:
+                    self.malformed += 1
+                    return 0
+                store.append(table, (t,) + tuple(convert(f.partition(b'=')[2]) for f in fields))
+                return 1
+            if line.startswith(b'STATE,'):
+                parts = line.split(b',')
+                if len(parts) != 6:
+                    self.malformed += 1
+                    return 0
+                store.append('ultra', (t, int(parts[1]), int(parts[3]), int(parts[5])))
+                return 1
+        except ValueError:
+            self.malformed += 1
+            return 0
+        for prefix, code in EVENTS.items():
+            if line.startswith(prefix):
+                store.append('events', (t, code))
+                return 1
+        return 0
+
+
+class TelemetryService:
+    """Reads a serial port, parses telemetry and flushes it periodically"""
+
+    def __init__(self, port: str, baudrate: int = 115200, log_dir: str = 'telemetry',
+                 run_id: Optional[str] = None, chunk_rows: int = 4096,
+                 flush_interval: float = 5.0):
+        """
+        Initialize service
+
+        Args:
+            port: Serial port of the AutoParking / ultrasonic board
+            baudrate: Both sketches use 115200
+            log_dir: Telemetry log directory
+            run_id: Run identifier (generated if omitted)
+            chunk_rows: Rows per chunk
+            flush_interval: Seconds between flushes of partially filled chunks
+        """
+        import serial
+
+        self.serial = serial.Serial(port, baudrate, timeout=0.1)
+        self.store = ColumnStore(log_dir, run_id, chunk_rows)
+        self.parser = TelemetryParser(self.store)
+        self.flush_interval = flush_interval
+        self.running = False
+
+    def run(self, duration: Optional[float] = None):
+        """Read until stop(), Ctrl+C or duration elapses"""
+        print(f"Logging telemetry from {self.serial.port} to "
+              f"{self.store.log_dir} (run {self.store.run_id})")
+        self.running = True
+        start = last_flush = time.time()
+        try:
+            while self.running:
+                data = self.serial.read(self.serial.in_waiting or 1)
+                if data:
+                    self.parser.feed(data)
+                now = time.time()
+                if now - last_flush >= self.flush_interval:
+                    self.store.flush()
+                    last_flush = now
+                    print(f"\r{self.parser.lines} lines, {self.parser.records} samples, "
+                          f"{self.parser.malformed} malformed", end='', flush=True)
+                if duration is not None and now - start >= duration:
+                    break
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.store.flush()
+            self.serial.close()
+            print(f"\nStopped: {self.parser.records} samples in run {self.store.run_id}")
+
+    def stop(self):
+        self.running = False
+
+
+def replay(path: str, log_dir: str = 'telemetry', rate: float = 10.0,
+           run_id: Optional[str] = None) -> TelemetryParser:
+    """
+    Parse a captured serial text log
+
+    Args:
+        path: Text capture (e.g. saved Serial Monitor output)
+        log_dir: Telemetry log directory
+        rate: Assumed line rate in Hz (captures have no timestamps)
+        run_id: Run identifier (default: file name)
+    """
+    run_id = run_id or os.path.splitext(os.path.basename(path))[0]
+    store = ColumnStore(log_dir, run_id)
+    parser = TelemetryParser(store, line_period=1.0 / rate)
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 16), b''):
+            parser.feed(block)
+    parser.feed(b'\n')
+    store.flush()
+    return parser
+
+
+def load_table(log_dir: str, table: str, columns: Optional[List[str]] = None,
+               mmap: bool = True) -> Dict[str, Dict[str, np.ndarray]]:
+    """
+    Load one table, grouped by run
+
+    Args:
+        log_dir: Telemetry log directory
+        table: Table name (see TABLES)
+        columns: Columns to load (default: all)
+        mmap: Memory-map the chunk files instead of reading them
+
+    Returns:
+        {run_id: {column: array}} with chunks concatenated in order
+    """
+    table_dir = os.path.join(log_dir, table)
+    if not os.path.isdir(table_dir):
+        return {}
+    columns = columns or [name for name, _ in TABLES[table]]
+    chunks: Dict[str, List[str]] = {}
+    for name in sorted(os.listdir(table_dir)):
+        if name.startswith('.'):
+            continue  # Chunk still being written
+        run_id = name.rsplit('.', 1)[0]
+        chunks.setdefault(run_id, []).append(os.path.join(table_dir, name))
+
+    runs = {}
+    mode = 'r' if mmap else None
+    for run_id, paths in chunks.items():
+        parts = {column: [np.load(os.path.join(p, column + '.npy'), mmap_mode=mode)
+                          for p in paths] for column in columns}
+        runs[run_id] = {column: arrays[0] if len(arrays) == 1 else np.concatenate(arrays)
+                        for column, arrays in parts.items()}
+    return runs
+
+
+def _synthetic_capture(lines: int) -> bytes:
+    """Mixed AutoParking/ultrasonic output for benchmarking"""
+    rng = np.random.default_rng(0)
+    templates = []
+    for i in range(1000):
+        uf, ur = rng.uniform(5, 120, 2)
+        templates.append(rng.choice([
+            f"S1| L={rng.integers(0, 1023)} R={rng.integers(0, 1023)} Sum=900 Diff=12 Lock={i % 10}",
+            f"S2| UF={uf:.2f} UR={ur:.2f}",
+            f"S3| UF={uf:.2f} UR={ur:.2f} Delta={uf - ur:.2f}",
+            f"S4| AvgDist={(uf + ur) / 2:.2f} Error={(uf + ur) / 2 - 8:.2f}",
+            f"STATE,{i % 5}, UL,{int(uf)}, UR,{int(ur)}"
+        ]))
+    templates.append("!!! EMERGENCY STOP !!! Distance < 6cm")
+    return ('\r\n'.join(templates[i % len(templates)] for i in range(lines)) + '\r\n').encode()
+
+
+# Test function
+if __name__ == "__main__":
+    import argparse
+    import tempfile
+
+    parser = argparse.ArgumentParser(description="Serial telemetry logger")
+    parser.add_argument('--port', default=None, help="serial port to log")
+    parser.add_argument('--baud', type=int, default=115200)
+    parser.add_argument('--log-dir', default='telemetry')
+    parser.add_argument('--duration', type=float, default=None, help="seconds to log")
+    parser.add_argument('--replay', default=None, help="parse a captured text log")
+    parser.add_argument('--rate', type=float, default=10.0, help="line rate of --replay (Hz)")
+    parser.add_argument('--bench', type=int, default=None, metavar='LINES',
+                        help="measure parse + store throughput")
+    args = parser.parse_args()
+
+    if args.bench:
+        data = _synthetic_capture(args.bench)
+        with tempfile.TemporaryDirectory() as tmp:
+            store = ColumnStore(tmp, 'bench', chunk_rows=65536)
+            telemetry = TelemetryParser(store)
+            start = time.perf_counter()
+            for i in range(0, len(data), 4096):  # Serial-sized reads
+                telemetry.feed(data[i:i + 4096])
+            store.flush()
+            elapsed = time.perf_counter() - start
+        print(f"{telemetry.lines} lines in {elapsed:.2f}s: {telemetry.lines / elapsed:,.0f} lines/s "
+              f"({len(data) / elapsed / 1e6:.1f} MB/s), {telemetry.malformed} malformed")
+    elif args.replay:
+        telemetry = replay(args.replay, args.log_dir, args.rate)
+        print(f"{telemetry.lines} lines, {telemetry.records} samples, "
+              f"{telemetry.malformed} malformed -> {args.log_dir}")
+    elif args.port:
+        TelemetryService(args.port, args.baud, args.log_dir).run(args.duration)
+    else:
+        parser.print_help()
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Telemetry Report Tool
+Run-level statistics from the chunked log written by telemetry.py:
+stage timing, light lock time, distance profiles, emergency stops and
+ultrasonic state times. Chunks are memory-mapped and every statistic is
+computed with NumPy array operations, so hours of logs load quickly.
+
+Usage:
+    python3 telemetry_report.py [log_dir] [--runs ID ...] [--bins 10]
+"""
+
+import sys
+import argparse
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from telemetry import load_table, ULTRA_STATES, EMERGENCY_STOP, LIGHT_LOCKED, PARKED
+
+
+def _first(t: Optional[np.ndarray]) -> Optional[float]:
+    return float(t[0]) if t is not None and len(t) else None
+
+
+def parking_stats(tables: Dict[str, Dict], run_id: str) -> Optional[Dict]:
+    """Stage entry times, lock/park times and distance summary of one AutoParking run"""
+    runs = {name: table.get(run_id) for name, table in tables.items()}
+    starts = [_first(runs[name]['t']) for name in ('s1', 's2', 's3', 's4', 'events')
+              if runs.get(name) is not None]
+    starts = [s for s in starts if s is not None]
+    if not starts:
+        return None
+    start = min(starts)
+
+    stats = {'start': start}
+    for stage in ('s2', 's3', 's4'):
+        first = _first(runs[stage]['t']) if runs.get(stage) is not None else None
+        stats[f'{stage}_entry'] = first - start if first is not None else None
+
+    events = runs.get('events')
+    codes = events['code'] if events is not None else np.empty(0, np.int8)
+    times = events['t'] if events is not None else np.empty(0)
+    stats['emergency_stops'] = int(np.count_nonzero(codes == EMERGENCY_STOP))
+    locked = times[codes == LIGHT_LOCKED]
+    parked = times[codes == PARKED]
+    stats['lock_time'] = float(locked[0] - start) if len(locked) else None
+    stats['park_time'] = float(parked[0] - start) if len(parked) else None
+
+    # Distance profile from both ultrasonic sensors in S2/S3
+    t_parts, d_parts = [], []
+    for stage in ('s2', 's3'):
+        if runs.get(stage) is not None:
+            t_parts.append(runs[stage]['t'])
+            d_parts.append((runs[stage]['uf'] + runs[stage]['ur']) / 2)
+    if runs.get('s4') is not None:
+        t_parts.append(runs['s4']['t'])
+        d_parts.append(runs['s4']['avg_dist'])
+        stats['final_distance'] = float(runs['s4']['avg_dist'][-1]) \
+            if len(runs['s4']['avg_dist']) else None
+    if t_parts:
+        t = np.concatenate(t_parts) - start
+        d = np.concatenate(d_parts).astype(np.float64)
+        valid = np.isfinite(d) & (d < 400)  # 999 = no echo
+        stats['profile'] = (t[valid], d[valid])
+        stats['min_distance'] = float(d[valid].min()) if valid.any() else None
+    return stats
+
+
+def distance_profile(t: np.ndarray, d: np.ndarray, bins: int) -> np.ndarray:
+    """Mean distance in equal time bins (NaN for empty bins)"""
+    if len(t) == 0:
+        return np.full(bins, np.nan)
+    edges = np.linspace(0, max(t.max(), 1e-9), bins + 1)
+    index = np.clip(np.searchsorted(edges, t, side='right') - 1, 0, bins - 1)
+    sums = np.bincount(index, weights=d, minlength=bins)
+    counts = np.bincount(index, minlength=bins)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return sums / counts
+
+
+def ultra_stats(run: Dict[str, np.ndarray]) -> Dict:
+    """Time per state, FAIL entries and closest readings of one ultrasonicv2 run"""
+    t, state = run['t'], run['state'].astype(np.int64)
+    dt = np.diff(t, append=t[-1]) if len(t) else np.empty(0)
+    seconds = np.bincount(state, weights=dt, minlength=len(ULTRA_STATES))
+    entered = np.flatnonzero(np.diff(state, prepend=-1) != 0)
+    fail = ULTRA_STATES.index('FAIL')
+    ul, ur = run['ul'], run['ur']
+    return {
+        'duration': float(t[-1] - t[0]) if len(t) else 0.0,
+        'state_seconds': {name: float(seconds[i]) for i, name in enumerate(ULTRA_STATES)},
+        'fail_entries': int(np.count_nonzero(state[entered] == fail)),
+        'min_ul': int(ul[ul > 0].min()) if (ul > 0).any() else None,
+        'min_ur': int(ur[ur > 0].min()) if (ur > 0).any() else None
+    }
+
+
+def _fmt(value, spec='.1f', none='-'):
+    return format(value, spec) if value is not None else none
+
+
+def print_parking(tables: Dict[str, Dict], run_ids: List[str], bins: int):
+    """One line per AutoParking run plus its distance profile"""
+    print(f"{'run':28s} {'lock':>6s} {'S2':>6s} {'S3':>6s} {'S4':>6s} {'park':>6s} "
+          f"{'estop':>5s} {'min cm':>6s} {'final':>6s}")
+    for run_id in run_ids:
+        stats = parking_stats(tables, run_id)
+        if stats is None:
+            continue
+        print(f"{run_id[:28]:28s} {_fmt(stats['lock_time']):>6s} "
+              f"{_fmt(stats['s2_entry']):>6s} {_fmt(stats['s3_entry']):>6s} "
+              f"{_fmt(stats['s4_entry']):>6s} {_fmt(stats['park_time']):>6s} "
+              f"{stats['emergency_stops']:5d} {_fmt(stats.get('min_distance')):>6s} "
+              f"{_fmt(stats.get('final_distance')):>6s}")
+        if 'profile' in stats:
+            profile = distance_profile(*stats['profile'], bins)
+            cells = ' '.join(f"{v:5.1f}" if np.isfinite(v) else '    -' for v in profile)
+            print(f"  distance profile (cm): {cells}")
+
+
+def print_ultra(ultra: Dict[str, Dict], run_ids: List[str]):
+    """One line per ultrasonicv2 run"""
+    print(f"\n{'run':28s} {'secs':>6s} " + ' '.join(f"{s:>10s}" for s in ULTRA_STATES)
+          + f" {'fails':>5s} {'minUL':>5s} {'minUR':>5s}")
+    for run_id in run_ids:
+        stats = ultra_stats(ultra[run_id])
+        states = ' '.join(f"{stats['state_seconds'][s]:10.1f}" for s in ULTRA_STATES)
+        print(f"{run_id[:28]:28s} {stats['duration']:6.1f} {states} {stats['fail_entries']:5d} "
+              f"{_fmt(stats['min_ul'], 'd'):>5s} {_fmt(stats['min_ur'], 'd'):>5s}")
+
+
+def main():
+    """Main entry point"""
+    parser = argparse.ArgumentParser(description="Telemetry run statistics")
+    parser.add_argument('log_dir', nargs='?', default='telemetry', help="telemetry log directory")
+    parser.add_argument('--runs', nargs='*', default=None, help="only these run ids")
+    parser.add_argument('--bins', type=int, default=10, help="distance profile bins")
+    args = parser.parse_args()
+
+    tables = {name: load_table(args.log_dir, name) for name in ('s1', 's2', 's3', 's4', 'events')}
+    ultra = load_table(args.log_dir, 'ultra')
+
+    parking_runs = sorted(set().union(*[set(t) for t in tables.values()]))
+    ultra_runs = sorted(ultra)
+    if args.runs:
+        parking_runs = [r for r in parking_runs if r in args.runs]
+        ultra_runs = [r for r in ultra_runs if r in args.runs]
+    if not parking_runs and not ultra_runs:
+        print(f"No telemetry found in {args.log_dir}")
+        return 1
+
+    print(f"=== Telemetry Report: {args.log_dir} ===\n")
+    if parking_runs:
+        print("AutoParking (seconds since first sample)")
+        print_parking(tables, parking_runs, args.bins)
+    if ultra_runs:
+        print_ultra(ultra, ultra_runs)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
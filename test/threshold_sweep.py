@@ -0,0 +1,415 @@
+#!/usr/bin/env python3
+"""
+HSV Threshold Sweep
+Offline tuning of the detector thresholds (color_ranges, min/max area,
+morphology kernel) against a folder of annotated frames. Frames are decoded,
+blurred and converted to HSV once into a memory-mapped cache shared by all
+worker processes, so each parameter set only costs the thresholding step.
+
+Dataset folder: frames (*.png / *.jpg) plus annotations.json:
+    {"frame_0001.png": {"blocks":  [{"color": "red",   "bbox": [x, y, w, h]}],
+                        "regions": [{"color": "green", "bbox": [x, y, w, h]}]}}
+
+Usage:
+    python3 threshold_sweep.py --make-sim-dataset data/sim --frames 200
+    python3 threshold_sweep.py data/sim --mode block --search random --samples 300
+    python3 threshold_sweep.py data/sim --mode region --out region_best.json
+"""
+
+import os
+import json
+import time
+import hashlib
+import itertools
+from multiprocessing import Pool
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from camera_source import IMAGE_EXTENSIONS
+from buffer_pool import BufferPool, color_mask
+
+
+ANNOTATION_FILE = 'annotations.json'
+
+# Best parameter files loaded by main.py when present
+BLOCK_PARAMS_FILE = 'block_best.json'
+REGION_PARAMS_FILE = 'region_best.json'
+
+# Search space; hue_pad widens (+) or narrows (-) every hue range, s_shift and
+# v_shift move each color's own saturation/value lower bound
+SEARCH_SPACE = {
+    'block': {
+        's_shift': [-60, -30, 0, 30],
+        'v_shift': [-40, 0, 40],
+        'hue_pad': [-3, 0, 3, 6],
+        'kernel': [3, 5, 7],
+        'min_area': [100, 200, 500, 800],
+        'max_area': [4000, 8000, 15000]
+    },
+    'region': {
+        's_shift': [-50, -20, 0, 30],
+        'v_shift': [-50, 0, 40],
+        'hue_pad': [-3, 0, 3, 6],
+        'kernel': [3, 5, 7],
+        'min_area': [1000, 3000, 6000]
+    }
+}
+
+# Current detector settings, the starting point of every sweep
+BASELINE = {
+    'block': {'s_shift': 0, 'v_shift': 0, 'hue_pad': 0, 'kernel': 5,
+              'min_area': 500, 'max_area': 8000},
+    'region': {'s_shift': 0, 'v_shift': 0, 'hue_pad': 0, 'kernel': 5, 'min_area': 3000}
+}
+
+IOU_THRESHOLD = 0.3
+
+
+def base_bounds(mode: str) -> Dict[str, List[Tuple[int, int, int, int]]]:
+    """(hue low, hue high, saturation low, value low) per range of the current detector"""
+    if mode == 'block':
+        from color_detector import SmallBlockDetector
+        ranges = SmallBlockDetector().color_ranges
+    else:
+        from vision_servo import VisualServo
+        ranges = VisualServo().color_ranges
+    return {color: [(int(lo[0]), int(hi[0]), int(lo[1]), int(lo[2])) for lo, hi in bounds]
+            for color, bounds in ranges.items()}
+
+
+def make_ranges(params: Dict,
+                bounds: Dict[str, List[Tuple[int, int, int, int]]]) -> Dict[str, List]:
+    """HSV (lower, upper) bounds per color for a parameter set (zero shifts = current)"""
+    pad = params['hue_pad']
+    ranges = {}
+    for color, intervals in bounds.items():
+        ranges[color] = [
+            (np.array([lo if lo == 0 else max(0, lo - pad),
+                       min(max(s_lo + params['s_shift'], 0), 255),
+                       min(max(v_lo + params['v_shift'], 0), 255)]),
+             np.array([hi if hi == 180 else min(180, hi + pad), 255, 255]))
+            for lo, hi, s_lo, v_lo in intervals]
+    return ranges
+
+
+def apply_params(detector, result: Dict):
+    """
+    Apply a sweep result (or the JSON written by --out) to a detector
+
+    Args:
+        detector: color_detector.SmallBlockDetector or vision_servo.VisualServo
+        result: {'mode', 'params', 'color_ranges'}
+    """
+    params = result['params']
+    detector.color_ranges.update({
+        color: [(np.array(lo), np.array(hi)) for lo, hi in bounds]
+        for color, bounds in result['color_ranges'].items()})
+    detector.kernel = np.ones((params['kernel'], params['kernel']), np.uint8)
+    if result['mode'] == 'block':
+        detector.min_area = params['min_area']
+        detector.max_area = params['max_area']
+    else:
+        detector.min_area_threshold = params['min_area']
+
+
+# ---- Dataset and cache ---------------------------------------------------
+
+def load_dataset(folder: str) -> Tuple[List[str], List[Dict]]:
+    """Frame paths and their annotations (frames without an entry have no objects)"""
+    with open(os.path.join(folder, ANNOTATION_FILE)) as f:
+        annotations = json.load(f)
+    names = sorted(n for n in os.listdir(folder) if n.lower().endswith(IMAGE_EXTENSIONS))
+    if not names:
+        raise ValueError(f"No frames in {folder}")
+    return ([os.path.join(folder, n) for n in names],
+            [annotations.get(n, {}) for n in names])
+
+
+def build_cache(paths: List[str], cache_dir: str = '.cache') -> str:
+    """
+    Decode, blur and HSV-convert every frame once into a .npy file
+
+    The file is keyed by the frame names, sizes and modification times and
+    reused by later sweeps over the same dataset.
+
+    Returns:
+        Path of the (N, H, W, 3) uint8 HSV cache
+    """
+    digest = hashlib.sha1()
+    for path in paths:
+        stat = os.stat(path)
+        digest.update(f"{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+    cache_path = os.path.join(cache_dir, f"sweep-hsv-{digest.hexdigest()[:16]}.npy")
+    if os.path.exists(cache_path):
+        return cache_path
+
+    os.makedirs(cache_dir, exist_ok=True)
+    first = cv2.imread(paths[0])
+    tmp_path = cache_path + '.tmp'
+    cache = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=np.uint8,
+                                      shape=(len(paths),) + first.shape)
+    blurred = np.empty_like(first)
+    for i, path in enumerate(paths):
+        frame = first if i == 0 else cv2.imread(path)
+        if frame is None or frame.shape != first.shape:
+            raise ValueError(f"{path}: unreadable or not {first.shape[1]}x{first.shape[0]}")
+        cv2.GaussianBlur(frame, (5, 5), 0, dst=blurred)
+        cv2.cvtColor(blurred, cv2.COLOR_BGR2HSV, dst=cache[i])
+    cache.flush()
+    del cache
+    os.replace(tmp_path, cache_path)
+    return cache_path
+
+
+# ---- Evaluation ----------------------------------------------------------
+
+def _iou(a, b) -> float:
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    w = min(ax + aw, bx + bw) - max(ax, bx)
+    h = min(ay + ah, by + bh) - max(ay, by)
+    if w <= 0 or h <= 0:
+        return 0.0
+    inter = w * h
+    return inter / (aw * ah + bw * bh - inter)
+
+
+def detect(hsv: np.ndarray, ranges: Dict, kernel: np.ndarray, params: Dict,
+           mode: str, pool: BufferPool) -> List[Tuple[str, tuple]]:
+    """Thresholding step of the detectors: (color, bbox) detections"""
+    detections = []
+    for color, bounds in ranges.items():
+        mask = color_mask(hsv, bounds, kernel, pool)
+        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        if mode == 'block':
+            for contour in contours:
+                if params['min_area'] <= cv2.contourArea(contour) <= params['max_area']:
+                    detections.append((color, cv2.boundingRect(contour)))
+        elif contours:
+            largest = max(contours, key=cv2.contourArea)
+            if cv2.contourArea(largest) >= params['min_area']:
+                detections.append((color, cv2.boundingRect(largest)))
+    return detections
+
+
+def score_frame(detections, truth: List[Dict], min_truth_area: int) -> Tuple[int, int, int]:
+    """
+    Greedy IoU matching per color
+
+    Ground-truth objects smaller than min_truth_area are "don't care": they
+    neither count as misses nor make a detection on them a false positive.
+
+    Returns:
+        (true positives, false positives, false negatives)
+    """
+    tp = fp = 0
+    matched = set()
+    for color, bbox in detections:
+        best, best_iou = None, IOU_THRESHOLD
+        for i, obj in enumerate(truth):
+            if i in matched or obj['color'] != color:
+                continue
+            iou = _iou(bbox, obj['bbox'])
+            if iou >= best_iou:
+                best, best_iou = i, iou
+        if best is None:
+            fp += 1
+        else:
+            matched.add(best)
+            if truth[best]['bbox'][2] * truth[best]['bbox'][3] >= min_truth_area:
+                tp += 1
+    fn = sum(1 for i, obj in enumerate(truth)
+             if i not in matched and obj['bbox'][2] * obj['bbox'][3] >= min_truth_area)
+    return tp, fp, fn
+
+
+_worker: Dict = {}
+
+
+def _init_worker(cache_path: str, truths: List[List[Dict]], mode: str,
+                 bounds: Dict, min_truth_area: int):
+    """Open the shared HSV cache once per worker process"""
+    hsv = np.load(cache_path, mmap_mode='r')
+    _worker.update(hsv=hsv, truths=truths, mode=mode, bounds=bounds,
+                   min_truth_area=min_truth_area, pool=BufferPool())
+
+
+def evaluate(params: Dict) -> Dict:
+    """Score one parameter set over the whole cached dataset"""
+    hsv, truths, mode = _worker['hsv'], _worker['truths'], _worker['mode']
+    ranges = make_ranges(params, _worker['bounds'])
+    kernel = np.ones((params['kernel'], params['kernel']), np.uint8)
+    tp = fp = fn = 0
+    elapsed = 0.0
+    for i, truth in enumerate(truths):
+        start = time.perf_counter()
+        detections = detect(hsv[i], ranges, kernel, params, mode, _worker['pool'])
+        elapsed += time.perf_counter() - start
+        t, f, n = score_frame(detections, truth, _worker['min_truth_area'])
+        tp, fp, fn = tp + t, fp + f, fn + n
+    precision = tp / (tp + fp) if tp + fp else 0.0
+    recall = tp / (tp + fn) if tp + fn else 0.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return {'params': params, 'precision': precision, 'recall': recall, 'f1': f1,
+            'tp': tp, 'fp': fp, 'fn': fn, 'ms_per_frame': elapsed / len(truths) * 1000}
+
+
+def candidates(mode: str, search: str = 'grid', samples: int = 200,
+               seed: int = 0) -> List[Dict]:
+    """Parameter sets to evaluate (the baseline is always included first)"""
+    space = SEARCH_SPACE[mode]
+    keys = list(space)
+    if search == 'grid':
+        sets = [dict(zip(keys, values)) for values in itertools.product(*space.values())]
+    else:
+        rng = np.random.default_rng(seed)
+        sets = [{k: space[k][rng.integers(len(space[k]))] for k in keys}
+                for _ in range(samples)]
+    unique = [BASELINE[mode]]
+    seen = {tuple(sorted(BASELINE[mode].items()))}
+    for params in sets:
+        params = {k: int(v) for k, v in params.items()}
+        key = tuple(sorted(params.items()))
+        if key not in seen:
+            seen.add(key)
+            unique.append(params)
+    return unique
+
+
+def sweep(folder: str, mode: str = 'block', search: str = 'grid', samples: int = 200,
+          jobs: Optional[int] = None, cache_dir: str = '.cache', min_truth_area: int = 150,
+          seed: int = 0) -> List[Dict]:
+    """
+    Evaluate many threshold sets on an annotated dataset
+
+    Args:
+        folder: Dataset folder (frames + annotations.json)
+        mode: 'block' (SmallBlockDetector) or 'region' (VisualServo)
+        search: 'grid' or 'random'
+        samples: Parameter sets drawn by random search
+        jobs: Worker processes (default: all cores)
+        cache_dir: Where the decoded HSV cache is kept
+        min_truth_area: Smaller annotations are ignored (bbox pixels)
+        seed: Random search seed
+
+    Returns:
+        Results sorted best first (F1, then per-frame cost)
+    """
+    paths, annotations = load_dataset(folder)
+    key = 'blocks' if mode == 'block' else 'regions'
+    truths = [a.get(key, []) for a in annotations]
+    cache_path = build_cache(paths, cache_dir)
+    params = candidates(mode, search, samples, seed)
+    init_args = (cache_path, truths, mode, base_bounds(mode), min_truth_area)
+
+    if jobs == 1:
+        _init_worker(*init_args)
+        results = [evaluate(p) for p in params]
+    else:
+        with Pool(jobs, initializer=_init_worker, initargs=init_args) as pool:
+            results = pool.map(evaluate, params, chunksize=max(1, len(params) // 64))
+    baseline = results[0]
+    for result in results:
+        result['baseline'] = result is baseline
+    return sorted(results, key=lambda r: (-r['f1'], r['ms_per_frame']))
+
+
+def write_best(result: Dict, mode: str, path: str):
+    """Write the best parameter set with its color ranges and scores"""
+    ranges = make_ranges(result['params'], base_bounds(mode))
+    data = {
+        'mode': mode,
+        'params': result['params'],
+        'color_ranges': {color: [[lo.tolist(), hi.tolist()] for lo, hi in bounds]
+                         for color, bounds in ranges.items()},
+        'precision': result['precision'],
+        'recall': result['recall'],
+        'f1': result['f1'],
+        'ms_per_frame': result['ms_per_frame']
+    }
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=2)
+
+
+def make_sim_dataset(out_dir: str, frames: int = 200, seed: int = 0):
+    """Render annotated frames from random simulator arenas and poses"""
+    import math
+    from simulator import Arena, SimulatedRobot, SimulatedCamera, VirtualClock
+
+    os.makedirs(out_dir, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    annotations = {}
+    for i in range(frames):
+        arena = Arena.random(rng)
+        if i % 2 == 0:
+            # Look toward the START mat from a short distance
+            sx, sy = arena.mat('green')['center']
+            angle = rng.uniform(-math.pi, math.pi)
+            dist = rng.uniform(0.35, 0.9)
+            x = float(np.clip(sx + dist * math.cos(angle), 0.15, arena.width - 0.15))
+            y = float(np.clip(sy + dist * math.sin(angle), 0.15, arena.height - 0.15))
+            yaw = math.degrees(math.atan2(sy - y, sx - x)) + rng.uniform(-25, 25)
+        else:
+            x, y = rng.uniform(0.3, arena.width - 0.3), rng.uniform(0.3, arena.height - 0.3)
+            yaw = rng.uniform(-180, 180)
+        robot = SimulatedRobot(arena, VirtualClock(), pose=(x, y, yaw))
+        camera = SimulatedCamera(robot, noise_sigma=rng.uniform(0, 6), seed=i)
+        name = f"frame_{i:05d}.png"
+        cv2.imwrite(os.path.join(out_dir, name), camera.render())
+        annotations[name] = camera.ground_truth()
+    with open(os.path.join(out_dir, ANNOTATION_FILE), 'w') as f:
+        json.dump(annotations, f, indent=1)
+
+
+def main():
+    """Main entry point"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Parallel HSV threshold sweep")
+    parser.add_argument('folder', nargs='?', help="annotated dataset folder")
+    parser.add_argument('--mode', choices=['block', 'region'], default='block')
+    parser.add_argument('--search', choices=['grid', 'random'], default='grid')
+    parser.add_argument('--samples', type=int, default=200, help="random search size")
+    parser.add_argument('--jobs', type=int, default=None, help="worker processes")
+    parser.add_argument('--min-truth-area', type=int, default=150,
+                        help="ignore annotations smaller than this (bbox pixels)")
+    parser.add_argument('--out', default=None, help="best parameter JSON (default: the file main.py loads)")
+    parser.add_argument('--top', type=int, default=10, help="results to print")
+    parser.add_argument('--make-sim-dataset', default=None, metavar='DIR',
+                        help="render an annotated dataset from the simulator")
+    parser.add_argument('--frames', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    if args.make_sim_dataset:
+        make_sim_dataset(args.make_sim_dataset, args.frames, args.seed)
+        print(f"Wrote {args.frames} annotated frames to {args.make_sim_dataset}")
+        return 0
+    if not args.folder:
+        parser.print_help()
+        return 1
+
+    start = time.time()
+    results = sweep(args.folder, args.mode, args.search, args.samples, args.jobs,
+                    min_truth_area=args.min_truth_area, seed=args.seed)
+    print(f"=== Threshold Sweep ({args.mode}): {len(results)} parameter sets "
+          f"in {time.time() - start:.1f}s ===\n")
+    keys = list(SEARCH_SPACE[args.mode])
+    print(' '.join(f"{k:>8s}" for k in keys) + f" {'prec':>6s} {'recall':>6s} {'F1':>6s} {'ms/frm':>6s}")
+    shown = results[:args.top] + [r for r in results[args.top:] if r['baseline']]
+    for result in shown:
+        line = ' '.join(f"{result['params'][k]:8d}" for k in keys)
+        line += (f" {result['precision']:6.3f} {result['recall']:6.3f} {result['f1']:6.3f} "
+                 f"{result['ms_per_frame']:6.2f}")
+        print(line + ('  <-- current' if result['baseline'] else ''))
+
+    out = args.out or (BLOCK_PARAMS_FILE if args.mode == 'block' else REGION_PARAMS_FILE)
+    write_best(results[0], args.mode, out)
+    print(f"\nBest parameters written to {out}")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+"""
+Tiled Segmentation
+Runs the detector segmentation (blur, color conversion, thresholding,
+morphology) on horizontal strips in a thread pool. OpenCV and NumPy release
+the GIL, so the strips run on separate cores without multiprocessing.
+
+Each strip is processed with a halo of extra rows above and below, as wide
+as the blur and open/close reach, so its core rows are bit-identical to the
+full-frame result. External contours are traced per strip as well. Blobs
+that do not touch an inner strip border are final as traced. Blobs cut by a
+border are merged with union-find, by matching the runs of mask pixels on
+the two border rows (8-connectivity), and are retraced once in their merged
+bounding box. The resulting contours are the ones the serial findContours
+finds, except that a blob inside the hole of a larger blob spanning several
+strips is reported as well.
+
+Benchmark (scaling over thread counts, and a check that tiled detections
+match the serial ones):
+    python3 tiled.py --size 1280x720 --threads 1 2 3 4
+    python3 tiled.py --source v4l2:///dev/video0?fourcc=MJPG --size 1920x1080
+"""
+
+import copy
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from buffer_pool import BufferPool
+
+
+def halo_rows(kernel: np.ndarray) -> int:
+    """Rows a strip core depends on beyond its edges: 5x5 blur, then open + close"""
+    reach = kernel.shape[0] // 2 if kernel is not None else 0
+    return 2 + 4 * reach
+
+
+def _runs(row: np.ndarray) -> np.ndarray:
+    """(start, end) columns of the nonzero runs of a mask row (end inclusive)"""
+    edges = np.diff(np.concatenate(([0], (row > 0).view(np.int8), [0])))
+    return np.stack([np.flatnonzero(edges == 1), np.flatnonzero(edges == -1) - 1], axis=1)
+
+
+def _owner(x: int, y: int, candidates: List[int], contours: List, rects: List) -> Optional[int]:
+    """Which candidate contour the mask pixel (x, y) belongs to"""
+    inside = [i for i in candidates if rects[i][0] <= x < rects[i][0] + rects[i][2]]
+    if len(inside) > 1:
+        inside = [i for i in inside
+                  if cv2.pointPolygonTest(contours[i], (float(x), float(y)), False) >= 0]
+    return inside[0] if inside else None
+
+
+def merge_strips(strip_contours: List[List], bounds: np.ndarray,
+                 mask: np.ndarray) -> List[Dict]:
+    """
+    Merge per-strip contours into frame components
+
+    Args:
+        strip_contours: External contours of each strip core (frame coordinates)
+        bounds: Strip row boundaries (len = strips + 1)
+        mask: Assembled full-frame mask
+
+    Returns:
+        [{'bbox': (x, y, w, h), 'area', 'contour'}, ...]; 'contour' is None for
+        components merged across strips (area is then the sum of the parts)
+    """
+    contours, rects, strip_of = [], [], []
+    for k, found in enumerate(strip_contours):
+        contours.extend(found)
+        rects.extend(cv2.boundingRect(c) for c in found)
+        strip_of.extend([k] * len(found))
+    if not contours:
+        return []
+
+    parent = list(range(len(contours)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for k in range(1, len(bounds) - 1):
+        row = bounds[k]  # First row of strip k; row - 1 is the last row of strip k - 1
+        above = [i for i, r in enumerate(rects)
+                 if strip_of[i] == k - 1 and r[1] + r[3] == row]
+        below = [i for i, r in enumerate(rects) if strip_of[i] == k and r[1] == row]
+        if not above or not below:
+            continue
+        runs_a, runs_b = _runs(mask[row - 1]), _runs(mask[row])
+        owners_a = [_owner(x0, row - 1, above, contours, rects) for x0, _ in runs_a]
+        owners_b = [_owner(x0, row, below, contours, rects) for x0, _ in runs_b]
+        for (a0, a1), oa in zip(runs_a, owners_a):
+            for (b0, b1), ob in zip(runs_b, owners_b):
+                if oa is not None and ob is not None and a0 <= b1 + 1 and b0 <= a1 + 1:
+                    ra, rb = find(oa), find(ob)
+                    if ra != rb:
+                        parent[max(ra, rb)] = min(ra, rb)
+
+    groups: Dict[int, List[int]] = {}
+    for i in range(len(contours)):
+        groups.setdefault(find(i), []).append(i)
+
+    components = []
+    for members in groups.values():
+        if len(members) == 1:
+            i = members[0]
+            components.append({'bbox': rects[i], 'area': cv2.contourArea(contours[i]),
+                               'contour': contours[i]})
+            continue
+        x0 = min(rects[i][0] for i in members)
+        y0 = min(rects[i][1] for i in members)
+        x1 = max(rects[i][0] + rects[i][2] for i in members)
+        y1 = max(rects[i][1] + rects[i][3] for i in members)
+        components.append({'bbox': (x0, y0, x1 - x0, y1 - y0),
+                           'area': sum(cv2.contourArea(contours[i]) for i in members),
+                           'contour': None})
+    return components
+
+
+def component_contours(mask: np.ndarray, components: List[Dict], min_area: float) -> List:
+    """
+    External contours of the components that can reach min_area
+
+    A contour never encloses more than its bounding box, so components with
+    a smaller box are skipped. Components merged across strips are traced
+    again in their one-pixel-padded box and identified by bounding rect,
+    which gives the same contour as tracing the full mask.
+    """
+    height, width = mask.shape
+    contours = []
+    for comp in components:
+        x, y, w, h = comp['bbox']
+        if w * h < min_area:
+            continue
+        if comp['contour'] is not None:
+            contours.append(comp['contour'])
+            continue
+        x0, y0 = max(0, x - 1), max(0, y - 1)
+        roi = mask[y0:min(height, y + h + 1), x0:min(width, x + w + 1)]
+        found, _ = cv2.findContours(roi, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE,
+                                    offset=(x0, y0))
+        for contour in found:
+            if cv2.boundingRect(contour) == (x, y, w, h):
+                contours.append(contour)
+                break
+    return contours
+
+
+class TiledSegmenter:
+    """Strip-parallel segmentation with components merged across strip borders"""
+
+    def __init__(self, workers: int = 4, strips: Optional[int] = None):
+        """
+        Initialize thread pool
+
+        Args:
+            workers: Worker threads
+            strips: Horizontal strips per frame (default: one per worker)
+        """
+        self.workers = workers
+        self.strips = strips or workers
+        self.executor = ThreadPoolExecutor(max_workers=workers,
+                                           thread_name_prefix='segment')
+        self.pools = [BufferPool() for _ in range(self.strips)]
+        self.frame_pool = BufferPool()  # Assembled full-frame masks
+        self.backend = None
+        self.clones = []
+
+    def _clones_for(self, backend) -> List:
+        """One shallow copy of the backend per strip (per-frame state is per copy)"""
+        if backend is not self.backend:
+            self.backend = backend
+            self.clones = [copy.copy(backend) for _ in range(self.strips)]
+        return self.clones
+
+    def segment(self, frame: np.ndarray, backend, color_ranges: Dict[str, List],
+                kernel: np.ndarray) -> Dict[str, Tuple[np.ndarray, List[Dict]]]:
+        """
+        Masks and merged components of each color
+
+        Args:
+            frame: BGR frame
+            backend: segmentation.SegmentationBackend of the detector
+            color_ranges: {color: HSV ranges} to segment
+            kernel: Morphology kernel
+
+        Returns:
+            {color: (full-frame mask, components)}; masks are reused buffers,
+            valid until the next call
+        """
+        height = frame.shape[0]
+        halo = halo_rows(kernel)
+        bounds = np.linspace(0, height, self.strips + 1).astype(int)
+        masks = {color: self.frame_pool.get(f'mask_{color}', frame.shape[:2])
+                 for color in color_ranges}
+        clones = self._clones_for(backend)
+
+        def work(i):
+            y0, y1 = bounds[i], bounds[i + 1]
+            top, bottom = max(0, y0 - halo), min(height, y1 + halo)
+            pool = self.pools[i]
+            clones[i].prepare(frame[top:bottom], pool)
+            traced = {}
+            for color, ranges in color_ranges.items():
+                mask = clones[i].mask(color, ranges, kernel, pool)
+                core = masks[color][y0:y1]
+                np.copyto(core, mask[y0 - top:y1 - top])
+                traced[color], _ = cv2.findContours(core, cv2.RETR_EXTERNAL,
+                                                    cv2.CHAIN_APPROX_SIMPLE, offset=(0, int(y0)))
+            return traced
+
+        if self.strips == 1:
+            parts = [work(0)]
+        else:
+            parts = list(self.executor.map(work, range(self.strips)))
+
+        return {color: (masks[color],
+                        merge_strips([part[color] for part in parts], bounds, masks[color]))
+                for color in color_ranges}
+
+    def close(self):
+        """Stop the worker threads"""
+        self.executor.shutdown(wait=False)
+
+
+# ---- Scaling benchmark ---------------------------------------------------
+
+def _detections(detector, servo, frame) -> List[Tuple]:
+    blocks = [(b['color'], b['bbox'], round(b['area'], 1)) for b in detector.detect_blocks(frame)]
+    region = servo.detect_largest_block(frame, 'green')
+    return sorted(blocks) + ([('green', region['bbox'], round(region['area'], 1))]
+                             if region is not None else [])
+
+
+def main():
+    """Main entry point"""
+    import argparse
+    from camera_source import open_source
+    from color_detector import SmallBlockDetector
+    from vision_servo import VisualServo
+
+    parser = argparse.ArgumentParser(description="Tiled segmentation scaling benchmark")
+    parser.add_argument('--source', default='synthetic:', help="camera source URI")
+    parser.add_argument('--size', default='1280x720', help="capture size WxH")
+    parser.add_argument('--frames', type=int, default=60)
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 2, 3, 4])
+    parser.add_argument('--segmentation', default='hsv', help="backend spec (segmentation.py)")
+    parser.add_argument('--cv-threads', type=int, default=1,
+                        help="OpenCV internal threads (1 = only the tiling is parallel)")
+    args = parser.parse_args()
+
+    width, height = (int(v) for v in args.size.split('x'))
+    cv2.setNumThreads(args.cv_threads)
+    source = open_source(args.source, width, height)
+    frames = []
+    while len(frames) < args.frames:
+        ok, frame = source.read()
+        if not ok:
+            break
+        frames.append(frame)
+    source.release()
+    if not frames:
+        print(f"No frames from {args.source}")
+        return 1
+    height, width = frames[0].shape[:2]
+    print(f"=== Tiled Segmentation: {len(frames)} frames {width}x{height} "
+          f"from {args.source}, backend {args.segmentation} ===\n")
+
+    def run(workers):
+        detector = SmallBlockDetector(preallocate=True, segmentation=args.segmentation,
+                                      workers=workers)
+        servo = VisualServo(width, height, preallocate=True, segmentation=args.segmentation,
+                            workers=workers)
+        results = [_detections(detector, servo, frame) for frame in frames[:3]]  # Warm up
+        start = time.perf_counter()
+        results = [_detections(detector, servo, frame) for frame in frames]
+        elapsed = time.perf_counter() - start
+        for d in (detector, servo):
+            if d.tiler is not None:
+                d.tiler.close()
+        return elapsed / len(frames) * 1000, results
+
+    serial_ms, reference = run(1)
+    print(f"{'threads':>7s} {'ms/frame':>9s} {'fps':>7s} {'speedup':>8s}  detections")
+    print(f"{'serial':>7s} {serial_ms:9.2f} {1000 / serial_ms:7.1f} {1.0:8.2f}")
+    for workers in args.threads:
+        if workers < 2:
+            continue
+        ms, results = run(workers)
+        same = 'identical' if results == reference else 'DIFFERENT'
+        print(f"{workers:7d} {ms:9.2f} {1000 / ms:7.1f} {serial_ms / ms:8.2f}  {same}")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+"""
+Differential Correctness Harness for Optimized Vision Pipelines
+A faster detect_blocks / detect_largest_block (another segmentation
+backend, strip tiling, a downscaled or ROI-tracked quality level) has to
+keep making the robot's decisions. The harness runs the current pipeline
+(HSV thresholds, whole frame, one thread) and a candidate side by side on
+the same frames and compares:
+
+- detections: every reference block / region must have a candidate
+  detection of the same color within centroid_tol pixels and area_tol
+  (relative) of its area, and the candidate must find nothing extra
+- decisions: the SEARCH_BLOCK step (target color and strafe / creep /
+  pick, as in ColorBlockRobot.state_search_block) and
+  VisualServo.get_movement_command for every region color
+
+Frames with a disagreement are written side by side (reference left,
+candidate right) to the dump folder, and the per-frame vision time of both
+gives the candidate's speedup.
+
+Candidate specs join options with '+':
+    seg=<backend spec>    segmentation backend (see segmentation.py)
+    tiled=<workers>       strip-parallel segmentation (see tiled.py)
+    level=<0-4>           fixed qos.py quality level (downscale, ROI, morphology)
+
+Frames come from the simulator (sequential, a robot turning and driving
+toward the START mat) or any camera_source.py URI:
+    python3 vision_diff.py --candidates seg=lut tiled=4 level=2 level=3
+    python3 vision_diff.py --source recordings/run1 --candidates seg=lut:mat_colors.npz
+"""
+
+import math
+import os
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from color_detector import SmallBlockDetector
+from vision_servo import VisualServo
+from qos import QualityGovernor
+
+
+REFERENCE = 'hsv'
+
+# Horizontal pixel error beyond which SEARCH_BLOCK strafes (main.py)
+BLOCK_CENTER_TOLERANCE = 60
+
+# Text colors for the frame dumps
+DUMP_COLORS = {'red': (0, 0, 255), 'yellow': (0, 255, 255), 'blue': (255, 0, 0),
+               'green': (0, 255, 0)}
+
+
+class Pipeline:
+    """Block detector and region servo configured from a candidate spec"""
+
+    def __init__(self, spec: str, width: int = 640, height: int = 480):
+        """
+        Initialize pipeline
+
+        Args:
+            spec: Candidate spec, e.g. 'seg=lut+tiled=4' ('hsv' = reference)
+            width, height: Frame size
+        """
+        self.spec = spec
+        segmentation, workers, level = 'hsv', 1, None
+        for option in spec.split('+'):
+            name, _, value = option.partition('=')
+            if name == 'seg':
+                segmentation = value
+            elif name == 'tiled':
+                workers = int(value)
+            elif name == 'level':
+                level = int(value)
+            elif option != REFERENCE:
+                raise ValueError(f"Unknown candidate option '{option}' "
+                                 f"(use seg=<spec>, tiled=<workers>, level=<n>)")
+        self.detector = SmallBlockDetector(preallocate=True, segmentation=segmentation,
+                                           workers=workers)
+        self.servo = VisualServo(width, height, preallocate=True, segmentation=segmentation,
+                                 workers=workers)
+        self.governor = None
+        if level is not None:
+            self.governor = QualityGovernor(policies={'DIFF': (level, level)})
+
+    def detect(self, frame: np.ndarray, colors) -> Tuple[List[Dict], Dict[str, Optional[Dict]]]:
+        """Blocks and the largest region of every color in one frame"""
+        if self.governor is not None:
+            self.governor.frame('DIFF')
+            blocks = self.governor.detect_blocks(self.detector, frame)
+            regions = {c: self.governor.detect_region(self.servo, frame, c) for c in colors}
+        else:
+            blocks = self.detector.detect_blocks(frame)
+            regions = {c: self.servo.detect_largest_block(frame, c) for c in colors}
+        return blocks, regions
+
+    def block_decision(self, blocks: List[Dict], width: int) -> str:
+        """What SEARCH_BLOCK would do with these detections"""
+        blocks = self.detector.confident_blocks(blocks)
+        if not blocks:
+            return 'search'
+        target = blocks[0]
+        error = target['center'][0] - width // 2
+        if abs(error) > BLOCK_CENTER_TOLERANCE:
+            step = 'right' if error > 0 else 'left'
+        elif not self.detector.in_reach(target):
+            step = 'forward'
+        else:
+            step = 'pick'
+        return f"{target['color']}:{step}"
+
+    def close(self):
+        """Stop tiling threads"""
+        for d in (self.detector, self.servo):
+            if d.tiler is not None:
+                d.tiler.close()
+
+
+def compare_detections(reference: List[Dict], candidate: List[Dict],
+                       centroid_tol: float, area_tol: float) -> List[Tuple[str, str]]:
+    """
+    Match candidate detections to reference ones by color and centroid
+
+    Returns:
+        (kind, description) per disagreement, kind one of 'missing', 'extra',
+        'centroid', 'area' (empty if all match within tolerance)
+    """
+    issues = []
+    unmatched = list(candidate)
+    for ref in reference:
+        same = [c for c in unmatched if c['color'] == ref['color']]
+        if not same:
+            issues.append(('missing', f"missing {ref['color']} at {ref['center']}"))
+            continue
+        best = min(same, key=lambda c: _dist(c['center'], ref['center']))
+        offset = _dist(best['center'], ref['center'])
+        if offset > 4 * centroid_tol:
+            issues.append(('missing', f"missing {ref['color']} at {ref['center']}"))
+            continue
+        unmatched.remove(best)
+        if offset > centroid_tol:
+            issues.append(('centroid', f"{ref['color']} centroid moved {offset:.1f}px"))
+        if abs(best['area'] - ref['area']) > area_tol * ref['area']:
+            issues.append(('area', f"{ref['color']} area {ref['area']:.0f} -> {best['area']:.0f}"))
+    for extra in unmatched:
+        issues.append(('extra', f"extra {extra['color']} at {extra['center']}"))
+    return issues
+
+
+def _dist(a, b) -> float:
+    return math.hypot(a[0] - b[0], a[1] - b[1])
+
+
+def _regions(regions: Dict[str, Optional[Dict]]) -> List[Dict]:
+    return [dict(r, color=c) for c, r in regions.items() if r is not None]
+
+
+def _annotate(frame: np.ndarray, blocks: List[Dict], regions: Dict[str, Optional[Dict]],
+              title: str) -> np.ndarray:
+    """Boxes and labels of one pipeline's detections"""
+    image = frame.copy()
+    for color, region in regions.items():
+        if region is not None:
+            x, y, w, h = region['bbox']
+            cv2.rectangle(image, (x, y), (x + w, y + h), DUMP_COLORS.get(color, (255, 255, 255)), 1)
+    for block in blocks:
+        x, y, w, h = block['bbox']
+        cv2.rectangle(image, (x, y), (x + w, y + h), (255, 255, 255), 2)
+        cv2.putText(image, f"{block['color']} {block['area']:.0f}", (x, max(y - 4, 10)),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.4, (255, 255, 255), 1)
+    cv2.putText(image, title, (10, 20), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
+    return image
+
+
+def _dump(folder: str, index: int, frame: np.ndarray, reference, candidate,
+          spec: str, issues: List[str]):
+    """Write reference | candidate for one disagreeing frame"""
+    os.makedirs(folder, exist_ok=True)
+    image = cv2.hconcat([_annotate(frame, *reference, 'reference'),
+                         _annotate(frame, *candidate, spec)])
+    for i, issue in enumerate(issues[:8]):
+        cv2.putText(image, issue, (10, 45 + 18 * i), cv2.FONT_HERSHEY_SIMPLEX, 0.5,
+                    (0, 0, 255), 1)
+    name = spec.replace('=', '').replace('+', '_').replace(':', '_').replace('/', '_')
+    cv2.imwrite(os.path.join(folder, f"{name}_{index:05d}.png"), image)
+
+
+def sim_frames(count: int, seed: int = 0, width: int = 640, height: int = 480,
+               noise: float = 3.0, per_arena: int = 60) -> Iterator[np.ndarray]:
+    """
+    Sequential simulator frames: a robot facing the START mat turns and drives
+
+    Every per_arena frames a new random arena and start pose; the motion
+    alternates turning, driving forward and turning back, so ROI tracking
+    sees realistic frame-to-frame movement.
+    """
+    from simulator import Arena, SimulatedRobot, SimulatedCamera, VirtualClock
+
+    rng = np.random.default_rng(seed)
+    produced = 0
+    while produced < count:
+        arena = Arena.random(rng)
+        clock = VirtualClock()
+        mx, my = arena.mat('green')['center']
+        angle = rng.uniform(-math.pi, math.pi)
+        distance = rng.uniform(0.5, 1.2)
+        x = min(max(mx + distance * math.cos(angle), 0.2), arena.width - 0.2)
+        y = min(max(my + distance * math.sin(angle), 0.2), arena.height - 0.2)
+        yaw = math.degrees(math.atan2(my - y, mx - x)) + rng.uniform(-25, 25)
+        robot = SimulatedRobot(arena, clock, pose=(x, y, yaw))
+        camera = SimulatedCamera(robot, width, height, noise_sigma=noise,
+                                 seed=int(rng.integers(1 << 31)))
+        moves = [robot.rotate_counterclockwise, robot.forward, robot.rotate_clockwise]
+        for i in range(min(per_arena, count - produced)):
+            if i % 20 == 0:
+                moves[(i // 20) % len(moves)]()
+            ok, frame = camera.read()
+            if not ok:
+                break
+            produced += 1
+            yield frame
+
+
+def source_frames(uri: str, count: int, width: int = 640,
+                  height: int = 480) -> Iterator[np.ndarray]:
+    """Frames from a camera_source.py URI (recording, directory, camera)"""
+    from camera_source import open_source
+
+    source = open_source(uri, width, height)
+    try:
+        for _ in range(count):
+            ok, frame = source.read()
+            if not ok:
+                return
+            yield frame
+    finally:
+        source.release()
+
+
+def run(frames: Iterator[np.ndarray], candidates: List[str], centroid_tol: float = 3.0,
+        area_tol: float = 0.05, dump_dir: Optional[str] = 'vision_diff',
+        max_dumps: int = 20, width: int = 640, height: int = 480) -> Dict[str, Dict]:
+    """
+    Run the reference and every candidate over the frames
+
+    Args:
+        frames: BGR frames (sequential, for ROI-tracking candidates)
+        candidates: Candidate specs
+        centroid_tol: Allowed centroid offset in pixels
+        area_tol: Allowed relative area difference
+        dump_dir: Folder for disagreeing frames (None = no dumps)
+        max_dumps: Dumps per candidate
+        width, height: Frame size
+
+    Returns:
+        {spec: {'frames', 'detection_frames', 'decision_frames', 'command_frames',
+        'issues' (count per kind), 'ms_reference', 'ms_candidate', 'speedup'}}
+    """
+    reference = Pipeline(REFERENCE, width, height)
+    colors = list(reference.servo.color_ranges)
+    pipelines = {spec: Pipeline(spec, width, height) for spec in candidates}
+    results = {spec: {'frames': 0, 'detection_frames': 0, 'decision_frames': 0,
+                      'command_frames': 0, 'issues': {}, 'reference_s': 0.0,
+                      'candidate_s': 0.0, 'dumps': 0} for spec in candidates}
+
+    for index, frame in enumerate(frames):
+        start = time.perf_counter()
+        ref_blocks, ref_regions = reference.detect(frame, colors)
+        ref_time = time.perf_counter() - start
+        ref_decision = reference.block_decision(ref_blocks, frame.shape[1])
+        ref_commands = {c: reference.servo.get_movement_command(r) for c, r in ref_regions.items()}
+
+        for spec, pipeline in pipelines.items():
+            r = results[spec]
+            start = time.perf_counter()
+            blocks, regions = pipeline.detect(frame, colors)
+            r['candidate_s'] += time.perf_counter() - start
+            r['reference_s'] += ref_time
+            r['frames'] += 1
+
+            detection_issues = (compare_detections(ref_blocks, blocks, centroid_tol, area_tol) +
+                                compare_detections(_regions(ref_regions), _regions(regions),
+                                                   centroid_tol, area_tol))
+            decision = pipeline.block_decision(blocks, frame.shape[1])
+            decision_issues = ([('block step', f"block step {ref_decision} -> {decision}")]
+                               if decision != ref_decision else [])
+            command_issues = []
+            for color, region in regions.items():
+                command = pipeline.servo.get_movement_command(region)
+                if command != ref_commands[color]:
+                    command_issues.append(('command', f"{color} command "
+                                                      f"{ref_commands[color]} -> {command}"))
+
+            r['detection_frames'] += bool(detection_issues)
+            r['decision_frames'] += bool(decision_issues)
+            r['command_frames'] += bool(command_issues)
+            issues = decision_issues + command_issues + detection_issues
+            for kind, _ in issues:
+                r['issues'][kind] = r['issues'].get(kind, 0) + 1
+            if issues and dump_dir and r['dumps'] < max_dumps:
+                _dump(dump_dir, index, frame, (ref_blocks, ref_regions), (blocks, regions),
+                      spec, [text for _, text in issues])
+                r['dumps'] += 1
+
+    for pipeline in [reference] + list(pipelines.values()):
+        pipeline.close()
+    for r in results.values():
+        n = max(r['frames'], 1)
+        r['ms_reference'] = r.pop('reference_s') / n * 1000
+        r['ms_candidate'] = r.pop('candidate_s') / n * 1000
+        r['speedup'] = r['ms_reference'] / r['ms_candidate'] if r['ms_candidate'] > 0 else 0.0
+    return results
+
+
+def main():
+    """Main entry point"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Differential test of vision pipelines")
+    parser.add_argument('--candidates', nargs='+', required=True,
+                        help="candidate specs, e.g. seg=lut tiled=4 level=3 seg=lut+level=2")
+    parser.add_argument('--source', default='sim',
+                        help="'sim' (simulator frames) or a camera source URI")
+    parser.add_argument('--frames', type=int, default=240)
+    parser.add_argument('--seed', type=int, default=0, help="simulator seed")
+    parser.add_argument('--noise', type=float, default=3.0, help="simulator pixel noise")
+    parser.add_argument('--centroid-tol', type=float, default=3.0, help="pixels")
+    parser.add_argument('--area-tol', type=float, default=0.05, help="relative")
+    parser.add_argument('--dump-dir', default='vision_diff',
+                        help="folder for disagreeing frames ('' = none)")
+    parser.add_argument('--max-dumps', type=int, default=20, help="per candidate")
+    args = parser.parse_args()
+
+    if args.source == 'sim':
+        frames = sim_frames(args.frames, args.seed, noise=args.noise)
+    else:
+        frames = source_frames(args.source, args.frames)
+    results = run(frames, args.candidates, args.centroid_tol, args.area_tol,
+                  args.dump_dir or None, args.max_dumps)
+
+    print(f"=== Vision diff vs {REFERENCE}: {args.source}, "
+          f"centroid {args.centroid_tol:.0f}px, area {args.area_tol:.0%} ===")
+    print(f"{'candidate':24s} {'frames':>6s} {'detect':>6s} {'decide':>6s} {'command':>7s} "
+          f"{'ref ms':>7s} {'cand ms':>7s} {'speedup':>7s}")
+    failed = False
+    for spec, r in results.items():
+        print(f"{spec[:24]:24s} {r['frames']:6d} {r['detection_frames']:6d} "
+              f"{r['decision_frames']:6d} {r['command_frames']:7d} {r['ms_reference']:7.2f} "
+              f"{r['ms_candidate']:7.2f} {r['speedup']:7.2f}")
+        if r['issues']:
+            print(' ' * 26 + ', '.join(f"{k}: {v}" for k, v in sorted(r['issues'].items())))
+        failed |= bool(r['detection_frames'] or r['decision_frames'] or r['command_frames'])
+    if failed and args.dump_dir:
+        print(f"\nDisagreeing frames written to {args.dump_dir}/")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    exit(main())
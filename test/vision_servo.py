@@ -4,21 +4,37 @@ Visual Servoing Module for Region Alignment
 Uses color block detection to align robot with target regions
 """
 
+import math
 import cv2
 import numpy as np
-from typing import Tuple, Optional, Dict
+from typing import Tuple, Optional, Dict, List, Union
+
+from buffer_pool import BufferPool, annotation_frame, measure_allocation_rate
+from segmentation import SegmentationBackend, make_backend
+from tiled import TiledSegmenter, component_contours
 
 
 class VisualServo:
     """Visual servoing controller for aligning with colored regions"""
     
-    def __init__(self, frame_width: int = 640, frame_height: int = 480):
+    def __init__(self, frame_width: int = 640, frame_height: int = 480,
+                 camera_model=None, preallocate: bool = False,
+                 segmentation: Union[str, SegmentationBackend] = 'hsv',
+                 workers: int = 1):
         """
         Initialize visual servo controller
         
         Args:
             frame_width: Camera frame width
             frame_height: Camera frame height
+            camera_model: Optional camera_calibration.CameraModel with a ground
+                          homography; enables metric distance/bearing decisions
+            preallocate: Reuse preallocated full-frame buffers; the returned
+                         'mask' is then only valid until the next detection
+            segmentation: Segmentation backend spec (see segmentation.py),
+                          e.g. 'hsv', 'lut' or 'backproject:mat_colors.npz'
+            workers: Segment horizontal strips in this many threads
+                     (see tiled.py; 1 = whole frame in the calling thread)
         """
         self.frame_width = frame_width
         self.frame_height = frame_height
@@ -31,6 +47,12 @@ class VisualServo:
         self.min_area_threshold = 3000  # minimum area to consider block as target
         self.approach_area_threshold = 50000  # area threshold for "close enough"
         
+        # Metric thresholds (used when a ground-calibrated camera model is set)
+        self.camera_model = camera_model
+        self.approach_distance = 0.35  # meters to the near edge for "close enough"
+        self.rotate_bearing = 15.0  # degrees - rotate instead of strafe above this
+        self.lateral_tolerance = 0.04  # meters - sideways alignment tolerance
+        
         # Define HSV color ranges for regions
         self.color_ranges = {
             'red': [
@@ -49,6 +71,21 @@ class VisualServo:
         }
         
         self.kernel = np.ones((5, 5), np.uint8)
+        
+        # Buffer pool (None = allocate per call)
+        self.buffers = BufferPool() if preallocate else None
+        
+        self.segmentation = segmentation
+        self.tiler = TiledSegmenter(workers) if workers > 1 else None
+    
+    @property
+    def segmentation(self) -> SegmentationBackend:
+        """Color segmentation backend (assign a spec to switch at runtime)"""
+        return self._segmentation
+    
+    @segmentation.setter
+    def segmentation(self, backend: Union[str, SegmentationBackend]):
+        self._segmentation = make_backend(backend, self.color_ranges)
     
     def detect_largest_block(self, frame: np.ndarray, color: str) -> Optional[Dict]:
         """
@@ -64,21 +101,19 @@ class VisualServo:
         if color not in self.color_ranges:
             return None
         
-        # Preprocess
-        blurred = cv2.GaussianBlur(frame, (5, 5), 0)
-        hsv = cv2.cvtColor(blurred, cv2.COLOR_BGR2HSV)
-        
-        # Create mask for target color
-        mask = np.zeros(hsv.shape[:2], dtype=np.uint8)
-        for lower, upper in self.color_ranges[color]:
-            mask = cv2.bitwise_or(mask, cv2.inRange(hsv, lower, upper))
-        
-        # Morphological operations
-        mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, self.kernel)
-        mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, self.kernel)
-        
-        # Find contours
-        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        if self.tiler is not None:
+            # Strip-parallel; contours only for components that can pass the area check
+            mask, components = self.tiler.segment(
+                frame, self.segmentation, {color: self.color_ranges[color]}, self.kernel)[color]
+            contours = component_contours(mask, components, self.min_area_threshold)
+        else:
+            # Segment the target color (open + close)
+            self.segmentation.prepare(frame, self.buffers)
+            mask = self.segmentation.mask(color, self.color_ranges[color], self.kernel,
+                                          self.buffers)
+            
+            # Find contours
+            contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
         
         if not contours:
             return None
@@ -101,13 +136,48 @@ class VisualServo:
         # Get bounding box
         x, y, w, h = cv2.boundingRect(largest_contour)
         
-        return {
+        block_info = {
             'center': (cx, cy),
             'area': area,
             'bbox': (x, y, w, h),
             'contour': largest_contour,
             'mask': mask
         }
+        block_info.update(self.get_target_range(block_info) or {})
+        return block_info
+    
+    @property
+    def metric(self) -> bool:
+        """True when decisions use metric distance instead of blob area"""
+        return self.camera_model is not None and self.camera_model.has_ground
+    
+    def get_target_range(self, block_info: Dict) -> Optional[Dict]:
+        """
+        Metric position of a detected region on the floor
+        
+        Only the centroid and the bottom of the blob are undistorted and
+        projected, so no per-frame remap is needed.
+        
+        Args:
+            block_info: Block detection result
+            
+        Returns:
+            {'distance', 'bearing', 'lateral', 'near_distance'} in meters and
+            degrees (bearing positive = right), or None without calibration
+        """
+        if not self.metric:
+            return None
+        
+        cx, cy = block_info['center']
+        x, y, w, h = block_info['bbox']
+        ground = self.camera_model.pixel_to_ground([(cx, cy), (cx, y + h - 1)])
+        (gx, gy), (nx, ny) = ground
+        return {
+            'distance': math.hypot(gx, gy),
+            'bearing': math.degrees(math.atan2(-gy, gx)),
+            'lateral': -gy,  # positive = target to the right
+            'near_distance': nx
+        }
     
     def calculate_alignment_error(self, block_info: Dict) -> Tuple[int, int]:
         """
@@ -137,6 +207,9 @@ class VisualServo:
         if block_info is None:
             return 'search'  # Need to search for target
         
+        if self.metric:
+            return self._metric_movement_command(block_info)
+        
         x_error, y_error = self.calculate_alignment_error(block_info)
         area = block_info['area']
         
@@ -155,11 +228,30 @@ class VisualServo:
         # If horizontally aligned, move forward
         return 'forward'
     
+    def _metric_movement_command(self, block_info: Dict) -> str:
+        """Movement decision from floor distance and bearing"""
+        target = block_info if 'bearing' in block_info else self.get_target_range(block_info)
+        
+        if target['near_distance'] <= self.approach_distance:
+            return 'close'
+        
+        if abs(target['bearing']) > self.rotate_bearing:
+            return 'rotate_cw' if target['bearing'] > 0 else 'rotate_ccw'
+        
+        if abs(target['lateral']) > self.lateral_tolerance:
+            return 'right' if target['lateral'] > 0 else 'left'
+        
+        return 'forward'
+    
     def is_aligned(self, block_info: Dict) -> bool:
         """Check if robot is aligned with target"""
         if block_info is None:
             return False
         
+        if self.metric:
+            target = self.get_target_range(block_info)
+            return abs(target['lateral']) <= self.lateral_tolerance
+        
         x_error, y_error = self.calculate_alignment_error(block_info)
         return abs(x_error) <= self.x_tolerance
     
@@ -168,10 +260,13 @@ class VisualServo:
         if block_info is None:
             return False
         
+        if self.metric:
+            return self.get_target_range(block_info)['near_distance'] <= self.approach_distance
+        
         return block_info['area'] > self.approach_area_threshold
     
     def draw_debug_info(self, frame: np.ndarray, block_info: Optional[Dict], 
-                        target_color: str) -> np.ndarray:
+                        target_color: str, out: Optional[np.ndarray] = None) -> np.ndarray:
         """
         Draw debug visualization on frame
         
@@ -179,11 +274,12 @@ class VisualServo:
             frame: Input frame
             block_info: Block detection result
             target_color: Target color name
+            out: Optional buffer for the annotated frame
             
         Returns:
             Annotated frame
         """
-        annotated = frame.copy()
+        annotated = annotation_frame(frame, self.buffers, out)
         
         # Draw center crosshair
         cv2.line(annotated, (self.center_x - 30, self.center_y), 
@@ -221,6 +317,10 @@ class VisualServo:
                 f"Status: {'ALIGNED' if self.is_aligned(block_info) else 'ADJUSTING'}",
                 f"Distance: {'CLOSE' if self.is_close_enough(block_info) else 'FAR'}"
             ]
+            if self.metric:
+                target = self.get_target_range(block_info)
+                info_text.append(f"Range: {target['distance']:.2f}m "
+                                 f"Bearing: {target['bearing']:+.1f}deg")
             
             y_offset = 30
             for text in info_text:
@@ -232,17 +332,28 @@ class VisualServo:
                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
         
         return annotated
+    
+    def allocation_rate(self, frames: List[np.ndarray], color: str = 'green',
+                        fps: float = 30.0) -> Dict:
+        """Steady-state allocation rate of detect_largest_block (see buffer_pool)"""
+        return measure_allocation_rate(lambda f: self.detect_largest_block(f, color),
+                                       frames, fps=fps)
 
 
 # Test function
 if __name__ == "__main__":
     print("=== Visual Servo Test ===")
     
-    cap = cv2.VideoCapture(0)
-    cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
-    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
+    import sys
+    from camera_source import open_source
+    from loop_log import LoopLogger
+    
+    # Camera index or source URI, e.g. v4l2:///dev/video0?fourcc=MJPG&buffers=2
+    cap = open_source(sys.argv[1] if len(sys.argv) > 1 else 0, 640, 480)
+    frame = cap.new_buffer()
     
     servo = VisualServo(640, 480)
+    log = LoopLogger()  # Status line without blocking the frame loop
     target_color = 'red'  # Change to test different colors
     
     print(f"Testing visual servo with target color: {target_color}")
@@ -250,8 +361,7 @@ if __name__ == "__main__":
     print("Press 'q' to quit")
     
     while True:
-        ret, frame = cap.read()
-        if not ret:
+        if not cap.read_into(frame):
             break
         
         # Detect target
@@ -260,7 +370,7 @@ if __name__ == "__main__":
         # Get movement command
         if block_info:
             command = servo.get_movement_command(block_info)
-            print(f"\rCommand: {command:15s}", end='', flush=True)
+            log.status("Command: {:15s}", command)
         
         # Draw debug info
         debug_frame = servo.draw_debug_info(frame, block_info, target_color)
@@ -279,6 +389,7 @@ if __name__ == "__main__":
         elif key == ord('g'):
             target_color = 'green'
     
+    log.close()
     cap.release()
     cv2.destroyAllWindows()
 
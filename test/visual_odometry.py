@@ -0,0 +1,369 @@
+#!/usr/bin/env python3
+"""
+Visual Odometry
+Dead reckoning between detections from sparse optical flow. Corners are
+tracked with pyramidal Lucas-Kanade on small grayscale frames (160 px wide
+by default), so one update costs about a millisecond.
+
+With a ground-calibrated camera (camera_calibration.CameraModel), tracked
+floor points are projected onto the floor and a rigid 2D motion is fitted
+with RANSAC. That gives yaw and translation in meters, and points on
+blocks or walls are rejected as outliers. Without calibration only yaw is
+estimated, from the median horizontal flow and the focal length.
+
+RegionMemory keeps the last sighting of each region in the odometry frame,
+so a search can turn the short way toward where a region was last seen.
+
+Benchmark (simulated arena with a textured floor, scripted drive):
+    python3 visual_odometry.py --frames 600
+    python3 visual_odometry.py --uncalibrated
+"""
+
+import math
+import time
+from typing import Dict, Optional, Tuple
+
+import cv2
+import numpy as np
+
+
+def _rotate(points: np.ndarray, angle: float) -> np.ndarray:
+    """Rotate Nx2 floor points counter-clockwise by angle (radians)"""
+    if not angle:
+        return points
+    c, s = math.cos(angle), math.sin(angle)
+    return points @ np.array([[c, s], [-s, c]])
+
+
+class VisualOdometry:
+    """Sparse-flow yaw and translation increments between frames"""
+
+    def __init__(self, camera_model=None, width: int = 160, max_features: int = 80,
+                 min_features: int = 30, hfov: float = 62.0, max_range: float = 1.5):
+        """
+        Initialize odometry
+
+        Args:
+            camera_model: Optional CameraModel with a ground homography
+                          (enables metric translation)
+            width: Width of the tracking frames in pixels
+            max_features: Corners detected when re-seeding
+            min_features: Re-seed when fewer corners survive tracking
+            hfov: Horizontal field of view in degrees (used without calibration)
+            max_range: Only track floor points closer than this (meters)
+        """
+        self.camera_model = camera_model
+        self.width = width
+        self.max_features = max_features
+        self.min_features = min_features
+        self.hfov = hfov
+        self.max_range = max_range
+        self.lk_params = dict(winSize=(15, 15), maxLevel=2,
+                              criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 20, 0.03))
+
+        self.frame_shape = None
+        self.scale = None       # Tracking frame / full frame
+        self.focal = None       # Focal length in full-frame pixels
+        self.feature_mask = None
+        self.gray = [None, None]  # Ping-pong tracking frames
+        self.small = None
+        self.index = 0
+        self.points = None
+
+        # Accumulated pose in the odometry frame (start = origin, x forward)
+        self.x = 0.0
+        self.y = 0.0
+        self.yaw = 0.0  # radians, counter-clockwise positive
+        self.last_timestamp = None
+        self.camera_yaw = 0.0  # Gimbal pan of the previous frame, radians
+        self.last_increment = None
+
+        # Statistics
+        self.updates = 0
+        self.lost = 0  # Frames without a usable motion estimate
+        self.elapsed = 0.0
+
+    @property
+    def metric(self) -> bool:
+        """True when translation is estimated (ground-calibrated camera)"""
+        return self.camera_model is not None and self.camera_model.has_ground
+
+    @property
+    def pose(self) -> Tuple[float, float, float]:
+        """Current (x, y, yaw_degrees) relative to where odometry started"""
+        return float(self.x), float(self.y), math.degrees(self.yaw)
+
+    def reset(self):
+        """Restart from the origin (keeps the tracked corners)"""
+        self.x = self.y = self.yaw = 0.0
+
+    def _setup(self, frame: np.ndarray):
+        """Size the tracking buffers and feature mask for this frame size"""
+        height, width = frame.shape[:2]
+        self.frame_shape = (height, width)
+        self.scale = self.width / width
+        size = (self.width, int(round(height * self.scale)))
+        self.small = np.empty((size[1], size[0], 3), np.uint8)
+        self.gray = [np.empty((size[1], size[0]), np.uint8) for _ in range(2)]
+        if self.camera_model is not None:
+            self.focal = float(self.camera_model.camera_matrix[0, 0])
+        else:
+            self.focal = (width / 2) / math.tan(math.radians(self.hfov) / 2)
+
+        # Seed corners only where the floor is within range (if calibrated)
+        self.feature_mask = np.full((size[1], size[0]), 255, np.uint8)
+        if self.metric:
+            v, u = np.mgrid[0:size[1], 0:size[0]]
+            pixels = np.stack([u.ravel(), v.ravel()], axis=1) / self.scale
+            ground = self.camera_model.pixel_to_ground(pixels).reshape(size[1], size[0], 2)
+            valid = (ground[..., 0] > 0) & (ground[..., 0] < self.max_range)
+            self.feature_mask[~valid] = 0
+
+    def _seed(self, gray: np.ndarray):
+        self.points = cv2.goodFeaturesToTrack(gray, self.max_features, 0.01, 6,
+                                              mask=self.feature_mask, blockSize=5)
+
+    def update(self, frame: np.ndarray, timestamp: Optional[float] = None,
+               camera_yaw: float = 0.0) -> Optional[Dict]:
+        """
+        Track corners into this frame and integrate the motion since the last one
+
+        Args:
+            frame: BGR frame
+            timestamp: Capture time (kept for consumers of last_increment)
+            camera_yaw: Gimbal pan from straight ahead in degrees (positive =
+                        left); pan changes are removed from the motion,
+                        assuming the pan axis is close to the robot center
+
+        Returns:
+            {'dyaw' (deg, CCW positive), 'dx', 'dy' (m, previous body frame,
+            None without calibration), 'tracked', 'inliers'}, or None when
+            there is no previous frame or too few corners were tracked
+        """
+        start = time.perf_counter()
+        if frame.shape[:2] != self.frame_shape:
+            self._setup(frame)
+            self.points = None
+        cv2.resize(frame, (self.small.shape[1], self.small.shape[0]), dst=self.small,
+                   interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(self.small, cv2.COLOR_BGR2GRAY, dst=self.gray[self.index % 2])
+        previous = self.gray[(self.index + 1) % 2]
+        self.index += 1
+        self.updates += 1
+        self.last_timestamp = timestamp
+
+        increment = None
+        if self.points is not None and len(self.points) >= 6:
+            increment = self._track(previous, gray, math.radians(camera_yaw))
+            if increment is None:
+                self.lost += 1
+        if self.points is None or len(self.points) < self.min_features:
+            self._seed(gray)
+        self.camera_yaw = math.radians(camera_yaw)
+
+        self.last_increment = increment
+        self.elapsed += time.perf_counter() - start
+        return increment
+
+    def _track(self, previous: np.ndarray, gray: np.ndarray,
+               camera_yaw: float) -> Optional[Dict]:
+        moved, status, _ = cv2.calcOpticalFlowPyrLK(previous, gray, self.points, None,
+                                                    **self.lk_params)
+        ok = status.reshape(-1) == 1
+        before = self.points.reshape(-1, 2)[ok] / self.scale
+        after = moved.reshape(-1, 2)[ok] / self.scale
+        self.points = moved[ok].reshape(-1, 1, 2)
+        if len(after) < 6:
+            return None
+
+        if not self.metric:
+            # Uncalibrated: a pure rotation shifts the scene sideways by f*tan(dyaw)
+            dyaw = math.atan2(float(np.median(after[:, 0] - before[:, 0])), self.focal)
+            dyaw -= camera_yaw - self.camera_yaw
+            self.yaw = (self.yaw + dyaw + math.pi) % (2 * math.pi) - math.pi
+            return {'dyaw': math.degrees(dyaw), 'dx': None, 'dy': None,
+                    'tracked': len(after), 'inliers': len(after)}
+
+        ground_before = self.camera_model.pixel_to_ground(before)
+        ground_after = self.camera_model.pixel_to_ground(after)
+        floor = (ground_before[:, 0] > 0) & (ground_before[:, 0] < self.max_range) & \
+                (ground_after[:, 0] > 0) & (ground_after[:, 0] < self.max_range)
+        if np.count_nonzero(floor) < 6:
+            return None
+        # Static floor points move by the inverse of the robot motion:
+        # p_after = R(-dyaw) (p_before - t)
+        matrix, inliers = cv2.estimateAffinePartial2D(
+            _rotate(ground_before[floor], self.camera_yaw),
+            _rotate(ground_after[floor], camera_yaw), method=cv2.RANSAC,
+            ransacReprojThreshold=0.01, maxIters=200)
+        if matrix is None:
+            return None
+        angle = math.atan2(matrix[1, 0], matrix[0, 0])
+        dyaw = -angle
+        c, s = math.cos(dyaw), math.sin(dyaw)
+        tx, ty = matrix[0, 2], matrix[1, 2]
+        dx, dy = -(c * tx - s * ty), -(s * tx + c * ty)
+
+        # Integrate in the odometry frame
+        cy, sy = math.cos(self.yaw), math.sin(self.yaw)
+        self.x += dx * cy - dy * sy
+        self.y += dx * sy + dy * cy
+        self.yaw = (self.yaw + dyaw + math.pi) % (2 * math.pi) - math.pi
+        return {'dyaw': math.degrees(dyaw), 'dx': dx, 'dy': dy,
+                'tracked': len(after), 'inliers': int(inliers.sum())}
+
+    def stats(self) -> Dict:
+        """Update count, lost frames and mean cost per update"""
+        return {'updates': self.updates, 'lost': self.lost,
+                'ms_per_frame': self.elapsed / self.updates * 1000 if self.updates else 0.0}
+
+
+class RegionMemory:
+    """Last sighting of each region, kept in the odometry frame"""
+
+    def __init__(self, odometry: VisualOdometry):
+        self.odometry = odometry
+        self.sightings: Dict[str, Dict] = {}
+
+    def remember(self, color: str, bearing: float, distance: Optional[float] = None):
+        """
+        Record a region seen now
+
+        Args:
+            color: Region color
+            bearing: Bearing from the current heading in degrees (positive = right)
+            distance: Floor distance in meters, if known
+        """
+        x, y, yaw = self.odometry.pose
+        sighting = {'pose': (x, y, yaw), 'bearing': bearing, 'distance': distance}
+        if distance is not None and self.odometry.metric:
+            heading = math.radians(yaw - bearing)
+            sighting['position'] = (x + distance * math.cos(heading),
+                                    y + distance * math.sin(heading))
+        self.sightings[color] = sighting
+
+    def remember_pixel(self, color: str, center_x: float, frame_width: int):
+        """Record a region from its image column (no calibration needed)"""
+        focal = self.odometry.focal or (frame_width / 2) / math.tan(
+            math.radians(self.odometry.hfov) / 2)
+        self.remember(color, math.degrees(math.atan2(center_x - frame_width / 2, focal)))
+
+    def bearing_to(self, color: str) -> Optional[float]:
+        """
+        Bearing to where the region was last seen, from the current pose
+
+        Returns:
+            Degrees, positive = right, or None if never seen
+        """
+        sighting = self.sightings.get(color)
+        if sighting is None:
+            return None
+        x, y, yaw = self.odometry.pose
+        if 'position' in sighting:
+            px, py = sighting['position']
+            heading = math.degrees(math.atan2(py - y, px - x))
+        else:
+            heading = sighting['pose'][2] - sighting['bearing']
+        return (yaw - heading + 180.0) % 360.0 - 180.0
+
+
+# ---- Benchmark -------------------------------------------------------------
+
+# Scripted drive: (command, seconds)
+BENCH_SCRIPT = [('A', 1.5), ('rC', 1.2), ('A', 1.0), ('L', 1.0), ('rA', 2.0),
+                ('S', 0.5), ('A', 1.5), ('R', 0.8), ('rC', 1.0), ('B', 1.0)]
+
+
+def benchmark(frames: int = 600, calibrated: bool = True, width: int = 160,
+              texture: float = 25.0, seed: int = 0) -> Dict:
+    """
+    Drive a simulated robot through BENCH_SCRIPT and compare the odometry
+    pose with the true one
+
+    Args:
+        frames: Frames to process (the script repeats)
+        calibrated: Give the odometry the exact ground model
+        width: Tracking frame width
+        texture: Floor texture contrast (0 = plain floor)
+        seed: Arena seed
+
+    Returns:
+        Cost per frame and final yaw / position errors
+    """
+    from simulator import Arena, SimulatedRobot, SimulatedCamera, VirtualClock
+
+    rng = np.random.default_rng(seed)
+    arena = Arena.random(rng)
+    clock = VirtualClock()
+    robot = SimulatedRobot(arena, clock, pose=(arena.width / 2, arena.height / 2, 0.0))
+    camera = SimulatedCamera(robot, floor_texture=texture, seed=seed)
+    odometry = VisualOdometry(camera.camera_model() if calibrated else None, width=width)
+
+    start_pose = robot.pose
+    frame = camera.new_buffer()
+    costs = []
+    travelled = turned = 0.0
+    last = robot.pose
+    step, until = 0, 0.0
+    for _ in range(frames):
+        if clock.time() >= until:
+            command, seconds = BENCH_SCRIPT[step % len(BENCH_SCRIPT)]
+            robot._send_command(command)
+            until = clock.time() + seconds
+            step += 1
+        camera.read_into(frame)
+        t0 = time.perf_counter()
+        odometry.update(frame, clock.time())
+        costs.append(time.perf_counter() - t0)
+        pose = robot.pose
+        travelled += math.hypot(pose[0] - last[0], pose[1] - last[1])
+        turned += abs((pose[2] - last[2] + 180) % 360 - 180)
+        last = pose
+
+    # True motion in the start frame
+    c, s = math.cos(math.radians(start_pose[2])), math.sin(math.radians(start_pose[2]))
+    dx, dy = last[0] - start_pose[0], last[1] - start_pose[1]
+    true_x, true_y = dx * c + dy * s, -dx * s + dy * c
+    true_yaw = (last[2] - start_pose[2] + 180) % 360 - 180
+    x, y, yaw = odometry.pose
+    ms = np.array(costs) * 1000
+    return {
+        'frames': frames,
+        'ms_mean': float(ms.mean()),
+        'ms_p95': float(np.percentile(ms, 95)),
+        'lost': odometry.lost,
+        'turned_deg': turned,
+        'travelled_m': travelled,
+        'yaw_error_deg': (yaw - true_yaw + 180) % 360 - 180,
+        'position_error_m': math.hypot(x - true_x, y - true_y) if odometry.metric else None
+    }
+
+
+def main():
+    """Main entry point"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Visual odometry benchmark")
+    parser.add_argument('--frames', type=int, default=600)
+    parser.add_argument('--width', type=int, default=160, help="tracking frame width")
+    parser.add_argument('--texture', type=float, default=25.0, help="floor texture contrast")
+    parser.add_argument('--uncalibrated', action='store_true', help="yaw only, no ground model")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    result = benchmark(args.frames, not args.uncalibrated, args.width, args.texture, args.seed)
+    print(f"=== Visual Odometry: {result['frames']} frames, {args.width}px tracking, "
+          f"{'calibrated' if not args.uncalibrated else 'uncalibrated'} ===")
+    print(f"Cost:      {result['ms_mean']:.2f} ms/frame mean, {result['ms_p95']:.2f} ms p95 "
+          f"(budget {1000 / 30:.1f} ms at 30 fps)")
+    print(f"Lost:      {result['lost']} frames")
+    print(f"Yaw:       {result['yaw_error_deg']:+.1f} deg error after {result['turned_deg']:.0f} "
+          f"deg turned")
+    if result['position_error_m'] is not None:
+        print(f"Position:  {result['position_error_m'] * 100:.1f} cm error after "
+              f"{result['travelled_m']:.2f} m travelled")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())